@@ -172,7 +172,8 @@ class TaskQueue:
             my_rep_temp=params['my_rep_temp'],
             my_last_report_month=params['my_last_report_month'],
             my_last_actual_month=params['my_last_actual_month'],
-            project_id=settings.GCP_PROJECT_ID
+            project_id=settings.GCP_PROJECT_ID,
+            progress_callback=lambda done, total: setattr(task, 'progress', 30 + 65 * done // total)
         )
         
         task.progress = 100
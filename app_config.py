@@ -26,6 +26,16 @@ class Settings(BaseSettings):
     REP_CELL_TABLE_NAME: str = "RepCell"
     ALLOCATION_TO_ITEM_TABLE_NAME: str = "AllocationToItem_NativeTable"
     SO_CELL_TABLE_NAME: str = "so_cell_processed"
+
+    # Report build settings
+    # True = Plan / Actual / Forecast của mỗi RepTempBlock được đọc trong một scan (conditional aggregation)
+    REPORT_SO_CELL_SINGLE_SCAN: bool = False
+    # Số RepTempBlocks được build song song trong build_report (1 = tuần tự)
+    REPORT_BUILD_MAX_WORKERS: int = 4
+    # RepCells của các blocks được gom và load bằng một load job khi đạt số MB này (memory của các
+    # frames, và cuối report), để số load jobs không tăng theo số RepTempBlocks (quota load jobs
+    # mỗi table mỗi ngày). Khi load, frames được gộp lại nên peak memory khoảng gấp đôi ngưỡng này
+    REPORT_REP_CELL_LOAD_MB: int = 128
     
     # API settings
     API_HOST: str = "0.0.0.0"
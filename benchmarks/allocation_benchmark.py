@@ -0,0 +1,156 @@
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_data import DEFAULT_SEED, DEFAULT_Z_NUMBER, generate_allocation_dataset, scale_params
+from calculate.allocation_runner import ALLOCATION_RUN_CONFIG, run_allocate
+from db.sqlite_connector import SqliteConnector
+from utils.log_utils import configure_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BENCHMARK_DIR = os.path.join(".alloc_state", "benchmark")
+
+
+def _run_allocate_case(db_path: str, my_x_period: str, z_number: int, state_dir: str,
+                       chunk_size: Optional[int]) -> Dict:
+    """
+    Chạy run_allocate trên SQLite database của một case (trong process riêng để đo peak memory).
+    """
+    configure_logging()
+    bq = SqliteConnector(db_path, project_id=ALLOCATION_RUN_CONFIG['project_id'])
+    started = time.perf_counter()
+    summary = run_allocate(
+        z_number,
+        z_number,
+        my_x_period,
+        checkpoint_dir=state_dir,
+        chunk_size=chunk_size,
+        metrics_dir=os.path.join(state_dir, "metrics"),
+        bq=bq
+    )
+    wall_sec = time.perf_counter() - started
+    bq.close()
+    return {
+        'wall_sec': wall_sec,
+        # ru_maxrss: KB trên Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'totals_by_step': summary['totals_by_step']
+    }
+
+
+def run_benchmark_case(scale: str, to_item_fanout: Optional[int] = None, my_x_period: str = 'M2501',
+                       seed: int = DEFAULT_SEED, chunk_size: Optional[int] = None,
+                       benchmark_dir: str = DEFAULT_BENCHMARK_DIR) -> Dict:
+    """
+    Sinh dataset cho scale (database mới mỗi lần chạy) rồi chạy run_allocate trên local backend.
+
+    Returns:
+        Dict kết quả: throughput (source cells/s, output rows/s), peak RSS, số queries/inserts
+    """
+    params = scale_params(scale, to_item_fanout)
+    case_name = f"{scale}_fo{params['to_item_fanout']}" + (f"_chunk{chunk_size}" if chunk_size else "")
+    case_dir = os.path.join(benchmark_dir, case_name)
+    shutil.rmtree(case_dir, ignore_errors=True)
+    db_path = os.path.join(case_dir, "data.sqlite")
+
+    logger.info("[Benchmark] %s: generating %s source SoCells, fan-out %s",
+                case_name, params['source_cells'], params['to_item_fanout'])
+    started = time.perf_counter()
+    bq = SqliteConnector(db_path, project_id=ALLOCATION_RUN_CONFIG['project_id'])
+    generate_allocation_dataset(
+        bq,
+        ALLOCATION_RUN_CONFIG,
+        source_cells=params['source_cells'],
+        to_item_fanout=params['to_item_fanout'],
+        my_x_period=my_x_period,
+        seed=seed
+    )
+    bq.close()
+    generate_sec = time.perf_counter() - started
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        run = pool.apply(_run_allocate_case, (db_path, my_x_period, DEFAULT_Z_NUMBER, os.path.join(case_dir, "state"), chunk_size))
+
+    totals = run['totals_by_step'].values()
+    bq_calls = sum(total['bq_calls'] for total in totals)
+    rows_written = sum(total['rows_written'] for total in totals)
+    result = {
+        'case': case_name,
+        'scale': scale,
+        'source_cells': params['source_cells'],
+        'to_item_fanout': params['to_item_fanout'],
+        'chunk_size': chunk_size,
+        'seed': seed,
+        'generate_sec': round(generate_sec, 3),
+        'wall_sec': round(run['wall_sec'], 3),
+        'source_cells_per_sec': round(params['source_cells'] / run['wall_sec'], 1) if run['wall_sec'] else None,
+        'rows_written': rows_written,
+        'rows_written_per_sec': round(rows_written / run['wall_sec'], 1) if run['wall_sec'] else None,
+        'bq_calls': bq_calls,
+        'bq_sec': round(sum(total['bq_sec'] for total in totals), 3),
+        'peak_rss_mb': round(run['peak_rss_mb'], 1),
+        'totals_by_step': run['totals_by_step']
+    }
+    logger.info("[Benchmark] %s: %.3fs, %s source cells/s, %s rows written, %s queries/inserts, peak RSS %.1f MB",
+                case_name, result['wall_sec'], result['source_cells_per_sec'], rows_written, bq_calls,
+                result['peak_rss_mb'])
+    return result
+
+
+def format_benchmark_table(results: List[Dict]) -> str:
+    """Format kết quả các cases thành bảng text."""
+    headers = ['Case', 'Source cells', 'Fan-out', 'Wall s', 'Cells/s', 'Rows written', 'Rows/s', 'BQ calls', 'Peak MB']
+    rows = [
+        [result['case'], str(result['source_cells']), str(result['to_item_fanout']), f"{result['wall_sec']:.3f}",
+         str(result['source_cells_per_sec']), str(result['rows_written']), str(result['rows_written_per_sec']),
+         str(result['bq_calls']), f"{result['peak_rss_mb']:.1f}"]
+        for result in results
+    ]
+    widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(len(headers))]
+    lines = [" | ".join(headers[i].rjust(widths[i]) for i in range(len(headers)))]
+    lines.append("-+-".join("-" * width for width in widths))
+    for row in rows:
+        lines.append(" | ".join(row[i].rjust(widths[i]) for i in range(len(headers))))
+    return "\n".join(lines)
+
+
+def run_benchmark(scales: List[str], to_item_fanouts: Optional[List[int]] = None, my_x_period: str = 'M2501',
+                  seed: int = DEFAULT_SEED, chunk_size: Optional[int] = None,
+                  benchmark_dir: str = DEFAULT_BENCHMARK_DIR) -> List[Dict]:
+    """
+    Chạy benchmark cho mỗi (scale, fan-out) và ghi kết quả ra JSON trong benchmark_dir.
+
+    Args:
+        scales: Các scale trong BENCHMARK_SCALES ('1k', '100k', '10m')
+        to_item_fanouts: Các fan-out cần đo (default: fan-out của scale)
+        chunk_size: Truyền vào run_allocate (chunked mode)
+
+    Returns:
+        List kết quả theo case (xem run_benchmark_case)
+    """
+    configure_logging()
+    results = []
+    for scale in scales:
+        for to_item_fanout in to_item_fanouts or [None]:
+            results.append(run_benchmark_case(
+                scale,
+                to_item_fanout=to_item_fanout,
+                my_x_period=my_x_period,
+                seed=seed,
+                chunk_size=chunk_size,
+                benchmark_dir=benchmark_dir
+            ))
+
+    os.makedirs(benchmark_dir, exist_ok=True)
+    results_path = os.path.join(benchmark_dir, f"benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    logger.info("[Benchmark] Results (JSON: %s):\n%s", results_path, format_benchmark_table(results))
+    return results
@@ -0,0 +1,83 @@
+import logging
+import random
+import time
+import typing
+from dataclasses import fields
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic_data import DEFAULT_SEED
+from models.allocation_models import AllocationByType
+from models.report_models import RepCell
+from models.schema import schema_for
+from models.so_cell_model import SoCell
+from utils.log_utils import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _field_type(annotation):
+    """Optional[X] -> X"""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    return args[0] if args else annotation
+
+
+def generate_model_frame(model_cls, rows: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """
+    Sinh DataFrame (deterministic) với mọi column trong schema của model, giá trị theo kiểu
+    của field (str từ vocabulary nhỏ, int, float, datetime).
+    """
+    rng = random.Random(seed)
+    schema = schema_for(model_cls)
+    field_types = {f.name: _field_type(f.type) for f in fields(model_cls)}
+    columns = {}
+    for column, field in schema.column_to_field.items():
+        field_type = field_types[field]
+        if field_type is int:
+            columns[column] = [rng.randrange(1000) for _ in range(rows)]
+        elif field_type is float:
+            columns[column] = [rng.random() * 1000 for _ in range(rows)]
+        elif field_type is datetime:
+            columns[column] = pd.Timestamp('2025-01-01')
+        else:
+            vocabulary = [f"{field[:4]}{value:03d}" for value in range(50)] + [None]
+            columns[column] = [rng.choice(vocabulary) for _ in range(rows)]
+    return pd.DataFrame(columns, index=range(rows))
+
+
+def run_codec_benchmark(rows: int = 100_000, seed: int = DEFAULT_SEED) -> List[Dict]:
+    """
+    So sánh thời gian hydrate DataFrame thành model instances: df.iterrows() + from_bigquery_row
+    (cách cũ của from_dataframe) và codec theo cột của ModelSchema.decode_frame.
+
+    Returns:
+        List kết quả theo model (seconds mỗi cách, speedup)
+    """
+    configure_logging()
+    results = []
+    for model_cls in [AllocationByType, RepCell, SoCell]:
+        df = generate_model_frame(model_cls, rows, seed=seed)
+
+        started = time.perf_counter()
+        iterrows_items = [model_cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        iterrows_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        codec_items = schema_for(model_cls).decode_frame(df)
+        codec_sec = time.perf_counter() - started
+
+        result = {
+            'model': model_cls.__name__,
+            'rows': rows,
+            'columns': len(df.columns),
+            'iterrows_sec': round(iterrows_sec, 4),
+            'codec_sec': round(codec_sec, 4),
+            'speedup': round(iterrows_sec / codec_sec, 1) if codec_sec else None,
+            'equal': iterrows_items == codec_items
+        }
+        results.append(result)
+        logger.info("[Benchmark] %s: %s rows x %s columns, iterrows %.3fs, codec %.3fs (x%s)",
+                    result['model'], rows, result['columns'], iterrows_sec, codec_sec, result['speedup'])
+    return results
@@ -0,0 +1,99 @@
+import logging
+import random
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic_data import DEFAULT_SEED
+from config.field_mappings import YBLOCK_FIELD_MAPPING
+from models.allocation_models import AllocationByType
+from models.so_cell_model import SoCell
+from queries.by_type_matcher import ByTypeMatcher
+from queries.query_builder import create_allocation_key, group_socell_by_allocation
+from benchmarks.so_cell_index import SoCellIndex
+from utils.log_utils import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Các Y-block fields được dùng bởi patterns synthetic (sparse subset, phần còn lại NULL)
+MATCHER_BENCHMARK_FIELDS = ['to_y_block_kr1', 'to_y_block_kr2', 'to_y_block_cdt1', 'to_y_block_pt1', 'to_y_block_ch']
+
+
+def generate_match_workload(rows: int, patterns: int, values_per_field: int = 20, seed: int = DEFAULT_SEED):
+    """
+    Sinh (deterministic) AllocationByType patterns và DataFrame SoCells, mỗi SoCell copy các
+    giá trị của một pattern ngẫu nhiên, có thể điền thêm giá trị vào field pattern bỏ trống.
+
+    Returns:
+        Tuple (allocation_by_type_items, so_cell_df)
+    """
+    rng = random.Random(seed)
+    allocation_by_type_items = []
+    for y_number in range(patterns):
+        fields = {'to_y_block_kr1': f"K{rng.randrange(values_per_field * 10):04d}"}
+        for field in MATCHER_BENCHMARK_FIELDS[1:]:
+            if rng.random() < 0.4:
+                fields[field] = f"V{rng.randrange(values_per_field):03d}"
+        allocation_by_type_items.append(AllocationByType(z_number=422, y_number=y_number, **fields))
+
+    so_cell_rows = []
+    for _ in range(rows):
+        pattern = allocation_by_type_items[rng.randrange(patterns)]
+        row = {}
+        for field in MATCHER_BENCHMARK_FIELDS:
+            value = getattr(pattern, field)
+            if value is None and rng.random() < 0.2:
+                value = f"V{rng.randrange(values_per_field):03d}"
+            row[YBLOCK_FIELD_MAPPING[field]] = value
+        so_cell_rows.append(row)
+
+    return allocation_by_type_items, pd.DataFrame(so_cell_rows)
+
+
+def run_matcher_benchmark(rows: int = 100_000, patterns: int = 1_000, seed: int = DEFAULT_SEED) -> List[Dict]:
+    """
+    So sánh throughput (rows/s) của các cách match SoCells với AllocationByType patterns:
+    key grouping (group_socell_by_allocation + lookup theo key), SoCellIndex (giao posting lists
+    theo từng pattern) và ByTypeMatcher (một lần duyệt, exact và wildcard).
+
+    Returns:
+        List kết quả theo approach (seconds, rows/s, số (row, pattern) matches)
+    """
+    configure_logging()
+    allocation_by_type_items, so_cell_df = generate_match_workload(rows, patterns, seed=seed)
+    so_cell_items = SoCell.from_dataframe(so_cell_df)
+
+    # Mỗi approach tính cả keys của patterns (như trong run_allocate)
+    def key_grouping():
+        so_cell_map = group_socell_by_allocation(so_cell_items, so_cell_df)
+        return sum(len(so_cell_map.get(create_allocation_key(item), [])) for item in allocation_by_type_items)
+
+    def inverted_index():
+        so_cell_index = SoCellIndex(so_cell_df)
+        return sum(len(so_cell_index.match(create_allocation_key(item))) for item in allocation_by_type_items)
+
+    def matcher(wildcard):
+        return sum(len(rows_ids) for rows_ids in ByTypeMatcher(allocation_by_type_items, wildcard=wildcard).classify(so_cell_df).values())
+
+    results = []
+    for name, approach in [
+        ('key_grouping', key_grouping),
+        ('inverted_index', inverted_index),
+        ('matcher_exact', lambda: matcher(False)),
+        ('matcher_wildcard', lambda: matcher(True)),
+    ]:
+        started = time.perf_counter()
+        matched = approach()
+        elapsed = time.perf_counter() - started
+        results.append({
+            'approach': name,
+            'rows': rows,
+            'patterns': patterns,
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(rows / elapsed, 1) if elapsed else None,
+            'matches': matched
+        })
+        logger.info("[Benchmark] %s: %s rows x %s patterns in %.4fs (%s rows/s, %s matches)",
+                    name, rows, patterns, elapsed, results[-1]['rows_per_sec'], matched)
+    return results
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from queries.match_keys import SOCELL_KEY, _normalize_column
+
+
+class SoCellIndex:
+    """
+    Inverted index trên các Y-block columns của một batch SoCells (DataFrame của Step 70).
+
+    Mỗi (column, value) có một posting list: các row ids (sorted) có column = value. Pattern
+    của một AllocationByType (các fields có giá trị, field None = không ràng buộc) được resolve
+    bằng cách giao các posting lists (list ngắn nhất trước), thay vì build key cho mỗi row và
+    mỗi pattern. Chi phí lookup tỷ lệ với số rows khớp, không phải kích thước batch.
+
+    Với exact=True (default, giống group_socell_by_allocation) các column mà pattern không ràng
+    buộc phải NULL/rỗng ở row: mỗi row có một signature (bitmask các column có giá trị) và
+    candidate rows được lọc theo signature của pattern.
+
+    Runner dùng ByTypeMatcher (queries/by_type_matcher.py); SoCellIndex chỉ còn là baseline so
+    sánh trong matcher_benchmark.
+    """
+
+    def __init__(self, so_cell_df: pd.DataFrame, columns: Optional[List[str]] = None):
+        """
+        Args:
+            so_cell_df: DataFrame các SoCells (row i tương ứng item thứ i)
+            columns: Các columns được index theo thứ tự key (default: SOCELL_KEY.fields)
+        """
+        self.columns = tuple(columns or SOCELL_KEY.fields)
+        if len(self.columns) > 64:
+            raise ValueError(f"SoCellIndex supports at most 64 columns, got {len(self.columns)}")
+        self.length = len(so_cell_df) if so_cell_df is not None else 0
+        # column -> (row ids sorted theo value code, value -> (start, end) trong row ids)
+        self._postings: Dict[str, Tuple[np.ndarray, Dict[str, Tuple[int, int]]]] = {}
+        self._signatures = np.zeros(self.length, dtype=np.uint64)
+
+        if self.length == 0:
+            return
+
+        for position, column in enumerate(self.columns):
+            if column not in so_cell_df.columns:
+                continue
+            codes, uniques = pd.factorize(_normalize_column(so_cell_df[column]))
+            has_value = codes >= 0
+            if not has_value.any():
+                continue
+
+            self._signatures |= has_value.astype(np.uint64) << np.uint64(position)
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            sorted_codes = codes[order]
+            starts = np.searchsorted(sorted_codes, np.arange(len(uniques)), side='left')
+            ends = np.searchsorted(sorted_codes, np.arange(len(uniques)), side='right')
+            self._postings[column] = (
+                order,
+                {value: (int(start), int(end)) for value, start, end in zip(uniques, starts, ends)}
+            )
+
+    @property
+    def posting_count(self) -> int:
+        """Số (column, value) posting lists."""
+        return sum(len(values) for _, values in self._postings.values())
+
+    def postings(self, column: str, value) -> np.ndarray:
+        """Row ids (sorted) có column = value (value đã chuẩn hoá như key)."""
+        entry = self._postings.get(column)
+        if entry is None:
+            return np.empty(0, dtype=np.int32)
+        order, values = entry
+        bounds = values.get(value)
+        if bounds is None:
+            return np.empty(0, dtype=np.int32)
+        return order[bounds[0]:bounds[1]]
+
+    def match(self, key: tuple, exact: bool = True) -> np.ndarray:
+        """
+        Resolve một pattern thành row ids.
+
+        Args:
+            key: Tuple giá trị đã chuẩn hoá theo thứ tự columns (ví dụ create_allocation_key),
+                None = không ràng buộc
+            exact: True = các column None của pattern phải NULL/rỗng ở row
+
+        Returns:
+            numpy array row ids (sorted)
+        """
+        constrained = [(column, value) for column, value in zip(self.columns, key) if value is not None]
+        if not constrained:
+            rows = np.arange(self.length, dtype=np.int32)
+        else:
+            lists = sorted((self.postings(column, value) for column, value in constrained), key=len)
+            rows = lists[0]
+            for posting in lists[1:]:
+                if len(rows) == 0:
+                    break
+                rows = np.intersect1d(rows, posting, assume_unique=True)
+
+        if exact and len(rows):
+            signature = np.uint64(0)
+            for position, value in enumerate(key):
+                if value is not None:
+                    signature |= np.uint64(1) << np.uint64(position)
+            rows = rows[self._signatures[rows] == signature]
+        return rows
+
+    def select(self, items: List, key: tuple, exact: bool = True) -> List:
+        """
+        Các items (cùng thứ tự với DataFrame đã index) khớp pattern key.
+        """
+        return [items[row] for row in self.match(key, exact=exact)]
@@ -0,0 +1,192 @@
+import logging
+import math
+import random
+from typing import Dict, Optional
+
+from models.so_cell_model import SOCELL_COLUMN_TO_FIELD
+
+logger = logging.getLogger(__name__)
+
+# Các scale chuẩn của benchmark: số source SoCells (now_np = my_x_period) và fan-out to_items mỗi ALT
+BENCHMARK_SCALES = {
+    '1k': {'source_cells': 1_000, 'to_item_fanout': 3},
+    '100k': {'source_cells': 100_000, 'to_item_fanout': 12},
+    '10m': {'source_cells': 10_000_000, 'to_item_fanout': 12},
+}
+
+DEFAULT_SEED = 42
+DEFAULT_Z_NUMBER = 422
+DEFAULT_FROM_TYPE = 'NP'
+DEFAULT_TO_TYPE = 'NP'
+# Source SoCells của mỗi allocation_by_type_item (số by_type items = source_cells / cells_per_by_type)
+DEFAULT_CELLS_PER_BY_TYPE = 200
+# Tỷ lệ allocation_by_type_items dùng KR by_type (phần còn lại là offset by_type như '-1', '2')
+DEFAULT_KR_BY_TYPE_RATIO = 0.5
+# Tỷ lệ allocation_by_type_items đã có prev SoCell (source cells bị skip ở Step 120)
+DEFAULT_PREV_RATIO = 0.1
+KR_BY_TYPES = ['KR01', 'KR02', 'KR03', 'KR04']
+OFFSET_BY_TYPES = ['-2', '-1', '1', '2']
+CONFIG_UPLOAD_AT = '2025-01-01T00:00:00'
+
+SO_CELL_COLUMNS = list(SOCELL_COLUMN_TO_FIELD)
+# Các cột được filter bởi queries của run_allocate
+SO_CELL_INDEXES = [
+    ['now_y_block_kr_item_code_kr1', 'now_np'],
+    ['prev_y_block_kr_item_code_kr1', 'now_zblock2_alt'],
+]
+
+
+def _so_cell_row(**values) -> Dict:
+    row = dict.fromkeys(SO_CELL_COLUMNS)
+    row.update(values)
+    return row
+
+
+def _insert_in_batches(bq, dataset_id, table_id, rows, batch_size):
+    """Insert generator rows theo batch để memory không phụ thuộc vào scale."""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            bq.insert_rows(dataset_id, table_id, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        bq.insert_rows(dataset_id, table_id, batch)
+        total += len(batch)
+    return total
+
+
+def generate_allocation_dataset(
+        bq,
+        config: Dict,
+        source_cells: int,
+        to_item_fanout: int,
+        my_x_period: str = 'M2501',
+        z_number: int = DEFAULT_Z_NUMBER,
+        cells_per_by_type: int = DEFAULT_CELLS_PER_BY_TYPE,
+        kr_by_type_ratio: float = DEFAULT_KR_BY_TYPE_RATIO,
+        prev_ratio: float = DEFAULT_PREV_RATIO,
+        seed: int = DEFAULT_SEED,
+        batch_size: int = 10000
+) -> Dict[str, int]:
+    """
+    Sinh dữ liệu synthetic (deterministic theo seed) cho AllocationALT, AllocationToItem,
+    AllocationByType, AllocationByKR và so_cell_raw_full, insert qua connector (SqliteConnector).
+
+    - 1 ALT (z_number, NP -> NP) với to_item_fanout to_items MP01..MPnn
+    - ceil(source_cells / cells_per_by_type) allocation_by_type_items, mỗi item một key KR1 riêng;
+      by_type là KR type (có AllocationByKR + by_percent SoCells cho mọi to_item) hoặc offset
+    - source SoCells phân đều cho các by_type items, prev SoCells cho prev_ratio by_type items
+
+    Args:
+        bq: Connector có insert_rows (SqliteConnector)
+        config: Dict tên datasets/tables (ALLOCATION_RUN_CONFIG)
+        source_cells: Số source SoCells
+        to_item_fanout: Số to_items của ALT (1-99)
+        my_x_period: Period của source SoCells
+        seed: Random seed
+
+    Returns:
+        Dict số rows đã insert theo table
+    """
+    if not 1 <= to_item_fanout <= 99:
+        raise ValueError(f"to_item_fanout must be in [1, 99], got {to_item_fanout}")
+
+    rng = random.Random(seed)
+    config_dataset = config['allocation_config_dataset_name']
+    data_dataset = config['alloc_data_dataset_name']
+    so_cell_table = config['so_cell_table_name']
+    by_type_count = max(1, math.ceil(source_cells / cells_per_by_type))
+    to_items = [f"MP{i:02d}" for i in range(1, to_item_fanout + 1)]
+
+    counts = {}
+    counts[config['allocation_alt_table_name']] = _insert_in_batches(bq, config_dataset, config['allocation_alt_table_name'], [{
+        'ZNumber': z_number,
+        'FROM_ALT_FromALT': 'SYN-FROM',
+        'TO_ALT_ToALT': 'SYN-TO',
+        'FROM_Y_BLOCK_FromType': DEFAULT_FROM_TYPE,
+        'TO_Y_BLOCK_ToType': DEFAULT_TO_TYPE,
+    }], batch_size)
+
+    counts[config['allocation_to_item_table_name']] = _insert_in_batches(bq, config_dataset, config['allocation_to_item_table_name'], [{
+        'FROM_Y_BLOCK_FromType': DEFAULT_FROM_TYPE,
+        'FROM_Y_BLOCK_FromItem': None,
+        'TO_Y_BLOCK_ToType': DEFAULT_TO_TYPE,
+        'TO_Y_BLOCK_ToItem': to_item,
+        'Config_Upload_at': CONFIG_UPLOAD_AT,
+    } for to_item in to_items], batch_size)
+
+    by_types = [
+        rng.choice(KR_BY_TYPES) if rng.random() < kr_by_type_ratio else rng.choice(OFFSET_BY_TYPES)
+        for _ in range(by_type_count)
+    ]
+    counts[config['allocation_by_type_table_name']] = _insert_in_batches(bq, config_dataset, config['allocation_by_type_table_name'], ({
+        'ZNumber': z_number,
+        'YNumber': y_number,
+        'TO_Y_BLOCK_KR1': f"K{y_number:07d}",
+        'BY_BLOCK_ByType': by_type,
+        'Config_Upload_at': CONFIG_UPLOAD_AT,
+    } for y_number, by_type in enumerate(by_types)), batch_size)
+
+    counts[config['allocation_by_kr_table_name']] = _insert_in_batches(bq, config_dataset, config['allocation_by_kr_table_name'], [{
+        'TO_Y_BLOCK_KR1': f"PCT-{by_type}",
+        'TO_Y_BLOCK_KR4': DEFAULT_TO_TYPE,
+        'TO_Y_BLOCK_KR6': DEFAULT_FROM_TYPE,
+        'BY_BLOCK_ByType': by_type,
+        'Config_Upload_at': CONFIG_UPLOAD_AT,
+    } for by_type in KR_BY_TYPES], batch_size)
+
+    def so_cell_rows():
+        # by_percent SoCells: mỗi KR by_type chia 100% cho các to_items
+        for by_type in KR_BY_TYPES:
+            weights = [rng.random() + 0.1 for _ in to_items]
+            total_weight = sum(weights)
+            for to_item, weight in zip(to_items, weights):
+                yield _so_cell_row(
+                    so_row_id=f"PCT-{by_type}-{to_item}",
+                    now_y_block_kr_item_code_kr1=f"PCT-{by_type}",
+                    now_y_block_kr_item_code_kr4=DEFAULT_TO_TYPE,
+                    now_y_block_kr_item_code_kr6=DEFAULT_FROM_TYPE,
+                    now_y_block_period_mx=to_item,
+                    now_value=round(weight / total_weight, 6)
+                )
+
+        # prev SoCells: các by_type items này đã được allocate trước đó
+        for y_number in range(by_type_count):
+            if rng.random() < prev_ratio:
+                yield _so_cell_row(
+                    so_row_id=f"PREV-{y_number}",
+                    now_zblock2_alt=str(z_number),
+                    now_np=my_x_period,
+                    prev_y_block_kr_item_code_kr1=f"K{y_number:07d}"
+                )
+
+        for i in range(source_cells):
+            yield _so_cell_row(
+                so_row_id=f"SRC-{i}",
+                now_y_block_kr_item_code_kr1=f"K{i % by_type_count:07d}",
+                now_np=my_x_period,
+                now_value=round(rng.uniform(1, 1000), 2)
+            )
+
+    counts[so_cell_table] = _insert_in_batches(bq, data_dataset, so_cell_table, so_cell_rows(), batch_size)
+
+    for columns in SO_CELL_INDEXES:
+        bq.create_index(data_dataset, so_cell_table, columns)
+
+    logger.info("[Benchmark] Generated synthetic dataset (seed=%s): %s", seed, counts)
+    return counts
+
+
+def scale_params(scale: str, to_item_fanout: Optional[int] = None) -> Dict:
+    """
+    Lấy params của một scale trong BENCHMARK_SCALES (có thể override fan-out).
+    """
+    if scale not in BENCHMARK_SCALES:
+        raise ValueError(f"Unknown scale: {scale}. Expected one of: {', '.join(BENCHMARK_SCALES)}")
+    params = dict(BENCHMARK_SCALES[scale])
+    if to_item_fanout is not None:
+        params['to_item_fanout'] = to_item_fanout
+    return params
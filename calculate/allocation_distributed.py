@@ -0,0 +1,428 @@
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from db.bigquery_connector import BigQueryConnector
+from models.allocation_models import AllocationALT, AllocationByType, AllocationByKR
+from queries.match_keys import ALLOCATION_KEY, SOCELL_KEY, _normalize_value
+from services.checkpoint_service import AllocationCheckpoint
+from services.query_plan_cache import QueryPlanCache
+from services.run_metrics import RunMetrics, MeteredBigQuery
+from services.so_cell_store import by_kr_predicates
+from services.work_queue import SqliteWorkQueue, UnitHeartbeat, STATUS_PENDING, STATUS_RUNNING
+from utils.log_utils import configure_logging
+from calculate.allocation_runner import (
+    ALLOCATION_RUN_CONFIG,
+    DEFAULT_CHECKPOINT_DIR,
+    query_allocation_alt_items,
+    query_allocation_items,
+    query_allocation_by_kr_items,
+    should_skip_alt_item,
+    process_allocation_alt_item
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = ".alloc_state/work_queue.sqlite"
+
+# Unit đang chạy không cập nhật heartbeat trong số giây này (worker chết) được đưa về pending
+DEFAULT_STALE_AFTER_SEC = 600.0
+
+
+def make_run_key(min_alt, max_alt, my_x_period: str) -> str:
+    return f"{min_alt}-{max_alt}-{my_x_period}"
+
+
+def _alt_id(value) -> Optional[str]:
+    """ZNumber / ToALT -> string so sánh được (422, '422', 422.0 -> '422')."""
+    value = _normalize_value(value)
+    if value is None:
+        return None
+    try:
+        return str(int(float(value)))
+    except ValueError:
+        return value
+
+
+_KEY_POSITIONS = {field: position for position, field in enumerate(SOCELL_KEY.fields)}
+
+
+def build_alt_footprint(
+        my_allocation_alt_item: AllocationALT,
+        my_allocation_by_type_items: List[AllocationByType],
+        my_allocation_by_kr_items: List[AllocationByKR],
+        wildcard_match: bool = False
+) -> Optional[Dict]:
+    """
+    Các SoCells một ALT đọc và ghi trong so_cell table, suy ra từ config của ALT.
+
+    Output SoCells giữ NowYBlock của source SoCell (xem so_cell_factory), nên với exact match
+    NowYBlock của output là key của một allocation_by_type_item của ALT. Output được ghi với
+    now_zblock2_alt = ToALT.
+
+    Returns:
+        Dict gồm z_number, to_alt, keys (Step 70 / output keys) và kr_conditions (Step 160),
+        hoặc None nếu không giới hạn được: ByAgg (đọc / ghi theo PT, CTY, NP của mọi ALT) hoặc
+        wildcard match (NowYBlock của output không xác định từ config)
+    """
+    if wildcard_match or any(item.by_block_by_type == 'ByAgg' for item in my_allocation_by_type_items):
+        return None
+
+    return {
+        'z_number': _alt_id(my_allocation_alt_item.z_number),
+        'to_alt': _alt_id(my_allocation_alt_item.to_alt),
+        'keys': {ALLOCATION_KEY.key_of(item) for item in my_allocation_by_type_items
+                 if item.by_block_by_type != 'GAgg'},
+        'kr_conditions': [by_kr_predicates(kr_item) for kr_item in my_allocation_by_kr_items]
+    }
+
+
+def _key_matches(key: tuple, predicates: Dict) -> bool:
+    for column, value in predicates.items():
+        position = _KEY_POSITIONS.get(column)
+        if position is not None and key[position] != _normalize_value(value):
+            return False
+    return True
+
+
+def _reads_outputs_of(reader: Dict, writer: Dict) -> bool:
+    """reader có thể đọc output SoCells của writer (không xét now_np / to_items, để an toàn)."""
+    # Step 70: source SoCells khớp chính xác key của allocation_by_type_item
+    if reader['keys'] & writer['keys']:
+        return True
+    # Step 90: prev SoCells có now_zblock2_alt = ZNumber của reader
+    if writer['to_alt'] is not None and writer['to_alt'] == reader['z_number']:
+        return True
+    # Step 160: by_percent SoCells khớp điều kiện AllocationByKR
+    return any(_key_matches(key, predicates) for predicates in reader['kr_conditions'] for key in writer['keys'])
+
+
+def alts_independent(footprint_a: Optional[Dict], footprint_b: Optional[Dict]) -> bool:
+    """
+    Hai ALTs độc lập nếu không ALT nào đọc được output của ALT kia: chạy song song cho cùng
+    kết quả như chạy tuần tự theo thứ tự bất kỳ.
+    """
+    if footprint_a is None or footprint_b is None:
+        return False
+    return not _reads_outputs_of(footprint_a, footprint_b) and not _reads_outputs_of(footprint_b, footprint_a)
+
+
+def build_work_units(
+        bq: BigQueryConnector,
+        run_key: str,
+        my_allocation_alt_items: List[AllocationALT],
+        my_x_period: str
+) -> List[Dict]:
+    """
+    Mỗi ALT là một work unit, kèm dependencies theo thứ tự của run tuần tự (z_number).
+
+    Source query của một ALT (Step 70 / 90 / 160) đọc cả output của các ALTs chạy trước, nên
+    unit chỉ được claim khi mọi ALT trước nó không chứng minh được độc lập (alts_independent)
+    đã done. ALT không được chia theo allocation_by_type_item: Step 70 của ALT chạy một lần,
+    trước mọi output của ALT, và ByAgg chạy trước (Step 60).
+
+    Args:
+        bq: BigQueryConnector instance
+        run_key: Định danh của run
+        my_allocation_alt_items: List of AllocationALT (theo z_number)
+        my_x_period: Period của source cells (now_np)
+
+    Returns:
+        List of unit dicts (unit_id, z_number, my_x_period, seq, depends_on)
+    """
+    cfg = ALLOCATION_RUN_CONFIG
+    units = []
+    footprints = []
+
+    for my_allocation_alt_item in my_allocation_alt_items:
+        if should_skip_alt_item(my_allocation_alt_item):
+            continue
+
+        z_number = my_allocation_alt_item.z_number
+        _, my_allocation_by_type_items = query_allocation_items(
+            bq=bq,
+            project_id=cfg['project_id'],
+            allocation_config_dataset_name=cfg['allocation_config_dataset_name'],
+            allocation_to_item_table_name=cfg['allocation_to_item_table_name'],
+            allocation_by_type_table_name=cfg['allocation_by_type_table_name'],
+            my_allocation_alt_item=my_allocation_alt_item
+        )
+        my_allocation_by_kr_items = query_allocation_by_kr_items(
+            bq=bq,
+            project_id=cfg['project_id'],
+            allocation_config_dataset_name=cfg['allocation_config_dataset_name'],
+            allocation_by_kr_table_name=cfg['allocation_by_kr_table_name'],
+            my_allocation_alt_item=my_allocation_alt_item,
+            my_allocation_by_type_items=my_allocation_by_type_items
+        )
+        footprint = build_alt_footprint(
+            my_allocation_alt_item,
+            my_allocation_by_type_items,
+            my_allocation_by_kr_items,
+            wildcard_match=cfg.get('by_type_wildcard_match', False)
+        )
+
+        depends_on = [
+            unit['unit_id'] for unit, previous_footprint in zip(units, footprints)
+            if not alts_independent(footprint, previous_footprint)
+        ]
+        units.append({
+            'unit_id': f"{run_key}:{z_number}",
+            'z_number': z_number,
+            'my_x_period': my_x_period,
+            'seq': len(units),
+            'depends_on': depends_on
+        })
+        footprints.append(footprint)
+        logger.info("[Coordinator] z_number=%s: depends on %s of %s previous ALTs", z_number, len(depends_on), len(units) - 1)
+
+    return units
+
+
+def run_allocate_worker(
+        run_key: str,
+        queue_path: str = DEFAULT_QUEUE_PATH,
+        worker_id: Optional[str] = None,
+        wait_for_units: bool = False,
+        poll_interval_sec: float = 5.0,
+        chunk_size: Optional[int] = None,
+        stale_after_sec: float = DEFAULT_STALE_AFTER_SEC,
+        checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR,
+        query_plan_dir: Optional[str] = None
+) -> List[Dict]:
+    """
+    Worker: claim và xử lý work units của run cho đến khi queue hết unit pending.
+
+    Khi còn unit pending nhưng chưa claim được (dependencies đang chạy), worker chờ và poll lại.
+    Mỗi lần poll, các unit running không có heartbeat quá stale_after_sec được đưa về pending.
+
+    Mỗi unit có AllocationCheckpoint riêng trong checkpoint_dir (file theo run_key và z_number):
+    lần thử lại của unit (attempts > 1, sau khi worker trước lỗi hoặc bị requeue) resume từ
+    checkpoint đó và bỏ qua các allocation_by_type_items đã ghi output, thay vì ghi lại.
+    Worker không còn giữ unit khi xong (đã bị requeue) thì bỏ result của mình.
+
+    Args:
+        run_key: Định danh của run (từ coordinator)
+        queue_path: Đường dẫn file SQLite work queue
+        worker_id: Định danh worker (default: hostname-pid)
+        wait_for_units: True = khi hết unit pending nhưng còn unit running thì chờ
+            (unit có thể bị requeue), False = dừng ngay
+        poll_interval_sec: Số giây giữa các lần poll khi chờ
+        chunk_size: Chunked mode cho source SoCells (xem process_allocation_alt_item)
+        stale_after_sec: Unit running không có heartbeat quá số giây này được requeue
+        checkpoint_dir: Thư mục chứa checkpoint của các units (local disk, dùng chung giữa workers)
+        query_plan_dir: Thư mục cache query plans (None = không cache, xem run_allocate)
+
+    Returns:
+        List results của các units worker đã xử lý
+    """
+    configure_logging()
+    cfg = ALLOCATION_RUN_CONFIG
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = SqliteWorkQueue(queue_path)
+    bq = BigQueryConnector(
+        credentials_path=cfg['credentials_path'],
+        project_id=cfg['project_id']
+    )
+    alt_item_cache = {}
+    query_plan_cache = QueryPlanCache(query_plan_dir) if query_plan_dir else None
+    worker_results = []
+
+    logger.info("[Worker %s] Started for run %s", worker_id, run_key)
+
+    try:
+        while True:
+            unit = queue.claim(run_key, worker_id)
+            if unit is None:
+                stale = queue.requeue_stale(run_key, stale_after_sec)
+                if stale:
+                    logger.warning("[Worker %s] Requeued %s stale units", worker_id, stale)
+                    continue
+                counts = queue.summary(run_key)
+                if counts[STATUS_RUNNING] > 0 and (wait_for_units or counts[STATUS_PENDING] > 0):
+                    time.sleep(poll_interval_sec)
+                    continue
+                if counts[STATUS_PENDING] > 0:
+                    logger.warning("[Worker %s] %s pending units are blocked by failed dependencies", worker_id, counts[STATUS_PENDING])
+                break
+
+            logger.info("[Worker %s] Claimed unit %s (attempt %s)", worker_id, unit['unit_id'], unit['attempts'])
+            started_at = time.time()
+            stats = {}
+            metrics = RunMetrics(run_key=unit['unit_id'])
+            result = {'worker_id': worker_id}
+
+            try:
+                z_number = unit['z_number']
+                if z_number not in alt_item_cache:
+                    alt_items = query_allocation_alt_items(
+                        bq=bq,
+                        project_id=cfg['project_id'],
+                        allocation_config_dataset_name=cfg['allocation_config_dataset_name'],
+                        allocation_alt_table_name=cfg['allocation_alt_table_name'],
+                        min_alt=z_number,
+                        max_alt=z_number
+                    )
+                    alt_item_cache[z_number] = alt_items[0] if alt_items else None
+
+                my_allocation_alt_item = alt_item_cache[z_number]
+                if my_allocation_alt_item is None:
+                    raise ValueError(f"AllocationALT z_number={z_number} not found")
+
+                unit_checkpoint = AllocationCheckpoint(
+                    checkpoint_dir=checkpoint_dir,
+                    run_key=f"{run_key}-z{z_number}",
+                    resume=unit['attempts'] > 1
+                )
+                if unit_checkpoint.is_alt_done(z_number):
+                    # Lần thử trước đã ghi xong output nhưng không kịp complete unit
+                    logger.info("[Worker %s] Unit %s already written by a previous attempt", worker_id, unit['unit_id'])
+                    success = True
+                else:
+                    with UnitHeartbeat(queue_path, unit['unit_id'], worker_id), metrics.alt(z_number):
+                        success = process_allocation_alt_item(
+                            bq=MeteredBigQuery(bq, metrics),
+                            my_allocation_alt_item=my_allocation_alt_item,
+                            my_x_period=unit['my_x_period'],
+                            project_id=cfg['project_id'],
+                            allocation_config_dataset_name=cfg['allocation_config_dataset_name'],
+                            alloc_data_dataset_name=cfg['alloc_data_dataset_name'],
+                            allocation_to_item_table_name=cfg['allocation_to_item_table_name'],
+                            allocation_by_type_table_name=cfg['allocation_by_type_table_name'],
+                            allocation_by_kr_table_name=cfg['allocation_by_kr_table_name'],
+                            so_cell_table_name=cfg['so_cell_table_name'],
+                            checkpoint=unit_checkpoint,
+                            stats=stats,
+                            chunk_size=chunk_size,
+                            metrics=metrics,
+                            wildcard_match=cfg.get('by_type_wildcard_match', False),
+                            query_plan_cache=query_plan_cache
+                        )
+                result.update(stats)
+                result['metrics'] = metrics.to_dict()['totals_by_step']
+                result['duration_sec'] = round(time.time() - started_at, 3)
+
+                if success:
+                    unit_checkpoint.mark_alt_done(z_number)
+                    if not queue.complete(unit['unit_id'], worker_id, result):
+                        logger.warning("[Worker %s] Unit %s was requeued while running, result discarded", worker_id, unit['unit_id'])
+                        continue
+                    logger.info("[Worker %s] Completed unit %s: %s", worker_id, unit['unit_id'], {**stats, 'duration_sec': result['duration_sec']})
+                else:
+                    queue.fail(unit['unit_id'], worker_id, "Failed to insert SoCell records", result)
+                    logger.error("[Worker %s] Unit %s failed to insert SoCell records", worker_id, unit['unit_id'])
+
+            except Exception as e:
+                result.update(stats)
+                result['duration_sec'] = round(time.time() - started_at, 3)
+                queue.fail(unit['unit_id'], worker_id, f"{e}\n{traceback.format_exc()}", result)
+                logger.error("[Worker %s] Unit %s failed: %s", worker_id, unit['unit_id'], e)
+                continue
+
+            worker_results.append({'unit_id': unit['unit_id'], **result})
+    finally:
+        queue.close()
+
+    logger.info("[Worker %s] No more pending units, processed %s units", worker_id, len(worker_results))
+    return worker_results
+
+
+def _worker_process_main(run_key: str, queue_path: str, worker_id: str, chunk_size: Optional[int], stale_after_sec: float):
+    run_allocate_worker(run_key=run_key, queue_path=queue_path, worker_id=worker_id, chunk_size=chunk_size,
+                        stale_after_sec=stale_after_sec)
+
+
+def run_allocate_coordinator(
+        min_alt,
+        max_alt,
+        my_x_period: str,
+        queue_path: str = DEFAULT_QUEUE_PATH,
+        local_workers: int = 0,
+        max_attempts: int = 3,
+        chunk_size: Optional[int] = None,
+        stale_after_sec: float = DEFAULT_STALE_AFTER_SEC
+) -> Dict:
+    """
+    Coordinator: chia ALT range thành work units trên work queue dùng chung, rồi (tuỳ chọn)
+    khởi chạy local_workers worker processes và tổng hợp kết quả.
+
+    Worker processes khác trên cùng host chạy run_allocate_worker(run_key, queue_path) với cùng
+    queue file (queue file phải nằm trên local disk, xem SqliteWorkQueue).
+    Chạy lại coordinator với cùng tham số sẽ không tạo unit trùng và requeue các unit failed.
+
+    Args:
+        min_alt: ZNumber nhỏ nhất
+        max_alt: ZNumber lớn nhất
+        my_x_period: Period của source cells (now_np)
+        queue_path: Đường dẫn file SQLite work queue
+        local_workers: Số worker processes chạy trên máy coordinator (0 = chỉ enqueue)
+        max_attempts: Số lần thử tối đa của một unit khi requeue unit failed
+        chunk_size: Chunked mode cho local workers (xem process_allocation_alt_item)
+        stale_after_sec: Unit running không có heartbeat quá số giây này (worker chết) được requeue
+
+    Returns:
+        Dict gồm run_key, summary (số units theo status) và units (result/metrics từng unit)
+    """
+    configure_logging()
+    cfg = ALLOCATION_RUN_CONFIG
+    run_key = make_run_key(min_alt, max_alt, my_x_period)
+
+    bq = BigQueryConnector(
+        credentials_path=cfg['credentials_path'],
+        project_id=cfg['project_id']
+    )
+
+    my_allocation_alt_items = query_allocation_alt_items(
+        bq=bq,
+        project_id=cfg['project_id'],
+        allocation_config_dataset_name=cfg['allocation_config_dataset_name'],
+        allocation_alt_table_name=cfg['allocation_alt_table_name'],
+        min_alt=min_alt,
+        max_alt=max_alt
+    )
+
+    units = build_work_units(
+        bq=bq,
+        run_key=run_key,
+        my_allocation_alt_items=my_allocation_alt_items,
+        my_x_period=my_x_period
+    )
+
+    queue = SqliteWorkQueue(queue_path)
+    try:
+        added = queue.enqueue(run_key, units)
+        stale = queue.requeue_stale(run_key, stale_after_sec)
+        requeued = queue.requeue_failed(run_key, max_attempts=max_attempts)
+        logger.info("[Coordinator] Run %s: enqueued %s new units, requeued %s stale and %s failed units (%s units total) in %s", run_key, added, stale, requeued, len(units), queue_path)
+
+        if local_workers > 0:
+            processes = [
+                multiprocessing.Process(
+                    target=_worker_process_main,
+                    args=(run_key, queue_path, f"{socket.gethostname()}-local-{index}", chunk_size, stale_after_sec)
+                )
+                for index in range(local_workers)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+        summary = queue.summary(run_key)
+        unit_results = queue.results(run_key)
+    finally:
+        queue.close()
+
+    logger.info("[Coordinator] Run %s summary: %s", run_key, summary)
+    if summary[STATUS_PENDING] or summary[STATUS_RUNNING]:
+        logger.info("[Coordinator] Start workers with run_allocate_worker('%s', '%s') to process remaining units", run_key, queue_path)
+
+    return {
+        'run_key': run_key,
+        'summary': summary,
+        'units': unit_results
+    }
@@ -0,0 +1,283 @@
+import logging
+from typing import List, Dict
+from db.bigquery_connector import BigQueryConnector
+from models.allocation_models import AllocationALT, AllocationByKR
+from models.so_cell_model import SoCell
+from queries.query_builder import (
+    build_so_cell_batch_query,
+    build_so_cell_batch_count_query,
+    build_so_cell_prev_batch_query,
+    build_so_cell_by_kr_batch_query,
+    build_so_cell_byagg_query
+)
+from config.field_mappings import (
+    YBLOCK_MAPPING,
+    SO_CELL_SOURCE_COLUMNS,
+    SO_CELL_PREV_KEY_COLUMNS,
+    SO_CELL_BY_PERCENT_COLUMNS,
+    SO_CELL_VALUE_COLUMNS
+)
+
+logger = logging.getLogger(__name__)
+
+PLAN_STEPS = ['Step 40', 'Step 50', 'Step 55', 'Step 60', 'Step 70', 'Step 90', 'Step 160']
+
+
+def _is_offset_by_type(by_type) -> bool:
+    return bool(by_type) and str(by_type).lstrip('-').isdigit()
+
+
+def _pattern_so_cell(allocation_by_type_item, my_x_period: str) -> SoCell:
+    """
+    Tạo SoCell đại diện cho một AllocationByType item (NowYBlock = pattern của item)
+    để dry-run Step 90 query mà không cần đọc source cells thật.
+    """
+    so_cell = SoCell(now_np=my_x_period)
+    for so_cell_field, value in YBLOCK_MAPPING.items_of(allocation_by_type_item):
+        setattr(so_cell, so_cell_field, value)
+    return so_cell
+
+
+def plan_allocation_alt_item(
+        bq: BigQueryConnector,
+        my_allocation_alt_item: AllocationALT,
+        my_x_period: str,
+        project_id: str,
+        allocation_config_dataset_name: str,
+        alloc_data_dataset_name: str,
+        allocation_to_item_table_name: str,
+        allocation_by_type_table_name: str,
+        allocation_by_kr_table_name: str,
+        so_cell_table_name: str
+) -> Dict:
+    """
+    Ước lượng chi phí xử lý một AllocationALT item mà không ghi dữ liệu.
+
+    Config queries (Step 40/50/55) được thực thi thật vì plan phụ thuộc vào kết quả
+    của chúng; SoCell queries chỉ được dry-run. Số source cells lấy từ một COUNTIF
+    query duy nhất. Số queries/output rows của Step 160/Step 230 là cận trên vì
+    prev-check (Step 120) và by_percent lookup (Step 170) chưa được tính.
+
+    Returns:
+        Dictionary plan của ALT: z_number, queries, bytes, source_cells, output_rows
+    """
+    # Import ở đây để tránh circular import với allocation_runner
+    from calculate.allocation_runner import query_allocation_items
+
+    queries = {step: 0 for step in PLAN_STEPS}
+    bytes_scanned = {step: 0 for step in PLAN_STEPS}
+    source_cells = 0
+    output_rows = 0
+
+    # Step40-50
+    my_to_items, my_allocation_by_type_items = query_allocation_items(
+        bq=bq,
+        project_id=project_id,
+        allocation_config_dataset_name=allocation_config_dataset_name,
+        allocation_to_item_table_name=allocation_to_item_table_name,
+        allocation_by_type_table_name=allocation_by_type_table_name,
+        my_allocation_alt_item=my_allocation_alt_item
+    )
+    queries['Step 40'] += 1
+    queries['Step 50'] += 1
+
+    # Step55
+    my_from_type = my_allocation_alt_item.from_type
+    my_to_type = my_allocation_alt_item.to_type
+    by_types = {
+        item.by_block_by_type for item in my_allocation_by_type_items
+        if item.by_block_by_type and item.by_block_by_type not in ['GAgg', 'ByAgg']
+        and not _is_offset_by_type(item.by_block_by_type)
+    }
+    allocation_by_kr_map = {}
+    if by_types:
+        by_types_in_clause = "', '".join(by_types)
+        query_allocation_by_kr_batch = f"""
+        SELECT *
+        FROM `{project_id}.{allocation_config_dataset_name}.{allocation_by_kr_table_name}`
+        WHERE TO_Y_BLOCK_KR6 = '{my_from_type}'
+        AND TO_Y_BLOCK_KR4 = '{my_to_type}'
+        AND BY_BLOCK_ByType IN ('{by_types_in_clause}')
+        """
+        queries['Step 55'] += 1
+        for kr_item in AllocationByKR.from_dataframe(bq.execute_query(query_allocation_by_kr_batch)):
+            allocation_by_kr_map.setdefault(kr_item.by_block_by_type, kr_item)
+
+    # Step60: ByAgg - 3 to_item queries + 1 SoCell query cho mỗi tổ hợp PT-S2 x CTY-S2 x NP-D365
+    by_agg_count = sum(1 for item in my_allocation_by_type_items if item.by_block_by_type == 'ByAgg')
+    if by_agg_count:
+        query_by_agg_types = f"""
+        SELECT TO_Y_BLOCK_ToType, COUNT(TO_Y_BLOCK_ToItem) AS item_count
+        FROM `{project_id}.{allocation_config_dataset_name}.{allocation_to_item_table_name}`
+        WHERE TO_Y_BLOCK_ToType IN ('PT-S2', 'CTY-S2', 'NP-D365')
+        GROUP BY TO_Y_BLOCK_ToType
+        """
+        by_agg_type_df = bq.execute_query(query_by_agg_types)
+        item_counts = dict(zip(by_agg_type_df['TO_Y_BLOCK_ToType'], by_agg_type_df['item_count']))
+        combinations = (int(item_counts.get('PT-S2', 0)) * int(item_counts.get('CTY-S2', 0))
+                        * int(item_counts.get('NP-D365', 0)))
+
+        sample_query = build_so_cell_byagg_query(
+            project_id=project_id,
+            to_item_pts2='PT',
+            to_item_ctys2='CTY',
+            to_item_np_d365=my_x_period,
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name,
+            columns=SO_CELL_VALUE_COLUMNS
+        )
+        sample_bytes = bq.dry_run_query(sample_query) if combinations else 0
+        queries['Step 60'] += by_agg_count * (3 + combinations)
+        bytes_scanned['Step 60'] += by_agg_count * combinations * sample_bytes
+        output_rows += by_agg_count * combinations
+
+    # Step70
+    query_so_cell_batch = build_so_cell_batch_query(
+        my_allocation_by_type_items,
+        project_id,
+        my_x_period=my_x_period,
+        dataset_id=alloc_data_dataset_name,
+        table_id=so_cell_table_name,
+        columns=SO_CELL_SOURCE_COLUMNS
+    )
+    if query_so_cell_batch is not None:
+        queries['Step 70'] += 1
+        bytes_scanned['Step 70'] += bq.dry_run_query(query_so_cell_batch)
+
+        query_count, counted_items = build_so_cell_batch_count_query(
+            my_allocation_by_type_items,
+            project_id,
+            my_x_period=my_x_period,
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name
+        )
+        count_row = bq.execute_query(query_count).iloc[0] if query_count else {}
+
+        # Step80-230 per allocation_by_type_item
+        for index, my_allocation_by_type_item in enumerate(counted_items):
+            item_cells = int(count_row[f"cnt_{index}"] or 0)
+            if item_cells == 0:
+                continue
+            source_cells += item_cells
+
+            query_prev = build_so_cell_prev_batch_query(
+                from_so_cell_items=[_pattern_so_cell(my_allocation_by_type_item, my_x_period)],
+                z_number=my_allocation_alt_item.z_number,
+                project_id=project_id,
+                dataset_id=alloc_data_dataset_name,
+                table_id=so_cell_table_name,
+                columns=SO_CELL_PREV_KEY_COLUMNS
+            )
+            if query_prev is None:
+                continue
+            queries['Step 90'] += 1
+            bytes_scanned['Step 90'] += bq.dry_run_query(query_prev)
+
+            my_by_type = my_allocation_by_type_item.by_block_by_type
+            if _is_offset_by_type(my_by_type):
+                output_rows += item_cells
+                continue
+
+            allocation_by_kr_item = allocation_by_kr_map.get(my_by_type)
+            if allocation_by_kr_item is None:
+                continue
+
+            query_by_percent = build_so_cell_by_kr_batch_query(
+                allocation_by_kr_item=allocation_by_kr_item,
+                to_items=[item.to_item for item in my_to_items],
+                project_id=project_id,
+                dataset_id=alloc_data_dataset_name,
+                table_id=so_cell_table_name,
+                columns=SO_CELL_BY_PERCENT_COLUMNS
+            )
+            if query_by_percent is None:
+                continue
+
+            # Step160 query được issue một lần cho mỗi source cell
+            queries['Step 160'] += item_cells
+            bytes_scanned['Step 160'] += item_cells * bq.dry_run_query(query_by_percent)
+
+            if my_from_type == 'NP':
+                output_rows += item_cells * len(my_to_items)
+
+    return {
+        'z_number': my_allocation_alt_item.z_number,
+        'queries': queries,
+        'bytes': bytes_scanned,
+        'source_cells': source_cells,
+        'output_rows': output_rows
+    }
+
+
+def format_plan_report(alt_plans: List[Dict]) -> str:
+    """
+    Format kết quả plan thành bảng text: mỗi dòng một ALT, cột là số queries
+    theo step, tổng bytes (GB), source cells và output rows ước lượng.
+    """
+    headers = ['ZNumber'] + [f"Q {step[5:]}" for step in PLAN_STEPS] + ['GB scanned', 'Source cells', 'Output rows']
+    rows = []
+    for plan in alt_plans:
+        rows.append(
+            [str(plan['z_number'])]
+            + [str(plan['queries'][step]) for step in PLAN_STEPS]
+            + [f"{sum(plan['bytes'].values()) / 1024 ** 3:.3f}", str(plan['source_cells']), str(plan['output_rows'])]
+        )
+    rows.append(
+        ['TOTAL']
+        + [str(sum(plan['queries'][step] for plan in alt_plans)) for step in PLAN_STEPS]
+        + [f"{sum(sum(plan['bytes'].values()) for plan in alt_plans) / 1024 ** 3:.3f}",
+           str(sum(plan['source_cells'] for plan in alt_plans)),
+           str(sum(plan['output_rows'] for plan in alt_plans))]
+    )
+
+    widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(len(headers))]
+    lines = [" | ".join(headers[i].rjust(widths[i]) for i in range(len(headers)))]
+    lines.append("-+-".join("-" * width for width in widths))
+    for row in rows:
+        lines.append(" | ".join(row[i].rjust(widths[i]) for i in range(len(headers))))
+    return "\n".join(lines)
+
+
+def plan_allocate(
+        bq: BigQueryConnector,
+        my_allocation_alt_items: List[AllocationALT],
+        my_x_period: str,
+        project_id: str,
+        allocation_config_dataset_name: str,
+        alloc_data_dataset_name: str,
+        allocation_to_item_table_name: str,
+        allocation_by_type_table_name: str,
+        allocation_by_kr_table_name: str,
+        so_cell_table_name: str
+) -> List[Dict]:
+    """
+    Dry-run planning cho run_allocate: đi qua config của từng ALT và ước lượng
+    số queries theo step, bytes scan, số source cells và output rows. Không ghi
+    bất kỳ dữ liệu nào.
+
+    Returns:
+        List plan của từng ALT (xem plan_allocation_alt_item)
+    """
+    alt_plans = []
+    for my_allocation_alt_item in my_allocation_alt_items:
+        if my_allocation_alt_item.z_number != 422:
+            logger.warning("[Plan] Skip my_allocation_alt_item: %s because z_number is not equal 422 for testing purpose, remove it when calculating in production mode", my_allocation_alt_item)
+            continue
+
+        alt_plan = plan_allocation_alt_item(
+            bq=bq,
+            my_allocation_alt_item=my_allocation_alt_item,
+            my_x_period=my_x_period,
+            project_id=project_id,
+            allocation_config_dataset_name=allocation_config_dataset_name,
+            alloc_data_dataset_name=alloc_data_dataset_name,
+            allocation_to_item_table_name=allocation_to_item_table_name,
+            allocation_by_type_table_name=allocation_by_type_table_name,
+            allocation_by_kr_table_name=allocation_by_kr_table_name,
+            so_cell_table_name=so_cell_table_name
+        )
+        alt_plans.append(alt_plan)
+        logger.info("[Plan] z_number=%s: queries=%s, bytes=%s, source_cells=%s, output_rows=%s", alt_plan['z_number'], alt_plan['queries'], sum(alt_plan['bytes'].values()), alt_plan['source_cells'], alt_plan['output_rows'])
+
+    logger.info("[Plan] Dry-run plan for my_x_period=%s:\n%s", my_x_period, format_plan_report(alt_plans))
+    return alt_plans
@@ -1,7 +1,11 @@
-import copy
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from db.bigquery_connector import BigQueryConnector
 from models.allocation_models import AllocationALT, AllocationToItem, AllocationByType, AllocationByKR
-from models.so_cell_model import SoCell
+from models.so_cell_model import SoCell, SoCellBatch
 from queries.query_builder import (
     build_so_cell_query, 
     build_so_cell_by_kr_query, 
@@ -9,15 +13,96 @@ from queries.query_builder import (
     build_so_cell_batch_query,
     build_so_cell_prev_batch_query,
     build_so_cell_by_kr_batch_query,
-    create_allocation_key,
-    group_socell_by_allocation,
+    build_so_cell_byagg_query,
     create_prev_socell_key,
     group_prev_socell_by_key,
     group_by_percent_results
 )
-from utils.period_utils import add_period_strings
-from services.allocation_service import calculate_offset
-from services.so_cell_factory import create_socell_from_yblocks
+from queries.by_type_matcher import ByTypeMatcher
+from config.field_mappings import (
+    SO_CELL_SOURCE_COLUMNS,
+    SO_CELL_PREV_KEY_COLUMNS,
+    SO_CELL_BY_PERCENT_COLUMNS,
+    SO_CELL_VALUE_COLUMNS
+)
+from utils.period_utils import parse_period, parse_period_offset, format_period
+from services.allocation_service import calculate_offset_batch
+from services.so_cell_factory import overlay_socell_from_yblocks, materialize_so_cells
+from services.checkpoint_service import AllocationCheckpoint, by_type_unit_key
+from services.run_metrics import RunMetrics, MeteredBigQuery, NULL_METRICS
+from services.output_spool import OutputSpool, DEFAULT_SPOOL_FLUSH_ROWS
+from services.so_cell_store import (
+    SoCellStore,
+    prev_conditions,
+    by_kr_predicates
+)
+from services.query_plan_cache import QueryPlanCache, compile_alt_query_plan
+from calculate.allocation_planner import plan_allocate
+from utils.log_utils import StepLogSampler, configure_logging
+
+logger = logging.getLogger(__name__)
+
+ALLOCATION_RUN_CONFIG = {
+    'credentials_path': "/home/tunk/Desktop/fp-a-project-0c82aa55ae6a.json",
+    'project_id': "fp-a-project",
+    'allocation_config_dataset_name': "allocation_config",
+    'alloc_data_dataset_name': "alloc_stage",
+    'allocation_alt_table_name': "AllocationALT_NativeTable",
+    'allocation_to_item_table_name': "AllocationToItem_NativeTable",
+    'allocation_by_type_table_name': "AllocationByType_NativeTable",
+    'allocation_by_kr_table_name': "AllocationByKR_NativeTable",
+    'so_cell_table_name': "so_cell_raw_full",
+    # True = field None của AllocationByType khớp mọi giá trị (một SoCell có thể khớp nhiều by_type items)
+    'by_type_wildcard_match': False,
+}
+
+DEFAULT_CHECKPOINT_DIR = ".alloc_state"
+DEFAULT_METRICS_DIR = os.path.join(DEFAULT_CHECKPOINT_DIR, "metrics")
+
+# ALT có từ số source cells này trở lên được ghi (Step 240) sau từng allocation_by_type_item
+BY_TYPE_CHECKPOINT_MIN_CELLS = 10000
+
+
+def query_allocation_alt_items(
+        bq: BigQueryConnector,
+        project_id: str,
+        allocation_config_dataset_name: str,
+        allocation_alt_table_name: str,
+        min_alt,
+        max_alt
+) -> List[AllocationALT]:
+    """
+    Step20: Query các AllocationALT items trong khoảng [min_alt, max_alt].
+
+    Returns:
+        List of AllocationALT (ORDER BY ZNumber)
+    """
+    query = f"""
+    SELECT
+        ZNumber,
+        FROM_ALT_FromALT,
+        TO_ALT_ToALT,
+        FROM_Y_BLOCK_FromType,
+        TO_Y_BLOCK_ToType
+    FROM `{project_id}.{allocation_config_dataset_name}.{allocation_alt_table_name}` 
+    WHERE ZNumber >= {min_alt} AND ZNumber <= {max_alt}
+    ORDER BY ZNumber 
+    """
+    df = bq.execute_query(query)
+    my_allocation_alt_items = AllocationALT.from_dataframe(df)
+
+    logger.info("[Step 20] We having %s my_allocation_alt_items by query: \n %s", len(my_allocation_alt_items), query)
+    return my_allocation_alt_items
+
+
+def should_skip_alt_item(my_allocation_alt_item: AllocationALT) -> bool:
+    """
+    Step30: Filter ALT items trước khi xử lý (hiện tại chỉ chạy z_number 422 để test).
+    """
+    if my_allocation_alt_item.z_number != 422:
+        logger.warning("[Step 30] Skip process my_allocation_alt_item: %s because z_number is not equal 422 for testing purpose, remove it when calculating in production mode", my_allocation_alt_item)
+        return True
+    return False
 
 
 def query_allocation_items(
@@ -51,7 +136,7 @@ def query_allocation_items(
     my_to_items_raw = bq.execute_query(query_to_item)
     my_to_items = AllocationToItem.from_dataframe(my_to_items_raw)
     
-    print(f"[INFO][Step 40] We having {len(my_to_items)} my_to_items by query: \n {query_to_item}")
+    logger.info("[Step 40] We having %s my_to_items by query: \n %s", len(my_to_items), query_to_item)
     
     # Query AllocationByType
     query_by_type = f"""
@@ -64,11 +149,55 @@ def query_allocation_items(
     my_by_type_raw = bq.execute_query(query_by_type)
     my_allocation_by_type_items = AllocationByType.from_dataframe(my_by_type_raw)
     
-    print(f"[INFO][Step 50] We having {len(my_allocation_by_type_items)} my_allocation_by_type_items by query: \n {query_by_type}")
+    logger.info("[Step 50] We having %s my_allocation_by_type_items by query: \n %s", len(my_allocation_by_type_items), query_by_type)
     
     return my_to_items, my_allocation_by_type_items
 
 
+def query_allocation_by_kr_items(
+        bq: BigQueryConnector,
+        project_id: str,
+        allocation_config_dataset_name: str,
+        allocation_by_kr_table_name: str,
+        my_allocation_alt_item: AllocationALT,
+        my_allocation_by_type_items: List[AllocationByType]
+) -> List[AllocationByKR]:
+    """
+    Step 55: Query AllocationByKR của các by_types (không gồm GAgg / ByAgg / offset) của ALT
+    bằng một batch query.
+
+    Returns:
+        List of AllocationByKR (rỗng nếu ALT không có by_type cần AllocationByKR)
+    """
+    # Get unique by_types from allocation_by_type_items
+    by_types = set()
+    for item in my_allocation_by_type_items:
+        if item.by_block_by_type and item.by_block_by_type not in ['GAgg', 'ByAgg']:
+            # Only include numeric by_types
+            if str(item.by_block_by_type).lstrip('-').isdigit():
+                continue
+            by_types.add(item.by_block_by_type)
+
+    if not by_types:
+        logger.info("[Step 55] No valid by_types found, allocation_by_kr_map is empty")
+        return []
+
+    by_types_in_clause = "', '".join(by_types)
+    query_allocation_by_kr_batch = f"""
+    SELECT * 
+    FROM `{project_id}.{allocation_config_dataset_name}.{allocation_by_kr_table_name}` 
+    WHERE TO_Y_BLOCK_KR6 = '{my_allocation_alt_item.from_type}'
+    AND TO_Y_BLOCK_KR4 = '{my_allocation_alt_item.to_type}'
+    AND BY_BLOCK_ByType IN ('{by_types_in_clause}')
+    """
+
+    logger.info("[Step 55] Executing batch allocation_by_kr query for %s by_types", len(by_types))
+    allocation_by_kr_raw = bq.execute_query(query_allocation_by_kr_batch)
+    all_allocation_by_kr_items = AllocationByKR.from_dataframe(allocation_by_kr_raw)
+    logger.info("[Step 55] Batch query returned %s allocation_by_kr items", len(all_allocation_by_kr_items))
+    return all_allocation_by_kr_items
+
+
 def process_by_agg_allocation(
         bq: BigQueryConnector,
         project_id: str,
@@ -76,10 +205,13 @@ def process_by_agg_allocation(
         allocation_to_item_table_name: str,
         alloc_data_dataset_name: str,
         so_cell_table_name: str
-):
+) -> bool:
     """
     Process ByAgg allocation type by querying PT-S2, CTY-S2, and NP-D365 items,
     then aggregating and inserting SoCell data.
+
+    Các aggregated SoCells được insert trong một batch request sau khi đã tính xong tất cả
+    combinations, để ByAgg unit trong checkpoint ứng với đúng một lần ghi.
     
     Args:
         bq: BigQueryConnector instance
@@ -88,6 +220,9 @@ def process_by_agg_allocation(
         allocation_to_item_table_name: Table name for AllocationToItem
         alloc_data_dataset_name: Dataset name for allocation data
         so_cell_table_name: Table name for SoCell
+
+    Returns:
+        True nếu insert thành công hoặc không có combination nào
     """
     # Query PT-S2 items
     query_pt_s2 = f"""
@@ -117,27 +252,20 @@ def process_by_agg_allocation(
     np_d365_items = [str(item) for item in np_d365_raw['TO_Y_BLOCK_ToItem'].dropna().tolist()]
     
     # Process all combinations
+    insert_so_cells_byagg = []
     for my_to_item_pts2 in pt_s2_items:
         for my_to_item_ctys2 in cty_s2_items:
             for my_to_item_np_d365 in np_d365_items:
                 # Query and aggregate SoCell data
-                query_so_cell_byagg = f"""
-                SELECT * 
-                FROM `{project_id}.{alloc_data_dataset_name}.{so_cell_table_name}` 
-                WHERE now_y_block_fnf_fnf = "KRN"
-                AND now_y_block_kr_item_code_kr1 = "NO"
-                AND now_y_block_kr_item_code_kr2 = "GI"
-                AND now_y_block_kr_item_code_kr3 = "DAU"
-                AND now_y_block_kr_item_code_kr4 = "DC"
-                AND now_y_block_kr_item_code_kr5 = "NP"
-                AND CONCAT(now_y_block_ptnow_pt1, now_y_block_ptnow_pt2) = '{my_to_item_pts2}'
-                AND CONCAT(now_y_block_ptsub_cty1, now_y_block_ptsub_cty2) = '{my_to_item_ctys2}'
-                AND NOW_NP = '{my_to_item_np_d365}'
-                AND now_y_block_cdt_cdt1 IS NOT NULL
-                AND now_y_block_cdt_cdt2 IS NOT NULL
-                AND now_y_block_cdt_cdt3 IS NOT NULL
-                AND now_y_block_cdt_cdt4 IS NOT NULL
-                """
+                query_so_cell_byagg = build_so_cell_byagg_query(
+                    project_id=project_id,
+                    to_item_pts2=my_to_item_pts2,
+                    to_item_ctys2=my_to_item_ctys2,
+                    to_item_np_d365=my_to_item_np_d365,
+                    dataset_id=alloc_data_dataset_name,
+                    table_id=so_cell_table_name,
+                    columns=SO_CELL_VALUE_COLUMNS
+                )
                 so_cell_byagg_raw = bq.execute_query(query_so_cell_byagg)
                 so_cell_byagg_items = SoCell.from_dataframe(so_cell_byagg_raw)
                 
@@ -156,7 +284,7 @@ def process_by_agg_allocation(
                 cty2 = my_to_item_ctys2[2:] if len(my_to_item_ctys2) > 2 else None
                 
                 # Create aggregated SoCell record
-                insert_so_cell_byagg = SoCell(
+                insert_so_cells_byagg.append(SoCell(
                     now_y_block_fnf_fnf="KRN",
                     now_y_block_kr_item_code_kr1="NO",
                     now_y_block_kr_item_code_kr2="GI",
@@ -245,331 +373,901 @@ def process_by_agg_allocation(
                     prev_value=None,
                     by_block_bytype='ByAgg',
                     by_block_bypercent=None
-                )
-                
-                # Insert aggregated record
-                success = bq.insert_row(
+                ))
+                logger.info("ByAgg: Aggregated SoCell with value=%s, PTS2=%s, CTYS2=%s, NPD365=%s", value_2, my_to_item_pts2, my_to_item_ctys2, my_to_item_np_d365)
+
+    if not insert_so_cells_byagg:
+        return True
+
+    # Insert all aggregated records
+    success = bq.insert_rows_batch(
+        dataset_id=alloc_data_dataset_name,
+        table_id=so_cell_table_name,
+        rows_data=insert_so_cells_byagg
+    )
+    if success:
+        logger.info("ByAgg: Successfully batch inserted %s aggregated SoCells", len(insert_so_cells_byagg))
+    else:
+        logger.error("ByAgg: Failed to batch insert %s aggregated SoCells", len(insert_so_cells_byagg))
+    return success
+
+
+def allocate_from_so_cell_items(
+        bq: BigQueryConnector,
+        my_allocation_alt_item: AllocationALT,
+        my_allocation_by_type_item: AllocationByType,
+        from_so_cell_items: List[SoCell],
+        my_to_items: List[AllocationToItem],
+        allocation_by_kr_map: Dict,
+        project_id: str,
+        alloc_data_dataset_name: str,
+        so_cell_table_name: str,
+        metrics: Optional[RunMetrics] = None,
+        so_cell_store: Optional[SoCellStore] = None,
+        query_plan: Optional[Dict] = None
+) -> Tuple[List[SoCell], List[SoCell]]:
+    """
+    Step90-230: Prev-check, by_percent join và tạo output SoCells cho một nhóm
+    from_so_cell_items của một allocation_by_type_item.
+
+    Args:
+        bq: BigQueryConnector instance
+        my_allocation_alt_item: AllocationALT item
+        my_allocation_by_type_item: AllocationByType item của các from_so_cell_items
+        from_so_cell_items: Source SoCells (toàn bộ hoặc một chunk)
+        my_to_items: AllocationToItem items của ALT
+        allocation_by_kr_map: Map (from_type, to_type, by_type) -> AllocationByKR
+        project_id: GCP project ID
+        alloc_data_dataset_name: Dataset name for allocation data
+        so_cell_table_name: Table name for SoCell
+        metrics: RunMetrics của run (optional)
+        so_cell_store: SoCellStore của run (optional), prev SoCells và by_percent được lọc từ
+            slices đã cache thay vì query lại
+        query_plan: Query plan của ALT (optional, xem compile_alt_query_plan): conditions của
+            Step 160 theo by_type được dùng lại thay vì build từ AllocationByKR cho mỗi source cell
+
+    Returns:
+        Tuple (insert_so_cells, offset_so_cell_items): output SoCells cần insert và
+        các source SoCells của offset by_type (xử lý bằng insert_offset_outputs)
+    """
+    insert_so_cells = []
+    offset_so_cell_items = []
+    my_from_type = my_allocation_alt_item.from_type
+    my_to_type = my_allocation_alt_item.to_type
+    metrics = metrics or NULL_METRICS
+    # Per-cell/per-to_item messages chỉ được log ở DEBUG (sampled), INFO chỉ có dòng tổng hợp cuối hàm
+    sampler = StepLogSampler(logger)
+
+    # Step90: Batch query all prev SoCells for this allocation_by_type_item
+    with metrics.step("Step 90"):
+        logger.info("[Step 90] Building batch query for %s prev SoCells", len(from_so_cell_items))
+        query_so_cell_prev_batch = build_so_cell_prev_batch_query(
+            from_so_cell_items=from_so_cell_items,
+            z_number=my_allocation_alt_item.z_number,
+            project_id=project_id,
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name,
+            columns=SO_CELL_PREV_KEY_COLUMNS
+        )
+
+        if query_so_cell_prev_batch is None:
+            logger.warning("[Step 90] No valid prev query conditions, skipping")
+            return insert_so_cells, offset_so_cell_items
+
+        so_cell_prev_raw = None
+        if so_cell_store is not None:
+            so_cell_prev_raw = so_cell_store.select(
+                predicates={'now_zblock2_alt': str(my_allocation_alt_item.z_number)},
+                columns=SO_CELL_PREV_KEY_COLUMNS,
+                conditions=prev_conditions(from_so_cell_items)
+            )
+        if so_cell_prev_raw is None:
+            logger.info("[Step 90] Executing batch prev query")
+            so_cell_prev_raw = bq.execute_query(query_so_cell_prev_batch)
+        all_prev_so_cell_items = list(SoCellBatch.from_dataframe(so_cell_prev_raw))
+        logger.info("[Step 90] Batch prev query returned %s prev SoCell items", len(all_prev_so_cell_items))
+
+        # Group prev SoCell items by key for fast lookup
+        prev_so_cell_map = group_prev_socell_by_key(all_prev_so_cell_items, so_cell_prev_raw)
+        metrics.add(keys_grouped=len(prev_so_cell_map))
+        logger.info("[Step 90] Grouped prev SoCells into %s unique keys", len(prev_so_cell_map))
+
+    is_offset_by_type = bool(my_allocation_by_type_item.by_block_by_type) and str(
+        my_allocation_by_type_item.by_block_by_type).lstrip('-').isdigit()
+
+    # Step100: Process each from_so_cell_item using the prev map
+    with metrics.step("Step 100-230"):
+        for from_so_cell_item in from_so_cell_items:
+            y_block_1 = from_so_cell_item
+            x_period_1 = from_so_cell_item.now_np
+            value_1 = from_so_cell_item.now_value
+            sampler.debug("Step 100", "We have y_block_1: %s, x_period_1: %s, value_1: %s", y_block_1, x_period_1, value_1)
+
+            # Lookup prev SoCell items from map using key
+            prev_key = create_prev_socell_key(y_block_1)
+            so_cells_prev_y_block = prev_so_cell_map.get(prev_key, [])
+            sampler.debug("Step 110", "Found %s prev SoCell items for key: %.100s...", len(so_cells_prev_y_block), prev_key)
+
+            if len(so_cells_prev_y_block) > 0:
+                sampler.debug("Step 120", "Skip process because so_cells_prev_y_block is empty (N=0)")
+                continue
+
+            if is_offset_by_type:
+                # Offset case: gom lại để tính và insert một lần sau vòng lặp
+                offset_so_cell_items.append(y_block_1)
+                continue
+
+            # Lookup allocation_by_kr from map instead of querying
+            my_by_type = my_allocation_by_type_item.by_block_by_type
+            lookup_key = (my_from_type, my_to_type, my_by_type)
+            allocation_by_kr_item = allocation_by_kr_map.get(lookup_key)
+
+            if allocation_by_kr_item is None:
+                sampler.debug("Step 150", "No allocation_by_kr_item found for key %s, skipping", lookup_key)
+                continue
+
+            sampler.debug("Step 150", "Found allocation_by_kr_item from map for key %s: %s", lookup_key, allocation_by_kr_item)
+
+            kr_block_3 = allocation_by_kr_item
+
+            # Step160: Batch query all by_percent values for all my_to_items
+            with metrics.step("Step 160"):
+                sampler.debug("Step 160", "Building batch query for %s by_percent values", len(my_to_items))
+                to_item_values = [item.to_item for item in my_to_items]
+                kr_plan = query_plan['by_kr'].get(str(my_by_type)) if query_plan else None
+
+                by_percent_batch_query = build_so_cell_by_kr_batch_query(
+                    allocation_by_kr_item=kr_block_3,
+                    to_items=to_item_values,
+                    project_id=project_id,
                     dataset_id=alloc_data_dataset_name,
                     table_id=so_cell_table_name,
-                    row_data=insert_so_cell_byagg
+                    columns=SO_CELL_BY_PERCENT_COLUMNS,
+                    kr_conditions=kr_plan['where_conditions'] if kr_plan else None
+                )
+
+                if by_percent_batch_query is None:
+                    sampler.debug("Step 160", "No valid by_percent query conditions, skipping")
+                    continue
+
+                by_percent_result_raw = None
+                if so_cell_store is not None:
+                    by_percent_result_raw = so_cell_store.select(
+                        predicates=kr_plan['predicates'] if kr_plan else by_kr_predicates(kr_block_3),
+                        columns=SO_CELL_BY_PERCENT_COLUMNS,
+                        isin={'now_y_block_period_mx': to_item_values}
+                    )
+                if by_percent_result_raw is None:
+                    by_percent_result_raw = bq.execute_query(by_percent_batch_query)
+                all_by_percent_items = SoCellBatch.from_dataframe(by_percent_result_raw)
+
+                # Group by_percent results by to_item
+                by_percent_map = group_by_percent_results(all_by_percent_items)
+                metrics.add(keys_grouped=len(by_percent_map))
+                sampler.debug("Step 160", "Batch query returned %s by_percent items, %s unique to_items",
+                              len(all_by_percent_items), len(by_percent_map))
+
+            x_period_1_index = parse_period(x_period_1) if my_from_type == 'NP' else None
+
+            # Step170: Process each my_to_item using the by_percent map
+            for my_to_item in my_to_items:
+                # Lookup by_percent from map
+                by_percent = by_percent_map.get(my_to_item.to_item)
+
+                if by_percent is None:
+                    sampler.debug("Step 170", "No by_percent found for to_item %s, skipping", my_to_item.to_item)
+                    continue
+
+                sampler.debug("Step 170", "Found by_percent from map: %s for to_item: %s", by_percent, my_to_item.to_item)
+
+                value_2 = value_1 * by_percent
+
+                if my_from_type == 'NP':
+                    my_to_type_final = 'NP'
+                    my_to_item_final = format_period(x_period_1_index + parse_period_offset(my_to_item.to_item))
+                    # YBlock2 = YBlock1 với now_np = MyToItemFinal: output là overlay trên YBlock1 (không copy)
+                    insert_so_cell = overlay_socell_from_yblocks(
+                        y_block_1=y_block_1,
+                        x_period_2=my_to_item_final,
+                        x_period_1=x_period_1,
+                        value_2=value_2,
+                        value_1=value_1,
+                        by_type=my_by_type,
+                        by_percent=by_percent,
+                        to_alt=my_allocation_alt_item.to_alt
+                    )
+
+                    # Collect record for batch insert
+                    insert_so_cells.append(insert_so_cell)
+                    sampler.debug("Step 230", "Added SoCell to batch: %s", insert_so_cell)
+
+        metrics.add(cells_emitted=len(insert_so_cells) + len(offset_so_cell_items))
+
+    logger.info("[Step 100-230] Processed %s source SoCells: %s skipped (prev exists), %s offset, %s output SoCells",
+                len(from_so_cell_items), sampler.counts.get("Step 120", 0), len(offset_so_cell_items), len(insert_so_cells))
+    return insert_so_cells, offset_so_cell_items
+
+
+def insert_offset_outputs(
+        bq: BigQueryConnector,
+        my_allocation_alt_item: AllocationALT,
+        my_allocation_by_type_item: AllocationByType,
+        offset_so_cell_items: List[SoCell],
+        alloc_data_dataset_name: str,
+        so_cell_table_name: str,
+        stats: Optional[Dict] = None,
+        metrics: Optional[RunMetrics] = None
+) -> bool:
+    """
+    Offset case: tính và batch insert output cho các source SoCells của offset by_type.
+
+    Returns:
+        True nếu insert thành công hoặc không có cell nào
+    """
+    if not offset_so_cell_items:
+        return True
+
+    logger.info("Offset case: processing %s SoCell items for by_type=%s", len(offset_so_cell_items), my_allocation_by_type_item.by_block_by_type)
+    with (metrics or NULL_METRICS).step("Step offset"):
+        success = calculate_offset_batch(
+            bq=bq,
+            my_allocation_by_type_item=my_allocation_by_type_item,
+            my_allocation_alt_item=my_allocation_alt_item,
+            y_block_1_items=offset_so_cell_items,
+            alloc_data_dataset_name=alloc_data_dataset_name,
+            so_cell_table_name=so_cell_table_name
+        )
+    if success and stats is not None:
+        stats['output_rows'] += len(offset_so_cell_items)
+    return success
+
+
+def process_allocation_alt_item(
+        bq: BigQueryConnector,
+        my_allocation_alt_item: AllocationALT,
+        my_x_period: str,
+        project_id: str,
+        allocation_config_dataset_name: str,
+        alloc_data_dataset_name: str,
+        allocation_to_item_table_name: str,
+        allocation_by_type_table_name: str,
+        allocation_by_kr_table_name: str,
+        so_cell_table_name: str,
+        checkpoint: AllocationCheckpoint = None,
+        stats: Optional[Dict] = None,
+        chunk_size: Optional[int] = None,
+        metrics: Optional[RunMetrics] = None,
+        so_cell_store: Optional[SoCellStore] = None,
+        wildcard_match: bool = False,
+        query_plan_cache: Optional[QueryPlanCache] = None
+) -> bool:
+    """
+    Xử lý allocation cho một AllocationALT item (Step 35 - Step 240).
+
+    Mỗi allocation_by_type_item là một unit của checkpoint, được đánh dấu xong ngay sau lần ghi
+    cuối cùng chứa output của nó: ByAgg và offset by_types sau insert của chính chúng, regular
+    by_types sau Step 240 (với ALT lớn, số source cells >= BY_TYPE_CHECKPOINT_MIN_CELLS, Step 240
+    chạy sau mỗi allocation_by_type_item). Các unit đã xong được bỏ qua khi resume.
+
+    Args:
+        bq: BigQueryConnector instance
+        my_allocation_alt_item: AllocationALT item cần xử lý
+        my_x_period: Period của source cells (now_np)
+        project_id: GCP project ID
+        allocation_config_dataset_name: Dataset name for allocation config
+        alloc_data_dataset_name: Dataset name for allocation data
+        allocation_to_item_table_name: Table name for AllocationToItem
+        allocation_by_type_table_name: Table name for AllocationByType
+        allocation_by_kr_table_name: Table name for AllocationByKR
+        so_cell_table_name: Table name for SoCell
+        checkpoint: AllocationCheckpoint của run (optional)
+        stats: Dict để ghi lại số liệu (source_cells, output_rows), optional
+        chunk_size: Nếu có, chạy chunked mode: source SoCells được đọc theo page chunk_size rows,
+            mỗi chunk đi qua Step 80-230 và được spool ra disk trước khi đọc chunk tiếp theo, output
+            của ALT được load một lần sau chunk cuối (xem process_so_cell_chunks)
+        metrics: RunMetrics của run (optional), timers/counters được ghi theo step và
+            allocation_by_type_item; bq nên là MeteredBigQuery của cùng metrics để đo BigQuery time
+        so_cell_store: SoCellStore dùng chung giữa các ALTs của run (optional): source SoCells
+            (Step 70, trừ chunked mode), prev SoCells (Step 90) và by_percent (Step 160) được lọc
+            trong memory từ slices đã cache. bq nên là chính so_cell_store để output được ghi vào slices
+        wildcard_match: False = SoCell khớp allocation_by_type_item khi key bằng nhau (field None phải
+            NULL/rỗng), True = field None của item khớp mọi giá trị (xem ByTypeMatcher)
+        query_plan_cache: QueryPlanCache (optional): conditions của Step 70 / 160 được đọc từ plan
+            đã compile cho (z_number, config version) thay vì build lại từ config items
+
+    Returns:
+        True nếu toàn bộ output của ALT đã được ghi thành công
+    """
+    z_number = my_allocation_alt_item.z_number
+    metrics = metrics or NULL_METRICS
+
+    # Initialize list to collect all insert records for batch insert
+    batch_insert_records = []
+    all_inserted = True
+
+    # Query AllocationToItem and AllocationByType
+    #Step35-Step50
+    with metrics.step("Step 35-50"):
+        my_to_items, my_allocation_by_type_items = query_allocation_items(
+            bq=bq,
+            project_id=project_id,
+            allocation_config_dataset_name=allocation_config_dataset_name,
+            allocation_to_item_table_name=allocation_to_item_table_name,
+            allocation_by_type_table_name=allocation_by_type_table_name,
+            my_allocation_alt_item=my_allocation_alt_item
+        )
+
+    # (index, item): index dùng cho unit key của checkpoint (by_type_unit_key)
+    indexed_by_type_items = list(enumerate(my_allocation_by_type_items))
+    if stats is not None:
+        stats.setdefault('source_cells', 0)
+        stats.setdefault('output_rows', 0)
+
+    # Step55: Batch query all allocation_by_kr items for this alt_item
+    with metrics.step("Step 55"):
+        logger.info("[Step 55] Building batch query for allocation_by_kr items")
+        my_from_type = my_allocation_alt_item.from_type
+        my_to_type = my_allocation_alt_item.to_type
+        all_allocation_by_kr_items = query_allocation_by_kr_items(
+            bq=bq,
+            project_id=project_id,
+            allocation_config_dataset_name=allocation_config_dataset_name,
+            allocation_by_kr_table_name=allocation_by_kr_table_name,
+            my_allocation_alt_item=my_allocation_alt_item,
+            my_allocation_by_type_items=my_allocation_by_type_items
+        )
+
+        # Create map: (from_type, to_type, by_type) -> allocation_by_kr_item
+        allocation_by_kr_map = {}
+        for kr_item in all_allocation_by_kr_items:
+            key = (my_from_type, my_to_type, kr_item.by_block_by_type)
+            if key not in allocation_by_kr_map:
+                allocation_by_kr_map[key] = kr_item
+
+        logger.info("[Step 55] Created allocation_by_kr_map with %s keys", len(allocation_by_kr_map))
+
+    # Step60: Process ByAgg types first
+    for index, my_allocation_by_type_item in indexed_by_type_items:
+        if my_allocation_by_type_item.by_block_by_type == 'ByAgg':
+            unit_key = by_type_unit_key(index, my_allocation_by_type_item)
+            if checkpoint and checkpoint.is_unit_done(z_number, unit_key):
+                logger.info("[Step 60] Skipping ByAgg allocation %s (already completed)", unit_key)
+                continue
+            logger.info("[Step 60] Processing ByAgg allocation")
+            with metrics.by_type(unit_key), metrics.step("Step 60"):
+                success = process_by_agg_allocation(
+                    bq=bq,
+                    project_id=project_id,
+                    allocation_config_dataset_name=allocation_config_dataset_name,
+                    allocation_to_item_table_name=allocation_to_item_table_name,
+                    alloc_data_dataset_name=alloc_data_dataset_name,
+                    so_cell_table_name=so_cell_table_name
                 )
+            if not success:
+                all_inserted = False
+            elif checkpoint:
+                checkpoint.mark_unit_done(z_number, unit_key)
+
+    # Step70: Batch query all SoCell data once (excluding GAgg and ByAgg)
+    logger.info("[Step 70] Building batch query for all allocation_by_type_items")
+    with metrics.step("Step 70"):
+        if query_plan_cache is not None:
+            query_plan = query_plan_cache.get_or_compile(
+                z_number=z_number,
+                from_type=my_from_type,
+                to_type=my_to_type,
+                indexed_by_type_items=indexed_by_type_items,
+                allocation_by_kr_map=allocation_by_kr_map
+            )
+        else:
+            query_plan = compile_alt_query_plan(my_allocation_by_type_items, allocation_by_kr_map)
+    query_so_cell_batch = build_so_cell_batch_query(
+        my_allocation_by_type_items,
+        project_id,
+        my_x_period=my_x_period,
+        dataset_id=alloc_data_dataset_name,
+        table_id=so_cell_table_name,
+        columns=SO_CELL_SOURCE_COLUMNS,
+        or_conditions=query_plan['source_or_conditions']
+    )
+    
+    if query_so_cell_batch is None:
+        logger.warning("[Step 70] No valid allocation_by_type_items to query, skipping")
+        return all_inserted
+
+    if chunk_size:
+        return process_so_cell_chunks(
+            bq=bq,
+            query_so_cell_batch=query_so_cell_batch,
+            chunk_size=chunk_size,
+            my_allocation_alt_item=my_allocation_alt_item,
+            indexed_by_type_items=indexed_by_type_items,
+            my_to_items=my_to_items,
+            allocation_by_kr_map=allocation_by_kr_map,
+            project_id=project_id,
+            alloc_data_dataset_name=alloc_data_dataset_name,
+            so_cell_table_name=so_cell_table_name,
+            stats=stats,
+            metrics=metrics,
+            so_cell_store=so_cell_store,
+            wildcard_match=wildcard_match,
+            query_plan=query_plan
+        ) and all_inserted
+    
+    with metrics.step("Step 70"):
+        my_so_cell_raw = None
+        if so_cell_store is not None and my_x_period is not None:
+            my_so_cell_raw = so_cell_store.select(
+                predicates={'now_np': my_x_period},
+                columns=SO_CELL_SOURCE_COLUMNS,
+                conditions=query_plan['source_conditions']
+            )
+        if my_so_cell_raw is None:
+            logger.info("[Step 70] Executing batch query: \n%s", query_so_cell_batch)
+            my_so_cell_raw = bq.execute_query(query_so_cell_batch)
+        all_so_cell_items = SoCellBatch.from_dataframe(my_so_cell_raw)
+        logger.info("[Step 70] Batch query returned %s SoCell items", len(all_so_cell_items))
+        if stats is not None:
+            stats['source_cells'] += len(all_so_cell_items)
+
+        # Phân loại SoCell items vào các allocation_by_type_items khớp trong một lần duyệt
+        matched_rows = ByTypeMatcher(my_allocation_by_type_items, wildcard=wildcard_match).classify(my_so_cell_raw)
+        metrics.add(keys_grouped=len(matched_rows))
+        logger.info("[Step 70] Matched SoCell items to %s allocation_by_type_items", len(matched_rows))
+
+    # ALT lớn: chạy Step 240 sau mỗi allocation_by_type_item thay vì một lần cuối ALT
+    insert_by_type = checkpoint is not None and len(all_so_cell_items) >= BY_TYPE_CHECKPOINT_MIN_CELLS
+    # Units có regular output đang chờ Step 240 cuối ALT
+    pending_unit_keys = []
+
+    # Step80: Process each allocation_by_type_item using the matched rows
+    for position, (index, my_allocation_by_type_item) in enumerate(indexed_by_type_items):
+        logger.info("[Step 80] Processing my_allocation_by_type_item: %s", my_allocation_by_type_item)
+
+        if my_allocation_by_type_item.by_block_by_type == 'GAgg':
+            logger.info("[Step 80] Skipping GAgg type")
+            continue
+
+        if my_allocation_by_type_item.by_block_by_type == 'ByAgg':
+            logger.info("[Step 80] Skipping ByAgg type (already processed)")
+            continue
+
+        unit_key = by_type_unit_key(index, my_allocation_by_type_item)
+        if checkpoint and checkpoint.is_unit_done(z_number, unit_key):
+            logger.info("[Step 80] Skipping %s (already completed)", unit_key)
+            continue
+        
+        from_so_cell_items = all_so_cell_items.rows(matched_rows.get(position, ()))
+        logger.info("[Step 80] Found %s SoCell items for %s", len(from_so_cell_items), unit_key)
+
+        if not from_so_cell_items:
+            logger.info("[Step 80] No SoCell items found, skipping")
+            continue
+
+        with metrics.by_type(unit_key):
+            # Step90-230
+            insert_so_cells, offset_so_cell_items = allocate_from_so_cell_items(
+                bq=bq,
+                my_allocation_alt_item=my_allocation_alt_item,
+                my_allocation_by_type_item=my_allocation_by_type_item,
+                from_so_cell_items=from_so_cell_items,
+                my_to_items=my_to_items,
+                allocation_by_kr_map=allocation_by_kr_map,
+                project_id=project_id,
+                alloc_data_dataset_name=alloc_data_dataset_name,
+                so_cell_table_name=so_cell_table_name,
+                metrics=metrics,
+                so_cell_store=so_cell_store,
+                query_plan=query_plan
+            )
+            batch_insert_records.extend(insert_so_cells)
+
+            if not insert_offset_outputs(
+                bq=bq,
+                my_allocation_alt_item=my_allocation_alt_item,
+                my_allocation_by_type_item=my_allocation_by_type_item,
+                offset_so_cell_items=offset_so_cell_items,
+                alloc_data_dataset_name=alloc_data_dataset_name,
+                so_cell_table_name=so_cell_table_name,
+                stats=stats,
+                metrics=metrics
+            ):
+                all_inserted = False
+                continue
+
+            if not insert_so_cells:
+                # Offset by_type: toàn bộ output đã được ghi ở trên
+                if checkpoint:
+                    checkpoint.mark_unit_done(z_number, unit_key)
+            elif insert_by_type:
+                success = insert_so_cell_records(
+                    bq=bq,
+                    batch_insert_records=batch_insert_records,
+                    z_number=z_number,
+                    alloc_data_dataset_name=alloc_data_dataset_name,
+                    so_cell_table_name=so_cell_table_name,
+                    metrics=metrics
+                )
+                if success and stats is not None:
+                    stats['output_rows'] += len(batch_insert_records)
+                batch_insert_records = []
                 if success:
-                    print(f"[INFO] ByAgg: Successfully inserted aggregated SoCell with value={value_2}, PTS2={my_to_item_pts2}, CTYS2={my_to_item_ctys2}, NPD365={my_to_item_np_d365}")
+                    checkpoint.mark_unit_done(z_number, unit_key)
                 else:
-                    print(f"[ERROR] ByAgg: Failed to insert aggregated SoCell")
+                    all_inserted = False
+            else:
+                pending_unit_keys.append(unit_key)
+
+    # Batch insert all collected records for this my_allocation_alt_item
+    success = insert_so_cell_records(
+        bq=bq,
+        batch_insert_records=batch_insert_records,
+        z_number=z_number,
+        alloc_data_dataset_name=alloc_data_dataset_name,
+        so_cell_table_name=so_cell_table_name,
+        metrics=metrics
+    )
+    if success and stats is not None:
+        stats['output_rows'] += len(batch_insert_records)
+    if success and checkpoint:
+        for unit_key in pending_unit_keys:
+            checkpoint.mark_unit_done(z_number, unit_key)
+    return all_inserted and success
+
+
+def process_so_cell_chunks(
+        bq: BigQueryConnector,
+        query_so_cell_batch: str,
+        chunk_size: int,
+        my_allocation_alt_item: AllocationALT,
+        indexed_by_type_items: List[Tuple[int, AllocationByType]],
+        my_to_items: List[AllocationToItem],
+        allocation_by_kr_map: Dict,
+        project_id: str,
+        alloc_data_dataset_name: str,
+        so_cell_table_name: str,
+        stats: Optional[Dict] = None,
+        metrics: Optional[RunMetrics] = None,
+        so_cell_store: Optional[SoCellStore] = None,
+        wildcard_match: bool = False,
+        query_plan: Optional[Dict] = None
+) -> bool:
+    """
+    Chunked mode cho Step 70-240: đọc source SoCells theo từng page chunk_size rows, mỗi chunk
+    được group theo allocation_by_type_item, đi qua prev-check/by_percent join (Step 90-230)
+    và output của chunk được ghi ra trước khi đọc chunk tiếp theo. Memory chỉ giữ một chunk
+    tại một thời điểm.
+
+    Output của các chunks (regular và offset) được spool vào Parquet files tạm (OutputSpool)
+    rồi load vào so_cell table bằng một load job sau chunk cuối. ALT lỗi giữa chừng không để
+    lại output của các chunks đã xong, nên resume tính lại ALT từ đầu mà không ghi trùng
+    (source query chạy lại cũng không thấy output của chính ALT). Các chunks sau vì vậy không
+    đọc được output của chunks trước, và kết quả không phụ thuộc chunk_size.
+
+    Returns:
+        True nếu output của tất cả chunks đã được ghi thành công
+    """
+    z_number = my_allocation_alt_item.z_number
+    metrics = metrics or NULL_METRICS
+    all_inserted = True
+    total_so_cells = 0
+
+    logger.info("[Step 70] Chunked mode: executing batch query with chunk_size=%s: \n%s", chunk_size, query_so_cell_batch)
+    so_cell_chunks = bq.execute_query_iter(query_so_cell_batch, page_size=chunk_size)
+    with tempfile.TemporaryDirectory(prefix="alloc-chunks-") as spool_dir:
+        chunk_bq = OutputSpool(
+            bq,
+            run_key=str(z_number),
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name,
+            spool_dir=spool_dir,
+            flush_rows=None,
+            flush_on_read=False
+        )
+        by_type_matcher = ByTypeMatcher([item for _, item in indexed_by_type_items], wildcard=wildcard_match)
+        chunk_index = 0
+        while True:
+            # Step 70 time của mỗi chunk gồm cả thời gian fetch page
+            with metrics.step("Step 70"):
+                so_cell_chunk_raw = next(so_cell_chunks, None)
+                if so_cell_chunk_raw is None:
+                    break
+                chunk_so_cell_items = SoCellBatch.from_dataframe(so_cell_chunk_raw)
+                total_so_cells += len(chunk_so_cell_items)
+                if stats is not None:
+                    stats['source_cells'] += len(chunk_so_cell_items)
+
+                chunk_matched_rows = by_type_matcher.classify(so_cell_chunk_raw)
+                metrics.add(keys_grouped=len(chunk_matched_rows))
+            logger.info("[Step 70] Chunk %s: %s SoCell items matched to %s allocation_by_type_items", chunk_index, len(chunk_so_cell_items), len(chunk_matched_rows))
+
+            chunk_insert_records = []
+            for position, (index, my_allocation_by_type_item) in enumerate(indexed_by_type_items):
+                if my_allocation_by_type_item.by_block_by_type in ['GAgg', 'ByAgg']:
+                    continue
+
+                from_so_cell_items = chunk_so_cell_items.rows(chunk_matched_rows.get(position, ()))
+                if not from_so_cell_items:
+                    continue
+                logger.info("[Step 80] Chunk %s: %s SoCell items for my_allocation_by_type_item: %s", chunk_index, len(from_so_cell_items), my_allocation_by_type_item)
+
+                with metrics.by_type(by_type_unit_key(index, my_allocation_by_type_item)):
+                    insert_so_cells, offset_so_cell_items = allocate_from_so_cell_items(
+                        bq=chunk_bq,
+                        my_allocation_alt_item=my_allocation_alt_item,
+                        my_allocation_by_type_item=my_allocation_by_type_item,
+                        from_so_cell_items=from_so_cell_items,
+                        my_to_items=my_to_items,
+                        allocation_by_kr_map=allocation_by_kr_map,
+                        project_id=project_id,
+                        alloc_data_dataset_name=alloc_data_dataset_name,
+                        so_cell_table_name=so_cell_table_name,
+                        metrics=metrics,
+                        so_cell_store=so_cell_store,
+                        query_plan=query_plan
+                    )
+                    chunk_insert_records.extend(insert_so_cells)
+
+                    if not insert_offset_outputs(
+                        bq=chunk_bq,
+                        my_allocation_alt_item=my_allocation_alt_item,
+                        my_allocation_by_type_item=my_allocation_by_type_item,
+                        offset_so_cell_items=offset_so_cell_items,
+                        alloc_data_dataset_name=alloc_data_dataset_name,
+                        so_cell_table_name=so_cell_table_name,
+                        stats=stats,
+                        metrics=metrics
+                    ):
+                        all_inserted = False
+
+            success = insert_so_cell_records(
+                bq=chunk_bq,
+                batch_insert_records=chunk_insert_records,
+                z_number=z_number,
+                alloc_data_dataset_name=alloc_data_dataset_name,
+                so_cell_table_name=so_cell_table_name,
+                metrics=metrics
+            )
+            if success and stats is not None:
+                stats['output_rows'] += len(chunk_insert_records)
+            all_inserted = all_inserted and success
+            chunk_index += 1
+
+        if not all_inserted:
+            logger.error("[Step 240] Chunked mode: z_number=%s failed, %s spooled rows are discarded", z_number, chunk_bq.pending_rows)
+            return False
+        with metrics.step("Step 240"):
+            all_inserted = chunk_bq.flush()
+
+    logger.info("[Step 240] Chunked mode: processed %s SoCell items for z_number=%s", total_so_cells, z_number)
+    return all_inserted
+
+
+def insert_so_cell_records(
+        bq: BigQueryConnector,
+        batch_insert_records: list,
+        z_number,
+        alloc_data_dataset_name: str,
+        so_cell_table_name: str,
+        metrics: Optional[RunMetrics] = None
+) -> bool:
+    """
+    Step240: Batch insert các SoCell records đã thu thập.
+
+    Returns:
+        True nếu insert thành công hoặc không có record nào để insert
+    """
+    if not batch_insert_records:
+        logger.info("[Step 240] No records to insert for z_number=%s", z_number)
+        return True
+
+    logger.info("[Step 240] Starting batch insert of %s records for z_number=%s", len(batch_insert_records), z_number)
+    with (metrics or NULL_METRICS).step("Step 240"):
+        success = bq.insert_rows_batch(
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name,
+            rows_data=materialize_so_cells(batch_insert_records)
+        )
+    if success:
+        logger.info("[Step 240] Successfully batch inserted %s SoCell records", len(batch_insert_records))
+    else:
+        logger.error("[Step 240] Failed to batch insert %s SoCell records", len(batch_insert_records))
+    return success
 
 
 def run_allocate(
         min_alt,
         max_alt,
-        my_x_period
+        my_x_period,
+        dry_run: bool = False,
+        resume: bool = False,
+        checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR,
+        chunk_size: Optional[int] = None,
+        metrics_dir: str = DEFAULT_METRICS_DIR,
+        bq=None,
+        so_cell_cache_mb: float = 0,
+        query_plan_dir: Optional[str] = None,
+        output_spool_dir: Optional[str] = None,
+        output_spool_flush_rows: int = DEFAULT_SPOOL_FLUSH_ROWS
 ):
     """
     Main allocation calculation workflow.
     Orchestrates the entire allocation process from reading configuration
     to calculating and inserting results into BigQuery.
-    """
-    credentials_path = "/home/tunk/Desktop/fp-a-project-0c82aa55ae6a.json"
-    project_id = "fp-a-project"
 
-    allocation_config_dataset_name = "allocation_config"
-    alloc_data_dataset_name = "alloc_stage"
+    Khi dry_run=True, không tính toán/ghi dữ liệu mà chỉ trả về plan ước lượng
+    (queries theo step, bytes scan, source cells, output rows) cho từng ALT.
 
-    allocation_alt_table_name = "AllocationALT_NativeTable"
-    allocation_to_item_table_name = "AllocationToItem_NativeTable"
-    allocation_by_type_table_name = "AllocationByType_NativeTable"
-    allocation_by_kr_table_name = "AllocationByKR_NativeTable"
-    so_cell_table_name = "so_cell_raw_full"
+    Tiến độ được checkpoint theo ALT và theo allocation_by_type_item (mỗi unit ứng với đúng
+    các rows nó đã ghi) vào checkpoint_dir. Chạy lại với resume=True sẽ bỏ qua các unit đã hoàn thành.
 
-    try:
-        bq = BigQueryConnector(
-            credentials_path=credentials_path,
-            project_id=project_id
-        )
+    Với chunk_size, source SoCells của mỗi ALT được xử lý và ghi theo từng chunk để memory
+    không tăng theo kích thước ALT.
 
-        query = f"""
-        SELECT
-            ZNumber,
-            FROM_ALT_FromALT,
-            TO_ALT_ToALT,
-            FROM_Y_BLOCK_FromType,
-            TO_Y_BLOCK_ToType
-        FROM `{project_id}.{allocation_config_dataset_name}.{allocation_alt_table_name}` 
-        WHERE ZNumber >= min_alt AND ZNumber <= max_alt
-        ORDER BY ZNumber 
-        """
-        df = bq.execute_query(query)
-        my_allocation_alt_items = AllocationALT.from_dataframe(df)
-
-        print(f"[INFO][Step 20] We having {len(my_allocation_alt_items)} my_allocation_alt_items by query: \n {query}")
+    Log level đọc từ env FA_LOG_LEVEL (xem utils.log_utils); per-cell messages chỉ có ở DEBUG.
 
-        for my_allocation_alt_item in my_allocation_alt_items:
-            if my_allocation_alt_item.z_number != 422:
-                print(
-                    f"[WARN][Step 30] Skip process my_allocation_alt_item: {my_allocation_alt_item} because z_number is not equal 422 for testing purpose, remove it when calculating in production mode")
-                continue
-            print(f"[INFO][Step 30] Start process each my_allocation_alt_item: {my_allocation_alt_item}")
+    Cuối run, timers/counters theo step (BigQuery time vs Python time, rows read, keys grouped,
+    cells emitted, rows written), theo ALT và allocation_by_type_item được ghi ra JSON trong
+    metrics_dir và log thành bảng.
+
+    bq: connector có cùng interface với BigQueryConnector (default: BigQueryConnector theo
+    ALLOCATION_RUN_CONFIG). Benchmark truyền SqliteConnector với dữ liệu synthetic.
+
+    Các slices của so_cell_raw_full (theo now_np, ALT, AllocationByKR) được cache theo cột trong
+    SoCellStore dùng chung cho các ALTs, tối đa so_cell_cache_mb MB (0 = tắt cache, default).
+    Cache đọc cả slice (now_np / ALT) thay vì chỉ các rows khớp điều kiện, nên chỉ nên bật khi
+    nhiều ALTs dùng chung slices (ví dụ so_cell_cache_mb=1024).
+
+    Với query_plan_dir (ví dụ DEFAULT_QUERY_PLAN_DIR), conditions của Step 70 / 160 được compile
+    một lần cho mỗi (ALT, config version, giá trị các config items) và lưu trong query_plan_dir
+    (None = compile lại mỗi run, default).
+
+    Với output_spool_dir, output SoCells được ghi vào Parquet files local (partition theo ALT và
+    period) trong output_spool_dir và load vào so_cell_raw_full bằng load jobs thay vì streaming
+    inserts (None = insert trực tiếp). Output của một ALT chỉ được load sau khi ALT đã checkpoint,
+    ở query đầu tiên của ALT kế tiếp (tối đa một load job mỗi ALT), khi đạt
+    output_spool_flush_rows rows và cuối run (xem OutputSpool). Khi chạy lại với resume=True,
+    parts chưa load của các ALTs đã checkpoint được giữ và load; parts của ALT đang chạy dở bị
+    bỏ và ALT đó được tính lại từ đầu.
+
+    Returns:
+        Plan (dry_run) hoặc metrics summary dict (xem RunMetrics.to_dict)
+    """
+    configure_logging()
+    credentials_path = ALLOCATION_RUN_CONFIG['credentials_path']
+    project_id = ALLOCATION_RUN_CONFIG['project_id']
+
+    allocation_config_dataset_name = ALLOCATION_RUN_CONFIG['allocation_config_dataset_name']
+    alloc_data_dataset_name = ALLOCATION_RUN_CONFIG['alloc_data_dataset_name']
 
-            # Initialize list to collect all insert records for batch insert
-            batch_insert_records = []
+    allocation_alt_table_name = ALLOCATION_RUN_CONFIG['allocation_alt_table_name']
+    allocation_to_item_table_name = ALLOCATION_RUN_CONFIG['allocation_to_item_table_name']
+    allocation_by_type_table_name = ALLOCATION_RUN_CONFIG['allocation_by_type_table_name']
+    allocation_by_kr_table_name = ALLOCATION_RUN_CONFIG['allocation_by_kr_table_name']
+    so_cell_table_name = ALLOCATION_RUN_CONFIG['so_cell_table_name']
 
-            # Query AllocationToItem and AllocationByType
-            #Step35-Step50
-            my_to_items, my_allocation_by_type_items = query_allocation_items(
+    run_key = f"{min_alt}-{max_alt}-{my_x_period}"
+    metrics = RunMetrics(run_key=run_key)
+
+    try:
+        if bq is None:
+            bq = BigQueryConnector(
+                credentials_path=credentials_path,
+                project_id=project_id
+            )
+        metered_bq = MeteredBigQuery(bq, metrics)
+        query_plan_cache = QueryPlanCache(query_plan_dir) if query_plan_dir else None
+
+        with metrics.step("Step 20"):
+            my_allocation_alt_items = query_allocation_alt_items(
+                bq=metered_bq,
+                project_id=project_id,
+                allocation_config_dataset_name=allocation_config_dataset_name,
+                allocation_alt_table_name=allocation_alt_table_name,
+                min_alt=min_alt,
+                max_alt=max_alt
+            )
+
+        if dry_run:
+            return plan_allocate(
                 bq=bq,
+                my_allocation_alt_items=my_allocation_alt_items,
+                my_x_period=my_x_period,
                 project_id=project_id,
                 allocation_config_dataset_name=allocation_config_dataset_name,
+                alloc_data_dataset_name=alloc_data_dataset_name,
                 allocation_to_item_table_name=allocation_to_item_table_name,
                 allocation_by_type_table_name=allocation_by_type_table_name,
-                my_allocation_alt_item=my_allocation_alt_item
+                allocation_by_kr_table_name=allocation_by_kr_table_name,
+                so_cell_table_name=so_cell_table_name
             )
 
-            # Step55: Batch query all allocation_by_kr items for this alt_item
-            print(f"[INFO][Step 55] Building batch query for allocation_by_kr items")
-            my_from_type = my_allocation_alt_item.from_type
-            my_to_type = my_allocation_alt_item.to_type
-            
-            # Get unique by_types from allocation_by_type_items
-            by_types = set()
-            for item in my_allocation_by_type_items:
-                if item.by_block_by_type and item.by_block_by_type not in ['GAgg', 'ByAgg']:
-                    # Only include numeric by_types
-                    if str(item.by_block_by_type).lstrip('-').isdigit():
-                        continue
-                    by_types.add(item.by_block_by_type)
-            
-            if by_types:
-                by_types_list = list(by_types)
-                by_types_in_clause = "', '".join(by_types_list)
-                
-                query_allocation_by_kr_batch = f"""
-                SELECT * 
-                FROM `{project_id}.{allocation_config_dataset_name}.{allocation_by_kr_table_name}` 
-                WHERE TO_Y_BLOCK_KR6 = '{my_from_type}'
-                AND TO_Y_BLOCK_KR4 = '{my_to_type}'
-                AND BY_BLOCK_ByType IN ('{by_types_in_clause}')
-                """
-                
-                print(f"[INFO][Step 55] Executing batch allocation_by_kr query for {len(by_types)} by_types")
-                allocation_by_kr_raw = bq.execute_query(query_allocation_by_kr_batch)
-                all_allocation_by_kr_items = AllocationByKR.from_dataframe(allocation_by_kr_raw)
-                print(f"[INFO][Step 55] Batch query returned {len(all_allocation_by_kr_items)} allocation_by_kr items")
-                
-                # Create map: (from_type, to_type, by_type) -> allocation_by_kr_item
-                allocation_by_kr_map = {}
-                for kr_item in all_allocation_by_kr_items:
-                    key = (my_from_type, my_to_type, kr_item.by_block_by_type)
-                    if key not in allocation_by_kr_map:
-                        allocation_by_kr_map[key] = kr_item
-                
-                print(f"[INFO][Step 55] Created allocation_by_kr_map with {len(allocation_by_kr_map)} keys")
-            else:
-                allocation_by_kr_map = {}
-                print(f"[INFO][Step 55] No valid by_types found, allocation_by_kr_map is empty")
-
-            # Step60: Process ByAgg types first
-            for my_allocation_by_type_item in my_allocation_by_type_items:
-                if my_allocation_by_type_item.by_block_by_type == 'ByAgg':
-                    print(f"[INFO][Step 60] Processing ByAgg allocation")
-                    process_by_agg_allocation(
-                        bq=bq,
-                        project_id=project_id,
-                        allocation_config_dataset_name=allocation_config_dataset_name,
-                        allocation_to_item_table_name=allocation_to_item_table_name,
-                        alloc_data_dataset_name=alloc_data_dataset_name,
-                        so_cell_table_name=so_cell_table_name
-                    )
-
-            # Step70: Batch query all SoCell data once (excluding GAgg and ByAgg)
-            print(f"[INFO][Step 70] Building batch query for all allocation_by_type_items")
-            query_so_cell_batch = build_so_cell_batch_query(
-                my_allocation_by_type_items,
-                project_id,
-                my_x_period=my_x_period,
+        checkpoint = AllocationCheckpoint(
+            checkpoint_dir=checkpoint_dir,
+            run_key=run_key,
+            resume=resume
+        )
+        output_bq = metered_bq
+        if output_spool_dir:
+            output_bq = OutputSpool(
+                metered_bq,
+                run_key=run_key,
                 dataset_id=alloc_data_dataset_name,
-                table_id=so_cell_table_name
+                table_id=so_cell_table_name,
+                spool_dir=output_spool_dir,
+                flush_rows=output_spool_flush_rows,
+                resume=resume,
+                completed_alts=checkpoint.state['completed_alts']
             )
-            
-            if query_so_cell_batch is None:
-                print(f"[WARN][Step 70] No valid allocation_by_type_items to query, skipping")
+            # Output của các ALTs chưa xong chỉ nằm trong parts đã bỏ: tính lại toàn bộ ALT
+            for z_number in output_bq.abandoned_alts:
+                checkpoint.reset_units(z_number)
+        so_cell_store = SoCellStore(
+            output_bq,
+            project_id=project_id,
+            dataset_id=alloc_data_dataset_name,
+            table_id=so_cell_table_name,
+            memory_budget_mb=so_cell_cache_mb
+        ) if so_cell_cache_mb else None
+
+        for my_allocation_alt_item in my_allocation_alt_items:
+            if should_skip_alt_item(my_allocation_alt_item):
                 continue
-            
-            print(f"[INFO][Step 70] Executing batch query: \n{query_so_cell_batch}")
-            my_so_cell_raw = bq.execute_query(query_so_cell_batch)
-            all_so_cell_items = SoCell.from_dataframe(my_so_cell_raw)
-            print(f"[INFO][Step 70] Batch query returned {len(all_so_cell_items)} SoCell items")
-            
-            # Group SoCell items by key for fast lookup
-            so_cell_map = group_socell_by_allocation(all_so_cell_items)
-            print(f"[INFO][Step 70] Grouped into {len(so_cell_map)} unique keys")
-
-            # Step80: Process each allocation_by_type_item using the map
-            for my_allocation_by_type_item in my_allocation_by_type_items:
-                print(f"[INFO][Step 80] Processing my_allocation_by_type_item: {my_allocation_by_type_item}")
-
-                if my_allocation_by_type_item.by_block_by_type == 'GAgg':
-                    print("[INFO][Step 80] Skipping GAgg type")
-                    continue
 
-                if my_allocation_by_type_item.by_block_by_type == 'ByAgg':
-                    print("[INFO][Step 80] Skipping ByAgg type (already processed)")
-                    continue
-                
-                # Lookup SoCell items from map using key
-                allocation_key = create_allocation_key(my_allocation_by_type_item)
-                from_so_cell_items = so_cell_map.get(allocation_key, [])
-                print(f"[INFO][Step 80] Found {len(from_so_cell_items)} SoCell items for key: {allocation_key[:100]}...")
+            if checkpoint.is_alt_done(my_allocation_alt_item.z_number):
+                logger.info("[Step 30] Skip my_allocation_alt_item: %s (already completed)", my_allocation_alt_item)
+                continue
 
-                if not from_so_cell_items:
-                    print(f"[INFO][Step 80] No SoCell items found, skipping")
-                    continue
+            logger.info("[Step 30] Start process each my_allocation_alt_item: %s", my_allocation_alt_item)
+            if output_bq is not metered_bq:
+                output_bq.start_alt(my_allocation_alt_item.z_number)
 
-                # Step90: Batch query all prev SoCells for this allocation_by_type_item
-                print(f"[INFO][Step 90] Building batch query for {len(from_so_cell_items)} prev SoCells")
-                query_so_cell_prev_batch = build_so_cell_prev_batch_query(
-                    from_so_cell_items=from_so_cell_items,
-                    z_number=my_allocation_alt_item.z_number,
+            with metrics.alt(my_allocation_alt_item.z_number):
+                success = process_allocation_alt_item(
+                    bq=so_cell_store or output_bq,
+                    my_allocation_alt_item=my_allocation_alt_item,
+                    my_x_period=my_x_period,
                     project_id=project_id,
-                    dataset_id=alloc_data_dataset_name,
-                    table_id=so_cell_table_name
+                    allocation_config_dataset_name=allocation_config_dataset_name,
+                    alloc_data_dataset_name=alloc_data_dataset_name,
+                    allocation_to_item_table_name=allocation_to_item_table_name,
+                    allocation_by_type_table_name=allocation_by_type_table_name,
+                    allocation_by_kr_table_name=allocation_by_kr_table_name,
+                    so_cell_table_name=so_cell_table_name,
+                    checkpoint=checkpoint,
+                    chunk_size=chunk_size,
+                    metrics=metrics,
+                    so_cell_store=so_cell_store,
+                    wildcard_match=ALLOCATION_RUN_CONFIG.get('by_type_wildcard_match', False),
+                    query_plan_cache=query_plan_cache
                 )
-                
-                if query_so_cell_prev_batch is None:
-                    print(f"[WARN][Step 90] No valid prev query conditions, skipping")
-                    continue
-                
-                print(f"[INFO][Step 90] Executing batch prev query")
-                so_cell_prev_raw = bq.execute_query(query_so_cell_prev_batch)
-                all_prev_so_cell_items = SoCell.from_dataframe(so_cell_prev_raw)
-                print(f"[INFO][Step 90] Batch prev query returned {len(all_prev_so_cell_items)} prev SoCell items")
-                
-                # Group prev SoCell items by key for fast lookup
-                prev_so_cell_map = group_prev_socell_by_key(all_prev_so_cell_items)
-                print(f"[INFO][Step 90] Grouped prev SoCells into {len(prev_so_cell_map)} unique keys")
-
-                # Step100: Process each from_so_cell_item using the prev map
-                for from_so_cell_item in from_so_cell_items:
-                    print(f"[INFO][Step 100] Start processing for each from_so_cell_item: {from_so_cell_item}")
-                    y_block_1 = from_so_cell_item
-                    x_period_1 = from_so_cell_item.now_np
-                    value_1 = from_so_cell_item.now_value
-                    print(
-                        f"[INFO][Step 100] We have y_block_1: {y_block_1}, x_period_1: {x_period_1}, value_1: {value_1}")
-
-                    # Lookup prev SoCell items from map using key
-                    prev_key = create_prev_socell_key(y_block_1)
-                    so_cells_prev_y_block = prev_so_cell_map.get(prev_key, [])
-                    print(f"[INFO][Step 110] Found {len(so_cells_prev_y_block)} prev SoCell items for key: {prev_key[:100]}...")
-
-                    if len(so_cells_prev_y_block) > 0:
-                        print("[WARN][Step 120] Skip process because so_cells_prev_y_block is empty (N=0)")
-                        continue
 
-                    if my_allocation_by_type_item.by_block_by_type and str(
-                            my_allocation_by_type_item.by_block_by_type).lstrip('-').isdigit():
-                        calculate_offset(
-                            bq=bq,
-                            my_allocation_by_type_item=my_allocation_by_type_item,
-                            my_allocation_alt_item=my_allocation_alt_item,
-                            y_block_1=y_block_1,
-                            x_period_1=x_period_1,
-                            value_1=value_1,
-                            alloc_data_dataset_name=alloc_data_dataset_name,
-                            so_cell_table_name=so_cell_table_name
-                        )
-                        continue
-
-                    # Lookup allocation_by_kr from map instead of querying
-                    my_by_type = my_allocation_by_type_item.by_block_by_type
-                    lookup_key = (my_from_type, my_to_type, my_by_type)
-                    allocation_by_kr_item = allocation_by_kr_map.get(lookup_key)
-                    
-                    if allocation_by_kr_item is None:
-                        print(f"[WARN] No allocation_by_kr_item found for key {lookup_key}, skipping")
-                        continue
-                    
-                    print(f"[INFO] Found allocation_by_kr_item from map for key {lookup_key}: {allocation_by_kr_item}")
-
-                    kr_block_3 = allocation_by_kr_item
-
-                    # Step160: Batch query all by_percent values for all my_to_items
-                    print(f"[INFO][Step 160] Building batch query for {len(my_to_items)} by_percent values")
-                    to_item_values = [item.to_item for item in my_to_items]
-                    
-                    by_percent_batch_query = build_so_cell_by_kr_batch_query(
-                        allocation_by_kr_item=kr_block_3,
-                        to_items=to_item_values,
-                        project_id=project_id,
-                        dataset_id=alloc_data_dataset_name,
-                        table_id=so_cell_table_name
-                    )
-                    
-                    if by_percent_batch_query is None:
-                        print(f"[WARN][Step 160] No valid by_percent query conditions, skipping")
-                        continue
-                    
-                    print(f"[INFO][Step 160] Executing batch by_percent query")
-                    by_percent_result_raw = bq.execute_query(by_percent_batch_query)
-                    all_by_percent_items = SoCell.from_dataframe(by_percent_result_raw)
-                    print(f"[INFO][Step 160] Batch query returned {len(all_by_percent_items)} by_percent items")
-                    
-                    # Group by_percent results by to_item
-                    by_percent_map = group_by_percent_results(all_by_percent_items)
-                    print(f"[INFO][Step 160] Grouped by_percent into {len(by_percent_map)} unique to_items")
-
-                    # Step170: Process each my_to_item using the by_percent map
-                    for my_to_item in my_to_items:
-                        print(f"[INFO][Step 170] Start processing for each my_to_item: {my_to_item}")
-
-                        # Lookup by_percent from map
-                        by_percent = by_percent_map.get(my_to_item.to_item)
-                        
-                        if by_percent is None:
-                            print(f"[WARN][Step 170] No by_percent found for to_item {my_to_item.to_item}, skipping")
-                            continue
-                        
-                        print(f"[INFO][Step 170] Found by_percent from map: {by_percent} for to_item: {my_to_item.to_item}")
-
-                        value_2 = value_1 * by_percent
-
-                        if my_from_type == 'NP':
-                            my_to_type_final = 'NP'
-                            my_to_item_final = add_period_strings(x_period_1, my_to_item.to_item)
-                            y_block_2 = copy.copy(y_block_1)
-                            y_block_2.prev_ppc = x_period_1
-                            y_block_2.now_np = my_to_item_final
-
-                            insert_so_cell = create_socell_from_yblocks(
-                                y_block_2=y_block_2,
-                                y_block_1=y_block_1,
-                                x_period_1=x_period_1,
-                                value_2=value_2,
-                                value_1=value_1,
-                                by_type=my_by_type,
-                                by_percent=by_percent,
-                                to_alt=my_allocation_alt_item.to_alt
-                            )
-
-                            # Collect record for batch insert
-                            batch_insert_records.append(insert_so_cell)
-                            print(f"[INFO][Step 230] Added SoCell to batch: {insert_so_cell}")
-            
-            # Batch insert all collected records for this my_allocation_alt_item
-            if batch_insert_records:
-                print(f"[INFO][Step 240] Starting batch insert of {len(batch_insert_records)} records for z_number={my_allocation_alt_item.z_number}")
-                success = bq.insert_rows_batch(
-                    dataset_id=alloc_data_dataset_name,
-                    table_id=so_cell_table_name,
-                    rows_data=batch_insert_records
-                )
-                if success:
-                    print(f"[INFO][Step 240] Successfully batch inserted {len(batch_insert_records)} SoCell records")
-                else:
-                    print(f"[ERROR][Step 240] Failed to batch insert {len(batch_insert_records)} SoCell records")
+            if success:
+                checkpoint.mark_alt_done(my_allocation_alt_item.z_number)
+                if output_bq is not metered_bq and not output_bq.complete_alt(my_allocation_alt_item.z_number):
+                    logger.error("[Step 240] Failed to load spooled output, it will be loaded with the next flush")
             else:
-                print(f"[INFO][Step 240] No records to insert for z_number={my_allocation_alt_item.z_number}")
-        
-        print("[INFO] ================> DONE")
+                logger.error("[Step 240] z_number=%s not checkpointed, it will be retried on resume", my_allocation_alt_item.z_number)
+
+        if output_bq is not metered_bq:
+            with metrics.step("Step 240"):
+                if not output_bq.flush():
+                    logger.error("[Step 240] Failed to load spooled output, re-run with resume=True to load it")
+            if output_bq.pending_rows:
+                logger.warning("[Step 240] %s spooled rows of failed ALTs were not loaded, they are recomputed on resume", output_bq.pending_rows)
+            output_bq.log_summary()
+        if so_cell_store is not None:
+            so_cell_store.log_summary()
+        if query_plan_cache is not None:
+            query_plan_cache.log_summary()
+        logger.info("================> DONE")
 
     except Exception as e:
-        print(f"Lỗi: {str(e)}")
+        logger.error("Lỗi: %s", e)
+        logger.info("Progress is saved in %s, re-run with resume=True to continue", checkpoint_dir)
+
+    metrics_path = metrics.write_json(
+        os.path.join(metrics_dir, f"allocate_{run_key}_{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    )
+    logger.info("[Metrics] Run %s per-step summary (JSON: %s):\n%s", run_key, metrics_path, metrics.format_table())
+    return metrics.to_dict()
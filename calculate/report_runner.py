@@ -1,17 +1,66 @@
+import logging
+import numpy as np
+import pandas as pd
 from db.bigquery_connector import BigQueryConnector
 from models.report_models import RepPage, RepTemp, RepTempBlock, RepCell
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from itertools import product
 from app_config import get_settings
+from utils.period_utils import parse_period, format_period, format_periods, period_range
+from services.rep_cell_builder import REP_CELL_VALUE_TYPES, build_rep_cell_frame
+from services.filter_item_cache import FILTER_ITEM_CACHE, query_filter_items
+from config.field_mappings import (
+    REPORT_KR_MAPPING,
+    REPORT_FILTER_MAPPING,
+    REP_TEMP_BLOCK_KR_MAPPING,
+    REP_TEMP_BLOCK_FILTER_MAPPING
+)
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Scenarios của SOCell data (Step 160 / 170 / 180)
+SO_CELL_SCENARIOS = ('Plan', 'Actual', 'Forecast')
+
+
+def build_field_to_type_map(my_rep_temp_block: RepTempBlock) -> Dict[str, str]:
+    """
+    Step 70: Filter fields (non-None) của RepTempBlock -> TO_Y_BLOCK_ToType
+    (giá trị field, bỏ hậu tố "-<số>" nếu có).
+
+    Args:
+        my_rep_temp_block: RepTempBlock instance
+
+    Returns:
+        Dict field name -> to_type
+    """
+    field_map = {name: value for name, value in REP_TEMP_BLOCK_FILTER_MAPPING.items_of(my_rep_temp_block)
+                 if value is not None}
+    logger.info("[Step 70] Field map with non-None values: %s", field_map)
+
+    # Build mapping from field_name to to_type
+    field_to_type_map = {}
+    for field_name, field_value in field_map.items():
+        if '-' in field_value:
+            parts = field_value.rsplit('-', 1)
+            if len(parts) == 2 and parts[1].isdigit():
+                to_type = parts[0]
+            else:
+                to_type = field_value
+        else:
+            to_type = field_value
+        field_to_type_map[field_name] = to_type
+    return field_to_type_map
 
 
 def build_filter_and_kr_data(
         bq: BigQueryConnector,
         project_id: str,
-        my_rep_temp_block: RepTempBlock
+        my_rep_temp_block: RepTempBlock,
+        to_type_items_map: Optional[Dict[str, List[str]]] = None
 ) -> Tuple[Dict[str, List[str]], Dict[str, str], List[Dict[str, str]]]:
     """
     Build filter item map, KR type full, and filter combinations from RepTempBlock.
@@ -25,6 +74,8 @@ def build_filter_and_kr_data(
         bq: BigQuery connector instance
         project_id: GCP project ID
         my_rep_temp_block: RepTempBlock instance containing filter and KR fields
+        to_type_items_map: to_type -> items đã resolve cho cả RepTemp (build_report); None = query
+            AllocationToItem cho các to_types của block
 
     Returns:
         Tuple containing:
@@ -33,107 +84,23 @@ def build_filter_and_kr_data(
         - filter_combinations: List of all filter item combinations
     """
     # Step70 MyFilterType - Collect filter types and query AllocationToItem
-    field_map = {
-        'NOW_Y_BLOCK_CDT_CDT1': my_rep_temp_block.now_y_block_cdt_cdt1,
-        'NOW_Y_BLOCK_CDT_CDT2': my_rep_temp_block.now_y_block_cdt_cdt2,
-        'NOW_Y_BLOCK_CDT_CDT3': my_rep_temp_block.now_y_block_cdt_cdt3,
-        'NOW_Y_BLOCK_CDT_CDT4': my_rep_temp_block.now_y_block_cdt_cdt4,
-        'NOW_Y_BLOCK_PTNow_PT1': my_rep_temp_block.now_y_block_ptnow_pt1,
-        'NOW_Y_BLOCK_PTNow_PT2': my_rep_temp_block.now_y_block_ptnow_pt2,
-        'NOW_Y_BLOCK_PTNow_Duration': my_rep_temp_block.now_y_block_ptnow_duration,
-        'NOW_Y_BLOCK_PTPrev_PT1': my_rep_temp_block.now_y_block_ptprev_pt1,
-        'NOW_Y_BLOCK_PTPrev_PT2': my_rep_temp_block.now_y_block_ptprev_pt2,
-        'NOW_Y_BLOCK_PTPrev_Duration': my_rep_temp_block.now_y_block_ptprev_duration,
-        'NOW_Y_BLOCK_PTFix_OwnType': my_rep_temp_block.now_y_block_ptfix_owntype,
-        'NOW_Y_BLOCK_PTFix_AIType': my_rep_temp_block.now_y_block_ptfix_aitype,
-        'NOW_Y_BLOCK_PTSub_CTY1': my_rep_temp_block.now_y_block_ptsub_cty1,
-        'NOW_Y_BLOCK_PTSub_CTY2': my_rep_temp_block.now_y_block_ptsub_cty2,
-        'NOW_Y_BLOCK_PTSub_OSType': my_rep_temp_block.now_y_block_ptsub_ostype,
-        'NOW_Y_BLOCK_Funnel_FU1': my_rep_temp_block.now_y_block_funnel_fu1,
-        'NOW_Y_BLOCK_Funnel_FU2': my_rep_temp_block.now_y_block_funnel_fu2,
-        'NOW_Y_BLOCK_Channel_CH': my_rep_temp_block.now_y_block_channel_ch,
-        'NOW_Y_BLOCK_Employee_EGT1': my_rep_temp_block.now_y_block_employee_egt1,
-        'NOW_Y_BLOCK_Employee_EGT2': my_rep_temp_block.now_y_block_employee_egt2,
-        'NOW_Y_BLOCK_Employee_EGT3': my_rep_temp_block.now_y_block_employee_egt3,
-        'NOW_Y_BLOCK_Employee_EGT4': my_rep_temp_block.now_y_block_employee_egt4,
-        'NOW_Y_BLOCK_HR_HR1': my_rep_temp_block.now_y_block_hr_hr1,
-        'NOW_Y_BLOCK_HR_HR2': my_rep_temp_block.now_y_block_hr_hr2,
-        'NOW_Y_BLOCK_HR_HR3': my_rep_temp_block.now_y_block_hr_hr3,
-        'NOW_Y_BLOCK_SEC': my_rep_temp_block.now_y_block_sec,
-        'NOW_Y_BLOCK_Period_MX': my_rep_temp_block.now_y_block_period_mx,
-        'NOW_Y_BLOCK_Period_DX': my_rep_temp_block.now_y_block_period_dx,
-        'NOW_Y_BLOCK_Period_PPC': my_rep_temp_block.now_y_block_period_ppc,
-        'NOW_Y_BLOCK_Period_NP': my_rep_temp_block.now_y_block_period_np,
-        'NOW_Y_BLOCK_LE_LE1': my_rep_temp_block.now_y_block_le_le1,
-        'NOW_Y_BLOCK_LE_LE2': my_rep_temp_block.now_y_block_le_le2,
-        'NOW_Y_BLOCK_UNIT': my_rep_temp_block.now_y_block_unit,
-        # 'NOW_Y_BLOCK_TD_BU': my_rep_temp_block.now_y_block_td_bu
-    }
-
-    field_map = {k: v for k, v in field_map.items() if v is not None}
-    print(f"[INFO][Step 70] Field map with non-None values: {field_map}")
-
-    # Build mapping from field_name to to_type
-    field_to_type_map = {}
-    for field_name, field_value in field_map.items():
-        if '-' in field_value:
-            parts = field_value.rsplit('-', 1)
-            if len(parts) == 2 and parts[1].isdigit():
-                to_type = parts[0]
-            else:
-                to_type = field_value
-        else:
-            to_type = field_value
-        field_to_type_map[field_name] = to_type
-
-    # Collect all unique to_type values
-    to_type_list = list(set(field_to_type_map.values()))
+    field_to_type_map = build_field_to_type_map(my_rep_temp_block)
+    if to_type_items_map is None:
+        to_type_items_map = query_filter_items(bq, project_id, field_to_type_map.values())
 
-    # Query all filter items at once with IN clause
+    # Map back to field names
     my_filter_item_map = {}
-    if to_type_list:
-        to_type_str = "', '".join(to_type_list)
-        query_filter_items = f"""
-        SELECT TO_Y_BLOCK_ToType, TO_Y_BLOCK_ToItem 
-        FROM `{project_id}.{settings.ALLOCATION_CONFIG_DATASET_NAME}.{settings.ALLOCATION_TO_ITEM_TABLE_NAME}` 
-        WHERE TO_Y_BLOCK_ToType IN ('{to_type_str}')
-        """
-
-        filter_items_df = bq.execute_query(query_filter_items)
-
-        # Group results by TO_Y_BLOCK_ToType
-        to_type_items_map = {}
-        for _, row in filter_items_df.iterrows():
-            to_type = row['TO_Y_BLOCK_ToType']
-            to_item = row['TO_Y_BLOCK_ToItem']
-            if to_type not in to_type_items_map:
-                to_type_items_map[to_type] = []
-            to_type_items_map[to_type].append(to_item)
+    for field_name, to_type in field_to_type_map.items():
+        if to_type in to_type_items_map:
+            my_filter_item_map[field_name] = to_type_items_map[to_type]
+            logger.info("[Step 70] %s (%s): Found %s items", field_name, to_type, len(to_type_items_map[to_type]))
 
-        # Map back to field names
-        for field_name, to_type in field_to_type_map.items():
-            if to_type in to_type_items_map:
-                my_filter_item_map[field_name] = to_type_items_map[to_type]
-                print(f"[INFO][Step 70] {field_name} ({to_type}): Found {len(to_type_items_map[to_type])} items")
-
-    print(f"[INFO][Step 70] MyFilterItemMap: {my_filter_item_map}")
+    logger.info("[Step 70] MyFilterItemMap: %s", my_filter_item_map)
 
     # Step80 MyKRTypeFull - Collect KR-related fields
-    my_kr_type_full = {
-        'NOW_Y_BLOCK_FNF_FNF': my_rep_temp_block.now_y_block_fnf_fnf,
-        'NOW_Y_BLOCK_KR_Item_Code_KR1': my_rep_temp_block.now_y_block_kr_item_code_kr1,
-        'NOW_Y_BLOCK_KR_Item_Code_KR2': my_rep_temp_block.now_y_block_kr_item_code_kr2,
-        'NOW_Y_BLOCK_KR_Item_Code_KR3': my_rep_temp_block.now_y_block_kr_item_code_kr3,
-        'NOW_Y_BLOCK_KR_Item_Code_KR4': my_rep_temp_block.now_y_block_kr_item_code_kr4,
-        'NOW_Y_BLOCK_KR_Item_Code_KR5': my_rep_temp_block.now_y_block_kr_item_code_kr5,
-        'NOW_Y_BLOCK_KR_Item_Code_KR6': my_rep_temp_block.now_y_block_kr_item_code_kr6,
-        'NOW_Y_BLOCK_KR_Item_Code_KR7': my_rep_temp_block.now_y_block_kr_item_code_kr7,
-        'NOW_Y_BLOCK_KR_Item_Code_KR8': my_rep_temp_block.now_y_block_kr_item_code_kr8,
-        'NOW_Y_BLOCK_KR_Item_Name': my_rep_temp_block.now_y_block_kr_item_name
-    }
-
-    my_kr_type_full = {k: v for k, v in my_kr_type_full.items() if v is not None}
-    print(f"[INFO][Step 80] MyKRTypeFull: {my_kr_type_full}")
+    my_kr_type_full = {name: value for name, value in REP_TEMP_BLOCK_KR_MAPPING.items_of(my_rep_temp_block)
+                       if value is not None}
+    logger.info("[Step 80] MyKRTypeFull: %s", my_kr_type_full)
 
     # Step100 Create Cartesian product of filter items
     if my_filter_item_map:
@@ -147,11 +114,11 @@ def build_filter_and_kr_data(
                 combination_map[field_name] = combination[i]
             filter_combinations.append(combination_map)
 
-        print(f"[INFO][Step 100] Created {len(filter_combinations)} filter combinations")
-        print(f"[INFO][Step 100] First 3 combinations: {filter_combinations[:3]}")
+        logger.info("[Step 100] Created %s filter combinations", len(filter_combinations))
+        logger.info("[Step 100] First 3 combinations: %s", filter_combinations[:3])
     else:
         filter_combinations = []
-        print(f"[INFO][Step 100] No filter items to combine")
+        logger.info("[Step 100] No filter items to combine")
 
     return my_filter_item_map, my_kr_type_full, filter_combinations
 
@@ -167,19 +134,45 @@ def calculate_x_period(my_last_report_month: str, l: int) -> str:
     Returns:
         MyXPeriod in format M{YY}{MM}
     """
-    year = int(my_last_report_month[1:3])
-    month = int(my_last_report_month[3:5])
+    return format_period(parse_period(my_last_report_month) - l)
 
-    total_months = year * 12 + month - l
-    new_year = total_months // 12
-    new_month = total_months % 12
 
-    if new_month == 0:
-        new_month = 12
-        new_year -= 1
+def zblock1_conditions(source: str, pack: str, scenario: str, run: str) -> List[str]:
+    """Điều kiện ZBlock1 của một scenario (bỏ qua source/pack/scenario/run rỗng)."""
+    conditions = []
+    if source:
+        conditions.append(f"z_block_zblock1_source = '{source}'")
+    if pack:
+        conditions.append(f"z_block_zblock1_pack = '{pack}'")
+    if scenario:
+        conditions.append(f"z_block_zblock1_scenario = '{scenario}'")
+    if run:
+        conditions.append(f"z_block_zblock1_run = '{run}'")
+    return conditions
 
-    my_x_period = f"M{new_year:02d}{new_month:02d}"
-    return my_x_period
+
+def scenario_conditions(my_rep_page) -> Dict[str, List[str]]:
+    """
+    Điều kiện ZBlock1 của từng scenario (Step 160 Plan, Step 170 Actual, Step 180 Forecast).
+
+    Returns:
+        Dict scenario (SO_CELL_SCENARIOS) -> list conditions
+    """
+    return {
+        'Plan': zblock1_conditions(
+            my_rep_page.z_block_zblock_plan_source,
+            my_rep_page.z_block_zblock_plan_pack,
+            my_rep_page.z_block_zblock_plan_scenario,
+            my_rep_page.z_block_zblock_plan_run
+        ),
+        'Actual': ["z_block_zblock1_source = 'ACTUAL'"],
+        'Forecast': zblock1_conditions(
+            my_rep_page.z_block_forecast_source,
+            my_rep_page.z_block_forecast_pack,
+            my_rep_page.z_block_forecast_scenario,
+            my_rep_page.z_block_forecast_run
+        )
+    }
 
 
 def query_so_cell_data(
@@ -209,89 +202,26 @@ def query_so_cell_data(
         - actual_data: Dictionary mapping period to actual value
         - forecast_data: Dictionary mapping period to forecast value
     """
-    # Field mappings (shared across all queries)
-    kr_field_mapping = {
-        'NOW_Y_BLOCK_FNF_FNF': 'now_y_block_fnf_fnf',
-        'NOW_Y_BLOCK_KR_Item_Code_KR1': 'now_y_block_kr_item_code_kr1',
-        'NOW_Y_BLOCK_KR_Item_Code_KR2': 'now_y_block_kr_item_code_kr2',
-        'NOW_Y_BLOCK_KR_Item_Code_KR3': 'now_y_block_kr_item_code_kr3',
-        'NOW_Y_BLOCK_KR_Item_Code_KR4': 'now_y_block_kr_item_code_kr4',
-        'NOW_Y_BLOCK_KR_Item_Code_KR5': 'now_y_block_kr_item_code_kr5',
-        'NOW_Y_BLOCK_KR_Item_Code_KR6': 'now_y_block_kr_item_code_kr6',
-        'NOW_Y_BLOCK_KR_Item_Code_KR7': 'now_y_block_kr_item_code_kr7',
-        'NOW_Y_BLOCK_KR_Item_Code_KR8': 'now_y_block_kr_item_code_kr8',
-        'NOW_Y_BLOCK_KR_Item_Name': 'now_y_block_kr_item_name'
-    }
-
-    filter_field_mapping = {
-        'NOW_Y_BLOCK_CDT_CDT1': 'now_y_block_cdt_cdt1',
-        'NOW_Y_BLOCK_CDT_CDT2': 'now_y_block_cdt_cdt2',
-        'NOW_Y_BLOCK_CDT_CDT3': 'now_y_block_cdt_cdt3',
-        'NOW_Y_BLOCK_CDT_CDT4': 'now_y_block_cdt_cdt4',
-        'NOW_Y_BLOCK_PTNow_PT1': 'now_y_block_ptnow_pt1',
-        'NOW_Y_BLOCK_PTNow_PT2': 'now_y_block_ptnow_pt2',
-        'NOW_Y_BLOCK_PTNow_Duration': 'now_y_block_ptnow_duration',
-        'NOW_Y_BLOCK_PTPrev_PT1': 'now_y_block_ptprev_pt1',
-        'NOW_Y_BLOCK_PTPrev_PT2': 'now_y_block_ptprev_pt2',
-        'NOW_Y_BLOCK_PTPrev_Duration': 'now_y_block_ptprev_duration',
-        'NOW_Y_BLOCK_PTFix_OwnType': 'now_y_block_ptfix_owntype',
-        'NOW_Y_BLOCK_PTFix_AIType': 'now_y_block_ptfix_aitype',
-        'NOW_Y_BLOCK_PTSub_CTY1': 'now_y_block_ptsub_cty1',
-        'NOW_Y_BLOCK_PTSub_CTY2': 'now_y_block_ptsub_cty2',
-        'NOW_Y_BLOCK_PTSub_OSType': 'now_y_block_ptsub_ostype',
-        'NOW_Y_BLOCK_Funnel_FU1': 'now_y_block_funnel_fu1',
-        'NOW_Y_BLOCK_Funnel_FU2': 'now_y_block_funnel_fu2',
-        'NOW_Y_BLOCK_Channel_CH': 'now_y_block_channel_ch',
-        'NOW_Y_BLOCK_Employee_EGT1': 'now_y_block_employee_egt1',
-        'NOW_Y_BLOCK_Employee_EGT2': 'now_y_block_employee_egt2',
-        'NOW_Y_BLOCK_Employee_EGT3': 'now_y_block_employee_egt3',
-        'NOW_Y_BLOCK_Employee_EGT4': 'now_y_block_employee_egt4',
-        'NOW_Y_BLOCK_HR_HR1': 'now_y_block_hr_hr1',
-        'NOW_Y_BLOCK_HR_HR2': 'now_y_block_hr_hr2',
-        'NOW_Y_BLOCK_HR_HR3': 'now_y_block_hr_hr3',
-        'NOW_Y_BLOCK_SEC': 'now_y_block_sec',
-        'NOW_Y_BLOCK_Period_MX': 'now_y_block_period_mx',
-        'NOW_Y_BLOCK_Period_DX': 'now_y_block_period_dx',
-        'NOW_Y_BLOCK_Period_PPC': 'now_y_block_period_ppc',
-        'NOW_Y_BLOCK_Period_NP': 'now_y_block_period_np',
-        'NOW_Y_BLOCK_LE_LE1': 'now_y_block_le_le1',
-        'NOW_Y_BLOCK_LE_LE2': 'now_y_block_le_le2',
-        'NOW_Y_BLOCK_UNIT': 'now_y_block_unit',
-        'NOW_Y_BLOCK_TD_BU': 'now_y_block_td_bu'
-    }
-
-    periods_str = "', '".join(x_period_list)
-
-    # Step160 Query Plan data for ALL periods at once
-    z_block_plan_source = my_rep_page.z_block_zblock_plan_source
-    z_block_plan_pack = my_rep_page.z_block_zblock_plan_pack
-    z_block_plan_scenario = my_rep_page.z_block_zblock_plan_scenario
-    z_block_plan_run = my_rep_page.z_block_zblock_plan_run
-
-    where_conditions = []
-    if z_block_plan_source:
-        where_conditions.append(f"z_block_zblock1_source = '{z_block_plan_source}'")
-    if z_block_plan_pack:
-        where_conditions.append(f"z_block_zblock1_pack = '{z_block_plan_pack}'")
-    if z_block_plan_scenario:
-        where_conditions.append(f"z_block_zblock1_scenario = '{z_block_plan_scenario}'")
-    if z_block_plan_run:
-        where_conditions.append(f"z_block_zblock1_run = '{z_block_plan_run}'")
-
-    for kr_field, kr_value in my_kr_type_full.items():
-        if kr_field in kr_field_mapping:
-            so_cell_field = kr_field_mapping[kr_field]
-            where_conditions.append(f"{so_cell_field} = '{kr_value}'")
-
-    for filter_field, so_cell_field in filter_field_mapping.items():
+    # Điều kiện KR / filter (giống nhau cho cả Plan, Actual, Forecast): build một lần
+    y_block_conditions = [f"{so_cell_field} = '{kr_value}'"
+                          for so_cell_field, kr_value in REPORT_KR_MAPPING.translate_items(my_kr_type_full)]
+    for filter_field, so_cell_field in REPORT_FILTER_MAPPING.pairs:
         if filter_field in my_filter_item:
             # If the filter has a specific value, add an equality condition
             filter_value = my_filter_item[filter_field]
-            where_conditions.append(f"{so_cell_field} = '{filter_value}'")
+            y_block_conditions.append(f"{so_cell_field} = '{filter_value}'")
         else:
             # If the filter is not in my_filter_item, it was NULL in RepTempBlock.
             # So, we filter for NULL values in the so_cell table.
-            where_conditions.append(f"{so_cell_field} IS NULL")
+            y_block_conditions.append(f"{so_cell_field} IS NULL")
+
+    periods_str = "', '".join(x_period_list)
+    zblock_conditions = scenario_conditions(my_rep_page)
+
+    # Step160 Query Plan data for ALL periods at once
+    where_conditions = list(zblock_conditions['Plan'])
+
+    where_conditions.extend(y_block_conditions)
 
     where_conditions.append(f"now_np IN ('{periods_str}')")
     where_conditions.append(f"NOW_ZBlock2_ALT = '{my_alt}'")
@@ -305,22 +235,12 @@ def query_so_cell_data(
 
     so_cell_df = bq.execute_query(query_so_cell)
     plan_data = {row['now_np']: row['now_value'] for _, row in so_cell_df.iterrows()}
-    print(f"[INFO][Step 160] Queried Plan data for {len(plan_data)} periods")
+    logger.info("[Step 160] Queried Plan data for %s periods", len(plan_data))
 
     # Step170 Query Actual data for ALL periods at once
-    where_conditions_actual = ["z_block_zblock1_source = 'ACTUAL'"]
-
-    for kr_field, kr_value in my_kr_type_full.items():
-        if kr_field in kr_field_mapping:
-            so_cell_field = kr_field_mapping[kr_field]
-            where_conditions_actual.append(f"{so_cell_field} = '{kr_value}'")
+    where_conditions_actual = list(zblock_conditions['Actual'])
 
-    for filter_field, so_cell_field in filter_field_mapping.items():
-        if filter_field in my_filter_item:
-            filter_value = my_filter_item[filter_field]
-            where_conditions_actual.append(f"{so_cell_field} = '{filter_value}'")
-        else:
-            where_conditions_actual.append(f"{so_cell_field} IS NULL")
+    where_conditions_actual.extend(y_block_conditions)
 
     where_conditions_actual.append(f"now_np IN ('{periods_str}')")
     where_conditions_actual.append(f"NOW_ZBlock2_ALT = '{my_alt}'")
@@ -334,35 +254,12 @@ def query_so_cell_data(
 
     so_cell_actual_df = bq.execute_query(query_so_cell_actual)
     actual_data = {row['now_np']: row['now_value'] for _, row in so_cell_actual_df.iterrows()}
-    print(f"[INFO][Step 170] Queried Actual data for {len(actual_data)} periods")
+    logger.info("[Step 170] Queried Actual data for %s periods", len(actual_data))
 
     # Step180 Query Forecast data for ALL periods at once
-    z_block_forecast_source = my_rep_page.z_block_forecast_source
-    z_block_forecast_pack = my_rep_page.z_block_forecast_pack
-    z_block_forecast_scenario = my_rep_page.z_block_forecast_scenario
-    z_block_forecast_run = my_rep_page.z_block_forecast_run
-
-    where_conditions_forecast = []
-    if z_block_forecast_source:
-        where_conditions_forecast.append(f"z_block_zblock1_source = '{z_block_forecast_source}'")
-    if z_block_forecast_pack:
-        where_conditions_forecast.append(f"z_block_zblock1_pack = '{z_block_forecast_pack}'")
-    if z_block_forecast_scenario:
-        where_conditions_forecast.append(f"z_block_zblock1_scenario = '{z_block_forecast_scenario}'")
-    if z_block_forecast_run:
-        where_conditions_forecast.append(f"z_block_zblock1_run = '{z_block_forecast_run}'")
-
-    for kr_field, kr_value in my_kr_type_full.items():
-        if kr_field in kr_field_mapping:
-            so_cell_field = kr_field_mapping[kr_field]
-            where_conditions_forecast.append(f"{so_cell_field} = '{kr_value}'")
-
-    for filter_field, so_cell_field in filter_field_mapping.items():
-        if filter_field in my_filter_item:
-            filter_value = my_filter_item[filter_field]
-            where_conditions_forecast.append(f"{so_cell_field} = '{filter_value}'")
-        else:
-            where_conditions_forecast.append(f"{so_cell_field} IS NULL")
+    where_conditions_forecast = list(zblock_conditions['Forecast'])
+
+    where_conditions_forecast.extend(y_block_conditions)
 
     where_conditions_forecast.append(f"now_np IN ('{periods_str}')")
     where_conditions_forecast.append(f"NOW_ZBlock2_ALT = '{my_alt}'")
@@ -376,11 +273,189 @@ def query_so_cell_data(
 
     so_cell_forecast_df = bq.execute_query(query_so_cell_forecast)
     forecast_data = {row['now_np']: row['now_value'] for _, row in so_cell_forecast_df.iterrows()}
-    print(f"[INFO][Step 180] Queried Forecast data for {len(forecast_data)} periods")
+    logger.info("[Step 180] Queried Forecast data for %s periods", len(forecast_data))
 
     return plan_data, actual_data, forecast_data
 
 
+def _so_cell_block_conditions(
+        my_kr_type_full: Dict[str, str],
+        my_filter_item_map: Dict[str, List[str]],
+        x_period_list: List[str],
+        my_alt: str
+) -> Tuple[List[str], List[str]]:
+    """
+    Key columns (SOCell fields của các filter có items) và điều kiện chung của các scenarios
+    cho query SOCell theo block: KR = value, filter có items IN (items), filter không có
+    items IS NULL (như query_so_cell_data), now_np và ALT.
+    """
+    key_columns = [REPORT_FILTER_MAPPING.translate(filter_field) for filter_field in my_filter_item_map]
+
+    common_conditions = [f"{so_cell_field} = '{kr_value}'"
+                         for so_cell_field, kr_value in REPORT_KR_MAPPING.translate_items(my_kr_type_full)]
+    for filter_field, so_cell_field in REPORT_FILTER_MAPPING.pairs:
+        if filter_field in my_filter_item_map:
+            items_str = "', '".join(str(item) for item in my_filter_item_map[filter_field])
+            common_conditions.append(f"{so_cell_field} IN ('{items_str}')")
+        else:
+            common_conditions.append(f"{so_cell_field} IS NULL")
+    periods_str = "', '".join(x_period_list)
+    common_conditions.append(f"now_np IN ('{periods_str}')")
+    common_conditions.append(f"NOW_ZBlock2_ALT = '{my_alt}'")
+    return key_columns, common_conditions
+
+
+def _decode_period_vectors(
+        so_cell_df: pd.DataFrame,
+        key_columns: List[str],
+        x_period_list: List[str]
+) -> Dict[tuple, np.ndarray]:
+    """
+    Rows (key columns, now_np, plan_value, actual_forecast_value), unique theo (key, now_np)
+    -> dict combination key -> array (len(REP_CELL_VALUE_TYPES), len(x_period_list)).
+    """
+    if len(so_cell_df) == 0:
+        return {}
+    if key_columns:
+        key_codes = so_cell_df.groupby(key_columns, sort=False).ngroup().to_numpy()
+        keys = list(so_cell_df.loc[~pd.Series(key_codes).duplicated().to_numpy(), key_columns].itertuples(index=False, name=None))
+    else:
+        key_codes = np.zeros(len(so_cell_df), dtype=int)
+        keys = [()]
+    period_codes = so_cell_df['now_np'].map({period: i for i, period in enumerate(x_period_list)}).to_numpy()
+
+    vectors = np.full((len(keys), len(REP_CELL_VALUE_TYPES), len(x_period_list)), np.nan)
+    for i, column in enumerate(('plan_value', 'actual_forecast_value')):
+        vectors[key_codes, i, period_codes] = pd.to_numeric(so_cell_df[column], errors='coerce').to_numpy(dtype=float)
+    logger.info("[Step 160-180] Decoded period vectors for %s filter combinations", len(keys))
+    return {key: vectors[i] for i, key in enumerate(keys)}
+
+
+def query_so_cell_block_data(
+        bq: BigQueryConnector,
+        project_id: str,
+        my_rep_page,
+        my_kr_type_full: Dict[str, str],
+        my_filter_item_map: Dict[str, List[str]],
+        x_period_list: List[str],
+        is_actual_list: List[bool],
+        my_alt: str
+) -> Dict[tuple, np.ndarray]:
+    """
+    Query SOCell data (Plan, Actual, Forecast) cho mọi filter combination của một RepTempBlock
+    bằng một query (UNION ALL của 3 scenarios), thay vì 3 queries cho mỗi combination
+    (query_so_cell_data).
+
+    Filter field có items được lọc bằng IN (items) và trả về như key column; filter field không
+    có items được lọc IS NULL như query_so_cell_data. Với mỗi (combination, scenario, period),
+    giá trị được chọn giống query_so_cell_data (ORDER BY uploaded_at DESC, row cuối được giữ).
+    ActualForecast = Actual nếu is_actual_list[L], còn lại Forecast (Step 200).
+
+    Args:
+        bq: BigQuery connector instance
+        project_id: GCP project ID
+        my_rep_page: RepPage instance containing ZBlock information
+        my_kr_type_full: Dictionary of KR-related fields
+        my_filter_item_map: Filter field -> list filter items (build_filter_and_kr_data)
+        x_period_list: List of period strings to query
+        is_actual_list: Theo period: True = ActualForecast lấy Actual
+        my_alt: ALT identifier for NOW_ZBlock2_ALT filter
+
+    Returns:
+        Dict combination key (tuple filter items theo thứ tự của my_filter_item_map) ->
+        array (len(REP_CELL_VALUE_TYPES), len(x_period_list)), NaN nếu không có SOCell.
+        Combination không có SOCell nào không có trong dict.
+    """
+    key_columns, common_conditions = _so_cell_block_conditions(my_kr_type_full, my_filter_item_map, x_period_list, my_alt)
+
+    select_columns = ', '.join(key_columns + ['now_np', 'now_value', 'uploaded_at'])
+    scenario_queries = [
+        f"""
+    SELECT '{scenario}' AS scenario, {select_columns}
+    FROM `{project_id}.{settings.ALLOC_STAGE_DATASET_NAME}.{settings.SO_CELL_TABLE_NAME}` 
+    WHERE {' AND '.join(conditions + common_conditions)}"""
+        for scenario, conditions in scenario_conditions(my_rep_page).items()
+    ]
+    query_so_cell = "\n    UNION ALL".join(scenario_queries) + "\n    ORDER BY uploaded_at DESC\n    "
+
+    so_cell_df = bq.execute_query(query_so_cell)
+    logger.info("[Step 160-180] Queried %s SOCell rows for %s filter fields", len(so_cell_df), len(key_columns))
+    if len(so_cell_df) == 0:
+        return {}
+
+    # Giữ row cuối (uploaded_at sớm nhất) của mỗi (combination, scenario, period)
+    so_cell_df = so_cell_df.drop_duplicates(subset=key_columns + ['scenario', 'now_np'], keep='last')
+    so_cell_df = so_cell_df.assign(now_value=pd.to_numeric(so_cell_df['now_value'], errors='coerce'))
+    scenario_df = so_cell_df.pivot(index=key_columns + ['now_np'], columns='scenario', values='now_value')
+    scenario_df = scenario_df.reindex(columns=list(SO_CELL_SCENARIOS)).reset_index()
+
+    # Step200 ActualForecast theo period
+    actual_periods = {period for period, is_actual in zip(x_period_list, is_actual_list) if is_actual}
+    scenario_df['plan_value'] = scenario_df['Plan']
+    scenario_df['actual_forecast_value'] = np.where(
+        scenario_df['now_np'].isin(actual_periods), scenario_df['Actual'], scenario_df['Forecast']
+    )
+    return _decode_period_vectors(scenario_df, key_columns, x_period_list)
+
+
+def query_so_cell_block_data_single_scan(
+        bq: BigQueryConnector,
+        project_id: str,
+        my_rep_page,
+        my_kr_type_full: Dict[str, str],
+        my_filter_item_map: Dict[str, List[str]],
+        x_period_list: List[str],
+        is_actual_list: List[bool],
+        my_alt: str
+) -> Dict[tuple, np.ndarray]:
+    """
+    Giống query_so_cell_block_data nhưng đọc so_cell_processed một lần cho cả 3 scenarios:
+    mỗi row được đánh dấu theo điều kiện ZBlock1 của Plan và của ActualForecast (Actual với
+    period <= LastActualMonth, Forecast với period còn lại, chọn ở server), giá trị của row có
+    uploaded_at sớm nhất theo từng dấu được lấy bằng ROW_NUMBER + conditional aggregation,
+    group theo (combination, now_np).
+
+    Args / Returns: xem query_so_cell_block_data
+    """
+    key_columns, common_conditions = _so_cell_block_conditions(my_kr_type_full, my_filter_item_map, x_period_list, my_alt)
+    zblock_conditions = {
+        scenario: ' AND '.join(conditions) or '1 = 1'
+        for scenario, conditions in scenario_conditions(my_rep_page).items()
+    }
+    actual_periods = [period for period, is_actual in zip(x_period_list, is_actual_list) if is_actual]
+    actual_periods_str = "', '".join(actual_periods)
+    if actual_periods:
+        actual_forecast_condition = (f"CASE WHEN now_np IN ('{actual_periods_str}') "
+                                     f"THEN {zblock_conditions['Actual']} ELSE {zblock_conditions['Forecast']} END")
+    else:
+        actual_forecast_condition = zblock_conditions['Forecast']
+
+    key_select = ''.join(f"{column}, " for column in key_columns)
+    query_so_cell = f"""
+    SELECT {key_select}now_np,
+        MAX(CASE WHEN is_plan = 1 AND plan_rank = 1 THEN now_value END) AS plan_value,
+        MAX(CASE WHEN is_actual_forecast = 1 AND actual_forecast_rank = 1 THEN now_value END) AS actual_forecast_value
+    FROM (
+        SELECT {key_select}now_np, now_value, is_plan, is_actual_forecast,
+            ROW_NUMBER() OVER (PARTITION BY {key_select}now_np, is_plan ORDER BY uploaded_at) AS plan_rank,
+            ROW_NUMBER() OVER (PARTITION BY {key_select}now_np, is_actual_forecast ORDER BY uploaded_at) AS actual_forecast_rank
+        FROM (
+            SELECT {key_select}now_np, now_value, uploaded_at,
+                CASE WHEN {zblock_conditions['Plan']} THEN 1 ELSE 0 END AS is_plan,
+                CASE WHEN {actual_forecast_condition} THEN 1 ELSE 0 END AS is_actual_forecast
+            FROM `{project_id}.{settings.ALLOC_STAGE_DATASET_NAME}.{settings.SO_CELL_TABLE_NAME}` 
+            WHERE {' AND '.join(common_conditions)}
+        ) AS so_cell
+        WHERE is_plan = 1 OR is_actual_forecast = 1
+    ) AS ranked_so_cell
+    GROUP BY {key_select}now_np
+    """
+
+    so_cell_df = bq.execute_query(query_so_cell)
+    logger.info("[Step 160-180] Queried %s (combination, period) rows in one scan for %s filter fields", len(so_cell_df), len(key_columns))
+    return _decode_period_vectors(so_cell_df, key_columns, x_period_list)
+
+
 def calculate_y_number1(
         bq: BigQueryConnector,
         project_id: str,
@@ -413,7 +488,7 @@ def calculate_y_number1(
         AND Z_BLOCK_ZBlockPlan_Run = '{z_block_plan_run}'
         LIMIT 1
         """
-        print(f"[INFO] Querying ZBlockPlan YNumber...")
+        logger.info("Querying ZBlockPlan YNumber...")
         zblock_plan_df = bq.execute_query(query_zblock_plan)
 
         if len(zblock_plan_df) == 0:
@@ -421,7 +496,7 @@ def calculate_y_number1(
                 f"ZBlockPlan not found: {z_block_plan_source}-{z_block_plan_pack}-{z_block_plan_scenario}-{z_block_plan_run}")
 
         zblock_plan_ynumber = int(zblock_plan_df.iloc[0]['YNumber'])
-        print(f"[INFO] ZBlockPlan YNumber: {zblock_plan_ynumber}")
+        logger.info("ZBlockPlan YNumber: %s", zblock_plan_ynumber)
 
         # Query ZBlockForecast.YNumber
         query_zblock_forecast = f"""
@@ -432,7 +507,7 @@ def calculate_y_number1(
         AND Z_BLOCK_ZBlockForecast_Run = '{z_block_forecast_run}'
         LIMIT 1
         """
-        print(f"[INFO] Querying ZBlockForecast YNumber...")
+        logger.info("Querying ZBlockForecast YNumber...")
         zblock_forecast_df = bq.execute_query(query_zblock_forecast)
 
         if len(zblock_forecast_df) == 0:
@@ -440,7 +515,7 @@ def calculate_y_number1(
                 f"ZBlockForecast not found: {z_block_forecast_source}-{z_block_forecast_pack}-{z_block_forecast_scenario}-{z_block_forecast_run}")
 
         zblock_forecast_ynumber = int(zblock_forecast_df.iloc[0]['YNumber'])
-        print(f"[INFO] ZBlockForecast YNumber: {zblock_forecast_ynumber}")
+        logger.info("ZBlockForecast YNumber: %s", zblock_forecast_ynumber)
 
         # Query MyALT.YNumber
         query_alt = f"""
@@ -448,25 +523,24 @@ def calculate_y_number1(
         WHERE NOW_ZBlock2_ALT = '{my_alt}'
         LIMIT 1
         """
-        print(f"[INFO] Querying MyALT YNumber for: {my_alt}...")
+        logger.info("Querying MyALT YNumber for: %s...", my_alt)
         alt_df = bq.execute_query(query_alt)
 
         if len(alt_df) == 0:
             raise Exception(f"MyALT not found: {my_alt}")
 
         alt_ynumber = int(alt_df.iloc[0]['YNumber'])
-        print(f"[INFO] MyALT YNumber: {alt_ynumber}")
+        logger.info("MyALT YNumber: %s", alt_ynumber)
 
         # Calculate YNumber1
         y_number1 = zblock_plan_ynumber * 1000000 + zblock_forecast_ynumber * 1000 + alt_ynumber
-        print(
-            f"[INFO] Calculated YNumber1: {zblock_plan_ynumber} * 1000000 + {zblock_forecast_ynumber} * 1000 + {alt_ynumber} = {y_number1}")
+        logger.info("Calculated YNumber1: %s * 1000000 + %s * 1000 + %s = %s", zblock_plan_ynumber, zblock_forecast_ynumber, alt_ynumber, y_number1)
 
         return y_number1
 
     except Exception as e:
         error_msg = f"Failed to calculate YNumber1: {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
 
 
@@ -546,7 +620,7 @@ def find_or_create_rep_page(
 
     if len(rep_page_items) > 0:
         my_rep_page = rep_page_items[0]
-        print(f"[INFO][Step 20] Found existing RepPage: {my_rep_page}")
+        logger.info("[Step 20] Found existing RepPage: %s", my_rep_page)
         return my_rep_page, False
     else:
         my_rep_page = RepPage(
@@ -589,10 +663,10 @@ def find_or_create_rep_page(
         )
 
         if success:
-            print(f"[INFO][Step 20] Created new RepPage: {my_rep_page}")
+            logger.info("[Step 20] Created new RepPage: %s", my_rep_page)
             return my_rep_page, True
         else:
-            print(f"[ERROR][Step 20] Failed to create RepPage")
+            logger.error("[Step 20] Failed to create RepPage")
             raise Exception("Failed to create RepPage in BigQuery")
 
 
@@ -628,14 +702,14 @@ def load_report(
         - If data exists: (rep_cells, None, "success")
         - If building: ([], task_id, "building")
     """
-    print("[INFO] Starting load_report")
+    logger.info("Starting load_report")
 
     bq = BigQueryConnector(
         credentials_path=settings.GCP_CREDENTIALS_PATH,
         project_id=settings.GCP_PROJECT_ID
     )
 
-    print(f"[INFO] Processing report for: {my_rep_temp}, {my_z_block_plan}, {my_z_block_forecast}")
+    logger.info("Processing report for: %s, %s, %s", my_rep_temp, my_z_block_plan, my_z_block_forecast)
 
     # Step 1: Find or create RepPage
     existing_rep_page, is_newly_created = find_or_create_rep_page(
@@ -651,21 +725,21 @@ def load_report(
         rep_page_table_name=settings.REP_PAGE_TABLE_NAME
     )
 
-    print(f"[INFO] Using RepPage: {existing_rep_page} (newly_created={is_newly_created})")
+    logger.info("Using RepPage: %s (newly_created=%s)", existing_rep_page, is_newly_created)
 
     # Step 2: Check if RepCell data exists
     need_to_build = False
 
     if is_newly_created:
         # RepPage just created - definitely need to build report
-        print(f"[INFO] RepPage newly created, need to build report")
+        logger.info("RepPage newly created, need to build report")
         need_to_build = True
 
     # Step 3: If need to build, submit task to queue and return empty with task_id
     if need_to_build:
         from api.task_queue import task_queue_instance
 
-        print(f"[INFO] Submitting build report task to queue...")
+        logger.info("Submitting build report task to queue...")
         task_id = task_queue_instance.submit_task(
             task_type="build_report",
             params={
@@ -678,21 +752,18 @@ def load_report(
             }
         )
 
-        print(f"[INFO] Build task submitted with task_id: {task_id}")
+        logger.info("Build task submitted with task_id: %s", task_id)
         return [], task_id, "Report is being built. Please check task status."
 
     # Step 4: Calculate MyXPeriodLoadList for 6 recent months (M from 0 to 5)
-    my_x_period_load_list = []
-    for m in range(6):
-        my_x_period_load = calculate_x_period(my_last_report_month, m)
-        my_x_period_load_list.append(my_x_period_load)
+    my_x_period_load_list = format_periods(period_range(my_last_report_month, 6))
 
-    print(f"[INFO] Calculated MyXPeriodLoadList: {my_x_period_load_list}")
+    logger.info("Calculated MyXPeriodLoadList: %s", my_x_period_load_list)
 
     # Step 5: Load and return RepCell data using YNumber1, MyRepTempBlock, and NOW_NP IN clause
     y_number_1 = existing_rep_page.y_number1
     my_rep_temp_value = existing_rep_page.my_rep_temp
-    print(f"[INFO] Loading RepCell data for YNumber1: {y_number_1}, MyRepTempBlock: {my_rep_temp_value}")
+    logger.info("Loading RepCell data for YNumber1: %s, MyRepTempBlock: %s", y_number_1, my_rep_temp_value)
 
     # Build IN clause for periods
     period_in_clause = "', '".join(my_x_period_load_list)
@@ -709,21 +780,88 @@ def load_report(
     rep_cell_df = bq.execute_query(query_rep_cell)
 
     if len(rep_cell_df) == 0:
-        print(f"[WARN] No RepCell data found for YNumber1: {y_number_1}, MyRepTempBlock: {my_rep_temp_value}")
+        logger.warning("No RepCell data found for YNumber1: %s, MyRepTempBlock: %s", y_number_1, my_rep_temp_value)
         return [], None, "No data found"
 
     rep_cells = RepCell.from_dataframe(rep_cell_df)
-    print(f"[INFO] Successfully loaded {len(rep_cells)} RepCell records")
+    logger.info("Successfully loaded %s RepCell records", len(rep_cells))
     return rep_cells, None, "Data loaded successfully"
 
 
+def build_rep_temp_block_cells(
+        bq: BigQueryConnector,
+        project_id: str,
+        my_rep_page: RepPage,
+        my_rep_temp_block: RepTempBlock,
+        base_values: Dict[str, object],
+        x_period_list: List[str],
+        is_actual_list: List[bool],
+        query_block_data,
+        to_type_items_map: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
+    """
+    Step 60-200 của một RepTempBlock: filter items, SOCell data và RepCells (chưa ghi).
+
+    Args:
+        bq: BigQueryConnector instance
+        project_id: BigQuery project ID
+        my_rep_page: RepPage instance
+        my_rep_temp_block: RepTempBlock cần build
+        base_values: RepCell fields chung của report (z_number, y_number1, my_rep_page, my_rep_temp_block)
+        x_period_list: Periods theo L
+        is_actual_list: Theo L: True = ActualForecast lấy Actual
+        query_block_data: query_so_cell_block_data hoặc query_so_cell_block_data_single_scan
+        to_type_items_map: to_type -> items của cả RepTemp (None = query theo block)
+
+    Returns:
+        RepCell frame của block (build_rep_cell_frame)
+    """
+    logger.info("[Step 40] Processing RepTempBlock: %s", my_rep_temp_block)
+
+    # Step60 MyYNumber2 = MyRepTempBlock.YNumber2
+    my_y_number_2 = my_rep_temp_block.y_number2
+
+    # Step70-100: Build filter item map, KR type full, and filter combinations
+    my_filter_item_map, my_kr_type_full, filter_combinations = build_filter_and_kr_data(
+        bq, project_id, my_rep_temp_block, to_type_items_map
+    )
+
+    # KR fields của RepCell (NOW_Y_BLOCK_* -> now_y_block_*), giống nhau cho mọi filter item
+    kr_attributes = REPORT_KR_MAPPING.translate_items(my_kr_type_full)
+
+    # If filter_combinations is empty, create a list with one empty dict to run the logic once without filters
+    filter_items_to_process = filter_combinations if filter_combinations else [{}]
+    logger.info("Processing %s filter combinations (empty=%s)", len(filter_items_to_process), len(filter_combinations) == 0)
+
+    # Step160-180 Query SOCell data của mọi filter combinations của block một lần
+    block_so_cell_data = query_block_data(
+        bq, project_id, my_rep_page, my_kr_type_full, my_filter_item_map, x_period_list, is_actual_list,
+        my_rep_page.now_zblock2_alt
+    )
+
+    # Step120 / Step190-200 RepCells (Plan, ActualForecast) của mọi MyFilterItem × L, theo cột
+    rep_cell_frame = build_rep_cell_frame(
+        base_values={**base_values, 'y_number2': my_y_number_2},
+        y_block_values=dict(kr_attributes),
+        filter_fields=list(my_filter_item_map),
+        filter_items=filter_items_to_process,
+        block_so_cell_data=block_so_cell_data,
+        x_period_list=x_period_list
+    )
+    logger.debug("[Step 190-200] First RepCells of block:\n%s", rep_cell_frame.head(4))
+    return rep_cell_frame
+
+
 def build_report(
         bq: BigQueryConnector,
         my_rep_page: RepPage,
         my_rep_temp: str,
         my_last_report_month: str,
         my_last_actual_month: str,
-        project_id: str
+        project_id: str,
+        so_cell_single_scan: Optional[bool] = None,
+        max_workers: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
 ) -> str:
     # Step30A
     my_last_report_month = "M3012"
@@ -743,14 +881,24 @@ def build_report(
         my_last_report_month: Last report month
         my_last_actual_month: Last actual month
         project_id: BigQuery project ID
+        so_cell_single_scan: True = Plan / Actual / Forecast của mỗi block được đọc trong một scan
+            (query_so_cell_block_data_single_scan); default theo settings.REPORT_SO_CELL_SINGLE_SCAN
+        max_workers: Số RepTempBlocks được xử lý song song (default settings.REPORT_BUILD_MAX_WORKERS,
+            1 = tuần tự). RepCells vẫn được ghi theo thứ tự YNumber2
+        progress_callback: Gọi với (số blocks đã xong, tổng số blocks) sau mỗi block
+
+    RepCells được load theo lô, mỗi khi frames đã build đạt settings.REPORT_REP_CELL_LOAD_MB.
+    Report không all-or-nothing: khi một block lỗi, RepCells của các blocks trước nó (theo
+    YNumber2) vẫn được load trước khi exception được raise lại, như khi load từng block; RepPage
+    khi đó chỉ có một phần RepCells và caller cần build lại report.
 
     Returns:
         str: RepPage identifier
     """
     rep_page_identifier = f"{my_rep_page.z_block_zblock_plan_source}-{my_rep_page.z_block_zblock_plan_pack}-{my_rep_page.z_block_zblock_plan_scenario}-{my_rep_page.z_block_zblock_plan_run}"
-    print("[INFO] Starting build_report")
+    logger.info("Starting build_report")
 
-    print(f"[INFO][Step 20] Using RepPage: {my_rep_page}")
+    logger.info("[Step 20] Using RepPage: %s", my_rep_page)
 
     # Step30 Query from RepTemp (REP_TEMP_TYPE = MyRepTemp)
     query_rep_temp = f"""
@@ -762,7 +910,7 @@ def build_report(
     rep_temp_df = bq.execute_query(query_rep_temp)
     rep_temp_items = RepTemp.from_dataframe(rep_temp_df)
 
-    print(f"[INFO][Step 30] Found {len(rep_temp_items)} RepTemp records for type '{my_rep_temp}'")
+    logger.info("[Step 30] Found %s RepTemp records for type '%s'", len(rep_temp_items), my_rep_temp)
 
     my_rep_temp_item = rep_temp_items[0]
 
@@ -784,191 +932,110 @@ def build_report(
     rep_temp_block_df = bq.execute_query(query_rep_temp_block)
     my_rep_temp_block_list = RepTempBlock.from_dataframe(rep_temp_block_df)
 
-    print(f"[INFO][Step 40] Found {len(my_rep_temp_block_list)} RepTempBlock records for FK1 '{my_rep_temp}'")
-
-    # Step50 Foreach  MyRepTempBlock in MyRepTempBlockList (YNumber2 Increasing)
-    for my_rep_temp_block in my_rep_temp_block_list:
-        print(f"[INFO][Step 40] Processing RepTempBlock: {my_rep_temp_block}")
+    logger.info("[Step 40] Found %s RepTempBlock records for FK1 '%s'", len(my_rep_temp_block_list), my_rep_temp)
+
+    # Step70 AllocationToItem của mọi to_types của RepTemp, một lần cho mọi blocks (cache trong process)
+    to_types = [to_type for my_rep_temp_block in my_rep_temp_block_list
+                for to_type in build_field_to_type_map(my_rep_temp_block).values()]
+    to_type_items_map = FILTER_ITEM_CACHE.get_items(bq, project_id, to_types)
+    logger.info("[Step 70] Resolved %s to_types for %s RepTempBlocks", len(to_type_items_map), len(my_rep_temp_block_list))
+
+    # Step140 Calculate all MyXPeriod values for all L values (một lần cho cả report)
+    l_items = list(range(120))
+    x_period_index_list = period_range(my_last_report_month, len(l_items))
+    x_period_list = format_periods(x_period_index_list)
+    logger.info("[Step 140] Calculated %s periods: %s .. %s", len(x_period_list), x_period_list[0], x_period_list[-1])
+    logger.debug("[Step 140] Periods: %s", x_period_list)
+
+    # Step200 ActualForecast: L nào lấy Actual (LastActualMonth >= MyXPeriod), còn lại lấy Forecast
+    is_actual_list = (x_period_index_list <= parse_period(my_last_actual_month)).tolist()
+
+    if so_cell_single_scan is None:
+        so_cell_single_scan = settings.REPORT_SO_CELL_SINGLE_SCAN
+    query_block_data = query_so_cell_block_data_single_scan if so_cell_single_scan else query_so_cell_block_data
+
+    base_values = {
+        'z_number': my_z_number,
+        'y_number1': my_y_number_1,
+        'my_rep_page': rep_page_identifier,
+        'my_rep_temp_block': my_rep_temp
+    }
 
-        # TODO: Add further processing logic for each RepTempBlock item
-        # Step60 MyYNumber2 = MyRepTempBlock.YNumber2
-        my_y_number_2 = my_rep_temp_block.y_number2
+    def process_block(my_rep_temp_block: RepTempBlock) -> pd.DataFrame:
+        return build_rep_temp_block_cells(
+            bq, project_id, my_rep_page, my_rep_temp_block, base_values, x_period_list, is_actual_list, query_block_data,
+            to_type_items_map
+        )
 
-        # Step70-100: Build filter item map, KR type full, and filter combinations
-        my_filter_item_map, my_kr_type_full, filter_combinations = build_filter_and_kr_data(
-            bq, project_id, my_rep_temp_block
+    # RepCell frames chờ load: một load job cho mỗi settings.REPORT_REP_CELL_LOAD_MB thay vì mỗi block
+    pending_frames = []
+    pending_rows = 0
+    pending_bytes = 0
+
+    def flush_rep_cells():
+        nonlocal pending_frames, pending_rows, pending_bytes
+        if not pending_rows:
+            return
+        success = bq.load_dataframe(
+            dataset_id=settings.REPORT_DATASET_NAME,
+            table_id=settings.REP_CELL_TABLE_NAME,
+            df=pd.concat(pending_frames, ignore_index=True)
         )
+        if success:
+            logger.info("[Step 190-200] Loaded %s RepCell records from %s RepTempBlocks", pending_rows, len(pending_frames))
+        else:
+            logger.error("[Step 190-200] Failed to load %s RepCell records from %s RepTempBlocks", pending_rows, len(pending_frames))
+        pending_frames = []
+        pending_rows = 0
+        pending_bytes = 0
+
+    def load_block(my_rep_temp_block: RepTempBlock, rep_cell_frame: pd.DataFrame):
+        nonlocal pending_rows, pending_bytes
+        if len(rep_cell_frame):
+            pending_frames.append(rep_cell_frame)
+            pending_rows += len(rep_cell_frame)
+            pending_bytes += int(rep_cell_frame.memory_usage(deep=True).sum())
+            logger.info("[Step 190-200] Built %s RepCell records for RepTempBlock %s", len(rep_cell_frame), my_rep_temp_block.y_number2)
+        if pending_bytes >= settings.REPORT_REP_CELL_LOAD_MB * 1024 * 1024:
+            flush_rep_cells()
+
+    if max_workers is None:
+        max_workers = settings.REPORT_BUILD_MAX_WORKERS
+    block_count = len(my_rep_temp_block_list)
 
-        # Field mappings (defined once, reused for all filter items)
-        kr_field_map = {
-            'NOW_Y_BLOCK_FNF_FNF': 'now_y_block_fnf_fnf',
-            'NOW_Y_BLOCK_KR_Item_Code_KR1': 'now_y_block_kr_item_code_kr1',
-            'NOW_Y_BLOCK_KR_Item_Code_KR2': 'now_y_block_kr_item_code_kr2',
-            'NOW_Y_BLOCK_KR_Item_Code_KR3': 'now_y_block_kr_item_code_kr3',
-            'NOW_Y_BLOCK_KR_Item_Code_KR4': 'now_y_block_kr_item_code_kr4',
-            'NOW_Y_BLOCK_KR_Item_Code_KR5': 'now_y_block_kr_item_code_kr5',
-            'NOW_Y_BLOCK_KR_Item_Code_KR6': 'now_y_block_kr_item_code_kr6',
-            'NOW_Y_BLOCK_KR_Item_Code_KR7': 'now_y_block_kr_item_code_kr7',
-            'NOW_Y_BLOCK_KR_Item_Code_KR8': 'now_y_block_kr_item_code_kr8',
-            'NOW_Y_BLOCK_KR_Item_Name': 'now_y_block_kr_item_name'
-        }
-
-        filter_field_map = {
-            'NOW_Y_BLOCK_CDT_CDT1': 'now_y_block_cdt_cdt1',
-            'NOW_Y_BLOCK_CDT_CDT2': 'now_y_block_cdt_cdt2',
-            'NOW_Y_BLOCK_CDT_CDT3': 'now_y_block_cdt_cdt3',
-            'NOW_Y_BLOCK_CDT_CDT4': 'now_y_block_cdt_cdt4',
-            'NOW_Y_BLOCK_PTNow_PT1': 'now_y_block_ptnow_pt1',
-            'NOW_Y_BLOCK_PTNow_PT2': 'now_y_block_ptnow_pt2',
-            'NOW_Y_BLOCK_PTNow_Duration': 'now_y_block_ptnow_duration',
-            'NOW_Y_BLOCK_PTPrev_PT1': 'now_y_block_ptprev_pt1',
-            'NOW_Y_BLOCK_PTPrev_PT2': 'now_y_block_ptprev_pt2',
-            'NOW_Y_BLOCK_PTPrev_Duration': 'now_y_block_ptprev_duration',
-            'NOW_Y_BLOCK_PTFix_OwnType': 'now_y_block_ptfix_owntype',
-            'NOW_Y_BLOCK_PTFix_AIType': 'now_y_block_ptfix_aitype',
-            'NOW_Y_BLOCK_PTSub_CTY1': 'now_y_block_ptsub_cty1',
-            'NOW_Y_BLOCK_PTSub_CTY2': 'now_y_block_ptsub_cty2',
-            'NOW_Y_BLOCK_PTSub_OSType': 'now_y_block_ptsub_ostype',
-            'NOW_Y_BLOCK_Funnel_FU1': 'now_y_block_funnel_fu1',
-            'NOW_Y_BLOCK_Funnel_FU2': 'now_y_block_funnel_fu2',
-            'NOW_Y_BLOCK_Channel_CH': 'now_y_block_channel_ch',
-            'NOW_Y_BLOCK_Employee_EGT1': 'now_y_block_employee_egt1',
-            'NOW_Y_BLOCK_Employee_EGT2': 'now_y_block_employee_egt2',
-            'NOW_Y_BLOCK_Employee_EGT3': 'now_y_block_employee_egt3',
-            'NOW_Y_BLOCK_Employee_EGT4': 'now_y_block_employee_egt4',
-            'NOW_Y_BLOCK_HR_HR1': 'now_y_block_hr_hr1',
-            'NOW_Y_BLOCK_HR_HR2': 'now_y_block_hr_hr2',
-            'NOW_Y_BLOCK_HR_HR3': 'now_y_block_hr_hr3',
-            'NOW_Y_BLOCK_SEC': 'now_y_block_sec',
-            'NOW_Y_BLOCK_Period_MX': 'now_y_block_period_mx',
-            'NOW_Y_BLOCK_Period_DX': 'now_y_block_period_dx',
-            'NOW_Y_BLOCK_Period_PPC': 'now_y_block_period_ppc',
-            'NOW_Y_BLOCK_Period_NP': 'now_y_block_period_np',
-            'NOW_Y_BLOCK_LE_LE1': 'now_y_block_le_le1',
-            'NOW_Y_BLOCK_LE_LE2': 'now_y_block_le_le2',
-            'NOW_Y_BLOCK_UNIT': 'now_y_block_unit',
-            'NOW_Y_BLOCK_TD_BU': 'now_y_block_td_bu'
-        }
-
-        rep_cells_to_insert = []
-
-        # If filter_combinations is empty, create a list with one empty dict to run the logic once without filters
-        filter_items_to_process = filter_combinations if filter_combinations else [{}]
-        print(
-            f"[INFO] Processing {len(filter_items_to_process)} filter combinations (empty={len(filter_combinations) == 0})")
-
-        for my_filter_item in filter_items_to_process:
-            # Step120 Foreach MyFilterItem
-            l_items = list(range(120))
-
-            # Step140 Calculate all MyXPeriod values for all L values
-            x_period_list = [calculate_x_period(my_last_report_month, l) for l in l_items]
-            print(f"[INFO][Step 140] Calculated {len(x_period_list)} periods: {x_period_list}")
-
-            # Step160-180 Query all SOCell data at once
-            plan_data, actual_data, forecast_data = query_so_cell_data(
-                bq, project_id, my_rep_page, my_kr_type_full, my_filter_item, x_period_list, my_rep_page.now_zblock2_alt
-            )
-
-            # Collect RepCell records for batch insert
-
-            # Now loop through each L and process the data
-            for l in l_items:
-                my_x_period = x_period_list[l]
-                my_y_number_3 = l
-
-                so_cell1_now_value = plan_data.get(my_x_period)
-                so_cell2_now_value = actual_data.get(my_x_period)
-                so_cell3_now_value = forecast_data.get(my_x_period)
-
-                print(
-                    f"[INFO][Step 140-180] L={l}, MyXPeriod={my_x_period}, Plan={so_cell1_now_value}, Actual={so_cell2_now_value}, Forecast={so_cell3_now_value}")
-
-                # Step190 Create RepCell for Plan
-                rep_cell_plan = RepCell(
-                    z_number=my_z_number,
-                    y_number1=my_y_number_1,
-                    y_number2=my_y_number_2,
-                    y_number3=my_y_number_3,
-                    my_rep_page=rep_page_identifier,
-                    my_rep_temp_block=my_rep_temp,
-                    z_block_type="Plan",
-                    now_np=my_x_period,
-                    now_value=so_cell1_now_value
-                )
-
-                for kr_field, kr_value in my_kr_type_full.items():
-                    if kr_field in kr_field_map:
-                        setattr(rep_cell_plan, kr_field_map[kr_field], kr_value)
-
-                for filter_field, filter_value in my_filter_item.items():
-                    if filter_field in filter_field_map:
-                        setattr(rep_cell_plan, filter_field_map[filter_field], filter_value)
-
-                rep_cells_to_insert.append(rep_cell_plan.to_bigquery_dict())
-                print(f"[INFO][Step 190] Prepared RepCell (Plan): z_number={my_z_number}, "
-                      f"y_number1={my_y_number_1}, y_number2={my_y_number_2}, y_number3={my_y_number_3}, "
-                      f"now_value={so_cell1_now_value}")
-
-                # Step200 Create RepCell for ActualForecast
-                last_actual_month_year = int(my_last_actual_month[1:3])
-                last_actual_month_month = int(my_last_actual_month[3:5])
-                my_x_period_year = int(my_x_period[1:3])
-                my_x_period_month = int(my_x_period[3:5])
-
-                last_actual_total = last_actual_month_year * 12 + last_actual_month_month
-                my_x_period_total = my_x_period_year * 12 + my_x_period_month
-
-                if last_actual_total >= my_x_period_total:
-                    rep_cell_actual_forecast = RepCell(
-                        z_number=my_z_number,
-                        y_number1=my_y_number_1,
-                        y_number2=my_y_number_2,
-                        y_number3=my_y_number_3,
-                        my_rep_page=rep_page_identifier,
-                        my_rep_temp_block=my_rep_temp,
-                        z_block_type="ActualForecast",
-                        now_np=my_x_period,
-                        now_value=so_cell2_now_value
-                    )
-                    print(f"[INFO][Step 200] Prepared RepCell (ActualForecast-Actual): "
-                          f"LastActualMonth={my_last_actual_month} >= MyXPeriod={my_x_period}, "
-                          f"now_value={so_cell2_now_value}")
-                else:
-                    rep_cell_actual_forecast = RepCell(
-                        z_number=my_z_number,
-                        y_number1=my_y_number_1,
-                        y_number2=my_y_number_2,
-                        y_number3=my_y_number_3,
-                        my_rep_page=rep_page_identifier,
-                        my_rep_temp_block=my_rep_temp,
-                        z_block_type="ActualForecast",
-                        now_np=my_x_period,
-                        now_value=so_cell3_now_value
-                    )
-                    print(f"[INFO][Step 200] Prepared RepCell (ActualForecast-Forecast): "
-                          f"LastActualMonth={my_last_actual_month} < MyXPeriod={my_x_period}, "
-                          f"now_value={so_cell3_now_value}")
-
-                for kr_field, kr_value in my_kr_type_full.items():
-                    if kr_field in kr_field_map:
-                        setattr(rep_cell_actual_forecast, kr_field_map[kr_field], kr_value)
-
-                for filter_field, filter_value in my_filter_item.items():
-                    if filter_field in filter_field_map:
-                        setattr(rep_cell_actual_forecast, filter_field_map[filter_field], filter_value)
-
-                rep_cells_to_insert.append(rep_cell_actual_forecast.to_bigquery_dict())
-
-            # Batch insert all RepCell records for this filter_item
-        if rep_cells_to_insert:
-            bq.insert_rows(
-                dataset_id=settings.REPORT_DATASET_NAME,
-                table_id=settings.REP_CELL_TABLE_NAME,
-                rows_data=rep_cells_to_insert
-            )
-            print(f"[INFO][Step 190-200] Batch inserted {len(rep_cells_to_insert)} RepCell records for filter_item")
+    # Step50 Foreach  MyRepTempBlock in MyRepTempBlockList (YNumber2 Increasing)
+    try:
+        if max_workers <= 1 or block_count <= 1:
+            for done, my_rep_temp_block in enumerate(my_rep_temp_block_list, start=1):
+                load_block(my_rep_temp_block, process_block(my_rep_temp_block))
+                if progress_callback is not None:
+                    progress_callback(done, block_count)
+        else:
+            # Các blocks được query / build song song (tối đa max_workers), RepCells được load theo YNumber2.
+            # Ngoài các frames chờ load (tối đa REPORT_REP_CELL_LOAD_MB), chỉ tối đa 2 * max_workers blocks
+            # được submit trước block đang chờ, để frames đã build không dồn lại khi một block chậm
+            logger.info("[Step 50] Processing %s RepTempBlocks with %s workers", block_count, max_workers)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rep-block")
+            try:
+                pending_blocks = deque()
+                next_block = 0
+                for done in range(1, block_count + 1):
+                    while next_block < block_count and len(pending_blocks) < 2 * max_workers:
+                        my_rep_temp_block = my_rep_temp_block_list[next_block]
+                        pending_blocks.append((my_rep_temp_block, executor.submit(process_block, my_rep_temp_block)))
+                        next_block += 1
+                    my_rep_temp_block, future = pending_blocks.popleft()
+                    load_block(my_rep_temp_block, future.result())
+                    if progress_callback is not None:
+                        progress_callback(done, block_count)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        # Cả khi một block lỗi: RepCells của các blocks trước nó được load (xem docstring)
+        flush_rep_cells()
+
+    FILTER_ITEM_CACHE.log_summary()
 
     # Get RepPage identifier (using z_block_plan as identifier)
-    print(f"[INFO] build_report completed successfully. RepPage: {rep_page_identifier}")
+    logger.info("build_report completed successfully. RepPage: %s", rep_page_identifier)
     return rep_page_identifier
\ No newline at end of file
@@ -1,3 +1,87 @@
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+def is_empty_value(value) -> bool:
+    """None/NaN/'' -> True (field không tạo điều kiện WHERE / predicate)."""
+    if value is None or (isinstance(value, str) and value == ''):
+        return True
+    return bool(pd.isna(value))
+
+
+class FieldMapping:
+    """
+    Mapping source field -> target field/column, cùng các accessors được build sẵn một lần
+    khi import:
+
+    - values_of: đọc mọi source fields của một object bằng một operator.attrgetter
+    - non_empty_items: (target, value) của các fields có giá trị (điều kiện WHERE / predicates)
+    - translate / translate_items: đổi tên source -> target (ví dụ NOW_Y_BLOCK_* -> now_y_block_*)
+    - source_index / target_index: vị trí của field trong tuple values_of (column-index accessors)
+    """
+
+    def __init__(self, name: str, source_to_target: Dict[str, str]):
+        """
+        Args:
+            name: Tên mapping trong registry
+            source_to_target: Mapping source field -> target field (theo thứ tự)
+        """
+        self.name = name
+        self.source_to_target = dict(source_to_target)
+        self.source_fields = tuple(self.source_to_target.keys())
+        self.target_fields = tuple(self.source_to_target.values())
+        self.pairs = tuple(self.source_to_target.items())
+        self.target_to_source = {target: source for source, target in self.pairs}
+        self.source_index = {source: index for index, source in enumerate(self.source_fields)}
+        self.target_index = {target: index for index, target in enumerate(self.target_fields)}
+        getter = attrgetter(*self.source_fields)
+        self._get_values = getter if len(self.source_fields) > 1 else (lambda item: (getter(item),))
+
+    def values_of(self, item) -> tuple:
+        """Giá trị các source fields của item theo thứ tự (attribute thiếu = None)."""
+        try:
+            return self._get_values(item)
+        except AttributeError:
+            return tuple(getattr(item, field, None) for field in self.source_fields)
+
+    def items_of(self, item) -> List[Tuple[str, object]]:
+        """List (target, value) cho mọi source fields của item."""
+        return list(zip(self.target_fields, self.values_of(item)))
+
+    def non_empty_items(self, item) -> List[Tuple[str, object]]:
+        """List (target, value) của các fields có giá trị (bỏ None/NaN/'')."""
+        return [(target, value) for target, value in zip(self.target_fields, self.values_of(item))
+                if not is_empty_value(value)]
+
+    def translate(self, source: str) -> Optional[str]:
+        """Tên target của một source field (None nếu không có trong mapping)."""
+        return self.source_to_target.get(source)
+
+    def translate_items(self, values: Dict) -> List[Tuple[str, object]]:
+        """Dict source -> value thành list (target, value), bỏ các keys không có trong mapping."""
+        source_to_target = self.source_to_target
+        return [(source_to_target[source], value) for source, value in values.items() if source in source_to_target]
+
+
+# Registry: tên -> FieldMapping
+FIELD_MAPPINGS: Dict[str, FieldMapping] = {}
+
+
+def register_field_mapping(name: str, source_to_target: Dict[str, str]) -> FieldMapping:
+    """Đăng ký (hoặc thay) một field mapping."""
+    mapping = FieldMapping(name, source_to_target)
+    FIELD_MAPPINGS[name] = mapping
+    return mapping
+
+
+def field_mapping(name: str) -> FieldMapping:
+    """Field mapping đã đăng ký (KeyError nếu chưa đăng ký)."""
+    return FIELD_MAPPINGS[name]
+
+
+# AllocationByType / AllocationByKR (to_y_block_*) -> SoCell NowYBlock (now_y_block_*)
 YBLOCK_FIELD_MAPPING = {
     'to_y_block_kr1': 'now_y_block_kr_item_code_kr1',
     'to_y_block_kr2': 'now_y_block_kr_item_code_kr2',
@@ -42,6 +126,7 @@ YBLOCK_FIELD_MAPPING = {
     'to_y_block_unit': 'now_y_block_unit',
 }
 
+# SoCell NowYBlock (now_y_block_*) -> SoCell PrevYBlock (prev_y_block_*)
 PREV_YBLOCK_FIELD_MAPPING = {
     'now_y_block_fnf_fnf': 'prev_y_block_fnf_fnf',
     'now_y_block_kr_item_code_kr1': 'prev_y_block_kr_item_code_kr1',
@@ -87,3 +172,84 @@ PREV_YBLOCK_FIELD_MAPPING = {
     'now_y_block_le_le2': 'prev_y_block_le_le2',
     'now_y_block_unit': 'prev_y_block_unit',
 }
+
+# Report (RepTempBlock / RepCell): NOW_Y_BLOCK_* names -> now_y_block_* fields / so_cell columns
+REPORT_KR_FIELD_MAPPING = {
+    'NOW_Y_BLOCK_FNF_FNF': 'now_y_block_fnf_fnf',
+    'NOW_Y_BLOCK_KR_Item_Code_KR1': 'now_y_block_kr_item_code_kr1',
+    'NOW_Y_BLOCK_KR_Item_Code_KR2': 'now_y_block_kr_item_code_kr2',
+    'NOW_Y_BLOCK_KR_Item_Code_KR3': 'now_y_block_kr_item_code_kr3',
+    'NOW_Y_BLOCK_KR_Item_Code_KR4': 'now_y_block_kr_item_code_kr4',
+    'NOW_Y_BLOCK_KR_Item_Code_KR5': 'now_y_block_kr_item_code_kr5',
+    'NOW_Y_BLOCK_KR_Item_Code_KR6': 'now_y_block_kr_item_code_kr6',
+    'NOW_Y_BLOCK_KR_Item_Code_KR7': 'now_y_block_kr_item_code_kr7',
+    'NOW_Y_BLOCK_KR_Item_Code_KR8': 'now_y_block_kr_item_code_kr8',
+    'NOW_Y_BLOCK_KR_Item_Name': 'now_y_block_kr_item_name',
+}
+
+REPORT_FILTER_FIELD_MAPPING = {
+    'NOW_Y_BLOCK_CDT_CDT1': 'now_y_block_cdt_cdt1',
+    'NOW_Y_BLOCK_CDT_CDT2': 'now_y_block_cdt_cdt2',
+    'NOW_Y_BLOCK_CDT_CDT3': 'now_y_block_cdt_cdt3',
+    'NOW_Y_BLOCK_CDT_CDT4': 'now_y_block_cdt_cdt4',
+    'NOW_Y_BLOCK_PTNow_PT1': 'now_y_block_ptnow_pt1',
+    'NOW_Y_BLOCK_PTNow_PT2': 'now_y_block_ptnow_pt2',
+    'NOW_Y_BLOCK_PTNow_Duration': 'now_y_block_ptnow_duration',
+    'NOW_Y_BLOCK_PTPrev_PT1': 'now_y_block_ptprev_pt1',
+    'NOW_Y_BLOCK_PTPrev_PT2': 'now_y_block_ptprev_pt2',
+    'NOW_Y_BLOCK_PTPrev_Duration': 'now_y_block_ptprev_duration',
+    'NOW_Y_BLOCK_PTFix_OwnType': 'now_y_block_ptfix_owntype',
+    'NOW_Y_BLOCK_PTFix_AIType': 'now_y_block_ptfix_aitype',
+    'NOW_Y_BLOCK_PTSub_CTY1': 'now_y_block_ptsub_cty1',
+    'NOW_Y_BLOCK_PTSub_CTY2': 'now_y_block_ptsub_cty2',
+    'NOW_Y_BLOCK_PTSub_OSType': 'now_y_block_ptsub_ostype',
+    'NOW_Y_BLOCK_Funnel_FU1': 'now_y_block_funnel_fu1',
+    'NOW_Y_BLOCK_Funnel_FU2': 'now_y_block_funnel_fu2',
+    'NOW_Y_BLOCK_Channel_CH': 'now_y_block_channel_ch',
+    'NOW_Y_BLOCK_Employee_EGT1': 'now_y_block_employee_egt1',
+    'NOW_Y_BLOCK_Employee_EGT2': 'now_y_block_employee_egt2',
+    'NOW_Y_BLOCK_Employee_EGT3': 'now_y_block_employee_egt3',
+    'NOW_Y_BLOCK_Employee_EGT4': 'now_y_block_employee_egt4',
+    'NOW_Y_BLOCK_HR_HR1': 'now_y_block_hr_hr1',
+    'NOW_Y_BLOCK_HR_HR2': 'now_y_block_hr_hr2',
+    'NOW_Y_BLOCK_HR_HR3': 'now_y_block_hr_hr3',
+    'NOW_Y_BLOCK_SEC': 'now_y_block_sec',
+    'NOW_Y_BLOCK_Period_MX': 'now_y_block_period_mx',
+    'NOW_Y_BLOCK_Period_DX': 'now_y_block_period_dx',
+    'NOW_Y_BLOCK_Period_PPC': 'now_y_block_period_ppc',
+    'NOW_Y_BLOCK_Period_NP': 'now_y_block_period_np',
+    'NOW_Y_BLOCK_LE_LE1': 'now_y_block_le_le1',
+    'NOW_Y_BLOCK_LE_LE2': 'now_y_block_le_le2',
+    'NOW_Y_BLOCK_UNIT': 'now_y_block_unit',
+    'NOW_Y_BLOCK_TD_BU': 'now_y_block_td_bu',
+}
+
+YBLOCK_MAPPING = register_field_mapping('yblock', YBLOCK_FIELD_MAPPING)
+PREV_YBLOCK_MAPPING = register_field_mapping('prev_yblock', PREV_YBLOCK_FIELD_MAPPING)
+REPORT_KR_MAPPING = register_field_mapping('report_kr', REPORT_KR_FIELD_MAPPING)
+REPORT_FILTER_MAPPING = register_field_mapping('report_filter', REPORT_FILTER_FIELD_MAPPING)
+# RepTempBlock fields -> NOW_Y_BLOCK_* names (Step 70 filter types không gồm TD_BU, RepTempBlock không có field này)
+REP_TEMP_BLOCK_KR_MAPPING = register_field_mapping(
+    'rep_temp_block_kr', {field: name for name, field in REPORT_KR_FIELD_MAPPING.items()}
+)
+REP_TEMP_BLOCK_FILTER_MAPPING = register_field_mapping(
+    'rep_temp_block_filter',
+    {field: name for name, field in REPORT_FILTER_FIELD_MAPPING.items() if name != 'NOW_Y_BLOCK_TD_BU'}
+)
+
+# Column projections cho so_cell_raw_full: mỗi step chỉ SELECT các cột nó thực sự dùng
+# thay vì SELECT * trên bảng ~100 cột.
+SO_CELL_NOW_YBLOCK_COLUMNS = list(PREV_YBLOCK_FIELD_MAPPING.keys())
+SO_CELL_PREV_YBLOCK_COLUMNS = list(PREV_YBLOCK_FIELD_MAPPING.values())
+
+# Step 70: source cells - cần NowYBlock để group/tạo output, cùng now_np/now_value/ALT
+SO_CELL_SOURCE_COLUMNS = SO_CELL_NOW_YBLOCK_COLUMNS + ['now_zblock2_alt', 'now_np', 'now_value']
+
+# Step 90: prev SoCells - chỉ cần đủ cột để build prev key
+SO_CELL_PREV_KEY_COLUMNS = SO_CELL_PREV_YBLOCK_COLUMNS + ['now_np']
+
+# Step 160: by_percent - chỉ cần to_item (period_mx) và giá trị
+SO_CELL_BY_PERCENT_COLUMNS = ['now_y_block_period_mx', 'now_value']
+
+# ByAgg: chỉ cộng dồn now_value
+SO_CELL_VALUE_COLUMNS = ['now_value']
@@ -41,6 +41,44 @@ class BigQueryConnector:
             print(f"✗ Error when executing query: {str(e)}")
             raise
 
+    def execute_query_iter(self, query, page_size=10000):
+        """
+        Thực thi query và trả về kết quả theo từng page (không load toàn bộ vào memory)
+
+        Args:
+            query: SQL query string
+            page_size: Số rows mỗi page
+
+        Returns:
+            Generator các DataFrame, mỗi DataFrame tối đa page_size rows
+        """
+        try:
+            query_job = self.client.query(query)
+            results = query_job.result(page_size=page_size)
+            for df in results.to_dataframe_iterable():
+                yield df
+        except Exception as e:
+            print(f"✗ Error when executing query: {str(e)}")
+            raise
+
+    def dry_run_query(self, query):
+        """
+        Dry-run query để ước lượng chi phí mà không thực thi
+
+        Args:
+            query: SQL query string
+
+        Returns:
+            Số bytes query sẽ scan (total_bytes_processed)
+        """
+        try:
+            job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+            query_job = self.client.query(query, job_config=job_config)
+            return query_job.total_bytes_processed or 0
+        except Exception as e:
+            print(f"✗ Error when dry-running query: {str(e)}")
+            raise
+
     def list_datasets(self):
         """Liệt kê tất cả datasets trong project"""
         datasets = list(self.client.list_datasets())
@@ -177,3 +215,85 @@ class BigQueryConnector:
         except Exception as e:
             print(f"✗ Error when inserting rows: {str(e)}")
             return False
+
+    def insert_rows_batch(self, dataset_id, table_id, rows_data):
+        """
+        Insert list các dataclass instances (hoặc dictionaries) vào BigQuery table trong một request
+
+        Args:
+            dataset_id: Dataset ID
+            table_id: Table ID
+            rows_data: List of dataclass instances hoặc dictionaries
+
+        Returns:
+            True nếu insert thành công, False nếu có lỗi
+        """
+        from dataclasses import asdict
+
+        rows_dict = [
+            asdict(row) if hasattr(row, '__dataclass_fields__') else row
+            for row in rows_data
+        ]
+        return self.insert_rows(dataset_id, table_id, rows_dict)
+
+    def load_parquet_file(self, dataset_id, table_id, file_path):
+        """
+        Append nội dung một file Parquet local vào BigQuery table bằng một load job
+        (thay vì streaming insert từng batch)
+
+        Args:
+            dataset_id: Dataset ID
+            table_id: Table ID
+            file_path: Đường dẫn file Parquet (column names = table columns)
+
+        Returns:
+            True nếu load thành công, False nếu có lỗi
+        """
+        try:
+            table_ref = f"{self.client.project}.{dataset_id}.{table_id}"
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+            )
+            with open(file_path, 'rb') as f:
+                load_job = self.client.load_table_from_file(f, table_ref, job_config=job_config)
+            load_job.result()
+
+            print(f"✓ Successfully loaded {load_job.output_rows} rows into {table_ref}")
+            return True
+
+        except Exception as e:
+            print(f"✗ Error when loading {file_path}: {str(e)}")
+            return False
+
+    def load_dataframe(self, dataset_id, table_id, df):
+        """
+        Append một pandas DataFrame vào BigQuery table bằng một load job (theo schema của table),
+        không chuyển DataFrame thành list dictionaries như insert_rows
+
+        Args:
+            dataset_id: Dataset ID
+            table_id: Table ID
+            df: DataFrame với column names = table columns (NaN / None -> NULL)
+
+        Returns:
+            True nếu load thành công, False nếu có lỗi
+        """
+        if len(df) == 0:
+            return True
+        try:
+            table_ref = f"{self.client.project}.{dataset_id}.{table_id}"
+            table = self.client.get_table(table_ref)
+            job_config = bigquery.LoadJobConfig(
+                schema=[field for field in table.schema if field.name in df.columns],
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+            )
+            load_job = self.client.load_table_from_dataframe(df, table_ref, job_config=job_config)
+            load_job.result()
+
+            print(f"✓ Successfully loaded {load_job.output_rows} rows into {table_ref}")
+            return True
+
+        except Exception as e:
+            print(f"✗ Error when loading DataFrame into {dataset_id}.{table_id}: {str(e)}")
+            return False
@@ -0,0 +1,299 @@
+import logging
+import os
+import sqlite3
+from dataclasses import asdict
+from datetime import date, datetime
+from decimal import Decimal
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# SQLite giới hạn độ sâu expression tree (1000); OR chain dài của các batch queries được
+# viết lại thành cây OR cân bằng trước khi thực thi
+OR_SEPARATOR = "\nOR "
+
+
+class _CountIf:
+    """Aggregate COUNTIF(condition) giống BigQuery."""
+
+    def __init__(self):
+        self.count = 0
+
+    def step(self, condition):
+        if condition:
+            self.count += 1
+
+    def finalize(self):
+        return self.count
+
+
+class SqliteConnector:
+    """
+    Local backend cùng interface với BigQueryConnector (execute_query, execute_query_iter,
+    dry_run_query, insert_row, insert_rows, insert_rows_batch, load_parquet_file, load_dataframe)
+    trên một file SQLite.
+    Dùng cho benchmark / chạy local với dữ liệu synthetic (xem benchmarks.synthetic_data).
+
+    Table `project.dataset.table` được lưu với đúng tên đó, nên các queries build bởi
+    query_builder chạy được không cần sửa. Columns được tạo khi insert lần đầu.
+    """
+
+    def __init__(self, db_path, project_id):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite (hoặc ':memory:')
+            project_id: Project ID dùng trong tên table (giống BigQuery project)
+        """
+        self.db_path = db_path
+        self.project = project_id
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.create_aggregate("COUNTIF", 1, _CountIf)
+        self._table_columns = {}
+
+        logger.info("Connected to local SQLite backend: %s (project %s)", db_path, project_id)
+
+    def close(self):
+        self.conn.close()
+
+    def execute_query(self, query):
+        """
+        Thực thi query và trả về kết quả
+
+        Args:
+            query: SQL query string
+
+        Returns:
+            DataFrame chứa kết quả query
+        """
+        try:
+            return pd.read_sql_query(_balance_or_chain(query), self.conn)
+        except Exception as e:
+            logger.error("Error when executing query: %s", e)
+            raise
+
+    def execute_query_iter(self, query, page_size=10000):
+        """
+        Thực thi query và trả về kết quả theo từng page
+
+        Args:
+            query: SQL query string
+            page_size: Số rows mỗi page
+
+        Returns:
+            Generator các DataFrame, mỗi DataFrame tối đa page_size rows
+        """
+        try:
+            for df in pd.read_sql_query(_balance_or_chain(query), self.conn, chunksize=page_size):
+                yield df
+        except Exception as e:
+            logger.error("Error when executing query: %s", e)
+            raise
+
+    def dry_run_query(self, query):
+        """
+        Validate query (EXPLAIN) mà không thực thi. SQLite không ước lượng bytes scan nên luôn trả về 0.
+        """
+        self.conn.execute("EXPLAIN " + _balance_or_chain(query)).fetchall()
+        return 0
+
+    def create_index(self, dataset_id, table_id, columns):
+        """Tạo index trên columns của table (benchmark tạo index cho các cột filter chính)."""
+        table_ref = f"{self.project}.{dataset_id}.{table_id}"
+        index_name = f"idx_{dataset_id}_{table_id}_{'_'.join(columns)}".replace('-', '_')
+        self.conn.execute(
+            f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_ref}" ({", ".join(_quote(c) for c in columns)})'
+        )
+        self.conn.commit()
+
+    def insert_row(self, dataset_id, table_id, row_data):
+        """
+        Insert một row (dictionary hoặc dataclass instance)
+
+        Returns:
+            True nếu insert thành công, False nếu có lỗi
+        """
+        return self.insert_rows_batch(dataset_id, table_id, [row_data])
+
+    def insert_rows(self, dataset_id, table_id, rows_data):
+        """
+        Insert multiple rows (list of dictionaries) trong một transaction
+
+        Returns:
+            True nếu insert thành công, False nếu có lỗi
+        """
+        if not rows_data:
+            return True
+
+        table_ref = f"{self.project}.{dataset_id}.{table_id}"
+        try:
+            columns = list(dict.fromkeys(column for row in rows_data for column in row))
+            self._ensure_columns(table_ref, columns)
+            placeholders = ", ".join("?" for _ in columns)
+            with self.conn:
+                self.conn.executemany(
+                    f'INSERT INTO "{table_ref}" ({", ".join(_quote(c) for c in columns)}) VALUES ({placeholders})',
+                    ([_convert_value(row.get(column)) for column in columns] for row in rows_data)
+                )
+            return True
+        except Exception as e:
+            logger.error("Error when inserting rows into %s: %s", table_ref, e)
+            return False
+
+    def insert_rows_batch(self, dataset_id, table_id, rows_data):
+        """
+        Insert list các dataclass instances (hoặc dictionaries) trong một transaction
+
+        Returns:
+            True nếu insert thành công, False nếu có lỗi
+        """
+        rows_dict = [
+            asdict(row) if hasattr(row, '__dataclass_fields__') else row
+            for row in rows_data
+        ]
+        return self.insert_rows(dataset_id, table_id, rows_dict)
+
+    def load_parquet_file(self, dataset_id, table_id, file_path):
+        """
+        Append nội dung một file Parquet vào table (tương đương load job của BigQuery)
+
+        Returns:
+            True nếu load thành công, False nếu có lỗi
+        """
+        try:
+            df = pd.read_parquet(file_path)
+        except Exception as e:
+            logger.error("Error when reading %s: %s", file_path, e)
+            return False
+        rows_data = df.astype(object).where(df.notna(), None).to_dict('records')
+        return self.insert_rows(dataset_id, table_id, rows_data)
+
+    def load_dataframe(self, dataset_id, table_id, df):
+        """
+        Append một pandas DataFrame vào table theo cột (tương đương load job của BigQuery)
+
+        Returns:
+            True nếu load thành công, False nếu có lỗi
+        """
+        if len(df) == 0:
+            return True
+
+        table_ref = f"{self.project}.{dataset_id}.{table_id}"
+        try:
+            columns = list(df.columns)
+            self._ensure_columns(table_ref, columns)
+            values = df.astype(object).where(df.notna(), None)
+            column_values = [[_convert_value(value) for value in values[column].tolist()] for column in columns]
+            placeholders = ", ".join("?" for _ in columns)
+            with self.conn:
+                self.conn.executemany(
+                    f'INSERT INTO "{table_ref}" ({", ".join(_quote(c) for c in columns)}) VALUES ({placeholders})',
+                    zip(*column_values)
+                )
+            return True
+        except Exception as e:
+            logger.error("Error when loading DataFrame into %s: %s", table_ref, e)
+            return False
+
+    def _ensure_columns(self, table_ref, columns):
+        existing = self._table_columns.get(table_ref)
+        if existing is None:
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table_ref}" ({", ".join(_quote(c) for c in columns)})'
+            )
+            existing = {row[1] for row in self.conn.execute(f'PRAGMA table_info("{table_ref}")')}
+            self._table_columns[table_ref] = existing
+
+        for column in columns:
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE "{table_ref}" ADD COLUMN {_quote(column)}')
+                existing.add(column)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _convert_value(value):
+    if isinstance(value, Decimal):
+        return round(float(value), 9)
+    if isinstance(value, float):
+        return None if pd.isna(value) else round(value, 9)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _balance_or_chain(query: str) -> str:
+    """
+    Viết lại "WHERE (c1\\nOR c2\\nOR ... cn)" (build_so_cell_batch_query, build_so_cell_prev_batch_query)
+    thành cây OR cân bằng ((c1 OR c2) OR (c3 OR c4)) để độ sâu expression là log2(n) thay vì n.
+    Query không có OR chain được trả về nguyên vẹn.
+    """
+    parts = query.split(OR_SEPARATOR)
+    if len(parts) < 3:
+        return query
+
+    first_start = _find_term_start(parts[0])
+    last_end = _find_term_end(parts[-1])
+    if first_start is None or last_end is None:
+        return query
+
+    terms = [parts[0][first_start:]] + parts[1:-1] + [parts[-1][:last_end]]
+    return parts[0][:first_start] + _balanced_or(terms) + parts[-1][last_end:]
+
+
+def _balanced_or(terms):
+    if len(terms) == 1:
+        return terms[0]
+    middle = len(terms) // 2
+    return f"({_balanced_or(terms[:middle])} OR {_balanced_or(terms[middle:])})"
+
+
+def _find_term_start(text: str):
+    """Vị trí '(' mở của term cuối cùng (kết thúc bằng ')') trong text."""
+    if not text.endswith(')'):
+        return None
+    depth = 0
+    quote = None
+    for i in range(len(text) - 1, -1, -1):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == ')':
+            depth += 1
+        elif char == '(':
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def _find_term_end(text: str):
+    """Vị trí ngay sau ')' đóng của term đầu tiên (bắt đầu bằng '(') trong text."""
+    if not text.startswith('('):
+        return None
+    depth = 0
+    quote = None
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
@@ -0,0 +1,19 @@
+import sys
+from calculate.allocation_distributed import run_allocate_coordinator, run_allocate_worker, make_run_key
+
+if __name__ == '__main__':
+    # python main_allocate_worker.py coordinator   -> enqueue work units (và chạy 2 local workers)
+    # python main_allocate_worker.py worker        -> worker pull units từ shared queue
+    role = sys.argv[1] if len(sys.argv) > 1 else 'worker'
+
+    if role == 'coordinator':
+        run_allocate_coordinator(
+            100,
+            200,
+            'M2501',
+            local_workers=2
+        )
+    else:
+        run_allocate_worker(
+            make_run_key(100, 200, 'M2501')
+        )
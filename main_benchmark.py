@@ -0,0 +1,25 @@
+import sys
+from benchmarks.allocation_benchmark import run_benchmark
+from benchmarks.codec_benchmark import run_codec_benchmark
+from benchmarks.matcher_benchmark import run_matcher_benchmark
+from benchmarks.synthetic_data import BENCHMARK_SCALES
+
+if __name__ == '__main__':
+    # python main_benchmark.py                 -> scale 1k
+    # python main_benchmark.py 1k 100k 3,12,48 -> scales 1k, 100k với fan-out 3, 12 và 48 to_items
+    # python main_benchmark.py matcher         -> throughput của ByTypeMatcher vs key grouping
+    # python main_benchmark.py codec           -> model hydration: iterrows vs schema codecs
+    if sys.argv[1:2] == ['matcher']:
+        run_matcher_benchmark()
+        sys.exit(0)
+    if sys.argv[1:2] == ['codec']:
+        run_codec_benchmark()
+        sys.exit(0)
+
+    scales = [arg for arg in sys.argv[1:] if arg in BENCHMARK_SCALES]
+    fanouts = [int(value) for arg in sys.argv[1:] if arg not in BENCHMARK_SCALES for value in arg.split(',')]
+
+    run_benchmark(
+        scales or ['1k'],
+        to_item_fanouts=fanouts or None
+    )
@@ -1,6 +1,8 @@
 from calculate.report_runner import run_report
+from utils.log_utils import configure_logging
 
 if __name__ == '__main__':
+    configure_logging()
     my_rep_temp = "KRF-L4.CDT0"
     my_z_block_plan =  "PLAN-CA-Future-CAC"
     my_z_block_forecast = "FORECAST-CA-Future-CAC"
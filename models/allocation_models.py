@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from typing import Optional, List
+from models.schema import register_schema
 
 
 @dataclass
@@ -25,18 +26,7 @@ class AllocationALT:
         Returns:
             AllocationALT instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            z_number=data.get('ZNumber'),
-            from_alt=data.get('FROM_ALT_FromALT'),
-            to_alt=data.get('TO_ALT_ToALT'),
-            from_type=data.get('FROM_Y_BLOCK_FromType'),
-            to_type=data.get('TO_Y_BLOCK_ToType')
-        )
+        return ALLOCATION_ALT_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['AllocationALT']:
@@ -49,16 +39,7 @@ class AllocationALT:
         Returns:
             List of AllocationALT instances
         """
-        return [
-            cls(
-                z_number=row.get('ZNumber'),
-                from_alt=row.get('FROM_ALT_FromALT'),
-                to_alt=row.get('TO_ALT_ToALT'),
-                from_type=row.get('FROM_Y_BLOCK_FromType'),
-                to_type=row.get('TO_Y_BLOCK_ToType')
-            )
-            for _, row in df.iterrows()
-        ]
+        return ALLOCATION_ALT_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -90,18 +71,7 @@ class AllocationToItem:
         Returns:
             AllocationToItem instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            from_type=data.get('FROM_Y_BLOCK_FromType'),
-            from_item=data.get('FROM_Y_BLOCK_FromItem'),
-            to_type=data.get('TO_Y_BLOCK_ToType'),
-            to_item=data.get('TO_Y_BLOCK_ToItem'),
-            config_upload_at=data.get('Config_Upload_at')
-        )
+        return ALLOCATION_TO_ITEM_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['AllocationToItem']:
@@ -114,16 +84,7 @@ class AllocationToItem:
         Returns:
             List of AllocationToItem instances
         """
-        return [
-            cls(
-                from_type=row.get('FROM_Y_BLOCK_FromType'),
-                from_item=row.get('FROM_Y_BLOCK_FromItem'),
-                to_type=row.get('TO_Y_BLOCK_ToType'),
-                to_item=row.get('TO_Y_BLOCK_ToItem'),
-                config_upload_at=row.get('Config_Upload_at')
-            )
-            for _, row in df.iterrows()
-        ]
+        return ALLOCATION_TO_ITEM_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -195,58 +156,7 @@ class AllocationByType:
         Returns:
             AllocationByType instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            z_number=data.get('ZNumber'),
-            y_number=data.get('YNumber'),
-            to_y_block_kr1=data.get('TO_Y_BLOCK_KR1'),
-            to_y_block_kr2=data.get('TO_Y_BLOCK_KR2'),
-            to_y_block_kr3=data.get('TO_Y_BLOCK_KR3'),
-            to_y_block_kr4=data.get('TO_Y_BLOCK_KR4'),
-            to_y_block_kr5=data.get('TO_Y_BLOCK_KR5'),
-            to_y_block_kr6=data.get('TO_Y_BLOCK_KR6'),
-            to_y_block_kr7=data.get('TO_Y_BLOCK_KR7'),
-            to_y_block_kr8=data.get('TO_Y_BLOCK_KR8'),
-            to_y_block_cdt1=data.get('TO_Y_BLOCK_CDT1'),
-            to_y_block_cdt2=data.get('TO_Y_BLOCK_CDT2'),
-            to_y_block_cdt3=data.get('TO_Y_BLOCK_CDT3'),
-            to_y_block_cdt4=data.get('TO_Y_BLOCK_CDT4'),
-            to_y_block_pt1=data.get('TO_Y_BLOCK_PT1'),
-            to_y_block_pt2=data.get('TO_Y_BLOCK_PT2'),
-            to_y_block_duration=data.get('TO_Y_BLOCK_Duration'),
-            to_y_block_pt1_prev=data.get('TO_Y_BLOCK_PT1_PREV'),
-            to_y_block_pt2_prev=data.get('TO_Y_BLOCK_PT2_PREV'),
-            to_y_block_duration_prev=data.get('TO_Y_BLOCK_Duration_PREV'),
-            to_y_block_own_type=data.get('TO_Y_BLOCK_OwnType'),
-            to_y_block_ai_type=data.get('TO_Y_BLOCK_AIType'),
-            to_y_block_cty1=data.get('TO_Y_BLOCK_CTY1'),
-            to_y_block_cty2=data.get('TO_Y_BLOCK_CTY2'),
-            to_y_block_os_type=data.get('TO_Y_BLOCK_OSType'),
-            to_y_block_fu1=data.get('TO_Y_BLOCK_FU1'),
-            to_y_block_fu2=data.get('TO_Y_BLOCK_FU2'),
-            to_y_block_ch=data.get('TO_Y_BLOCK_CH'),
-            to_y_block_egt1=data.get('TO_Y_BLOCK_EGT1'),
-            to_y_block_egt2=data.get('TO_Y_BLOCK_EGT2'),
-            to_y_block_egt3=data.get('TO_Y_BLOCK_EGT3'),
-            to_y_block_egt4=data.get('TO_Y_BLOCK_EGT4'),
-            to_y_block_hr1=data.get('TO_Y_BLOCK_HR1'),
-            to_y_block_hr2=data.get('TO_Y_BLOCK_HR2'),
-            to_y_block_hr3=data.get('TO_Y_BLOCK_HR3'),
-            to_y_block_sec=data.get('TO_Y_BLOCK_SEC'),
-            to_y_block_mx=data.get('TO_Y_BLOCK_MX'),
-            to_y_block_dx=data.get('TO_Y_BLOCK_DX'),
-            to_y_block_ppc=data.get('TO_Y_BLOCK_PPC'),
-            to_y_block_np=data.get('TO_Y_BLOCK_NP'),
-            to_y_block_le1=data.get('TO_Y_BLOCK_LE1'),
-            to_y_block_le2=data.get('TO_Y_BLOCK_LE2'),
-            to_y_block_unit=data.get('TO_Y_BLOCK_UNIT'),
-            by_block_by_type=data.get('BY_BLOCK_ByType'),
-            config_upload_at=data.get('Config_Upload_at')
-        )
+        return ALLOCATION_BY_TYPE_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['AllocationByType']:
@@ -259,56 +169,7 @@ class AllocationByType:
         Returns:
             List of AllocationByType instances
         """
-        return [
-            cls(
-                z_number=row.get('ZNumber'),
-                y_number=row.get('YNumber'),
-                to_y_block_kr1=row.get('TO_Y_BLOCK_KR1'),
-                to_y_block_kr2=row.get('TO_Y_BLOCK_KR2'),
-                to_y_block_kr3=row.get('TO_Y_BLOCK_KR3'),
-                to_y_block_kr4=row.get('TO_Y_BLOCK_KR4'),
-                to_y_block_kr5=row.get('TO_Y_BLOCK_KR5'),
-                to_y_block_kr6=row.get('TO_Y_BLOCK_KR6'),
-                to_y_block_kr7=row.get('TO_Y_BLOCK_KR7'),
-                to_y_block_kr8=row.get('TO_Y_BLOCK_KR8'),
-                to_y_block_cdt1=row.get('TO_Y_BLOCK_CDT1'),
-                to_y_block_cdt2=row.get('TO_Y_BLOCK_CDT2'),
-                to_y_block_cdt3=row.get('TO_Y_BLOCK_CDT3'),
-                to_y_block_cdt4=row.get('TO_Y_BLOCK_CDT4'),
-                to_y_block_pt1=row.get('TO_Y_BLOCK_PT1'),
-                to_y_block_pt2=row.get('TO_Y_BLOCK_PT2'),
-                to_y_block_duration=row.get('TO_Y_BLOCK_Duration'),
-                to_y_block_pt1_prev=row.get('TO_Y_BLOCK_PT1_PREV'),
-                to_y_block_pt2_prev=row.get('TO_Y_BLOCK_PT2_PREV'),
-                to_y_block_duration_prev=row.get('TO_Y_BLOCK_Duration_PREV'),
-                to_y_block_own_type=row.get('TO_Y_BLOCK_OwnType'),
-                to_y_block_ai_type=row.get('TO_Y_BLOCK_AIType'),
-                to_y_block_cty1=row.get('TO_Y_BLOCK_CTY1'),
-                to_y_block_cty2=row.get('TO_Y_BLOCK_CTY2'),
-                to_y_block_os_type=row.get('TO_Y_BLOCK_OSType'),
-                to_y_block_fu1=row.get('TO_Y_BLOCK_FU1'),
-                to_y_block_fu2=row.get('TO_Y_BLOCK_FU2'),
-                to_y_block_ch=row.get('TO_Y_BLOCK_CH'),
-                to_y_block_egt1=row.get('TO_Y_BLOCK_EGT1'),
-                to_y_block_egt2=row.get('TO_Y_BLOCK_EGT2'),
-                to_y_block_egt3=row.get('TO_Y_BLOCK_EGT3'),
-                to_y_block_egt4=row.get('TO_Y_BLOCK_EGT4'),
-                to_y_block_hr1=row.get('TO_Y_BLOCK_HR1'),
-                to_y_block_hr2=row.get('TO_Y_BLOCK_HR2'),
-                to_y_block_hr3=row.get('TO_Y_BLOCK_HR3'),
-                to_y_block_sec=row.get('TO_Y_BLOCK_SEC'),
-                to_y_block_mx=row.get('TO_Y_BLOCK_MX'),
-                to_y_block_dx=row.get('TO_Y_BLOCK_DX'),
-                to_y_block_ppc=row.get('TO_Y_BLOCK_PPC'),
-                to_y_block_np=row.get('TO_Y_BLOCK_NP'),
-                to_y_block_le1=row.get('TO_Y_BLOCK_LE1'),
-                to_y_block_le2=row.get('TO_Y_BLOCK_LE2'),
-                to_y_block_unit=row.get('TO_Y_BLOCK_UNIT'),
-                by_block_by_type=row.get('BY_BLOCK_ByType'),
-                config_upload_at=row.get('Config_Upload_at')
-            )
-            for _, row in df.iterrows()
-        ]
+        return ALLOCATION_BY_TYPE_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -374,66 +235,136 @@ class AllocationByKR:
     @classmethod
     def from_bigquery_row(cls, row) -> 'AllocationByKR':
         """Factory method để tạo instance từ BigQuery Row"""
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            from_y_block_from_type=data.get('FROM_Y_BLOCK_FromType'),
-            to_y_block_to_type=data.get('TO_Y_BLOCK_ToType'),
-            to_y_block_kr1=data.get('TO_Y_BLOCK_KR1'),
-            to_y_block_kr2=data.get('TO_Y_BLOCK_KR2'),
-            to_y_block_kr3=data.get('TO_Y_BLOCK_KR3'),
-            to_y_block_kr4=data.get('TO_Y_BLOCK_KR4'),
-            to_y_block_kr5=data.get('TO_Y_BLOCK_KR5'),
-            to_y_block_kr6=data.get('TO_Y_BLOCK_KR6'),
-            to_y_block_kr7=data.get('TO_Y_BLOCK_KR7'),
-            to_y_block_kr8=data.get('TO_Y_BLOCK_KR8'),
-            to_y_block_kr9=data.get('TO_Y_BLOCK_KR9'),
-            to_y_block_cdt1=data.get('TO_Y_BLOCK_CDT1'),
-            to_y_block_cdt2=data.get('TO_Y_BLOCK_CDT2'),
-            to_y_block_cdt3=data.get('TO_Y_BLOCK_CDT3'),
-            to_y_block_cdt4=data.get('TO_Y_BLOCK_CDT4'),
-            to_y_block_pt1=data.get('TO_Y_BLOCK_PT1'),
-            to_y_block_pt2=data.get('TO_Y_BLOCK_PT2'),
-            to_y_block_duration=data.get('TO_Y_BLOCK_Duration'),
-            to_y_block_pt1_prev=data.get('TO_Y_BLOCK_PT1_PREV'),
-            to_y_block_pt2_prev=data.get('TO_Y_BLOCK_PT2_PREV'),
-            to_y_block_duration_prev=data.get('TO_Y_BLOCK_Duration_PREV'),
-            to_y_block_own_type=data.get('TO_Y_BLOCK_OwnType'),
-            to_y_block_ai_type=data.get('TO_Y_BLOCK_AIType'),
-            to_y_block_cty1=data.get('TO_Y_BLOCK_CTY1'),
-            to_y_block_cty2=data.get('TO_Y_BLOCK_CTY2'),
-            to_y_block_os_type=data.get('TO_Y_BLOCK_OSType'),
-            to_y_block_fu1=data.get('TO_Y_BLOCK_FU1'),
-            to_y_block_fu2=data.get('TO_Y_BLOCK_FU2'),
-            to_y_block_ch=data.get('TO_Y_BLOCK_CH'),
-            to_y_block_egt1=data.get('TO_Y_BLOCK_EGT1'),
-            to_y_block_egt2=data.get('TO_Y_BLOCK_EGT2'),
-            to_y_block_egt3=data.get('TO_Y_BLOCK_EGT3'),
-            to_y_block_egt4=data.get('TO_Y_BLOCK_EGT4'),
-            to_y_block_hr1=data.get('TO_Y_BLOCK_HR1'),
-            to_y_block_hr2=data.get('TO_Y_BLOCK_HR2'),
-            to_y_block_hr3=data.get('TO_Y_BLOCK_HR3'),
-            to_y_block_sec=data.get('TO_Y_BLOCK_SEC'),
-            to_y_block_mx=data.get('TO_Y_BLOCK_MX'),
-            to_y_block_dx=data.get('TO_Y_BLOCK_DX'),
-            to_y_block_ppc=data.get('TO_Y_BLOCK_PPC'),
-            to_y_block_np=data.get('TO_Y_BLOCK_NP'),
-            to_y_block_le1=data.get('TO_Y_BLOCK_LE1'),
-            to_y_block_le2=data.get('TO_Y_BLOCK_LE2'),
-            to_y_block_unit=data.get('TO_Y_BLOCK_UNIT'),
-            by_block_by_type=data.get('BY_BLOCK_ByType'),
-            config_upload_at=data.get('Config_Upload_at')
-        )
+        return ALLOCATION_BY_KR_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['AllocationByKR']:
         """Factory method để tạo list instances từ pandas DataFrame"""
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        return ALLOCATION_BY_KR_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
         return (f"AllocationByKR(from_type='{self.from_y_block_from_type}', to_type='{self.to_y_block_to_type}', "
                 f"kr6='{self.to_y_block_kr6}', kr4='{self.to_y_block_kr4}', by_type='{self.by_block_by_type}')")
+
+
+# Mapping BigQuery column -> AllocationALT field
+ALLOCATION_ALT_COLUMNS = {
+    'ZNumber': 'z_number',
+    'FROM_ALT_FromALT': 'from_alt',
+    'TO_ALT_ToALT': 'to_alt',
+    'FROM_Y_BLOCK_FromType': 'from_type',
+    'TO_Y_BLOCK_ToType': 'to_type'
+}
+ALLOCATION_ALT_SCHEMA = register_schema(AllocationALT, ALLOCATION_ALT_COLUMNS)
+
+# Mapping BigQuery column -> AllocationToItem field
+ALLOCATION_TO_ITEM_COLUMNS = {
+    'FROM_Y_BLOCK_FromType': 'from_type',
+    'FROM_Y_BLOCK_FromItem': 'from_item',
+    'TO_Y_BLOCK_ToType': 'to_type',
+    'TO_Y_BLOCK_ToItem': 'to_item',
+    'Config_Upload_at': 'config_upload_at'
+}
+ALLOCATION_TO_ITEM_SCHEMA = register_schema(AllocationToItem, ALLOCATION_TO_ITEM_COLUMNS)
+
+# Mapping BigQuery column -> AllocationByType field
+ALLOCATION_BY_TYPE_COLUMNS = {
+    'ZNumber': 'z_number',
+    'YNumber': 'y_number',
+    'TO_Y_BLOCK_KR1': 'to_y_block_kr1',
+    'TO_Y_BLOCK_KR2': 'to_y_block_kr2',
+    'TO_Y_BLOCK_KR3': 'to_y_block_kr3',
+    'TO_Y_BLOCK_KR4': 'to_y_block_kr4',
+    'TO_Y_BLOCK_KR5': 'to_y_block_kr5',
+    'TO_Y_BLOCK_KR6': 'to_y_block_kr6',
+    'TO_Y_BLOCK_KR7': 'to_y_block_kr7',
+    'TO_Y_BLOCK_KR8': 'to_y_block_kr8',
+    'TO_Y_BLOCK_CDT1': 'to_y_block_cdt1',
+    'TO_Y_BLOCK_CDT2': 'to_y_block_cdt2',
+    'TO_Y_BLOCK_CDT3': 'to_y_block_cdt3',
+    'TO_Y_BLOCK_CDT4': 'to_y_block_cdt4',
+    'TO_Y_BLOCK_PT1': 'to_y_block_pt1',
+    'TO_Y_BLOCK_PT2': 'to_y_block_pt2',
+    'TO_Y_BLOCK_Duration': 'to_y_block_duration',
+    'TO_Y_BLOCK_PT1_PREV': 'to_y_block_pt1_prev',
+    'TO_Y_BLOCK_PT2_PREV': 'to_y_block_pt2_prev',
+    'TO_Y_BLOCK_Duration_PREV': 'to_y_block_duration_prev',
+    'TO_Y_BLOCK_OwnType': 'to_y_block_own_type',
+    'TO_Y_BLOCK_AIType': 'to_y_block_ai_type',
+    'TO_Y_BLOCK_CTY1': 'to_y_block_cty1',
+    'TO_Y_BLOCK_CTY2': 'to_y_block_cty2',
+    'TO_Y_BLOCK_OSType': 'to_y_block_os_type',
+    'TO_Y_BLOCK_FU1': 'to_y_block_fu1',
+    'TO_Y_BLOCK_FU2': 'to_y_block_fu2',
+    'TO_Y_BLOCK_CH': 'to_y_block_ch',
+    'TO_Y_BLOCK_EGT1': 'to_y_block_egt1',
+    'TO_Y_BLOCK_EGT2': 'to_y_block_egt2',
+    'TO_Y_BLOCK_EGT3': 'to_y_block_egt3',
+    'TO_Y_BLOCK_EGT4': 'to_y_block_egt4',
+    'TO_Y_BLOCK_HR1': 'to_y_block_hr1',
+    'TO_Y_BLOCK_HR2': 'to_y_block_hr2',
+    'TO_Y_BLOCK_HR3': 'to_y_block_hr3',
+    'TO_Y_BLOCK_SEC': 'to_y_block_sec',
+    'TO_Y_BLOCK_MX': 'to_y_block_mx',
+    'TO_Y_BLOCK_DX': 'to_y_block_dx',
+    'TO_Y_BLOCK_PPC': 'to_y_block_ppc',
+    'TO_Y_BLOCK_NP': 'to_y_block_np',
+    'TO_Y_BLOCK_LE1': 'to_y_block_le1',
+    'TO_Y_BLOCK_LE2': 'to_y_block_le2',
+    'TO_Y_BLOCK_UNIT': 'to_y_block_unit',
+    'BY_BLOCK_ByType': 'by_block_by_type',
+    'Config_Upload_at': 'config_upload_at'
+}
+ALLOCATION_BY_TYPE_SCHEMA = register_schema(AllocationByType, ALLOCATION_BY_TYPE_COLUMNS)
+
+# Mapping BigQuery column -> AllocationByKR field
+ALLOCATION_BY_KR_COLUMNS = {
+    'FROM_Y_BLOCK_FromType': 'from_y_block_from_type',
+    'TO_Y_BLOCK_ToType': 'to_y_block_to_type',
+    'TO_Y_BLOCK_KR1': 'to_y_block_kr1',
+    'TO_Y_BLOCK_KR2': 'to_y_block_kr2',
+    'TO_Y_BLOCK_KR3': 'to_y_block_kr3',
+    'TO_Y_BLOCK_KR4': 'to_y_block_kr4',
+    'TO_Y_BLOCK_KR5': 'to_y_block_kr5',
+    'TO_Y_BLOCK_KR6': 'to_y_block_kr6',
+    'TO_Y_BLOCK_KR7': 'to_y_block_kr7',
+    'TO_Y_BLOCK_KR8': 'to_y_block_kr8',
+    'TO_Y_BLOCK_KR9': 'to_y_block_kr9',
+    'TO_Y_BLOCK_CDT1': 'to_y_block_cdt1',
+    'TO_Y_BLOCK_CDT2': 'to_y_block_cdt2',
+    'TO_Y_BLOCK_CDT3': 'to_y_block_cdt3',
+    'TO_Y_BLOCK_CDT4': 'to_y_block_cdt4',
+    'TO_Y_BLOCK_PT1': 'to_y_block_pt1',
+    'TO_Y_BLOCK_PT2': 'to_y_block_pt2',
+    'TO_Y_BLOCK_Duration': 'to_y_block_duration',
+    'TO_Y_BLOCK_PT1_PREV': 'to_y_block_pt1_prev',
+    'TO_Y_BLOCK_PT2_PREV': 'to_y_block_pt2_prev',
+    'TO_Y_BLOCK_Duration_PREV': 'to_y_block_duration_prev',
+    'TO_Y_BLOCK_OwnType': 'to_y_block_own_type',
+    'TO_Y_BLOCK_AIType': 'to_y_block_ai_type',
+    'TO_Y_BLOCK_CTY1': 'to_y_block_cty1',
+    'TO_Y_BLOCK_CTY2': 'to_y_block_cty2',
+    'TO_Y_BLOCK_OSType': 'to_y_block_os_type',
+    'TO_Y_BLOCK_FU1': 'to_y_block_fu1',
+    'TO_Y_BLOCK_FU2': 'to_y_block_fu2',
+    'TO_Y_BLOCK_CH': 'to_y_block_ch',
+    'TO_Y_BLOCK_EGT1': 'to_y_block_egt1',
+    'TO_Y_BLOCK_EGT2': 'to_y_block_egt2',
+    'TO_Y_BLOCK_EGT3': 'to_y_block_egt3',
+    'TO_Y_BLOCK_EGT4': 'to_y_block_egt4',
+    'TO_Y_BLOCK_HR1': 'to_y_block_hr1',
+    'TO_Y_BLOCK_HR2': 'to_y_block_hr2',
+    'TO_Y_BLOCK_HR3': 'to_y_block_hr3',
+    'TO_Y_BLOCK_SEC': 'to_y_block_sec',
+    'TO_Y_BLOCK_MX': 'to_y_block_mx',
+    'TO_Y_BLOCK_DX': 'to_y_block_dx',
+    'TO_Y_BLOCK_PPC': 'to_y_block_ppc',
+    'TO_Y_BLOCK_NP': 'to_y_block_np',
+    'TO_Y_BLOCK_LE1': 'to_y_block_le1',
+    'TO_Y_BLOCK_LE2': 'to_y_block_le2',
+    'TO_Y_BLOCK_UNIT': 'to_y_block_unit',
+    'BY_BLOCK_ByType': 'by_block_by_type',
+    'Config_Upload_at': 'config_upload_at'
+}
+ALLOCATION_BY_KR_SCHEMA = register_schema(AllocationByKR, ALLOCATION_BY_KR_COLUMNS)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Optional, List
 from datetime import datetime
+from models.schema import register_schema
 
 
 @dataclass
@@ -40,27 +41,7 @@ class RepPage:
         Returns:
             RepPage instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            y_number1=data.get('YNumber1'),
-            my_rep_temp=data.get('MyRepTemp'),
-            z_block_zblock_plan_source=data.get('Z_BLOCK_ZBlockPlan_Source'),
-            z_block_zblock_plan_pack=data.get('Z_BLOCK_ZBlockPlan_Pack'),
-            z_block_zblock_plan_scenario=data.get('Z_BLOCK_ZBlockPlan_Scenario'),
-            z_block_zblock_plan_run=data.get('Z_BLOCK_ZBlockPlan_Run'),
-            z_block_forecast_source=data.get('ZBlockForecast_Source'),
-            z_block_forecast_pack=data.get('ZBlockForecast_Pack'),
-            z_block_forecast_scenario=data.get('ZBlockForecast_Scenario'),
-            z_block_forecast_run=data.get('ZBlockForecast_Run'),
-            now_zblock2_alt=data.get('NOW_ZBlock2_ALT'),
-            time_x_block_last_report_month=data.get('TIME_X_BLOCK_LastReportMonth'),
-            time_x_block_last_acttual_month=data.get('TIME_X_BLOCK_LastActtualMonth'),
-            time_x_block_upload_at=data.get('TIME_X_BLOCK_Upload_at')
-        )
+        return REP_PAGE_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['RepPage']:
@@ -73,7 +54,7 @@ class RepPage:
         Returns:
             List of RepPage instances
         """
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        return REP_PAGE_SCHEMA.decode_frame(df)
 
     def to_bigquery_dict(self) -> dict:
         """
@@ -82,22 +63,7 @@ class RepPage:
         Returns:
             Dictionary with BigQuery-compatible field names
         """
-        return {
-            'YNumber1': self.y_number1,
-            'MyRepTemp': self.my_rep_temp,
-            'Z_BLOCK_ZBlockPlan_Source': self.z_block_zblock_plan_source,
-            'Z_BLOCK_ZBlockPlan_Pack': self.z_block_zblock_plan_pack,
-            'Z_BLOCK_ZBlockPlan_Scenario': self.z_block_zblock_plan_scenario,
-            'Z_BLOCK_ZBlockPlan_Run': self.z_block_zblock_plan_run,
-            'ZBlockForecast_Source': self.z_block_forecast_source,
-            'ZBlockForecast_Pack': self.z_block_forecast_pack,
-            'ZBlockForecast_Scenario': self.z_block_forecast_scenario,
-            'ZBlockForecast_Run': self.z_block_forecast_run,
-            'NOW_ZBlock2_ALT': self.now_zblock2_alt,
-            'TIME_X_BLOCK_LastReportMonth': self.time_x_block_last_report_month,
-            'TIME_X_BLOCK_LastActtualMonth': self.time_x_block_last_acttual_month,
-            'TIME_X_BLOCK_Upload_at': self.time_x_block_upload_at
-        }
+        return REP_PAGE_SCHEMA.encode(self)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -128,15 +94,7 @@ class RepTemp:
         Returns:
             RepTemp instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            z_number=data.get('ZNumber'),
-            rep_temp_type=data.get('REP_TEMP_TYPE')
-        )
+        return REP_TEMP_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['RepTemp']:
@@ -149,7 +107,7 @@ class RepTemp:
         Returns:
             List of RepTemp instances
         """
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        return REP_TEMP_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -221,59 +179,7 @@ class RepTempBlock:
         Returns:
             RepTempBlock instance
         """
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            y_number2=data.get('ynumber2'),
-            my_rep_temp=data.get('myreptemp'),
-            now_y_block_fnf_fnf=data.get('now_y_block_fnf_fnf'),
-            now_y_block_kr_item_code_kr1=data.get('now_y_block_kr_item_code_kr1'),
-            now_y_block_kr_item_code_kr2=data.get('now_y_block_kr_item_code_kr2'),
-            now_y_block_kr_item_code_kr3=data.get('now_y_block_kr_item_code_kr3'),
-            now_y_block_kr_item_code_kr4=data.get('now_y_block_kr_item_code_kr4'),
-            now_y_block_kr_item_code_kr5=data.get('now_y_block_kr_item_code_kr5'),
-            now_y_block_kr_item_code_kr6=data.get('now_y_block_kr_item_code_kr6'),
-            now_y_block_kr_item_code_kr7=data.get('now_y_block_kr_item_code_kr7'),
-            now_y_block_kr_item_code_kr8=data.get('now_y_block_kr_item_code_kr8'),
-            now_y_block_kr_item_name=data.get('now_y_block_kr_item_name'),
-            now_y_block_cdt_cdt1=data.get('now_y_block_cdt_cdt1'),
-            now_y_block_cdt_cdt2=data.get('now_y_block_cdt_cdt2'),
-            now_y_block_cdt_cdt3=data.get('now_y_block_cdt_cdt3'),
-            now_y_block_cdt_cdt4=data.get('now_y_block_cdt_cdt4'),
-            now_y_block_ptnow_pt1=data.get('now_y_block_ptnow_pt1'),
-            now_y_block_ptnow_pt2=data.get('now_y_block_ptnow_pt2'),
-            now_y_block_ptnow_duration=data.get('now_y_block_ptnow_duration'),
-            now_y_block_ptprev_pt1=data.get('now_y_block_ptprev_pt1'),
-            now_y_block_ptprev_pt2=data.get('now_y_block_ptprev_pt2'),
-            now_y_block_ptprev_duration=data.get('now_y_block_ptprev_duration'),
-            now_y_block_ptfix_owntype=data.get('now_y_block_ptfix_owntype'),
-            now_y_block_ptfix_aitype=data.get('now_y_block_ptfix_aitype'),
-            now_y_block_ptsub_cty1=data.get('now_y_block_ptsub_cty1'),
-            now_y_block_ptsub_cty2=data.get('now_y_block_ptsub_cty2'),
-            now_y_block_ptsub_ostype=data.get('now_y_block_ptsub_ostype'),
-            now_y_block_funnel_fu1=data.get('now_y_block_funnel_fu1'),
-            now_y_block_funnel_fu2=data.get('now_y_block_funnel_fu2'),
-            now_y_block_channel_ch=data.get('now_y_block_channel_ch'),
-            now_y_block_employee_egt1=data.get('now_y_block_employee_egt1'),
-            now_y_block_employee_egt2=data.get('now_y_block_employee_egt2'),
-            now_y_block_employee_egt3=data.get('now_y_block_employee_egt3'),
-            now_y_block_employee_egt4=data.get('now_y_block_employee_egt4'),
-            now_y_block_hr_hr1=data.get('now_y_block_hr_hr1'),
-            now_y_block_hr_hr2=data.get('now_y_block_hr_hr2'),
-            now_y_block_hr_hr3=data.get('now_y_block_hr_hr3'),
-            now_y_block_sec=data.get('now_y_block_sec'),
-            now_y_block_period_mx=data.get('now_y_block_period_mx'),
-            now_y_block_period_dx=data.get('now_y_block_period_dx'),
-            now_y_block_period_ppc=data.get('now_y_block_period_ppc'),
-            now_y_block_period_np=data.get('now_y_block_period_np'),
-            now_y_block_le_le1=data.get('now_y_block_le_le1'),
-            now_y_block_le_le2=data.get('now_y_block_le_le2'),
-            now_y_block_unit=data.get('now_y_block_unit'),
-            now_np=data.get('now_np')
-        )
+        return REP_TEMP_BLOCK_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['RepTempBlock']:
@@ -286,7 +192,7 @@ class RepTempBlock:
         Returns:
             List of RepTempBlock instances
         """
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        return REP_TEMP_BLOCK_SCHEMA.decode_frame(df)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -360,126 +266,20 @@ class RepCell:
         """
         Tạo RepCell instance từ BigQuery row
         """
-        return cls(
-            z_number=row.get('ZNumber'),
-            y_number1=row.get('YNumber1'),
-            y_number2=row.get('YNumber2'),
-            y_number3=row.get('YNumber3'),
-            my_rep_page=row.get('MyRepPage'),
-            my_rep_temp_block=row.get('MyRepTempBlock'),
-            z_block_type=row.get('Z_BLOCK_TYPE'),
-            now_y_block_kr_item_code_kr1=row.get('NOW_Y_BLOCK_KR_Item_Code_KR1'),
-            now_y_block_kr_item_code_kr2=row.get('NOW_Y_BLOCK_KR_Item_Code_KR2'),
-            now_y_block_kr_item_code_kr3=row.get('NOW_Y_BLOCK_KR_Item_Code_KR3'),
-            now_y_block_kr_item_code_kr4=row.get('NOW_Y_BLOCK_KR_Item_Code_KR4'),
-            now_y_block_kr_item_code_kr5=row.get('NOW_Y_BLOCK_KR_Item_Code_KR5'),
-            now_y_block_kr_item_code_kr6=row.get('NOW_Y_BLOCK_KR_Item_Code_KR6'),
-            now_y_block_kr_item_code_kr7=row.get('NOW_Y_BLOCK_KR_Item_Code_KR7'),
-            now_y_block_kr_item_code_kr8=row.get('NOW_Y_BLOCK_KR_Item_Code_KR8'),
-            now_y_block_kr_item_name=row.get('NOW_Y_BLOCK_KR_Item_Name'),
-            now_y_block_cdt_cdt1=row.get('NOW_Y_BLOCK_CDT_CDT1'),
-            now_y_block_cdt_cdt2=row.get('NOW_Y_BLOCK_CDT_CDT2'),
-            now_y_block_cdt_cdt3=row.get('NOW_Y_BLOCK_CDT_CDT3'),
-            now_y_block_cdt_cdt4=row.get('NOW_Y_BLOCK_CDT_CDT4'),
-            now_y_block_ptnow_pt1=row.get('NOW_Y_BLOCK_PTNow_PT1'),
-            now_y_block_ptnow_pt2=row.get('NOW_Y_BLOCK_PTNow_PT2'),
-            now_y_block_ptnow_duration=row.get('NOW_Y_BLOCK_PTNow_Duration'),
-            now_y_block_ptprev_pt1=row.get('NOW_Y_BLOCK_PTPrev_PT1'),
-            now_y_block_ptprev_pt2=row.get('NOW_Y_BLOCK_PTPrev_PT2'),
-            now_y_block_ptprev_duration=row.get('NOW_Y_BLOCK_PTPrev_Duration'),
-            now_y_block_ptfix_owntype=row.get('NOW_Y_BLOCK_PTFix_OwnType'),
-            now_y_block_ptfix_aitype=row.get('NOW_Y_BLOCK_PTFix_AIType'),
-            now_y_block_ptsub_cty1=row.get('NOW_Y_BLOCK_PTSub_CTY1'),
-            now_y_block_ptsub_cty2=row.get('NOW_Y_BLOCK_PTSub_CTY2'),
-            now_y_block_ptsub_ostype=row.get('NOW_Y_BLOCK_PTSub_OSType'),
-            now_y_block_funnel_fu1=row.get('NOW_Y_BLOCK_Funnel_FU1'),
-            now_y_block_funnel_fu2=row.get('NOW_Y_BLOCK_Funnel_FU2'),
-            now_y_block_channel_ch=row.get('NOW_Y_BLOCK_Channel_CH'),
-            now_y_block_employee_egt1=row.get('NOW_Y_BLOCK_Employee_EGT1'),
-            now_y_block_employee_egt2=row.get('NOW_Y_BLOCK_Employee_EGT2'),
-            now_y_block_employee_egt3=row.get('NOW_Y_BLOCK_Employee_EGT3'),
-            now_y_block_employee_egt4=row.get('NOW_Y_BLOCK_Employee_EGT4'),
-            now_y_block_hr_hr1=row.get('NOW_Y_BLOCK_HR_HR1'),
-            now_y_block_hr_hr2=row.get('NOW_Y_BLOCK_HR_HR2'),
-            now_y_block_hr_hr3=row.get('NOW_Y_BLOCK_HR_HR3'),
-            now_y_block_sec=row.get('NOW_Y_BLOCK_SEC'),
-            now_y_block_period_mx=row.get('NOW_Y_BLOCK_Period_MX'),
-            now_y_block_period_dx=row.get('NOW_Y_BLOCK_Period_DX'),
-            now_y_block_period_ppc=row.get('NOW_Y_BLOCK_Period_PPC'),
-            now_y_block_period_np=row.get('NOW_Y_BLOCK_Period_NP'),
-            now_y_block_le_le1=row.get('NOW_Y_BLOCK_LE_LE1'),
-            now_y_block_le_le2=row.get('NOW_Y_BLOCK_LE_LE2'),
-            now_y_block_unit=row.get('NOW_Y_BLOCK_UNIT'),
-            now_y_block_td_bu=row.get('NOW_Y_BLOCK_TD_BU'),
-            now_np=row.get('NOW_NP'),
-            now_value=row.get('NOW_VALUE')
-        )
+        return REP_CELL_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['RepCell']:
         """
         Tạo list RepCell instances từ pandas DataFrame
         """
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        return REP_CELL_SCHEMA.decode_frame(df)
 
     def to_bigquery_dict(self) -> dict:
         """
         Convert RepCell instance to dictionary with BigQuery field names
         """
-        return {
-            'ZNumber': self.z_number,
-            'YNumber1': self.y_number1,
-            'YNumber2': self.y_number2,
-            'YNumber3': self.y_number3,
-            'MyRepPage': self.my_rep_page,
-            'MyRepTempBlock': self.my_rep_temp_block,
-            'Z_BLOCK_TYPE': self.z_block_type,
-            'NOW_Y_BLOCK_KR_Item_Code_KR1': self.now_y_block_kr_item_code_kr1,
-            'NOW_Y_BLOCK_KR_Item_Code_KR2': self.now_y_block_kr_item_code_kr2,
-            'NOW_Y_BLOCK_KR_Item_Code_KR3': self.now_y_block_kr_item_code_kr3,
-            'NOW_Y_BLOCK_KR_Item_Code_KR4': self.now_y_block_kr_item_code_kr4,
-            'NOW_Y_BLOCK_KR_Item_Code_KR5': self.now_y_block_kr_item_code_kr5,
-            'NOW_Y_BLOCK_KR_Item_Code_KR6': self.now_y_block_kr_item_code_kr6,
-            'NOW_Y_BLOCK_KR_Item_Code_KR7': self.now_y_block_kr_item_code_kr7,
-            'NOW_Y_BLOCK_KR_Item_Code_KR8': self.now_y_block_kr_item_code_kr8,
-            'NOW_Y_BLOCK_KR_Item_Name': self.now_y_block_kr_item_name,
-            'NOW_Y_BLOCK_CDT_CDT1': self.now_y_block_cdt_cdt1,
-            'NOW_Y_BLOCK_CDT_CDT2': self.now_y_block_cdt_cdt2,
-            'NOW_Y_BLOCK_CDT_CDT3': self.now_y_block_cdt_cdt3,
-            'NOW_Y_BLOCK_CDT_CDT4': self.now_y_block_cdt_cdt4,
-            'NOW_Y_BLOCK_PTNow_PT1': self.now_y_block_ptnow_pt1,
-            'NOW_Y_BLOCK_PTNow_PT2': self.now_y_block_ptnow_pt2,
-            'NOW_Y_BLOCK_PTNow_Duration': self.now_y_block_ptnow_duration,
-            'NOW_Y_BLOCK_PTPrev_PT1': self.now_y_block_ptprev_pt1,
-            'NOW_Y_BLOCK_PTPrev_PT2': self.now_y_block_ptprev_pt2,
-            'NOW_Y_BLOCK_PTPrev_Duration': self.now_y_block_ptprev_duration,
-            'NOW_Y_BLOCK_PTFix_OwnType': self.now_y_block_ptfix_owntype,
-            'NOW_Y_BLOCK_PTFix_AIType': self.now_y_block_ptfix_aitype,
-            'NOW_Y_BLOCK_PTSub_CTY1': self.now_y_block_ptsub_cty1,
-            'NOW_Y_BLOCK_PTSub_CTY2': self.now_y_block_ptsub_cty2,
-            'NOW_Y_BLOCK_PTSub_OSType': self.now_y_block_ptsub_ostype,
-            'NOW_Y_BLOCK_Funnel_FU1': self.now_y_block_funnel_fu1,
-            'NOW_Y_BLOCK_Funnel_FU2': self.now_y_block_funnel_fu2,
-            'NOW_Y_BLOCK_Channel_CH': self.now_y_block_channel_ch,
-            'NOW_Y_BLOCK_Employee_EGT1': self.now_y_block_employee_egt1,
-            'NOW_Y_BLOCK_Employee_EGT2': self.now_y_block_employee_egt2,
-            'NOW_Y_BLOCK_Employee_EGT3': self.now_y_block_employee_egt3,
-            'NOW_Y_BLOCK_Employee_EGT4': self.now_y_block_employee_egt4,
-            'NOW_Y_BLOCK_HR_HR1': self.now_y_block_hr_hr1,
-            'NOW_Y_BLOCK_HR_HR2': self.now_y_block_hr_hr2,
-            'NOW_Y_BLOCK_HR_HR3': self.now_y_block_hr_hr3,
-            'NOW_Y_BLOCK_SEC': self.now_y_block_sec,
-            'NOW_Y_BLOCK_Period_MX': self.now_y_block_period_mx,
-            'NOW_Y_BLOCK_Period_DX': self.now_y_block_period_dx,
-            'NOW_Y_BLOCK_Period_PPC': self.now_y_block_period_ppc,
-            'NOW_Y_BLOCK_Period_NP': self.now_y_block_period_np,
-            'NOW_Y_BLOCK_LE_LE1': self.now_y_block_le_le1,
-            'NOW_Y_BLOCK_LE_LE2': self.now_y_block_le_le2,
-            'NOW_Y_BLOCK_UNIT': self.now_y_block_unit,
-            'NOW_Y_BLOCK_TD_BU': self.now_y_block_td_bu,
-            'NOW_NP': self.now_np,
-            'NOW_VALUE': self.now_value
-        }
+        return REP_CELL_SCHEMA.encode(self)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
@@ -489,3 +289,138 @@ class RepCell:
                 f"y_number3={self.y_number3}, "
                 f"z_block_type='{self.z_block_type}', "
                 f"now_value={self.now_value})")
+
+
+# Mapping BigQuery column -> RepPage field
+REP_PAGE_COLUMNS = {
+    'YNumber1': 'y_number1',
+    'MyRepTemp': 'my_rep_temp',
+    'Z_BLOCK_ZBlockPlan_Source': 'z_block_zblock_plan_source',
+    'Z_BLOCK_ZBlockPlan_Pack': 'z_block_zblock_plan_pack',
+    'Z_BLOCK_ZBlockPlan_Scenario': 'z_block_zblock_plan_scenario',
+    'Z_BLOCK_ZBlockPlan_Run': 'z_block_zblock_plan_run',
+    'ZBlockForecast_Source': 'z_block_forecast_source',
+    'ZBlockForecast_Pack': 'z_block_forecast_pack',
+    'ZBlockForecast_Scenario': 'z_block_forecast_scenario',
+    'ZBlockForecast_Run': 'z_block_forecast_run',
+    'NOW_ZBlock2_ALT': 'now_zblock2_alt',
+    'TIME_X_BLOCK_LastReportMonth': 'time_x_block_last_report_month',
+    'TIME_X_BLOCK_LastActtualMonth': 'time_x_block_last_acttual_month',
+    'TIME_X_BLOCK_Upload_at': 'time_x_block_upload_at'
+}
+REP_PAGE_SCHEMA = register_schema(RepPage, REP_PAGE_COLUMNS)
+
+# Mapping BigQuery column -> RepTemp field
+REP_TEMP_COLUMNS = {
+    'ZNumber': 'z_number',
+    'REP_TEMP_TYPE': 'rep_temp_type'
+}
+REP_TEMP_SCHEMA = register_schema(RepTemp, REP_TEMP_COLUMNS)
+
+# Mapping BigQuery column -> RepTempBlock field
+REP_TEMP_BLOCK_COLUMNS = {
+    'ynumber2': 'y_number2',
+    'myreptemp': 'my_rep_temp',
+    'now_y_block_fnf_fnf': 'now_y_block_fnf_fnf',
+    'now_y_block_kr_item_code_kr1': 'now_y_block_kr_item_code_kr1',
+    'now_y_block_kr_item_code_kr2': 'now_y_block_kr_item_code_kr2',
+    'now_y_block_kr_item_code_kr3': 'now_y_block_kr_item_code_kr3',
+    'now_y_block_kr_item_code_kr4': 'now_y_block_kr_item_code_kr4',
+    'now_y_block_kr_item_code_kr5': 'now_y_block_kr_item_code_kr5',
+    'now_y_block_kr_item_code_kr6': 'now_y_block_kr_item_code_kr6',
+    'now_y_block_kr_item_code_kr7': 'now_y_block_kr_item_code_kr7',
+    'now_y_block_kr_item_code_kr8': 'now_y_block_kr_item_code_kr8',
+    'now_y_block_kr_item_name': 'now_y_block_kr_item_name',
+    'now_y_block_cdt_cdt1': 'now_y_block_cdt_cdt1',
+    'now_y_block_cdt_cdt2': 'now_y_block_cdt_cdt2',
+    'now_y_block_cdt_cdt3': 'now_y_block_cdt_cdt3',
+    'now_y_block_cdt_cdt4': 'now_y_block_cdt_cdt4',
+    'now_y_block_ptnow_pt1': 'now_y_block_ptnow_pt1',
+    'now_y_block_ptnow_pt2': 'now_y_block_ptnow_pt2',
+    'now_y_block_ptnow_duration': 'now_y_block_ptnow_duration',
+    'now_y_block_ptprev_pt1': 'now_y_block_ptprev_pt1',
+    'now_y_block_ptprev_pt2': 'now_y_block_ptprev_pt2',
+    'now_y_block_ptprev_duration': 'now_y_block_ptprev_duration',
+    'now_y_block_ptfix_owntype': 'now_y_block_ptfix_owntype',
+    'now_y_block_ptfix_aitype': 'now_y_block_ptfix_aitype',
+    'now_y_block_ptsub_cty1': 'now_y_block_ptsub_cty1',
+    'now_y_block_ptsub_cty2': 'now_y_block_ptsub_cty2',
+    'now_y_block_ptsub_ostype': 'now_y_block_ptsub_ostype',
+    'now_y_block_funnel_fu1': 'now_y_block_funnel_fu1',
+    'now_y_block_funnel_fu2': 'now_y_block_funnel_fu2',
+    'now_y_block_channel_ch': 'now_y_block_channel_ch',
+    'now_y_block_employee_egt1': 'now_y_block_employee_egt1',
+    'now_y_block_employee_egt2': 'now_y_block_employee_egt2',
+    'now_y_block_employee_egt3': 'now_y_block_employee_egt3',
+    'now_y_block_employee_egt4': 'now_y_block_employee_egt4',
+    'now_y_block_hr_hr1': 'now_y_block_hr_hr1',
+    'now_y_block_hr_hr2': 'now_y_block_hr_hr2',
+    'now_y_block_hr_hr3': 'now_y_block_hr_hr3',
+    'now_y_block_sec': 'now_y_block_sec',
+    'now_y_block_period_mx': 'now_y_block_period_mx',
+    'now_y_block_period_dx': 'now_y_block_period_dx',
+    'now_y_block_period_ppc': 'now_y_block_period_ppc',
+    'now_y_block_period_np': 'now_y_block_period_np',
+    'now_y_block_le_le1': 'now_y_block_le_le1',
+    'now_y_block_le_le2': 'now_y_block_le_le2',
+    'now_y_block_unit': 'now_y_block_unit',
+    'now_np': 'now_np'
+}
+REP_TEMP_BLOCK_SCHEMA = register_schema(RepTempBlock, REP_TEMP_BLOCK_COLUMNS)
+
+# Mapping BigQuery column -> RepCell field
+REP_CELL_COLUMNS = {
+    'ZNumber': 'z_number',
+    'YNumber1': 'y_number1',
+    'YNumber2': 'y_number2',
+    'YNumber3': 'y_number3',
+    'MyRepPage': 'my_rep_page',
+    'MyRepTempBlock': 'my_rep_temp_block',
+    'Z_BLOCK_TYPE': 'z_block_type',
+    'NOW_Y_BLOCK_KR_Item_Code_KR1': 'now_y_block_kr_item_code_kr1',
+    'NOW_Y_BLOCK_KR_Item_Code_KR2': 'now_y_block_kr_item_code_kr2',
+    'NOW_Y_BLOCK_KR_Item_Code_KR3': 'now_y_block_kr_item_code_kr3',
+    'NOW_Y_BLOCK_KR_Item_Code_KR4': 'now_y_block_kr_item_code_kr4',
+    'NOW_Y_BLOCK_KR_Item_Code_KR5': 'now_y_block_kr_item_code_kr5',
+    'NOW_Y_BLOCK_KR_Item_Code_KR6': 'now_y_block_kr_item_code_kr6',
+    'NOW_Y_BLOCK_KR_Item_Code_KR7': 'now_y_block_kr_item_code_kr7',
+    'NOW_Y_BLOCK_KR_Item_Code_KR8': 'now_y_block_kr_item_code_kr8',
+    'NOW_Y_BLOCK_KR_Item_Name': 'now_y_block_kr_item_name',
+    'NOW_Y_BLOCK_CDT_CDT1': 'now_y_block_cdt_cdt1',
+    'NOW_Y_BLOCK_CDT_CDT2': 'now_y_block_cdt_cdt2',
+    'NOW_Y_BLOCK_CDT_CDT3': 'now_y_block_cdt_cdt3',
+    'NOW_Y_BLOCK_CDT_CDT4': 'now_y_block_cdt_cdt4',
+    'NOW_Y_BLOCK_PTNow_PT1': 'now_y_block_ptnow_pt1',
+    'NOW_Y_BLOCK_PTNow_PT2': 'now_y_block_ptnow_pt2',
+    'NOW_Y_BLOCK_PTNow_Duration': 'now_y_block_ptnow_duration',
+    'NOW_Y_BLOCK_PTPrev_PT1': 'now_y_block_ptprev_pt1',
+    'NOW_Y_BLOCK_PTPrev_PT2': 'now_y_block_ptprev_pt2',
+    'NOW_Y_BLOCK_PTPrev_Duration': 'now_y_block_ptprev_duration',
+    'NOW_Y_BLOCK_PTFix_OwnType': 'now_y_block_ptfix_owntype',
+    'NOW_Y_BLOCK_PTFix_AIType': 'now_y_block_ptfix_aitype',
+    'NOW_Y_BLOCK_PTSub_CTY1': 'now_y_block_ptsub_cty1',
+    'NOW_Y_BLOCK_PTSub_CTY2': 'now_y_block_ptsub_cty2',
+    'NOW_Y_BLOCK_PTSub_OSType': 'now_y_block_ptsub_ostype',
+    'NOW_Y_BLOCK_Funnel_FU1': 'now_y_block_funnel_fu1',
+    'NOW_Y_BLOCK_Funnel_FU2': 'now_y_block_funnel_fu2',
+    'NOW_Y_BLOCK_Channel_CH': 'now_y_block_channel_ch',
+    'NOW_Y_BLOCK_Employee_EGT1': 'now_y_block_employee_egt1',
+    'NOW_Y_BLOCK_Employee_EGT2': 'now_y_block_employee_egt2',
+    'NOW_Y_BLOCK_Employee_EGT3': 'now_y_block_employee_egt3',
+    'NOW_Y_BLOCK_Employee_EGT4': 'now_y_block_employee_egt4',
+    'NOW_Y_BLOCK_HR_HR1': 'now_y_block_hr_hr1',
+    'NOW_Y_BLOCK_HR_HR2': 'now_y_block_hr_hr2',
+    'NOW_Y_BLOCK_HR_HR3': 'now_y_block_hr_hr3',
+    'NOW_Y_BLOCK_SEC': 'now_y_block_sec',
+    'NOW_Y_BLOCK_Period_MX': 'now_y_block_period_mx',
+    'NOW_Y_BLOCK_Period_DX': 'now_y_block_period_dx',
+    'NOW_Y_BLOCK_Period_PPC': 'now_y_block_period_ppc',
+    'NOW_Y_BLOCK_Period_NP': 'now_y_block_period_np',
+    'NOW_Y_BLOCK_LE_LE1': 'now_y_block_le_le1',
+    'NOW_Y_BLOCK_LE_LE2': 'now_y_block_le_le2',
+    'NOW_Y_BLOCK_UNIT': 'now_y_block_unit',
+    'NOW_Y_BLOCK_TD_BU': 'now_y_block_td_bu',
+    'NOW_NP': 'now_np',
+    'NOW_VALUE': 'now_value'
+}
+REP_CELL_SCHEMA = register_schema(RepCell, REP_CELL_COLUMNS)
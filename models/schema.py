@@ -0,0 +1,100 @@
+from dataclasses import fields
+from itertools import repeat
+from operator import attrgetter
+from typing import Dict, List
+
+
+class ModelSchema:
+    """
+    Schema của một model: mapping BigQuery column -> dataclass field, cùng các codecs
+    được build sẵn từ mapping:
+
+    - decode_frame: hydrate cả result set theo cột (mỗi cột tolist một lần, mỗi row là một
+      dict zip), thay vì tạo một pandas Series cho mỗi row như df.iterrows()
+    - decode_row: BigQuery Row / dict -> instance
+    - encode / encode_many: instance -> dict theo BigQuery column names (to_bigquery_dict)
+    """
+
+    def __init__(self, model_cls, column_to_field: Dict[str, str]):
+        """
+        Args:
+            model_cls: Dataclass của model (fields đều có default)
+            column_to_field: Mapping BigQuery column -> field
+        """
+        self.model_cls = model_cls
+        self.column_to_field = dict(column_to_field)
+        self.field_names = tuple(f.name for f in fields(model_cls))
+        self.defaults = {f.name: f.default for f in fields(model_cls)}
+        self.columns = tuple(self.column_to_field)
+        self._encode_values = attrgetter(*self.column_to_field.values())
+
+    def _new(self, values: Dict):
+        item = self.model_cls.__new__(self.model_cls)
+        item.__dict__.update(values)
+        return item
+
+    def decode_row(self, row):
+        """
+        Tạo instance từ BigQuery Row hoặc dictionary (column thiếu -> default của field).
+        """
+        data = dict(row.items()) if hasattr(row, 'items') else row
+        values = dict(self.defaults)
+        values.update((field, data.get(column)) for column, field in self.column_to_field.items())
+        return self._new(values)
+
+    def decode_frame(self, df, partial: bool = False) -> List:
+        """
+        Tạo list instances từ pandas DataFrame, theo cột.
+
+        Args:
+            df: pandas DataFrame từ BigQuery query result
+            partial: True = chỉ set các field có cột trong DataFrame (field khác đọc ra default
+                của class), False = field không có cột được set default
+
+        Returns:
+            List instances theo thứ tự rows
+        """
+        loaded = [(column, field) for column, field in self.column_to_field.items() if column in df.columns]
+        names = [field for _, field in loaded]
+        columns = [df[column].tolist() for column, _ in loaded]
+        if not partial:
+            for field in self.field_names:
+                if field not in names:
+                    names.append(field)
+                    columns.append(repeat(self.defaults[field], len(df)))
+
+        new = self.model_cls.__new__
+        model_cls = self.model_cls
+        items = []
+        rows = zip(*columns) if columns else repeat((), len(df))
+        for values in rows:
+            item = new(model_cls)
+            item.__dict__ = dict(zip(names, values))
+            items.append(item)
+        return items
+
+    def encode(self, item) -> dict:
+        """Instance -> dict theo BigQuery column names."""
+        return dict(zip(self.columns, self._encode_values(item)))
+
+    def encode_many(self, items: List) -> List[dict]:
+        """List instances -> list dicts theo BigQuery column names (ví dụ cho insert_rows)."""
+        columns = self.columns
+        encode_values = self._encode_values
+        return [dict(zip(columns, encode_values(item))) for item in items]
+
+
+# Registry: model class -> ModelSchema
+MODEL_SCHEMAS: Dict[type, ModelSchema] = {}
+
+
+def register_schema(model_cls, column_to_field: Dict[str, str]) -> ModelSchema:
+    """Đăng ký (hoặc thay) schema của một model."""
+    schema = ModelSchema(model_cls, column_to_field)
+    MODEL_SCHEMAS[model_cls] = schema
+    return schema
+
+
+def schema_for(model_cls) -> ModelSchema:
+    """Schema đã đăng ký của model (KeyError nếu chưa đăng ký)."""
+    return MODEL_SCHEMAS[model_cls]
@@ -1,5 +1,9 @@
-from dataclasses import dataclass
-from typing import Optional, List
+from dataclasses import dataclass, fields
+from typing import Optional, List, FrozenSet, Dict, Iterator, Sequence
+
+import numpy as np
+
+from models.schema import register_schema
 
 
 @dataclass
@@ -121,130 +125,138 @@ class SoCell:
     @classmethod
     def from_bigquery_row(cls, row) -> 'SoCell':
         """Factory method để tạo instance từ BigQuery Row"""
-        if hasattr(row, 'items'):
-            data = dict(row.items())
-        else:
-            data = row
-
-        return cls(
-            i_o=data.get('i_o'),
-            z_block_zblock1_source=data.get('z_block_zblock1_source'),
-            z_block_zblock1_pack=data.get('Z-BLOCK_ZBlock1_PCK'),
-            z_block_zblock1_scenario=data.get('z_block_zblock1_scenario'),
-            z_block_zblock1_run=data.get('z_block_zblock1_run'),
-            now_zblock2_alt=data.get('now_zblock2_alt'),
-            z_block_zblock2_file=data.get('z_block_zblock2_file'),
-            z_block_zblock2_sheet=data.get('z_block_zblock2_sheet'),
-            now_y_block_fnf_fnf=data.get('now_y_block_fnf_fnf'),
-            now_y_block_kr_item_code_kr1=data.get('now_y_block_kr_item_code_kr1'),
-            now_y_block_kr_item_code_kr2=data.get('now_y_block_kr_item_code_kr2'),
-            now_y_block_kr_item_code_kr3=data.get('now_y_block_kr_item_code_kr3'),
-            now_y_block_kr_item_code_kr4=data.get('now_y_block_kr_item_code_kr4'),
-            now_y_block_kr_item_code_kr5=data.get('now_y_block_kr_item_code_kr5'),
-            now_y_block_kr_item_code_kr6=data.get('now_y_block_kr_item_code_kr6'),
-            now_y_block_kr_item_code_kr7=data.get('now_y_block_kr_item_code_kr7'),
-            now_y_block_kr_item_code_kr8=data.get('now_y_block_kr_item_code_kr8'),
-            now_y_block_kr_item_name=data.get('now_y_block_kr_item_name'),
-            now_y_block_cdt_cdt1=data.get('now_y_block_cdt_cdt1'),
-            now_y_block_cdt_cdt2=data.get('now_y_block_cdt_cdt2'),
-            now_y_block_cdt_cdt3=data.get('now_y_block_cdt_cdt3'),
-            now_y_block_cdt_cdt4=data.get('now_y_block_cdt_cdt4'),
-            now_y_block_ptnow_pt1=data.get('now_y_block_ptnow_pt1'),
-            now_y_block_ptnow_pt2=data.get('now_y_block_ptnow_pt2'),
-            now_y_block_ptnow_duration=data.get('now_y_block_ptnow_duration'),
-            now_y_block_ptprev_pt1=data.get('now_y_block_ptprev_pt1'),
-            now_y_block_ptprev_pt2=data.get('now_y_block_ptprev_pt2'),
-            now_y_block_ptprev_duration=data.get('now_y_block_ptprev_duration'),
-            now_y_block_ptfix_owntype=data.get('now_y_block_ptfix_owntype'),
-            now_y_block_ptfix_aitype=data.get('now_y_block_ptfix_aitype'),
-            now_y_block_ptsub_cty1=data.get('now_y_block_ptsub_cty1'),
-            now_y_block_ptsub_cty2=data.get('now_y_block_ptsub_cty2'),
-            now_y_block_ptsub_ostype=data.get('now_y_block_ptsub_ostype'),
-            now_y_block_funnel_fu1=data.get('now_y_block_funnel_fu1'),
-            now_y_block_funnel_fu2=data.get('now_y_block_funnel_fu2'),
-            now_y_block_channel_ch=data.get('now_y_block_channel_ch'),
-            now_y_block_employee_egt1=data.get('now_y_block_employee_egt1'),
-            now_y_block_employee_egt2=data.get('now_y_block_employee_egt2'),
-            now_y_block_employee_egt3=data.get('now_y_block_employee_egt3'),
-            now_y_block_employee_egt4=data.get('now_y_block_employee_egt4'),
-            now_y_block_hr_hr1=data.get('now_y_block_hr_hr1'),
-            now_y_block_hr_hr2=data.get('now_y_block_hr_hr2'),
-            now_y_block_hr_hr3=data.get('now_y_block_hr_hr3'),
-            now_y_block_sec=data.get('now_y_block_sec'),
-            now_y_block_period_mx=data.get('now_y_block_period_mx'),
-            now_y_block_period_dx=data.get('now_y_block_period_dx'),
-            now_y_block_period_ppc=data.get('now_y_block_period_ppc'),
-            now_y_block_period_np=data.get('now_y_block_period_np'),
-            now_y_block_le_le1=data.get('now_y_block_le_le1'),
-            now_y_block_le_le2=data.get('now_y_block_le_le2'),
-            now_y_block_unit=data.get('now_y_block_unit'),
-            uploaded_at=data.get('uploaded_at'),
-            upload_batch_id=data.get('upload_batch_id'),
-            source_file=data.get('source_file'),
-            uploaded_by=data.get('uploaded_by'),
-            source_row_no=data.get('source_row_no'),
-            so_row_id=data.get('so_row_id'),
-            now_np=data.get('now_np'),
-            now_value=data.get('now_value'),
-            time_col_name=data.get('time_col_name'),
-            prev_zblock2_alt=data.get('prev_zblock2_alt'),
-            prev_y_block_fnf_fnf=data.get('prev_y_block_fnf_fnf'),
-            prev_y_block_kr_item_code_kr1=data.get('prev_y_block_kr_item_code_kr1'),
-            prev_y_block_kr_item_code_kr2=data.get('prev_y_block_kr_item_code_kr2'),
-            prev_y_block_kr_item_code_kr3=data.get('prev_y_block_kr_item_code_kr3'),
-            prev_y_block_kr_item_code_kr4=data.get('prev_y_block_kr_item_code_kr4'),
-            prev_y_block_kr_item_code_kr5=data.get('prev_y_block_kr_item_code_kr5'),
-            prev_y_block_kr_item_code_kr6=data.get('prev_y_block_kr_item_code_kr6'),
-            prev_y_block_kr_item_code_kr7=data.get('prev_y_block_kr_item_code_kr7'),
-            prev_y_block_kr_item_code_kr8=data.get('prev_y_block_kr_item_code_kr8'),
-            prev_y_block_kr_item_name=data.get('prev_y_block_kr_item_name'),
-            prev_y_block_cdt_cdt1=data.get('prev_y_block_cdt_cdt1'),
-            prev_y_block_cdt_cdt2=data.get('prev_y_block_cdt_cdt2'),
-            prev_y_block_cdt_cdt3=data.get('prev_y_block_cdt_cdt3'),
-            prev_y_block_cdt_cdt4=data.get('prev_y_block_cdt_cdt4'),
-            prev_y_block_ptnow_pt1=data.get('prev_y_block_ptnow_pt1'),
-            prev_y_block_ptnow_pt2=data.get('prev_y_block_ptnow_pt2'),
-            prev_y_block_ptnow_duration=data.get('prev_y_block_ptnow_duration'),
-            prev_y_block_ptprev_pt1=data.get('prev_y_block_ptprev_pt1'),
-            prev_y_block_ptprev_pt2=data.get('prev_y_block_ptprev_pt2'),
-            prev_y_block_ptprev_duration=data.get('prev_y_block_ptprev_duration'),
-            prev_y_block_ptfix_owntype=data.get('prev_y_block_ptfix_owntype'),
-            prev_y_block_ptfix_aitype=data.get('prev_y_block_ptfix_aitype'),
-            prev_y_block_ptsub_cty1=data.get('prev_y_block_ptsub_cty1'),
-            prev_y_block_ptsub_cty2=data.get('prev_y_block_ptsub_cty2'),
-            prev_y_block_ptsub_ostype=data.get('prev_y_block_ptsub_ostype'),
-            prev_y_block_funnel_fu1=data.get('prev_y_block_funnel_fu1'),
-            prev_y_block_funnel_fu2=data.get('prev_y_block_funnel_fu2'),
-            prev_y_block_channel_ch=data.get('prev_y_block_channel_ch'),
-            prev_y_block_employee_egt1=data.get('prev_y_block_employee_egt1'),
-            prev_y_block_employee_egt2=data.get('prev_y_block_employee_egt2'),
-            prev_y_block_employee_egt3=data.get('prev_y_block_employee_egt3'),
-            prev_y_block_employee_egt4=data.get('prev_y_block_employee_egt4'),
-            prev_y_block_hr_hr1=data.get('prev_y_block_hr_hr1'),
-            prev_y_block_hr_hr2=data.get('prev_y_block_hr_hr2'),
-            prev_y_block_hr_hr3=data.get('prev_y_block_hr_hr3'),
-            prev_y_block_sec=data.get('prev_y_block_sec'),
-            prev_y_block_period_mx=data.get('prev_y_block_period_mx'),
-            prev_y_block_period_dx=data.get('prev_y_block_period_dx'),
-            prev_y_block_period_ppc=data.get('prev_y_block_period_ppc'),
-            prev_y_block_period_np=data.get('prev_y_block_period_np'),
-            prev_y_block_le_le1=data.get('prev_y_block_le_le1'),
-            prev_y_block_le_le2=data.get('prev_y_block_le_le2'),
-            prev_y_block_unit=data.get('prev_y_block_unit'),
-            prev_ppc=data.get('prev_ppc'),
-            prev_value=data.get('prev_value'),
-            prev_np=data.get('prev_np'),
-            by_block_bytype=data.get('by_block_bytype'),
-            by_block_bypercent=data.get('by_block_bypercent')
-        )
+        return SOCELL_SCHEMA.decode_row(row)
 
     @classmethod
     def from_dataframe(cls, df) -> List['SoCell']:
-        """Factory method để tạo list instances từ pandas DataFrame"""
-        return [cls.from_bigquery_row(row) for _, row in df.iterrows()]
+        """
+        Factory method để tạo list instances từ pandas DataFrame.
+
+        Chỉ materialize các cột có trong DataFrame: khi query dùng column projection,
+        mỗi instance là partial - field không được SELECT không được lưu trên instance
+        và đọc ra giá trị mặc định (None) của class.
+
+        Args:
+            df: pandas DataFrame từ BigQuery query result
+
+        Returns:
+            List of SoCell instances
+        """
+        return SOCELL_SCHEMA.decode_frame(df, partial=True)
+
+    def loaded_fields(self) -> FrozenSet[str]:
+        """Các field đã được hydrate từ query result (partial instance chỉ có một phần)"""
+        return frozenset(self.__dict__)
 
     def __repr__(self) -> str:
         """String representation cho debugging"""
         return (f"SoCellRawFull(fnf='{self.now_y_block_fnf_fnf}', "
                 f"kr1='{self.now_y_block_kr_item_code_kr1}', "
                 f"now_value={self.now_value}, by_type='{self.by_block_bytype}')")
+
+
+# Mapping BigQuery column -> SoCell field (khớp với from_bigquery_row)
+SOCELL_COLUMN_TO_FIELD = {f.name: f.name for f in fields(SoCell)}
+del SOCELL_COLUMN_TO_FIELD['z_block_zblock1_pack']
+SOCELL_COLUMN_TO_FIELD['Z-BLOCK_ZBlock1_PCK'] = 'z_block_zblock1_pack'
+SOCELL_SCHEMA = register_schema(SoCell, SOCELL_COLUMN_TO_FIELD)
+
+SOCELL_FIELDS = tuple(f.name for f in fields(SoCell))
+_SOCELL_FIELD_SET = frozenset(SOCELL_FIELDS)
+
+
+class SlottedSoCell:
+    """
+    Variant của SoCell dùng __slots__ (không có __dict__ per instance) cho các SoCells đọc
+    từ query (source, prev, by_percent). Cùng attribute access như SoCell; field không được
+    hydrate (column projection) đọc ra None như SoCell partial.
+
+    Output SoCells (insert) vẫn là SoCell dataclass.
+    """
+    __slots__ = SOCELL_FIELDS
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Chỉ được gọi khi slot chưa được gán
+        if name in _SOCELL_FIELD_SET:
+            return None
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def loaded_fields(self) -> FrozenSet[str]:
+        """Các field đã được hydrate từ query result"""
+        loaded = []
+        for name in SOCELL_FIELDS:
+            try:
+                object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            loaded.append(name)
+        return frozenset(loaded)
+
+    def __repr__(self) -> str:
+        return SoCell.__repr__(self)
+
+
+class SoCellBatch:
+    """
+    Batch SoCells lưu theo cột (struct-of-arrays): mỗi field đã load là một array (dùng lại
+    array của DataFrame query result, không copy). Row chỉ được materialize thành
+    SlottedSoCell khi truy cập (batch[i], rows(row_ids), iter), nên memory của một batch lớn
+    ở Step 70 gần bằng DataFrame thay vì một object + __dict__ cho mỗi cell.
+    """
+    __slots__ = ('fields', 'columns', 'length')
+
+    def __init__(self, columns: Dict[str, Sequence], length: int):
+        """
+        Args:
+            columns: Dict field -> array giá trị (cùng length)
+            length: Số rows
+        """
+        self.fields = tuple(columns)
+        self.columns = [columns[name] for name in self.fields]
+        self.length = length
+
+    @classmethod
+    def from_dataframe(cls, df) -> 'SoCellBatch':
+        """
+        Tạo batch từ pandas DataFrame (chỉ các cột thuộc SoCell, xem SoCell.from_dataframe).
+        """
+        columns = {}
+        for column in df.columns:
+            name = SOCELL_COLUMN_TO_FIELD.get(column)
+            if name is None:
+                continue
+            series = df[column]
+            # datetime/extension dtypes giữ pandas array để row có cùng kiểu giá trị như itertuples
+            columns[name] = series.to_numpy() if series.dtype.kind in 'biufO' else series.array
+        return cls(columns, len(df))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, row: int) -> SlottedSoCell:
+        item = SlottedSoCell.__new__(SlottedSoCell)
+        for name, column in zip(self.fields, self.columns):
+            value = column[row]
+            if isinstance(value, np.generic):
+                # numpy scalar -> Python scalar (giống itertuples)
+                value = value.item()
+            setattr(item, name, value)
+        return item
+
+    def __iter__(self) -> Iterator[SlottedSoCell]:
+        for row in range(self.length):
+            yield self[row]
+
+    def rows(self, row_ids) -> List[SlottedSoCell]:
+        """Materialize các rows theo row ids (ví dụ kết quả của ByTypeMatcher.classify)."""
+        return [self[row] for row in row_ids]
+
+    def column(self, name: str):
+        """Array giá trị của một field (None nếu field không được load)."""
+        if name not in self.fields:
+            return None
+        return self.columns[self.fields.index(name)]
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from queries.match_keys import ALLOCATION_KEY, SOCELL_KEY, _normalize_column
+
+
+class _TrieNode:
+    __slots__ = ('children', 'any_child', 'patterns')
+
+    def __init__(self):
+        # value -> node; với exact matching value None cũng là một key bình thường
+        self.children: Dict = {}
+        # Wildcard matching: nhánh của các patterns không ràng buộc field này
+        self.any_child: Optional['_TrieNode'] = None
+        self.patterns: List[int] = []
+
+
+class ByTypeMatcher:
+    """
+    Matcher được compile từ các AllocationByType items của một ALT: trie theo các Y-block
+    fields mà ít nhất một item có giá trị. Mỗi SoCell được phân loại vào tất cả items khớp
+    trong một lần duyệt (classify), thay vì build key cho mỗi row rồi lookup theo từng item.
+
+    - exact (default): khớp khi key bằng nhau, field None của item phải NULL/rỗng ở SoCell
+      (giống group_socell_by_allocation)
+    - wildcard=True: field None của item khớp mọi giá trị, một SoCell có thể khớp nhiều items
+    """
+
+    def __init__(self, allocation_by_type_items: List, wildcard: bool = False):
+        """
+        Args:
+            allocation_by_type_items: AllocationByType items (pattern i = item thứ i)
+            wildcard: True = field None của item không ràng buộc
+        """
+        self.wildcard = wildcard
+        self.pattern_count = len(allocation_by_type_items)
+        keys = [ALLOCATION_KEY.key_of(item) for item in allocation_by_type_items]
+
+        # Chỉ các fields được ít nhất một pattern ràng buộc; field ràng buộc bởi nhiều patterns trước
+        constrained_counts = [sum(1 for key in keys if key[position] is not None)
+                              for position in range(len(SOCELL_KEY.fields))]
+        self.positions = sorted((position for position, count in enumerate(constrained_counts) if count),
+                                key=lambda position: -constrained_counts[position])
+        self.columns = [SOCELL_KEY.fields[position] for position in self.positions]
+        # Exact matching: SoCell có giá trị ở field không pattern nào ràng buộc thì không khớp pattern nào
+        self.unconstrained_columns = [field for position, field in enumerate(SOCELL_KEY.fields)
+                                      if not constrained_counts[position]]
+
+        # Wildcard matching: trie theo self.positions
+        self.root = _TrieNode()
+        # Exact matching: trie suy biến thành lookup theo cả tuple giá trị của self.positions
+        self._exact: Dict[tuple, List[int]] = {}
+        for pattern_id, key in enumerate(keys):
+            if all(value is None for value in key):
+                continue
+            if not wildcard:
+                self._exact.setdefault(tuple(key[position] for position in self.positions), []).append(pattern_id)
+                continue
+            node = self.root
+            for position in self.positions:
+                value = key[position]
+                if value is None:
+                    if node.any_child is None:
+                        node.any_child = _TrieNode()
+                    node = node.any_child
+                else:
+                    child = node.children.get(value)
+                    if child is None:
+                        child = node.children[value] = _TrieNode()
+                    node = child
+            node.patterns.append(pattern_id)
+
+    def _walk(self, node: _TrieNode, values: tuple, depth: int, matched: List[int]):
+        if depth == len(values):
+            matched.extend(node.patterns)
+            return
+        child = node.children.get(values[depth])
+        if child is not None:
+            self._walk(child, values, depth + 1, matched)
+        if node.any_child is not None:
+            self._walk(node.any_child, values, depth + 1, matched)
+
+    def match_values(self, values: tuple) -> List[int]:
+        """Pattern ids khớp một tổ hợp giá trị (đã chuẩn hoá) theo thứ tự self.columns."""
+        if not self.wildcard:
+            return self._exact.get(values, [])
+        matched = []
+        self._walk(self.root, values, 0, matched)
+        return matched
+
+    def classify(self, so_cell_df: pd.DataFrame) -> Dict[int, np.ndarray]:
+        """
+        Phân loại mọi row của DataFrame vào các patterns khớp.
+
+        Rows được gom theo tổ hợp giá trị của các fields trong trie (vectorized), mỗi tổ hợp
+        duyệt trie một lần.
+
+        Returns:
+            Dict pattern id -> numpy array row ids (sorted); pattern không khớp row nào không có trong dict
+        """
+        if so_cell_df is None or so_cell_df.empty or not self.columns:
+            return {}
+
+        length = len(so_cell_df)
+        eligible = np.ones(length, dtype=bool)
+        if not self.wildcard:
+            for column in self.unconstrained_columns:
+                if column in so_cell_df.columns:
+                    eligible &= pd.isna(_normalize_column(so_cell_df[column]))
+
+        codes = []
+        uniques = []
+        for column in self.columns:
+            if column in so_cell_df.columns:
+                column_codes, column_uniques = pd.factorize(_normalize_column(so_cell_df[column]))
+            else:
+                column_codes, column_uniques = np.full(length, -1, dtype=np.int64), np.empty(0, dtype=object)
+            codes.append(column_codes)
+            # code -1 (NULL) -> None ở vị trí cuối
+            uniques.append(list(column_uniques) + [None])
+
+        row_ids = np.flatnonzero(eligible)
+        if len(row_ids) == 0:
+            return {}
+        code_matrix = np.stack([column_codes[row_ids] for column_codes in codes], axis=1)
+        cardinalities = [len(column_uniques) for column_uniques in uniques]
+        if np.prod(np.array(cardinalities, dtype=float)) < 2 ** 62:
+            # Ghép codes các cột thành một số int64 (mixed radix) rồi factorize bằng hash
+            combined = np.zeros(len(row_ids), dtype=np.int64)
+            for depth, cardinality in enumerate(cardinalities):
+                combined = combined * cardinality + (code_matrix[:, depth] + 1)
+            inverse, combo_keys = pd.factorize(combined)
+            first_rows = np.empty(len(combo_keys), dtype=np.int64)
+            first_rows[inverse[::-1]] = np.arange(len(inverse) - 1, -1, -1)
+            combos = code_matrix[first_rows]
+        else:
+            combos, inverse = np.unique(code_matrix, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(combos) + 1))
+
+        matches: Dict[int, List[np.ndarray]] = {}
+        for combo_index, combo in enumerate(combos.tolist()):
+            values = tuple(uniques[depth][code] for depth, code in enumerate(combo))
+            pattern_ids = self.match_values(values)
+            if not pattern_ids:
+                continue
+            combo_rows = row_ids[order[bounds[combo_index]:bounds[combo_index + 1]]]
+            for pattern_id in pattern_ids:
+                matches.setdefault(pattern_id, []).append(combo_rows)
+
+        return {
+            pattern_id: np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+            for pattern_id, parts in matches.items()
+        }
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from operator import attrgetter
+from typing import List, Optional
+from config.field_mappings import YBLOCK_MAPPING, PREV_YBLOCK_MAPPING
+
+
+def _normalize_value(value):
+    """
+    Chuẩn hoá một giá trị trong key: None/NaN/'' -> None, còn lại -> str(value).
+    Giống điều kiện bỏ qua field của các hàm build query.
+    """
+    if value is None or (isinstance(value, str) and value == ''):
+        return None
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def _normalize_column(series: pd.Series) -> np.ndarray:
+    """
+    Chuẩn hoá cả một cột DataFrame (vectorized), cùng quy tắc với _normalize_value.
+    """
+    # Chỉ format các giá trị unique, NaN/None được factorize thành code -1
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    lookup = np.empty(len(uniques) + 1, dtype=object)
+    lookup[0] = None
+    lookup[1:] = [_normalize_value(value) for value in uniques]
+    return lookup[codes + 1]
+
+
+class KeyExtractor:
+    """
+    Precompiled key extractor cho việc group/lookup SoCell.
+
+    Key là tuple các giá trị đã chuẩn hoá theo đúng thứ tự fields (field thiếu = None),
+    tương đương với string key "field:value|..." cũ nhưng không cần format/sort/join.
+    Hai extractor có cùng số fields (ví dụ AllocationByType và SoCell) tạo ra key so sánh được
+    với nhau khi fields tương ứng theo vị trí.
+    """
+
+    def __init__(self, fields: List[str]):
+        """
+        Args:
+            fields: Danh sách attribute/column names tạo nên key (theo thứ tự)
+        """
+        self.fields = tuple(fields)
+        getter = attrgetter(*self.fields)
+        self._get_values = getter if len(self.fields) > 1 else (lambda item: (getter(item),))
+
+    def key_of(self, item) -> tuple:
+        """
+        Tạo key cho một object (dataclass instance).
+        """
+        try:
+            values = self._get_values(item)
+        except AttributeError:
+            values = [getattr(item, field, None) for field in self.fields]
+        return tuple(map(_normalize_value, values))
+
+    def keys_from_frame(self, df: pd.DataFrame) -> list:
+        """
+        Tạo keys cho toàn bộ rows của DataFrame một lần (vectorized theo cột).
+        Column không có trong df được coi như None (giống SoCell partial).
+
+        Args:
+            df: DataFrame, mỗi row tương ứng một item theo thứ tự
+
+        Returns:
+            List of tuple keys
+        """
+        if df is None or df.empty:
+            return []
+
+        columns = {}
+        for index, field in enumerate(self.fields):
+            if field in df.columns:
+                columns[index] = _normalize_column(df[field])
+            else:
+                columns[index] = np.full(len(df), None, dtype=object)
+
+        return list(zip(*columns.values()))
+
+
+# AllocationByType (to_y_block_*) <-> SoCell (now_y_block_*)
+ALLOCATION_KEY = KeyExtractor(YBLOCK_MAPPING.source_fields)
+SOCELL_KEY = KeyExtractor(YBLOCK_MAPPING.target_fields)
+
+# y_block_1 (now_y_block_* + now_np) <-> prev SoCell result (prev_y_block_* + now_np)
+PREV_SOURCE_KEY = KeyExtractor(PREV_YBLOCK_MAPPING.source_fields + ('now_np',))
+PREV_RESULT_KEY = KeyExtractor(PREV_YBLOCK_MAPPING.target_fields + ('now_np',))
+
+
+def group_by_keys(items: List, keys: list) -> dict:
+    """
+    Group items theo keys đã tính sẵn (cùng thứ tự với items).
+
+    Returns:
+        Dictionary mapping key -> list of items
+    """
+    grouped = {}
+    for key, item in zip(keys, items):
+        bucket = grouped.get(key)
+        if bucket is None:
+            grouped[key] = [item]
+        else:
+            bucket.append(item)
+    return grouped
+
+
+def frame_matches_items(df: Optional[pd.DataFrame], items: List) -> bool:
+    """
+    Kiểm tra DataFrame có thể dùng để tính keys cho items (cùng số rows).
+    """
+    return df is not None and len(df) == len(items)
@@ -1,11 +1,52 @@
 import pandas as pd
-from config.field_mappings import YBLOCK_FIELD_MAPPING, PREV_YBLOCK_FIELD_MAPPING
-from typing import List, Dict
-from collections import defaultdict
+from config.field_mappings import FieldMapping, YBLOCK_MAPPING, PREV_YBLOCK_MAPPING, is_empty_value
+from typing import List, Dict, Optional
+from queries.match_keys import (
+    ALLOCATION_KEY,
+    SOCELL_KEY,
+    PREV_SOURCE_KEY,
+    PREV_RESULT_KEY,
+    group_by_keys,
+    frame_matches_items
+)
+
+
+def format_select_columns(columns: Optional[List[str]] = None) -> str:
+    """
+    Build SELECT list từ column spec.
+
+    Args:
+        columns: List tên cột cần đọc (None hoặc rỗng = tất cả cột)
+
+    Returns:
+        Chuỗi dùng sau SELECT, ví dụ "now_np, now_value" hoặc "*"
+    """
+    if not columns:
+        return "*"
+    return ", ".join(dict.fromkeys(columns))
+
+
+def _format_sql_value(value) -> str:
+    """Format một giá trị thành SQL literal (string được quote và escape)"""
+    if isinstance(value, str):
+        escaped_value = value.replace("'", "\\'")
+        return f"'{escaped_value}'"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return f"'{str(value)}'"
+
+
+def _mapping_conditions(item, mapping: FieldMapping) -> List[str]:
+    """
+    Các điều kiện "target = value" cho các fields có giá trị của item (bỏ None/NaN/'')
+    theo field mapping (ví dụ YBLOCK_MAPPING: to_y_block_* -> now_y_block_*).
+    """
+    return [f"{target} = {_format_sql_value(value)}" for target, value in mapping.non_empty_items(item)]
 
 
 def build_so_cell_query(allocation_by_type_item, project_id: str, my_x_period: str = None, 
-                        dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full') -> str:
+                        dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full',
+                        columns: Optional[List[str]] = None) -> str:
     """
     Build dynamic query cho SoCell dựa trên Y-block fields của AllocationByType
 
@@ -15,31 +56,12 @@ def build_so_cell_query(allocation_by_type_item, project_id: str, my_x_period: s
         my_x_period: Period value to filter by now_np (optional)
         dataset_id: Dataset ID (default: 'alloc_stage')
         table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
 
     Returns:
         SQL query string với WHERE conditions động
     """
-    where_conditions = []
-
-    for by_type_field, so_cell_field in YBLOCK_FIELD_MAPPING.items():
-        value = getattr(allocation_by_type_item, by_type_field, None)
-
-        if value is None:
-            continue
-        if pd.isna(value):
-            continue
-        if isinstance(value, str) and value == '':
-            continue
-
-        if isinstance(value, str):
-            escaped_value = value.replace("'", "\\'")
-            formatted_value = f"'{escaped_value}'"
-        elif isinstance(value, (int, float)):
-            formatted_value = str(value)
-        else:
-            formatted_value = f"'{str(value)}'"
-
-        where_conditions.append(f"{so_cell_field} = {formatted_value}")
+    where_conditions = _mapping_conditions(allocation_by_type_item, YBLOCK_MAPPING)
 
     # Add now_np condition if my_x_period is provided
     if my_x_period is not None and not pd.isna(my_x_period):
@@ -50,7 +72,7 @@ def build_so_cell_query(allocation_by_type_item, project_id: str, my_x_period: s
             where_conditions.append(f"now_np = {my_x_period}")
 
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`"
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`"
 
     if where_conditions:
         query += "\nWHERE " + "\nAND ".join(where_conditions)
@@ -58,25 +80,17 @@ def build_so_cell_query(allocation_by_type_item, project_id: str, my_x_period: s
     return query
 
 
-def build_so_cell_batch_query(allocation_by_type_items, project_id: str, my_x_period: str = None,
-                               dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full') -> str:
+def build_so_cell_batch_conditions(allocation_by_type_items) -> List[str]:
     """
-    Build batch query cho nhiều AllocationByType items sử dụng OR conditions.
-    Query một lần thay vì query nhiều lần trong loop.
-    
+    Build các OR conditions (một cho mỗi AllocationByType item, bỏ qua GAgg/ByAgg)
+    của build_so_cell_batch_query.
+
     Args:
         allocation_by_type_items: List of AllocationByType instances
-        project_id: Google Cloud Project ID
-        my_x_period: Period value to filter by now_np (optional)
-        dataset_id: Dataset ID (default: 'alloc_stage')
-        table_id: Table ID (default: 'so_cell_raw_full')
-        
+
     Returns:
-        SQL query string với WHERE conditions sử dụng OR cho từng item
+        List các condition strings dạng "(field = value AND ...)"
     """
-    if not allocation_by_type_items:
-        return None
-    
     or_conditions = []
     
     for allocation_by_type_item in allocation_by_type_items:
@@ -87,34 +101,45 @@ def build_so_cell_batch_query(allocation_by_type_items, project_id: str, my_x_pe
         
         and_conditions = []
         
-        for by_type_field, so_cell_field in YBLOCK_FIELD_MAPPING.items():
-            value = getattr(allocation_by_type_item, by_type_field, None)
-            
-            if value is None:
-                continue
-            if pd.isna(value):
-                continue
-            if isinstance(value, str) and value == '':
-                continue
-            
-            if isinstance(value, str):
-                escaped_value = value.replace("'", "\\'")
-                formatted_value = f"'{escaped_value}'"
-            elif isinstance(value, (int, float)):
-                formatted_value = str(value)
-            else:
-                formatted_value = f"'{str(value)}'"
-            
-            and_conditions.append(f"{so_cell_field} = {formatted_value}")
+        and_conditions.extend(_mapping_conditions(allocation_by_type_item, YBLOCK_MAPPING))
         
         if and_conditions:
             or_conditions.append(f"({' AND '.join(and_conditions)})")
+
+    return or_conditions
+
+
+def build_so_cell_batch_query(allocation_by_type_items, project_id: str, my_x_period: str = None,
+                               dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full',
+                               columns: Optional[List[str]] = None,
+                               or_conditions: Optional[List[str]] = None) -> str:
+    """
+    Build batch query cho nhiều AllocationByType items sử dụng OR conditions.
+    Query một lần thay vì query nhiều lần trong loop.
+    
+    Args:
+        allocation_by_type_items: List of AllocationByType instances
+        project_id: Google Cloud Project ID
+        my_x_period: Period value to filter by now_np (optional)
+        dataset_id: Dataset ID (default: 'alloc_stage')
+        table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
+        or_conditions: OR conditions đã build sẵn (ví dụ từ query plan cache),
+            None = build từ allocation_by_type_items
+        
+    Returns:
+        SQL query string với WHERE conditions sử dụng OR cho từng item
+    """
+    if or_conditions is None:
+        if not allocation_by_type_items:
+            return None
+        or_conditions = build_so_cell_batch_conditions(allocation_by_type_items)
     
     if not or_conditions:
         return None
     
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`\nWHERE ("
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`\nWHERE ("
     query += "\nOR ".join(or_conditions)
     query += ")"
     
@@ -129,7 +154,131 @@ def build_so_cell_batch_query(allocation_by_type_items, project_id: str, my_x_pe
     return query
 
 
-def create_allocation_key(allocation_by_type_item) -> str:
+def build_so_cell_batch_count_query(allocation_by_type_items, project_id: str, my_x_period: str = None,
+                                    dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full'):
+    """
+    Build query đếm số source SoCell cho từng AllocationByType item trong một lần scan.
+    Mỗi item là một COUNTIF với điều kiện khớp chính xác key (các Y-block field khác
+    của item phải NULL/rỗng), giống cách group_socell_by_allocation match key.
+
+    Args:
+        allocation_by_type_items: List of AllocationByType instances
+        project_id: Google Cloud Project ID
+        my_x_period: Period value to filter by now_np (optional)
+        dataset_id: Dataset ID (default: 'alloc_stage')
+        table_id: Table ID (default: 'so_cell_raw_full')
+
+    Returns:
+        Tuple (query, counted_items): cột cnt_{i} trong kết quả là số SoCell của
+        counted_items[i]. Trả về (None, []) nếu không có item hợp lệ.
+    """
+    count_columns = []
+    counted_items = []
+
+    for allocation_by_type_item in allocation_by_type_items or []:
+        if getattr(allocation_by_type_item, 'by_block_by_type', None) in ['GAgg', 'ByAgg']:
+            continue
+
+        match_conditions = []
+        has_value = False
+        for so_cell_field, value in YBLOCK_MAPPING.items_of(allocation_by_type_item):
+            if is_empty_value(value):
+                match_conditions.append(f"({so_cell_field} IS NULL OR {so_cell_field} = '')")
+                continue
+
+            has_value = True
+            match_conditions.append(f"{so_cell_field} = {_format_sql_value(value)}")
+
+        if not has_value:
+            continue
+
+        count_columns.append(f"COUNTIF({' AND '.join(match_conditions)}) AS cnt_{len(counted_items)}")
+        counted_items.append(allocation_by_type_item)
+
+    if not count_columns:
+        return None, []
+
+    table_name = f"{project_id}.{dataset_id}.{table_id}"
+    query = "SELECT\n" + ",\n".join(count_columns) + f"\nFROM `{table_name}`"
+
+    if my_x_period is not None and not pd.isna(my_x_period):
+        query += f"\nWHERE now_np = {_format_sql_value(my_x_period)}"
+
+    return query, counted_items
+
+
+def build_so_cell_byagg_query(project_id: str, to_item_pts2: str, to_item_ctys2: str, to_item_np_d365: str,
+                              dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full',
+                              columns: Optional[List[str]] = None) -> str:
+    """
+    Build query lấy SoCell cần cộng dồn cho một tổ hợp ByAgg (PT-S2, CTY-S2, NP-D365).
+
+    Args:
+        project_id: Google Cloud Project ID
+        to_item_pts2: ToItem của PT-S2
+        to_item_ctys2: ToItem của CTY-S2
+        to_item_np_d365: ToItem của NP-D365
+        dataset_id: Dataset ID (default: 'alloc_stage')
+        table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
+
+    Returns:
+        SQL query string
+    """
+    return f"""
+    SELECT {format_select_columns(columns)} 
+    FROM `{project_id}.{dataset_id}.{table_id}` 
+    WHERE now_y_block_fnf_fnf = "KRN"
+    AND now_y_block_kr_item_code_kr1 = "NO"
+    AND now_y_block_kr_item_code_kr2 = "GI"
+    AND now_y_block_kr_item_code_kr3 = "DAU"
+    AND now_y_block_kr_item_code_kr4 = "DC"
+    AND now_y_block_kr_item_code_kr5 = "NP"
+    AND CONCAT(now_y_block_ptnow_pt1, now_y_block_ptnow_pt2) = '{to_item_pts2}'
+    AND CONCAT(now_y_block_ptsub_cty1, now_y_block_ptsub_cty2) = '{to_item_ctys2}'
+    AND NOW_NP = '{to_item_np_d365}'
+    AND now_y_block_cdt_cdt1 IS NOT NULL
+    AND now_y_block_cdt_cdt2 IS NOT NULL
+    AND now_y_block_cdt_cdt3 IS NOT NULL
+    AND now_y_block_cdt_cdt4 IS NOT NULL
+    """
+
+
+def build_so_cell_slice_query(predicates: Dict, project_id: str, dataset_id: str = 'alloc_stage',
+                              table_id: str = 'so_cell_raw_full', columns: Optional[List[str]] = None) -> str:
+    """
+    Build query đọc một slice của so_cell_raw_full theo các điều kiện bằng (AND), dùng để
+    load slice vào SoCellStore.
+
+    Args:
+        predicates: Dict column -> value, ví dụ {'now_np': 'M2501'} (rỗng = cả table)
+        project_id: Google Cloud Project ID
+        dataset_id: Dataset ID (default: 'alloc_stage')
+        table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
+
+    Returns:
+        SQL query string
+    """
+    table_name = f"{project_id}.{dataset_id}.{table_id}"
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`"
+
+    where_conditions = [f"{column} = {_format_sql_value(value)}" for column, value in predicates.items()]
+    if where_conditions:
+        query += "\nWHERE " + "\nAND ".join(where_conditions)
+
+    return query
+
+
+def build_so_cell_slice_count_query(predicates: Dict, project_id: str, dataset_id: str = 'alloc_stage',
+                                    table_id: str = 'so_cell_raw_full') -> str:
+    """
+    Build query đếm số rows của một slice (cột row_count), để ước lượng size trước khi load.
+    """
+    return build_so_cell_slice_query(predicates, project_id, dataset_id, table_id, columns=['COUNT(*) AS row_count'])
+
+
+def create_allocation_key(allocation_by_type_item) -> tuple:
     """
     Tạo unique key từ AllocationByType item dựa trên các Y-block fields.
     Key này dùng để group và lookup SoCell results.
@@ -138,22 +287,12 @@ def create_allocation_key(allocation_by_type_item) -> str:
         allocation_by_type_item: Instance của AllocationByType
         
     Returns:
-        String key dạng "field1:value1|field2:value2|..."
+        Tuple key theo thứ tự YBLOCK_FIELD_MAPPING (field không có giá trị = None)
     """
-    key_parts = []
-    
-    for by_type_field, so_cell_field in YBLOCK_FIELD_MAPPING.items():
-        value = getattr(allocation_by_type_item, by_type_field, None)
-        
-        if value is None or pd.isna(value) or (isinstance(value, str) and value == ''):
-            continue
-        
-        key_parts.append(f"{so_cell_field}:{value}")
-    
-    return "|".join(sorted(key_parts))
+    return ALLOCATION_KEY.key_of(allocation_by_type_item)
 
 
-def create_socell_key(so_cell_item) -> str:
+def create_socell_key(so_cell_item) -> tuple:
     """
     Tạo unique key từ SoCell item dựa trên các now_y_block fields.
     Key này phải match với key từ create_allocation_key.
@@ -162,42 +301,34 @@ def create_socell_key(so_cell_item) -> str:
         so_cell_item: Instance của SoCell
         
     Returns:
-        String key dạng "field1:value1|field2:value2|..."
+        Tuple key theo thứ tự YBLOCK_FIELD_MAPPING (field không có giá trị = None)
     """
-    key_parts = []
-    
-    for by_type_field, so_cell_field in YBLOCK_FIELD_MAPPING.items():
-        value = getattr(so_cell_item, so_cell_field, None)
-        
-        if value is None or pd.isna(value) or (isinstance(value, str) and value == ''):
-            continue
-        
-        key_parts.append(f"{so_cell_field}:{value}")
-    
-    return "|".join(sorted(key_parts))
+    return SOCELL_KEY.key_of(so_cell_item)
 
 
-def group_socell_by_allocation(so_cell_items: List) -> Dict[str, List]:
+def group_socell_by_allocation(so_cell_items: List, so_cell_df: Optional[pd.DataFrame] = None) -> Dict[tuple, List]:
     """
     Group SoCell items theo key để lookup nhanh.
     
     Args:
         so_cell_items: List of SoCell instances
+        so_cell_df: DataFrame gốc của so_cell_items (optional). Nếu có, keys được tính
+            vectorized trên các cột thay vì từng item
         
     Returns:
         Dictionary mapping key -> list of SoCell items
     """
-    grouped = defaultdict(list)
-    
-    for so_cell_item in so_cell_items:
-        key = create_socell_key(so_cell_item)
-        grouped[key].append(so_cell_item)
+    if frame_matches_items(so_cell_df, so_cell_items):
+        keys = SOCELL_KEY.keys_from_frame(so_cell_df)
+    else:
+        keys = [create_socell_key(so_cell_item) for so_cell_item in so_cell_items]
     
-    return dict(grouped)
+    return group_by_keys(so_cell_items, keys)
 
 
 def build_so_cell_prev_batch_query(from_so_cell_items: List, z_number: int, project_id: str,
-                                     dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full') -> str:
+                                     dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full',
+                                     columns: Optional[List[str]] = None) -> str:
     """
     Build batch query cho nhiều prev SoCell lookups sử dụng OR conditions.
     Query một lần cho tất cả from_so_cell_items thay vì query nhiều lần trong loop.
@@ -208,6 +339,7 @@ def build_so_cell_prev_batch_query(from_so_cell_items: List, z_number: int, proj
         project_id: Google Cloud Project ID
         dataset_id: Dataset ID (default: 'alloc_stage')
         table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
         
     Returns:
         SQL query string với WHERE conditions sử dụng OR cho từng item
@@ -221,25 +353,7 @@ def build_so_cell_prev_batch_query(from_so_cell_items: List, z_number: int, proj
         and_conditions = []
         
         # Match PrevYBlock với NowYBlock của y_block_1
-        for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items():
-            value = getattr(y_block_1, now_field, None)
-            
-            if value is None:
-                continue
-            if pd.isna(value):
-                continue
-            if isinstance(value, str) and value == '':
-                continue
-            
-            if isinstance(value, str):
-                escaped_value = value.replace("'", "\\'")
-                formatted_value = f"'{escaped_value}'"
-            elif isinstance(value, (int, float)):
-                formatted_value = str(value)
-            else:
-                formatted_value = f"'{str(value)}'"
-            
-            and_conditions.append(f"{prev_field} = {formatted_value}")
+        and_conditions.extend(_mapping_conditions(y_block_1, PREV_YBLOCK_MAPPING))
         
         # Add now_np condition from y_block_1
         x_period_1 = y_block_1.now_np
@@ -257,7 +371,7 @@ def build_so_cell_prev_batch_query(from_so_cell_items: List, z_number: int, proj
         return None
     
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`\nWHERE ("
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`\nWHERE ("
     query += "\nOR ".join(or_conditions)
     query += ")"
     
@@ -268,7 +382,7 @@ def build_so_cell_prev_batch_query(from_so_cell_items: List, z_number: int, proj
     return query
 
 
-def create_prev_socell_key(y_block_1) -> str:
+def create_prev_socell_key(y_block_1) -> tuple:
     """
     Tạo unique key từ y_block_1 (from_so_cell_item) để match với prev SoCell.
     Key dựa trên now_y_block fields của y_block_1 và now_np.
@@ -277,28 +391,12 @@ def create_prev_socell_key(y_block_1) -> str:
         y_block_1: SoCell instance (from_so_cell_item)
         
     Returns:
-        String key dạng "field1:value1|field2:value2|...|now_np:value"
+        Tuple key theo thứ tự PREV_YBLOCK_FIELD_MAPPING + now_np
     """
-    key_parts = []
-    
-    for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items():
-        value = getattr(y_block_1, now_field, None)
-        
-        if value is None or pd.isna(value) or (isinstance(value, str) and value == ''):
-            continue
-        
-        # Use prev_field name in key to match with result
-        key_parts.append(f"{prev_field}:{value}")
-    
-    # Add now_np to key
-    x_period_1 = y_block_1.now_np
-    if x_period_1 is not None and not pd.isna(x_period_1):
-        key_parts.append(f"now_np:{x_period_1}")
-    
-    return "|".join(sorted(key_parts))
+    return PREV_SOURCE_KEY.key_of(y_block_1)
 
 
-def create_prev_result_key(prev_so_cell_item) -> str:
+def create_prev_result_key(prev_so_cell_item) -> tuple:
     """
     Tạo unique key từ prev SoCell result để match với y_block_1.
     Key dựa trên prev_y_block fields và now_np của result.
@@ -307,43 +405,29 @@ def create_prev_result_key(prev_so_cell_item) -> str:
         prev_so_cell_item: SoCell instance từ query result
         
     Returns:
-        String key dạng "field1:value1|field2:value2|...|now_np:value"
+        Tuple key theo thứ tự PREV_YBLOCK_FIELD_MAPPING + now_np
     """
-    key_parts = []
-    
-    for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items():
-        value = getattr(prev_so_cell_item, prev_field, None)
-        
-        if value is None or pd.isna(value) or (isinstance(value, str) and value == ''):
-            continue
-        
-        key_parts.append(f"{prev_field}:{value}")
-    
-    # Add now_np to key
-    now_np = prev_so_cell_item.now_np
-    if now_np is not None and not pd.isna(now_np):
-        key_parts.append(f"now_np:{now_np}")
-    
-    return "|".join(sorted(key_parts))
+    return PREV_RESULT_KEY.key_of(prev_so_cell_item)
 
 
-def group_prev_socell_by_key(prev_so_cell_items: List) -> Dict[str, List]:
+def group_prev_socell_by_key(prev_so_cell_items: List,
+                             prev_so_cell_df: Optional[pd.DataFrame] = None) -> Dict[tuple, List]:
     """
     Group prev SoCell items theo key để lookup nhanh.
     
     Args:
         prev_so_cell_items: List of SoCell instances từ batch query
+        prev_so_cell_df: DataFrame gốc của prev_so_cell_items (optional), dùng để tính keys vectorized
         
     Returns:
         Dictionary mapping key -> list of prev SoCell items
     """
-    grouped = defaultdict(list)
+    if frame_matches_items(prev_so_cell_df, prev_so_cell_items):
+        keys = PREV_RESULT_KEY.keys_from_frame(prev_so_cell_df)
+    else:
+        keys = [create_prev_result_key(prev_so_cell_item) for prev_so_cell_item in prev_so_cell_items]
     
-    for prev_so_cell_item in prev_so_cell_items:
-        key = create_prev_result_key(prev_so_cell_item)
-        grouped[key].append(prev_so_cell_item)
-    
-    return dict(grouped)
+    return group_by_keys(prev_so_cell_items, keys)
 
 
 def build_so_cell_by_kr_query(allocation_by_kr_item,
@@ -352,6 +436,7 @@ def build_so_cell_by_kr_query(allocation_by_kr_item,
                               to_item: str,
                               dataset_id: str = 'alloc_stage',
                               table_id: str = 'so_cell_raw_full',
+                              columns: Optional[List[str]] = None
                               ) -> str:
     """
     Build dynamic query cho SoCell dựa trên Y-block fields từ AllocationByKR và AllocationToItem
@@ -363,80 +448,17 @@ def build_so_cell_by_kr_query(allocation_by_kr_item,
         to_item: ToItem value
         dataset_id: Dataset ID (default: 'alloc_stage')
         table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
 
     Returns:
         SQL query string với WHERE conditions động
     """
-    where_conditions = []
-
-    kr_to_socell_mapping = {
-        'to_y_block_kr1': 'now_y_block_kr_item_code_kr1',
-        'to_y_block_kr2': 'now_y_block_kr_item_code_kr2',
-        'to_y_block_kr3': 'now_y_block_kr_item_code_kr3',
-        'to_y_block_kr4': 'now_y_block_kr_item_code_kr4',
-        'to_y_block_kr5': 'now_y_block_kr_item_code_kr5',
-        'to_y_block_kr6': 'now_y_block_kr_item_code_kr6',
-        'to_y_block_kr7': 'now_y_block_kr_item_code_kr7',
-        'to_y_block_kr8': 'now_y_block_kr_item_code_kr8',
-        'to_y_block_cdt1': 'now_y_block_cdt_cdt1',
-        'to_y_block_cdt2': 'now_y_block_cdt_cdt2',
-        'to_y_block_cdt3': 'now_y_block_cdt_cdt3',
-        'to_y_block_cdt4': 'now_y_block_cdt_cdt4',
-        'to_y_block_pt1': 'now_y_block_ptnow_pt1',
-        'to_y_block_pt2': 'now_y_block_ptnow_pt2',
-        'to_y_block_duration': 'now_y_block_ptnow_duration',
-        'to_y_block_pt1_prev': 'now_y_block_ptprev_pt1',
-        'to_y_block_pt2_prev': 'now_y_block_ptprev_pt2',
-        'to_y_block_duration_prev': 'now_y_block_ptprev_duration',
-        'to_y_block_own_type': 'now_y_block_ptfix_owntype',
-        'to_y_block_ai_type': 'now_y_block_ptfix_aitype',
-        'to_y_block_cty1': 'now_y_block_ptsub_cty1',
-        'to_y_block_cty2': 'now_y_block_ptsub_cty2',
-        'to_y_block_os_type': 'now_y_block_ptsub_ostype',
-        'to_y_block_fu1': 'now_y_block_funnel_fu1',
-        'to_y_block_fu2': 'now_y_block_funnel_fu2',
-        'to_y_block_ch': 'now_y_block_channel_ch',
-        'to_y_block_egt1': 'now_y_block_employee_egt1',
-        'to_y_block_egt2': 'now_y_block_employee_egt2',
-        'to_y_block_egt3': 'now_y_block_employee_egt3',
-        'to_y_block_egt4': 'now_y_block_employee_egt4',
-        'to_y_block_hr1': 'now_y_block_hr_hr1',
-        'to_y_block_hr2': 'now_y_block_hr_hr2',
-        'to_y_block_hr3': 'now_y_block_hr_hr3',
-        'to_y_block_sec': 'now_y_block_sec',
-        'to_y_block_mx': 'now_y_block_period_mx',
-        'to_y_block_dx': 'now_y_block_period_dx',
-        'to_y_block_ppc': 'now_y_block_period_ppc',
-        'to_y_block_np': 'now_y_block_period_np',
-        'to_y_block_le1': 'now_y_block_le_le1',
-        'to_y_block_le2': 'now_y_block_le_le2',
-        'to_y_block_unit': 'now_y_block_unit',
-    }
-
-    for kr_field, socell_field in kr_to_socell_mapping.items():
-        value = getattr(allocation_by_kr_item, kr_field, None)
-
-        if value is None:
-            continue
-        if pd.isna(value):
-            continue
-        if isinstance(value, str) and value == '':
-            continue
-
-        if isinstance(value, str):
-            escaped_value = value.replace("'", "\\'")
-            formatted_value = f"'{escaped_value}'"
-        elif isinstance(value, (int, float)):
-            formatted_value = str(value)
-        else:
-            formatted_value = f"'{str(value)}'"
-
-        where_conditions.append(f"{socell_field} = {formatted_value}")
+    where_conditions = _mapping_conditions(allocation_by_kr_item, YBLOCK_MAPPING)
 
     where_conditions.append(f"now_y_block_period_mx = '{to_item}'")
 
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`"
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`"
 
     if where_conditions:
         query += "\nWHERE " + "\nAND ".join(where_conditions)
@@ -444,11 +466,27 @@ def build_so_cell_by_kr_query(allocation_by_kr_item,
     return query
 
 
+def build_so_cell_by_kr_conditions(allocation_by_kr_item) -> List[str]:
+    """
+    Build các WHERE conditions theo fields của AllocationByKR (không gồm IN clause của to_items)
+    cho build_so_cell_by_kr_batch_query.
+
+    Args:
+        allocation_by_kr_item: Instance của AllocationByKR (kr_block_3)
+
+    Returns:
+        List các condition strings dạng "field = value"
+    """
+    return _mapping_conditions(allocation_by_kr_item, YBLOCK_MAPPING)
+
+
 def build_so_cell_by_kr_batch_query(allocation_by_kr_item,
                                      to_items: List,
                                      project_id: str,
                                      dataset_id: str = 'alloc_stage',
-                                     table_id: str = 'so_cell_raw_full') -> str:
+                                     table_id: str = 'so_cell_raw_full',
+                                     columns: Optional[List[str]] = None,
+                                     kr_conditions: Optional[List[str]] = None) -> str:
     """
     Build batch query cho SoCell by KR với nhiều to_items sử dụng IN clause.
     Query một lần cho tất cả to_items thay vì query nhiều lần trong loop.
@@ -459,6 +497,9 @@ def build_so_cell_by_kr_batch_query(allocation_by_kr_item,
         project_id: Google Cloud Project ID
         dataset_id: Dataset ID (default: 'alloc_stage')
         table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
+        kr_conditions: Conditions của AllocationByKR đã build sẵn (ví dụ từ query plan cache),
+            None = build từ allocation_by_kr_item
         
     Returns:
         SQL query string với WHERE conditions và IN clause cho to_items
@@ -466,71 +507,9 @@ def build_so_cell_by_kr_batch_query(allocation_by_kr_item,
     if not to_items:
         return None
     
-    where_conditions = []
-    
-    kr_to_socell_mapping = {
-        'to_y_block_kr1': 'now_y_block_kr_item_code_kr1',
-        'to_y_block_kr2': 'now_y_block_kr_item_code_kr2',
-        'to_y_block_kr3': 'now_y_block_kr_item_code_kr3',
-        'to_y_block_kr4': 'now_y_block_kr_item_code_kr4',
-        'to_y_block_kr5': 'now_y_block_kr_item_code_kr5',
-        'to_y_block_kr6': 'now_y_block_kr_item_code_kr6',
-        'to_y_block_kr7': 'now_y_block_kr_item_code_kr7',
-        'to_y_block_kr8': 'now_y_block_kr_item_code_kr8',
-        'to_y_block_cdt1': 'now_y_block_cdt_cdt1',
-        'to_y_block_cdt2': 'now_y_block_cdt_cdt2',
-        'to_y_block_cdt3': 'now_y_block_cdt_cdt3',
-        'to_y_block_cdt4': 'now_y_block_cdt_cdt4',
-        'to_y_block_pt1': 'now_y_block_ptnow_pt1',
-        'to_y_block_pt2': 'now_y_block_ptnow_pt2',
-        'to_y_block_duration': 'now_y_block_ptnow_duration',
-        'to_y_block_pt1_prev': 'now_y_block_ptprev_pt1',
-        'to_y_block_pt2_prev': 'now_y_block_ptprev_pt2',
-        'to_y_block_duration_prev': 'now_y_block_ptprev_duration',
-        'to_y_block_own_type': 'now_y_block_ptfix_owntype',
-        'to_y_block_ai_type': 'now_y_block_ptfix_aitype',
-        'to_y_block_cty1': 'now_y_block_ptsub_cty1',
-        'to_y_block_cty2': 'now_y_block_ptsub_cty2',
-        'to_y_block_os_type': 'now_y_block_ptsub_ostype',
-        'to_y_block_fu1': 'now_y_block_funnel_fu1',
-        'to_y_block_fu2': 'now_y_block_funnel_fu2',
-        'to_y_block_ch': 'now_y_block_channel_ch',
-        'to_y_block_egt1': 'now_y_block_employee_egt1',
-        'to_y_block_egt2': 'now_y_block_employee_egt2',
-        'to_y_block_egt3': 'now_y_block_employee_egt3',
-        'to_y_block_egt4': 'now_y_block_employee_egt4',
-        'to_y_block_hr1': 'now_y_block_hr_hr1',
-        'to_y_block_hr2': 'now_y_block_hr_hr2',
-        'to_y_block_hr3': 'now_y_block_hr_hr3',
-        'to_y_block_sec': 'now_y_block_sec',
-        'to_y_block_mx': 'now_y_block_period_mx',
-        'to_y_block_dx': 'now_y_block_period_dx',
-        'to_y_block_ppc': 'now_y_block_period_ppc',
-        'to_y_block_np': 'now_y_block_period_np',
-        'to_y_block_le1': 'now_y_block_le_le1',
-        'to_y_block_le2': 'now_y_block_le_le2',
-        'to_y_block_unit': 'now_y_block_unit',
-    }
-    
-    for kr_field, socell_field in kr_to_socell_mapping.items():
-        value = getattr(allocation_by_kr_item, kr_field, None)
-        
-        if value is None:
-            continue
-        if pd.isna(value):
-            continue
-        if isinstance(value, str) and value == '':
-            continue
-        
-        if isinstance(value, str):
-            escaped_value = value.replace("'", "\\'")
-            formatted_value = f"'{escaped_value}'"
-        elif isinstance(value, (int, float)):
-            formatted_value = str(value)
-        else:
-            formatted_value = f"'{str(value)}'"
-        
-        where_conditions.append(f"{socell_field} = {formatted_value}")
+    if kr_conditions is None:
+        kr_conditions = build_so_cell_by_kr_conditions(allocation_by_kr_item)
+    where_conditions = list(kr_conditions)
     
     # Add IN clause for to_items
     to_items_escaped = [str(item).replace("'", "\\'") for item in to_items]
@@ -538,7 +517,7 @@ def build_so_cell_by_kr_batch_query(allocation_by_kr_item,
     where_conditions.append(f"now_y_block_period_mx IN ('{to_items_in_clause}')")
     
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`"
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`"
     
     if where_conditions:
         query += "\nWHERE " + "\nAND ".join(where_conditions)
@@ -582,7 +561,8 @@ def group_by_percent_results(by_percent_items: List) -> Dict[str, float]:
 
 
 def build_so_cell_prev_query(y_block_1, x_period_1: str, z_number: int, project_id: str,
-                             dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full') -> str:
+                             dataset_id: str = 'alloc_stage', table_id: str = 'so_cell_raw_full',
+                             columns: Optional[List[str]] = None) -> str:
     """
     Build dynamic query cho SoCell dựa trên PrevYBlock matching với NowYBlock của y_block_1
 
@@ -593,31 +573,12 @@ def build_so_cell_prev_query(y_block_1, x_period_1: str, z_number: int, project_
         project_id: Google Cloud Project ID
         dataset_id: Dataset ID (default: 'alloc_stage')
         table_id: Table ID (default: 'so_cell_raw_full')
+        columns: Các cột cần SELECT (default: None = SELECT *)
 
     Returns:
         SQL query string với WHERE conditions động
     """
-    where_conditions = []
-
-    for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items():
-        value = getattr(y_block_1, now_field, None)
-
-        if value is None:
-            continue
-        if pd.isna(value):
-            continue
-        if isinstance(value, str) and value == '':
-            continue
-
-        if isinstance(value, str):
-            escaped_value = value.replace("'", "\\'")
-            formatted_value = f"'{escaped_value}'"
-        elif isinstance(value, (int, float)):
-            formatted_value = str(value)
-        else:
-            formatted_value = f"'{str(value)}'"
-
-        where_conditions.append(f"{prev_field} = {formatted_value}")
+    where_conditions = _mapping_conditions(y_block_1, PREV_YBLOCK_MAPPING)
 
     if x_period_1 is not None and not pd.isna(x_period_1):
         if isinstance(x_period_1, str):
@@ -630,7 +591,7 @@ def build_so_cell_prev_query(y_block_1, x_period_1: str, z_number: int, project_
         where_conditions.append(f"now_zblock2_alt = '{z_number}'")
 
     table_name = f"{project_id}.{dataset_id}.{table_id}"
-    query = f"SELECT * FROM `{table_name}`"
+    query = f"SELECT {format_select_columns(columns)} FROM `{table_name}`"
 
     if where_conditions:
         query += "\nWHERE " + "\nAND ".join(where_conditions)
@@ -1,6 +1,10 @@
 import copy
-from utils.period_utils import add_period_with_offset
-from services.so_cell_factory import create_socell_for_offset
+import logging
+from typing import List
+from utils.period_utils import add_period_with_offset, add_periods_with_offset
+from services.so_cell_factory import create_socell_for_offset, overlay_socell_for_offset, materialize_so_cells
+
+logger = logging.getLogger(__name__)
 
 
 def calculate_offset(
@@ -32,7 +36,7 @@ def calculate_offset(
     offset_month = int(my_allocation_by_type_item.by_block_by_type)
 
     x_period_2 = add_period_with_offset(x_period_1, offset_month)
-    print(f"[INFO] Offset case: offset={offset_month}, x_period_1={x_period_1}, x_period_2={x_period_2}")
+    logger.info("Offset case: offset=%s, x_period_1=%s, x_period_2=%s", offset_month, x_period_1, x_period_2)
 
     insert_so_cell_offset = create_socell_for_offset(
         y_block_1=y_block_1,
@@ -51,8 +55,67 @@ def calculate_offset(
     )
 
     if success:
-        print(f"[INFO] Offset case: Successfully inserted SoCell with x_period_2={x_period_2}")
+        logger.info("Offset case: Successfully inserted SoCell with x_period_2=%s", x_period_2)
+    else:
+        logger.error("Offset case: Failed to insert SoCell")
+
+    return success
+
+
+def calculate_offset_batch(
+        bq,
+        my_allocation_by_type_item,
+        my_allocation_alt_item,
+        y_block_1_items: List,
+        alloc_data_dataset_name: str,
+        so_cell_table_name: str
+) -> bool:
+    """
+    Batch version của calculate_offset: tính x_period_2 cho tất cả source cells của một
+    offset by_type trong một lần (vectorized), tạo SoCells và insert bằng một batch request.
+
+    Args:
+        bq: BigQueryConnector instance
+        my_allocation_by_type_item: AllocationByType item chứa offset trong by_block_by_type
+        my_allocation_alt_item: AllocationALT item
+        y_block_1_items: List of SoCell instances (YBlock1), XPeriod1/Value1 lấy từ now_np/now_value
+        alloc_data_dataset_name: Dataset name
+        so_cell_table_name: Table name
+
+    Returns:
+        True nếu insert thành công (hoặc không có cell nào), False nếu thất bại
+    """
+    if not y_block_1_items:
+        return True
+
+    offset_month = int(my_allocation_by_type_item.by_block_by_type)
+
+    x_period_1_list = [y_block_1.now_np for y_block_1 in y_block_1_items]
+    x_period_2_list = add_periods_with_offset(x_period_1_list, offset_month)
+    logger.info("Offset case: offset=%s, computed %s x_period_2 values", offset_month, len(x_period_2_list))
+
+    # Overlays trên source cells, chỉ materialize khi insert
+    insert_so_cells_offset = [
+        overlay_socell_for_offset(
+            y_block_1=y_block_1,
+            to_alt=my_allocation_alt_item.to_alt,
+            x_period_2=x_period_2,
+            x_period_1=x_period_1,
+            value_1=y_block_1.now_value,
+            by_type=my_allocation_by_type_item.by_block_by_type
+        )
+        for y_block_1, x_period_1, x_period_2 in zip(y_block_1_items, x_period_1_list, x_period_2_list)
+    ]
+
+    success = bq.insert_rows_batch(
+        dataset_id=alloc_data_dataset_name,
+        table_id=so_cell_table_name,
+        rows_data=materialize_so_cells(insert_so_cells_offset)
+    )
+
+    if success:
+        logger.info("Offset case: Successfully batch inserted %s SoCells", len(insert_so_cells_offset))
     else:
-        print(f"[ERROR] Offset case: Failed to insert SoCell")
+        logger.error("Offset case: Failed to batch insert %s SoCells", len(insert_so_cells_offset))
 
     return success
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class AllocationCheckpoint:
+    """
+    Lưu tiến độ của một lần run_allocate vào file JSON local để có thể resume.
+
+    Đơn vị checkpoint là ALT (z_number) và từng allocation_by_type_item (unit key) bên
+    trong ALT. Mỗi lần mark_* ghi file ngay (atomic replace) nên một
+    run bị lỗi giữa chừng vẫn giữ được các unit đã hoàn thành.
+    """
+
+    def __init__(self, checkpoint_dir: str, run_key: str, resume: bool = False):
+        """
+        Args:
+            checkpoint_dir: Thư mục chứa state files
+            run_key: Định danh của run (ví dụ "100-200-M2501"), mỗi run_key một file
+            resume: True = đọc lại state đã có, False = bắt đầu state mới
+        """
+        self.run_key = run_key
+        self.state_path = os.path.join(checkpoint_dir, f"allocate_{run_key}.json")
+        self.state = {
+            'run_key': run_key,
+            'completed_alts': [],
+            'completed_units': {},
+            'updated_at': None
+        }
+
+        if resume and os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                saved_state = json.load(f)
+            if saved_state.get('run_key') == run_key:
+                self.state = saved_state
+                logger.info("[Checkpoint] Resuming %s: %s ALTs already completed", run_key, len(self.state['completed_alts']))
+        else:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            self._save()
+
+    def is_alt_done(self, z_number) -> bool:
+        return str(z_number) in self.state['completed_alts']
+
+    def mark_alt_done(self, z_number):
+        if not self.is_alt_done(z_number):
+            self.state['completed_alts'].append(str(z_number))
+        self.state['completed_units'].pop(str(z_number), None)
+        self._save()
+
+    def is_unit_done(self, z_number, unit_key: str) -> bool:
+        return unit_key in self.state['completed_units'].get(str(z_number), [])
+
+    def mark_unit_done(self, z_number, unit_key: str):
+        units = self.state['completed_units'].setdefault(str(z_number), [])
+        if unit_key not in units:
+            units.append(unit_key)
+        self._save()
+
+    def reset_units(self, z_number):
+        """Bỏ các unit đã xong của ALT (output của chúng không còn, ví dụ spool parts bị bỏ)."""
+        if self.state['completed_units'].pop(str(z_number), None) is not None:
+            self._save()
+
+    def _save(self):
+        self.state['updated_at'] = datetime.now().isoformat()
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+
+def by_type_unit_key(index: int, allocation_by_type_item) -> str:
+    """
+    Key của một allocation_by_type_item trong checkpoint: vị trí trong list
+    (ORDER BY YNumber DESC) kèm YNumber và ByType để phát hiện config thay đổi.
+    """
+    return f"{index}:{allocation_by_type_item.y_number}:{allocation_by_type_item.by_block_by_type}"
+
@@ -0,0 +1,120 @@
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from app_config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def query_filter_items(bq, project_id: str, to_types: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Query AllocationToItem của các to_types bằng một query (IN clause).
+
+    Returns:
+        Dict to_type -> list TO_Y_BLOCK_ToItem (to_type không có item không có trong dict)
+    """
+    to_type_list = list(dict.fromkeys(to_types))
+    if not to_type_list:
+        return {}
+
+    to_type_str = "', '".join(to_type_list)
+    query_filter_items = f"""
+        SELECT TO_Y_BLOCK_ToType, TO_Y_BLOCK_ToItem
+        FROM `{project_id}.{settings.ALLOCATION_CONFIG_DATASET_NAME}.{settings.ALLOCATION_TO_ITEM_TABLE_NAME}`
+        WHERE TO_Y_BLOCK_ToType IN ('{to_type_str}')
+        """
+    filter_items_df = bq.execute_query(query_filter_items)
+
+    # Group results by TO_Y_BLOCK_ToType
+    to_type_items_map = {}
+    for to_type, to_item in zip(filter_items_df['TO_Y_BLOCK_ToType'].tolist(), filter_items_df['TO_Y_BLOCK_ToItem'].tolist()):
+        to_type_items_map.setdefault(to_type, []).append(to_item)
+    return to_type_items_map
+
+
+class FilterItemCache:
+    """
+    Cache trong process của AllocationToItem theo to_type (to_type -> items), dùng chung cho
+    mọi RepTempBlock và mọi build_report (kể cả các builds chạy đồng thời).
+
+    Cache gắn với config version của AllocationToItem (Config_Upload_at lớn nhất và số rows
+    của table, một query nhỏ mỗi lần get_items): khi version đổi (upload config mới), cache
+    được xoá và các to_types được query lại. Table không có Config_Upload_at thì không cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._items: Dict[str, List[str]] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'uncacheable': 0, 'invalidations': 0}
+
+    def config_version(self, bq, project_id: str) -> Optional[str]:
+        """Version của AllocationToItem (None nếu không xác định được)."""
+        query_version = f"""
+        SELECT MAX(Config_Upload_at) AS config_upload_at, COUNT(*) AS row_count
+        FROM `{project_id}.{settings.ALLOCATION_CONFIG_DATASET_NAME}.{settings.ALLOCATION_TO_ITEM_TABLE_NAME}`
+        """
+        version_df = bq.execute_query(query_version)
+        if len(version_df) == 0:
+            return None
+        config_upload_at = version_df.iloc[0]['config_upload_at']
+        if config_upload_at is None or pd.isna(config_upload_at):
+            return None
+        return f"{config_upload_at}/{version_df.iloc[0]['row_count']}"
+
+    def get_items(self, bq, project_id: str, to_types: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Items của các to_types: từ cache nếu config version không đổi, còn lại query một lần
+        cho mọi to_types chưa có trong cache.
+
+        Returns:
+            Dict to_type -> list items (to_type không có item không có trong dict), như query_filter_items
+        """
+        to_type_list = list(dict.fromkeys(to_types))
+        if not to_type_list:
+            return {}
+
+        version = self.config_version(bq, project_id)
+        if version is None:
+            with self._lock:
+                self.stats['uncacheable'] += 1
+            return query_filter_items(bq, project_id, to_type_list)
+
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.stats['invalidations'] += 1
+                    logger.info("[FilterItemCache] AllocationToItem version %s -> %s, cache cleared", self._version, version)
+                self._version = version
+                self._items = {}
+            missing = [to_type for to_type in to_type_list if to_type not in self._items]
+            found = {to_type: self._items[to_type] for to_type in to_type_list if to_type in self._items}
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(missing)
+
+        if missing:
+            queried = query_filter_items(bq, project_id, missing)
+            # to_type không có item cũng được cache (list rỗng)
+            found.update({to_type: queried.get(to_type, []) for to_type in missing})
+            with self._lock:
+                if version == self._version:
+                    self._items.update({to_type: found[to_type] for to_type in missing})
+
+        logger.info("[FilterItemCache] %s to_types (%s queried), version %s", len(to_type_list), len(missing), version)
+        return {to_type: list(found[to_type]) for to_type in to_type_list if found[to_type]}
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._items = {}
+
+    def log_summary(self):
+        logger.info("[FilterItemCache] Filter item cache stats: %s", self.stats)
+
+
+# Cache dùng chung trong process
+FILTER_ITEM_CACHE = FilterItemCache()
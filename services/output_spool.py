@@ -0,0 +1,323 @@
+import glob
+import logging
+import os
+import re
+import typing
+from dataclasses import asdict, fields
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from models.so_cell_model import SoCell
+from services.so_cell_factory import materialize_so_cells
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.path.join(".alloc_state", "spool")
+# Load khi số rows đã spool (chưa load) đạt ngưỡng này, phần còn lại được load cuối run
+DEFAULT_SPOOL_FLUSH_ROWS = 1_000_000
+
+# Thư mục con của spool: parts đã load (giữ lại để inspect / replay) và parts bỏ lại của run cũ
+LOADED_DIR = "loaded"
+ABANDONED_DIR = "abandoned"
+
+# Tag ALT đang xử lý (start_alt) trong tên part file: part-<ts>-<pid>-<seq>-z=<ZNumber>.parquet
+_PART_ALT_PATTERN = re.compile(r'-z=([0-9A-Za-z_.-]+)\.parquet$')
+
+
+def _partition_value(value) -> str:
+    """Giá trị partition (ALT / period) -> tên thư mục an toàn."""
+    if value is None:
+        return "__null__"
+    return re.sub(r'[^0-9A-Za-z_.-]', '-', str(value))
+
+
+def _arrow_type(annotation):
+    import pyarrow as pa
+
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    field_type = args[0] if args else annotation
+    if field_type is float:
+        return pa.float64()
+    if field_type is int:
+        return pa.int64()
+    return pa.string()
+
+
+def _coerce_column(values: list, arrow_type) -> list:
+    """Chuẩn hoá giá trị theo kiểu cột (giống convert_decimals của BigQueryConnector.insert_rows)."""
+    import pyarrow as pa
+
+    if arrow_type == pa.float64():
+        return [None if value is None or value != value else round(float(value), 9) for value in values]
+    if arrow_type == pa.int64():
+        return [None if value is None or value != value else int(value) for value in values]
+    return [None if value is None else (value.isoformat() if isinstance(value, datetime) else str(value))
+            for value in values]
+
+
+class OutputSpool:
+    """
+    Wrapper của connector cho output table (so_cell_raw_full): các insert_row / insert_rows /
+    insert_rows_batch vào output table được ghi vào Parquet files local, partition theo ALT
+    (now_zblock2_alt) và period (now_np):
+
+        <spool_dir>/<run_key>/alt=<ALT>/period=<now_np>/part-<seq>.parquet
+
+    rồi được load vào table bằng một load job duy nhất (flush: gộp các parts thành một file).
+    Ghi output không còn là các streaming inserts đồng bộ trên critical path; parts đã load
+    được chuyển vào thư mục loaded/.
+
+    Parts ghi giữa start_alt(z_number) và complete_alt(z_number) được tag theo ALT đang xử lý
+    và chỉ được load sau complete_alt: output của một ALT chưa xong (lỗi giữa chừng) không bao
+    giờ nằm trong table, và khi resume các parts đó được chuyển vào abandoned/ (abandoned_alts)
+    để ALT được tính lại từ đầu. Parts ghi ngoài start_alt / complete_alt được load ngay.
+
+    Số load jobs: với flush_on_read=True (default), query đầu tiên đọc output table sau khi một
+    ALT xong (thường là Step 70 của ALT kế tiếp) load output của các ALTs đã xong, để ALTs sau
+    đọc được output của ALTs trước như khi insert trực tiếp; tức là tối đa một load job mỗi ALT
+    có output. Các queries trong cùng ALT (Step 90 / 160) không load (và không thấy output đang
+    spool của chính ALT đó). Ngoài ra complete_alt load khi số rows đã xong đạt flush_rows, và
+    caller gọi flush() cuối run. Các method khác được chuyển thẳng tới connector gốc.
+    """
+
+    def __init__(self, bq, run_key: str, dataset_id: str, table_id: str, spool_dir: str = DEFAULT_SPOOL_DIR,
+                 flush_rows: Optional[int] = DEFAULT_SPOOL_FLUSH_ROWS, flush_on_read: bool = True,
+                 resume: bool = False, completed_alts: Optional[Iterable] = None):
+        """
+        Args:
+            bq: Connector gốc (cần load_parquet_file)
+            run_key: Định danh run (thư mục spool của run)
+            dataset_id: Dataset của output table
+            table_id: Output table
+            spool_dir: Thư mục gốc của spool
+            flush_rows: Load khi số rows (của các ALTs đã xong) chưa load đạt ngưỡng này
+                (None = chỉ load khi đọc output table hoặc khi gọi flush())
+            flush_on_read: Load output của các ALTs đã xong trước các queries đọc output table
+            resume: True = parts chưa load của lần chạy trước (cùng run_key) thuộc các ALTs trong
+                completed_alts (hoặc không tag ALT) được giữ và load cùng run này, parts của ALTs
+                khác được chuyển vào abandoned/; False = chuyển tất cả vào abandoned/
+            completed_alts: ZNumbers đã xong theo checkpoint của run (dùng khi resume)
+        """
+        import pyarrow as pa
+
+        self.bq = bq
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+        self.flush_rows = flush_rows
+        self.flush_on_read = flush_on_read
+        self.run_dir = os.path.join(spool_dir, _partition_value(run_key))
+        self.schema = pa.schema([(f.name, _arrow_type(f.type)) for f in fields(SoCell)])
+        self._sequence = 0
+        # Rows chưa load theo ALT tag (None = không tag) và các ALTs đã xong
+        self._pending_rows_by_alt: Dict[Optional[str], int] = {}
+        self._current_alt: Optional[str] = None
+        self._completed_alts = {_partition_value(z_number) for z_number in completed_alts or []}
+        self.abandoned_alts: List[str] = []
+        self.stats = {'rows_spooled': 0, 'parts_written': 0, 'loads': 0, 'rows_loaded': 0, 'read_flushes': 0}
+
+        leftover = self.pending_parts()
+        abandoned = [path for path in leftover if not resume or not self._is_loadable(path)]
+        if abandoned:
+            self.abandoned_alts = sorted({self._part_alt(path) for path in abandoned} - {None})
+            abandoned_dir = os.path.join(self.run_dir, ABANDONED_DIR, datetime.now().strftime('%Y%m%d%H%M%S'))
+            self._move_parts(abandoned, abandoned_dir)
+            logger.warning("[OutputSpool] Moved %s unloaded parts of a previous run (ALTs %s) to %s",
+                           len(abandoned), self.abandoned_alts, abandoned_dir)
+        kept = [path for path in leftover if path not in abandoned]
+        if kept:
+            for path in kept:
+                self._add_pending(self._part_alt(path), self._num_rows(path))
+            logger.info("[OutputSpool] Resuming with %s pending parts (%s rows) in %s",
+                        len(kept), self.pending_rows, self.run_dir)
+
+    def __getattr__(self, name):
+        return getattr(self.bq, name)
+
+    def _is_output_table(self, dataset_id, table_id) -> bool:
+        return dataset_id == self.dataset_id and table_id == self.table_id
+
+    @staticmethod
+    def _num_rows(path: str) -> int:
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+
+    @property
+    def pending_rows(self) -> int:
+        """Số rows chưa load (gồm cả rows của ALT đang xử lý)."""
+        return sum(self._pending_rows_by_alt.values())
+
+    @property
+    def loadable_rows(self) -> int:
+        """Số rows chưa load của các ALTs đã xong (và rows không tag ALT)."""
+        return sum(rows for alt, rows in self._pending_rows_by_alt.items()
+                   if alt is None or alt in self._completed_alts)
+
+    def _add_pending(self, alt: Optional[str], num_rows: int):
+        self._pending_rows_by_alt[alt] = self._pending_rows_by_alt.get(alt, 0) + num_rows
+
+    @staticmethod
+    def _part_alt(path: str) -> Optional[str]:
+        match = _PART_ALT_PATTERN.search(os.path.basename(path))
+        return match.group(1) if match else None
+
+    def _is_loadable(self, path: str) -> bool:
+        alt = self._part_alt(path)
+        return alt is None or alt in self._completed_alts
+
+    def pending_parts(self) -> List[str]:
+        """Các part files chưa load (theo thứ tự ghi)."""
+        parts = glob.glob(os.path.join(self.run_dir, "alt=*", "period=*", "part-*.parquet"))
+        return sorted(parts, key=os.path.basename)
+
+    def start_alt(self, z_number):
+        """Các parts ghi từ đây được tag theo ALT z_number (chỉ load sau complete_alt)."""
+        self._current_alt = _partition_value(z_number)
+
+    def complete_alt(self, z_number) -> bool:
+        """
+        Đánh dấu ALT z_number đã xong (sau checkpoint): parts của ALT được phép load.
+
+        Returns:
+            False nếu load theo flush_rows thất bại (parts được giữ và load ở lần flush sau)
+        """
+        alt = _partition_value(z_number)
+        self._completed_alts.add(alt)
+        if self._current_alt == alt:
+            self._current_alt = None
+        if self.flush_rows is not None and self.loadable_rows >= self.flush_rows:
+            return self.flush()
+        return True
+
+    def _move_parts(self, parts: List[str], target_dir: str):
+        for path in parts:
+            relative = os.path.relpath(path, self.run_dir)
+            destination = os.path.join(target_dir, relative)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(path, destination)
+
+    def _next_part_name(self) -> str:
+        self._sequence += 1
+        alt_tag = f"-z={self._current_alt}" if self._current_alt is not None else ""
+        return f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{self._sequence:06d}{alt_tag}.parquet"
+
+    def spool(self, rows_data: List) -> bool:
+        """
+        Ghi rows (dicts, dataclass instances hoặc SoCellOverlay) vào Parquet parts theo (ALT, period).
+
+        Returns:
+            True nếu ghi thành công
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not rows_data:
+            return True
+        rows = [asdict(row) if hasattr(row, '__dataclass_fields__') else row
+                for row in materialize_so_cells(rows_data)]
+
+        partitions: Dict[tuple, List[dict]] = {}
+        for row in rows:
+            partitions.setdefault((row.get('now_zblock2_alt'), row.get('now_np')), []).append(row)
+
+        try:
+            for (alt, period), partition_rows in partitions.items():
+                columns = [
+                    pa.array(_coerce_column([row.get(field.name) for row in partition_rows], field.type), type=field.type)
+                    for field in self.schema
+                ]
+                partition_dir = os.path.join(self.run_dir, f"alt={_partition_value(alt)}", f"period={_partition_value(period)}")
+                os.makedirs(partition_dir, exist_ok=True)
+                path = os.path.join(partition_dir, self._next_part_name())
+                tmp_path = f"{path}.tmp"
+                pq.write_table(pa.Table.from_arrays(columns, schema=self.schema), tmp_path)
+                os.replace(tmp_path, path)
+                self.stats['parts_written'] += 1
+        except Exception as e:
+            logger.error("[OutputSpool] Failed to spool %s rows: %s", len(rows), e)
+            return False
+
+        self._add_pending(self._current_alt, len(rows))
+        self.stats['rows_spooled'] += len(rows)
+        if self.flush_rows is not None and self.loadable_rows >= self.flush_rows:
+            return self.flush()
+        return True
+
+    def flush(self) -> bool:
+        """
+        Gộp các parts chưa load của các ALTs đã xong thành một Parquet file và load vào output
+        table bằng một load job. Parts của ALT chưa xong được giữ lại.
+
+        Returns:
+            True nếu load thành công (hoặc không có gì để load); parts giữ nguyên nếu thất bại
+        """
+        import pyarrow.parquet as pq
+
+        parts = [path for path in self.pending_parts() if self._is_loadable(path)]
+        if not parts:
+            return True
+
+        load_path = os.path.join(self.run_dir, f"load-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}.parquet")
+        num_rows = 0
+        with pq.ParquetWriter(load_path, self.schema) as writer:
+            for path in parts:
+                table = pq.read_table(path, schema=self.schema)
+                num_rows += table.num_rows
+                writer.write_table(table)
+
+        logger.info("[OutputSpool] Loading %s rows from %s parts into %s.%s", num_rows, len(parts), self.dataset_id, self.table_id)
+        success = self.bq.load_parquet_file(self.dataset_id, self.table_id, load_path)
+        os.remove(load_path)
+        if not success:
+            logger.error("[OutputSpool] Load failed, %s parts kept in %s", len(parts), self.run_dir)
+            return False
+
+        self._move_parts(parts, os.path.join(self.run_dir, LOADED_DIR))
+        for alt in {self._part_alt(path) for path in parts}:
+            self._pending_rows_by_alt.pop(alt, None)
+        self.stats['loads'] += 1
+        self.stats['rows_loaded'] += num_rows
+        return True
+
+    def _flush_before_read(self, query: str):
+        if self.flush_on_read and self.loadable_rows and f"{self.dataset_id}.{self.table_id}" in query:
+            self.stats['read_flushes'] += 1
+            if not self.flush():
+                raise RuntimeError(f"Failed to load spooled output before reading {self.dataset_id}.{self.table_id}")
+
+    def execute_query(self, query):
+        self._flush_before_read(query)
+        return self.bq.execute_query(query)
+
+    def execute_query_iter(self, query, page_size=10000):
+        self._flush_before_read(query)
+        return self.bq.execute_query_iter(query, page_size=page_size)
+
+    def load_parquet_file(self, dataset_id, table_id, file_path):
+        """Parquet file vào output table được spool như insert (load cùng parts của ALT)."""
+        import pyarrow.parquet as pq
+
+        if not self._is_output_table(dataset_id, table_id):
+            return self.bq.load_parquet_file(dataset_id, table_id, file_path)
+        for batch in pq.ParquetFile(file_path).iter_batches():
+            if not self.spool(batch.to_pylist()):
+                return False
+        return True
+
+    def insert_row(self, dataset_id, table_id, row_data):
+        if self._is_output_table(dataset_id, table_id):
+            return self.spool([row_data])
+        return self.bq.insert_row(dataset_id, table_id, row_data)
+
+    def insert_rows(self, dataset_id, table_id, rows_data):
+        if self._is_output_table(dataset_id, table_id):
+            return self.spool(rows_data)
+        return self.bq.insert_rows(dataset_id, table_id, rows_data)
+
+    def insert_rows_batch(self, dataset_id, table_id, rows_data):
+        if self._is_output_table(dataset_id, table_id):
+            return self.spool(rows_data)
+        return self.bq.insert_rows_batch(dataset_id, table_id, rows_data)
+
+    def log_summary(self):
+        logger.info("[OutputSpool] Spool %s: %s rows pending, stats: %s", self.run_dir, self.pending_rows, self.stats)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import fields
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from queries.query_builder import build_so_cell_batch_conditions, build_so_cell_by_kr_conditions
+from services.so_cell_store import source_conditions, by_kr_predicates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_PLAN_DIR = os.path.join(".alloc_state", "plans")
+# Tăng khi format của plan (hoặc cách build conditions) thay đổi để bỏ các plans cũ
+QUERY_PLAN_FORMAT_VERSION = 1
+
+
+def _json_value(value):
+    """numpy scalars -> Python scalars để ghi JSON (giữ int/float/str như khi build query)."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _item_values(item) -> list:
+    """Giá trị của mọi field của một config item (dataclass), dùng cho fingerprint của plan."""
+    return [_json_value(getattr(item, field.name)) for field in fields(item)]
+
+
+def config_version(*item_lists) -> Optional[str]:
+    """
+    Version của config snapshot: Config_Upload_at lớn nhất của các config items.
+
+    Returns:
+        Version string, hoặc None nếu có item không có Config_Upload_at (không cache được)
+    """
+    values = []
+    for items in item_lists:
+        for item in items:
+            value = getattr(item, 'config_upload_at', None)
+            if value is None or pd.isna(value):
+                return None
+            values.append(_json_value(value))
+    if not values:
+        return None
+    try:
+        return str(max(values))
+    except TypeError:
+        return max(str(value) for value in values)
+
+
+def compile_alt_query_plan(allocation_by_type_items: List, allocation_by_kr_map: Dict) -> Dict:
+    """
+    Compile các phần phụ thuộc config của Step 70 và Step 160 cho một ALT:
+
+    - source_or_conditions: OR conditions của build_so_cell_batch_query
+    - source_conditions: điều kiện lọc source slice của SoCellStore
+    - by_kr: by_type -> where_conditions (build_so_cell_by_kr_batch_query, không gồm to_items)
+      và predicates (slice của SoCellStore)
+
+    Args:
+        allocation_by_type_items: AllocationByType items (đã lọc theo work unit)
+        allocation_by_kr_map: Map (from_type, to_type, by_type) -> AllocationByKR (Step 55)
+
+    Returns:
+        Plan dict (JSON-serializable)
+    """
+    return {
+        'source_or_conditions': build_so_cell_batch_conditions(allocation_by_type_items),
+        'source_conditions': [
+            {column: _json_value(value) for column, value in condition.items()}
+            for condition in source_conditions(allocation_by_type_items)
+        ],
+        'by_kr': {
+            str(by_type): {
+                'where_conditions': build_so_cell_by_kr_conditions(kr_item),
+                'predicates': {column: _json_value(value) for column, value in by_kr_predicates(kr_item).items()}
+            }
+            for (_, _, by_type), kr_item in allocation_by_kr_map.items()
+        }
+    }
+
+
+class QueryPlanCache:
+    """
+    Cache trên disk (JSON, một file mỗi plan) các query plans đã compile của Step 70 / 160,
+    theo (z_number, config version).
+
+    Config version là Config_Upload_at lớn nhất của các AllocationByType / AllocationByKR items;
+    key còn gồm fingerprint (hash) giá trị mọi field của các items được chọn (kèm index) và của
+    các AllocationByKR items, nên item bị sửa mà không đổi Config_Upload_at, thêm/xoá item hoặc
+    work unit khác nhau đều có plan riêng. Chạy lại với config không đổi thì không cần walk các
+    field mappings cho từng item.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_QUERY_PLAN_DIR):
+        """
+        Args:
+            cache_dir: Thư mục chứa plan files
+        """
+        self.cache_dir = cache_dir
+        self.stats = {'hits': 0, 'misses': 0, 'uncacheable': 0}
+
+    def plan_key(self, z_number, version: str, indexed_by_type_items: List, allocation_by_kr_map: Dict,
+                 from_type, to_type) -> str:
+        fingerprint = json.dumps([
+            QUERY_PLAN_FORMAT_VERSION,
+            str(from_type),
+            str(to_type),
+            [[index, _item_values(item)] for index, item in indexed_by_type_items],
+            sorted(json.dumps(_item_values(kr_item), default=str) for kr_item in allocation_by_kr_map.values())
+        ], default=str)
+        digest = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+        return re.sub(r'[^0-9A-Za-z_.-]', '-', f"{z_number}_{version}_{digest}")
+
+    def get_or_compile(self, z_number, from_type, to_type, indexed_by_type_items: List,
+                       allocation_by_kr_map: Dict) -> Dict:
+        """
+        Lấy plan của ALT từ cache, hoặc compile (và lưu nếu config có version).
+
+        Args:
+            z_number: ZNumber của ALT
+            from_type: from_type của ALT
+            to_type: to_type của ALT
+            indexed_by_type_items: List (index, AllocationByType) được xử lý
+            allocation_by_kr_map: Map (from_type, to_type, by_type) -> AllocationByKR (Step 55)
+
+        Returns:
+            Plan dict (xem compile_alt_query_plan)
+        """
+        allocation_by_type_items = [item for _, item in indexed_by_type_items]
+        version = config_version(allocation_by_type_items, allocation_by_kr_map.values())
+        if version is None:
+            self.stats['uncacheable'] += 1
+            return compile_alt_query_plan(allocation_by_type_items, allocation_by_kr_map)
+
+        plan_key = self.plan_key(z_number, version, indexed_by_type_items, allocation_by_kr_map, from_type, to_type)
+        plan_path = os.path.join(self.cache_dir, f"plan_{plan_key}.json")
+        if os.path.exists(plan_path):
+            try:
+                with open(plan_path, 'r') as f:
+                    plan = json.load(f)
+                if plan.get('plan_key') == plan_key:
+                    self.stats['hits'] += 1
+                    logger.info("[QueryPlanCache] Using cached plan %s", plan_key)
+                    return plan
+            except (OSError, ValueError) as e:
+                logger.warning("[QueryPlanCache] Failed to read plan %s: %s", plan_path, e)
+
+        self.stats['misses'] += 1
+        plan = compile_alt_query_plan(allocation_by_type_items, allocation_by_kr_map)
+        plan.update({
+            'plan_key': plan_key,
+            'z_number': str(z_number),
+            'config_version': version,
+            'compiled_at': datetime.now().isoformat()
+        })
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{plan_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(plan, f, indent=2)
+        os.replace(tmp_path, plan_path)
+        logger.info("[QueryPlanCache] Compiled plan %s", plan_key)
+        return plan
+
+    def log_summary(self):
+        logger.info("[QueryPlanCache] Plan cache stats (%s): %s", self.cache_dir, self.stats)
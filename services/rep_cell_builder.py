@@ -0,0 +1,68 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config.field_mappings import REPORT_FILTER_MAPPING
+from models.report_models import REP_CELL_SCHEMA
+
+# Thứ tự values trong period vectors của một filter combination: Step 190 Plan, Step 200 ActualForecast
+REP_CELL_VALUE_TYPES = ('Plan', 'ActualForecast')
+
+_REP_CELL_FIELD_COLUMNS = {field: column for column, field in REP_CELL_SCHEMA.column_to_field.items()}
+
+
+def build_rep_cell_frame(
+        base_values: Dict[str, object],
+        y_block_values: Dict[str, object],
+        filter_fields: List[str],
+        filter_items: List[Dict[str, str]],
+        block_so_cell_data: Dict[tuple, np.ndarray],
+        x_period_list: List[str]
+) -> pd.DataFrame:
+    """
+    RepCells của một RepTempBlock dạng cột: filter items × periods (YNumber3 = L) ×
+    REP_CELL_VALUE_TYPES, thay vì tạo hai RepCell và setattr KR / filter fields cho mỗi
+    (filter item, L). Rows theo thứ tự filter item, L, Plan rồi ActualForecast.
+
+    Args:
+        base_values: RepCell field -> value chung của block (z_number, y_number1, y_number2,
+            my_rep_page, my_rep_temp_block)
+        y_block_values: KR fields (now_y_block_*) -> value, chung cho mọi filter item
+        filter_fields: Filter names (NOW_Y_BLOCK_*) theo thứ tự key của block_so_cell_data
+        filter_items: Filter combinations ([{}] nếu block không có filter)
+        block_so_cell_data: Combination key -> array (len(REP_CELL_VALUE_TYPES), len(x_period_list)),
+            NaN nếu không có SOCell (xem query_so_cell_block_data)
+        x_period_list: Periods theo L
+
+    Returns:
+        DataFrame với columns REP_CELL_SCHEMA.columns (BigQuery column names)
+    """
+    item_count = len(filter_items)
+    period_count = len(x_period_list)
+    type_count = len(REP_CELL_VALUE_TYPES)
+    rows_per_item = period_count * type_count
+
+    missing = np.full((type_count, period_count), np.nan)
+    if filter_items:
+        values = np.stack([
+            block_so_cell_data.get(tuple(item[field] for field in filter_fields), missing) for item in filter_items
+        ])
+    else:
+        values = np.empty((0, type_count, period_count))
+
+    constants = dict(base_values)
+    constants.update(y_block_values)
+    columns = {column: constants.get(field) for column, field in REP_CELL_SCHEMA.column_to_field.items()}
+    columns.update({
+        'YNumber3': np.tile(np.repeat(np.arange(period_count), type_count), item_count),
+        'Z_BLOCK_TYPE': np.tile(np.array(REP_CELL_VALUE_TYPES, dtype=object), item_count * period_count),
+        'NOW_NP': np.tile(np.repeat(np.array(x_period_list, dtype=object), type_count), item_count),
+        # (item, type, L) -> (item, L, type)
+        'NOW_VALUE': values.transpose(0, 2, 1).reshape(-1)
+    })
+    for filter_field in filter_fields:
+        column = _REP_CELL_FIELD_COLUMNS[REPORT_FILTER_MAPPING.translate(filter_field)]
+        columns[column] = np.repeat(np.array([item[filter_field] for item in filter_items], dtype=object), rows_per_item)
+
+    return pd.DataFrame(columns, index=range(item_count * rows_per_item), columns=list(REP_CELL_SCHEMA.columns))
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Counters của mỗi record (z_number, by_type, step)
+METRIC_FIELDS = ['calls', 'wall_sec', 'bq_sec', 'bq_calls', 'rows_read', 'keys_grouped', 'cells_emitted', 'rows_written']
+
+
+class RunMetrics:
+    """
+    Timers và counters cho một lần run_allocate, aggregate theo (ALT, allocation_by_type_item, step).
+
+    - step(): đo wall time của một step. Step lồng nhau được tính exclusive (thời gian của step
+      con không cộng vào step cha), nên tổng wall_sec các steps = thời gian đã đo.
+    - BigQuery time (query + insert) và rows_read/rows_written được ghi bởi MeteredBigQuery vào
+      step hiện tại; python_sec = wall_sec - bq_sec.
+    - add(): cộng các counters khác (keys_grouped, cells_emitted) vào step hiện tại.
+
+    RunMetrics(enabled=False) là no-op, dùng làm default cho các hàm được gọi không có metrics.
+    """
+
+    def __init__(self, run_key: Optional[str] = None, enabled: bool = True):
+        self.run_key = run_key
+        self.enabled = enabled
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        self.records: Dict[tuple, Dict] = {}
+        self._z_number = None
+        self._by_type = None
+        # Stack các step đang chạy: [step, record key, thời điểm bắt đầu đoạn đang đo]
+        self._stack: List[list] = []
+
+    def _record(self, key: tuple) -> Dict:
+        record = self.records.get(key)
+        if record is None:
+            record = dict.fromkeys(METRIC_FIELDS, 0)
+            self.records[key] = record
+        return record
+
+    def _current_key(self) -> tuple:
+        step = self._stack[-1][0] if self._stack else 'Other'
+        return self._z_number, self._by_type, step
+
+    @contextmanager
+    def alt(self, z_number):
+        """Scope ALT: các steps bên trong được ghi cho z_number."""
+        previous = self._z_number
+        self._z_number = z_number
+        try:
+            yield
+        finally:
+            self._z_number = previous
+
+    @contextmanager
+    def by_type(self, unit_key: Optional[str]):
+        """Scope allocation_by_type_item (unit key, xem by_type_unit_key)."""
+        previous = self._by_type
+        self._by_type = unit_key
+        try:
+            yield
+        finally:
+            self._by_type = previous
+
+    @contextmanager
+    def step(self, step: str):
+        """Đo exclusive wall time của step và đếm số lần gọi."""
+        if not self.enabled:
+            yield
+            return
+
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self._record(parent[1])['wall_sec'] += now - parent[2]
+        key = (self._z_number, self._by_type, step)
+        self._record(key)['calls'] += 1
+        self._stack.append([step, key, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, key, started = self._stack.pop()
+            self._record(key)['wall_sec'] += now - started
+            if self._stack:
+                self._stack[-1][2] = now
+
+    def add(self, **counters):
+        """Cộng counters (keys_grouped, cells_emitted, ...) vào step hiện tại."""
+        if not self.enabled:
+            return
+        record = self._record(self._current_key())
+        for name, value in counters.items():
+            record[name] += value
+
+    def record_bq(self, elapsed_sec: float, rows_read: int = 0, rows_written: int = 0):
+        """Ghi một BigQuery call (query hoặc insert) vào step hiện tại."""
+        if not self.enabled:
+            return
+        record = self._record(self._current_key())
+        record['bq_sec'] += elapsed_sec
+        record['bq_calls'] += 1
+        record['rows_read'] += rows_read
+        record['rows_written'] += rows_written
+
+    def _totals(self, group_by) -> Dict:
+        totals = {}
+        for key, record in self.records.items():
+            total = totals.setdefault(group_by(key), dict.fromkeys(METRIC_FIELDS, 0))
+            for name in METRIC_FIELDS:
+                total[name] += record[name]
+        for total in totals.values():
+            _finalize(total)
+        return totals
+
+    def to_dict(self) -> Dict:
+        """
+        Summary machine-readable: records chi tiết theo (z_number, by_type, step) và totals theo step / ALT.
+        """
+        records = []
+        for (z_number, by_type, step), record in self.records.items():
+            records.append(_finalize({'z_number': z_number, 'by_type': by_type, 'step': step, **record}))
+        return {
+            'run_key': self.run_key,
+            'started_at': self.started_at,
+            'duration_sec': round(time.perf_counter() - self._started, 3),
+            'records': records,
+            'totals_by_step': self._totals(lambda key: key[2]),
+            'totals_by_alt': {str(z_number): total for z_number, total in self._totals(lambda key: key[0]).items()}
+        }
+
+    def write_json(self, path: str) -> str:
+        """Ghi summary ra file JSON, trả về path."""
+        metrics_dir = os.path.dirname(path)
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+    def format_table(self) -> str:
+        """
+        Format totals theo step thành bảng text (thứ tự step theo lần xuất hiện đầu tiên).
+        """
+        headers = ['Step', 'Calls', 'Wall s', 'BQ s', 'Python s', 'BQ calls', 'Rows read',
+                   'Keys', 'Cells emitted', 'Rows written']
+        totals = self._totals(lambda key: key[2])
+        grand_total = dict.fromkeys(METRIC_FIELDS, 0)
+        rows = []
+        for step, total in totals.items():
+            rows.append(_format_row(step, total))
+            for name in METRIC_FIELDS:
+                grand_total[name] += total[name]
+        rows.append(_format_row('TOTAL', _finalize(grand_total)))
+
+        widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(len(headers))]
+        lines = [" | ".join(headers[i].rjust(widths[i]) for i in range(len(headers)))]
+        lines.append("-+-".join("-" * width for width in widths))
+        for row in rows:
+            lines.append(" | ".join(row[i].rjust(widths[i]) for i in range(len(headers))))
+        return "\n".join(lines)
+
+
+def _finalize(record: Dict) -> Dict:
+    record['wall_sec'] = round(record['wall_sec'], 6)
+    record['bq_sec'] = round(record['bq_sec'], 6)
+    record['python_sec'] = round(max(record['wall_sec'] - record['bq_sec'], 0.0), 6)
+    return record
+
+
+def _format_row(step: str, total: Dict) -> List[str]:
+    return [
+        step, str(total['calls']), f"{total['wall_sec']:.3f}", f"{total['bq_sec']:.3f}", f"{total['python_sec']:.3f}",
+        str(total['bq_calls']), str(total['rows_read']), str(total['keys_grouped']),
+        str(total['cells_emitted']), str(total['rows_written'])
+    ]
+
+
+NULL_METRICS = RunMetrics(enabled=False)
+
+
+class MeteredBigQuery:
+    """
+    Wrapper của BigQueryConnector: đo thời gian và số rows của các query/insert calls và ghi vào
+    step hiện tại của RunMetrics. Các method khác được chuyển thẳng tới connector gốc.
+    """
+
+    def __init__(self, bq, metrics: RunMetrics):
+        self.bq = bq
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.bq, name)
+
+    def execute_query(self, query):
+        started = time.perf_counter()
+        df = self.bq.execute_query(query)
+        self.metrics.record_bq(time.perf_counter() - started, rows_read=len(df))
+        return df
+
+    def execute_query_iter(self, query, page_size=10000):
+        pages = self.bq.execute_query_iter(query, page_size=page_size)
+        while True:
+            started = time.perf_counter()
+            df = next(pages, None)
+            if df is None:
+                return
+            self.metrics.record_bq(time.perf_counter() - started, rows_read=len(df))
+            yield df
+
+    def insert_row(self, dataset_id, table_id, row_data):
+        started = time.perf_counter()
+        success = self.bq.insert_row(dataset_id, table_id, row_data)
+        self.metrics.record_bq(time.perf_counter() - started, rows_written=1 if success else 0)
+        return success
+
+    def insert_rows(self, dataset_id, table_id, rows_data):
+        started = time.perf_counter()
+        success = self.bq.insert_rows(dataset_id, table_id, rows_data)
+        self.metrics.record_bq(time.perf_counter() - started, rows_written=len(rows_data) if success else 0)
+        return success
+
+    def insert_rows_batch(self, dataset_id, table_id, rows_data):
+        started = time.perf_counter()
+        success = self.bq.insert_rows_batch(dataset_id, table_id, rows_data)
+        self.metrics.record_bq(time.perf_counter() - started, rows_written=len(rows_data) if success else 0)
+        return success
+
+    def load_parquet_file(self, dataset_id, table_id, file_path):
+        import pyarrow.parquet as pq
+
+        num_rows = pq.ParquetFile(file_path).metadata.num_rows
+        started = time.perf_counter()
+        success = self.bq.load_parquet_file(dataset_id, table_id, file_path)
+        self.metrics.record_bq(time.perf_counter() - started, rows_written=num_rows if success else 0)
+        return success
+
+    def load_dataframe(self, dataset_id, table_id, df):
+        started = time.perf_counter()
+        success = self.bq.load_dataframe(dataset_id, table_id, df)
+        self.metrics.record_bq(time.perf_counter() - started, rows_written=len(df) if success else 0)
+        return success
@@ -1,6 +1,142 @@
-import copy
+from dataclasses import fields
+from typing import List, Tuple
+
+from config.field_mappings import FieldMapping, PREV_YBLOCK_FIELD_MAPPING, register_field_mapping
 from models.so_cell_model import SoCell
 
+# Field mappings (source SoCell field -> output SoCell field) của các output SoCells.
+# NowYBlock của output = NowYBlock của source (YBlock2 là copy của YBlock1 chỉ khác now_np),
+# PrevYBlock của output = NowYBlock của source.
+YBLOCKS_NOW_MAPPING = register_field_mapping('yblocks_output_now', {
+    field: field for field in PREV_YBLOCK_FIELD_MAPPING if field != 'now_y_block_kr_item_name'
+})
+YBLOCKS_PREV_MAPPING = register_field_mapping('yblocks_output_prev', {
+    **{now_field: prev_field for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items()
+       if now_field not in ('now_y_block_period_ppc', 'now_y_block_period_np')},
+    'now_zblock2_alt': 'prev_zblock2_alt'
+})
+OFFSET_NOW_MAPPING = register_field_mapping('offset_output_now', {
+    field: field for field in PREV_YBLOCK_FIELD_MAPPING
+    if field not in ('now_y_block_fnf_fnf', 'now_y_block_kr_item_name')
+})
+OFFSET_PREV_MAPPING = register_field_mapping('offset_output_prev', {
+    now_field: prev_field for now_field, prev_field in PREV_YBLOCK_FIELD_MAPPING.items()
+    if now_field not in ('now_y_block_fnf_fnf', 'now_y_block_kr_item_name', 'now_y_block_period_ppc')
+})
+
+_SOCELL_DEFAULTS = {f.name: f.default for f in fields(SoCell)}
+
+
+class SoCellOverlayLayout:
+    """
+    Layout của một loại output SoCell: các field copy từ source SoCell (theo field mappings,
+    đọc bằng attrgetter build sẵn) và các field được override (theo thứ tự của overrides tuple).
+    Field còn lại là default của SoCell.
+    """
+
+    def __init__(self, mappings: List[FieldMapping], overridden_fields: Tuple[str, ...]):
+        """
+        Args:
+            mappings: Field mappings source field -> output field
+            overridden_fields: Các output fields lấy từ overrides tuple của overlay
+        """
+        self.mappings = mappings
+        self.overridden_fields = tuple(overridden_fields)
+
+    def materialize(self, source, overrides: tuple) -> dict:
+        """Row đầy đủ (dict theo SoCell field names, như asdict của SoCell tương ứng)."""
+        row = dict(_SOCELL_DEFAULTS)
+        for mapping in self.mappings:
+            row.update(zip(mapping.target_fields, mapping.values_of(source)))
+        row.update(zip(self.overridden_fields, overrides))
+        return row
+
+
+YBLOCKS_OUTPUT_LAYOUT = SoCellOverlayLayout(
+    [YBLOCKS_NOW_MAPPING, YBLOCKS_PREV_MAPPING],
+    ('now_np', 'now_value', 'prev_y_block_period_np', 'prev_value', 'by_block_bytype', 'by_block_bypercent',
+     'now_zblock2_alt', 'prev_np')
+)
+OFFSET_OUTPUT_LAYOUT = SoCellOverlayLayout(
+    [OFFSET_NOW_MAPPING, OFFSET_PREV_MAPPING],
+    ('now_zblock2_alt', 'now_np', 'now_value', 'prev_ppc', 'prev_value', 'by_block_bytype')
+)
+
+
+class SoCellOverlay:
+    """
+    Output SoCell dạng overlay: tham chiếu source SoCell (YBlock1) và chỉ giữ các field được
+    override (now_np, values, by_type/percent, ALT, ...), thay vì copy ~90 fields vào một
+    SoCell mới cho mỗi (source cell, to_item). Row đầy đủ chỉ được materialize khi serialize
+    (to_dict / materialize_so_cells trước khi insert).
+    """
+    __slots__ = ('layout', 'source', 'overrides')
+
+    def __init__(self, layout: SoCellOverlayLayout, source, overrides: tuple):
+        self.layout = layout
+        self.source = source
+        self.overrides = overrides
+
+    def to_dict(self) -> dict:
+        """Dict theo SoCell field names (giống asdict(SoCell))."""
+        return self.layout.materialize(self.source, self.overrides)
+
+    def to_so_cell(self) -> SoCell:
+        return SoCell(**self.to_dict())
+
+    def __getattr__(self, name):
+        # Chỉ được gọi cho SoCell fields (slots của overlay đã có sẵn)
+        if name in SoCellOverlay.__slots__:
+            raise AttributeError(name)
+        row = self.to_dict()
+        if name in row:
+            return row[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __repr__(self) -> str:
+        return SoCell.__repr__(self)
+
+
+def materialize_so_cells(rows: List) -> List:
+    """
+    Materialize các SoCellOverlay thành dicts (rows khác giữ nguyên) ngay trước khi insert.
+    """
+    return [row.to_dict() if type(row) is SoCellOverlay else row for row in rows]
+
+
+def overlay_socell_from_yblocks(
+        y_block_1: SoCell,
+        x_period_2: str,
+        x_period_1: str,
+        value_2: float,
+        value_1: float,
+        by_type: str,
+        by_percent: float,
+        to_alt: str
+) -> SoCellOverlay:
+    """
+    Overlay tương đương create_socell_from_yblocks với YBlock2 = YBlock1 có now_np = XPeriod2,
+    không copy YBlock1 và không tạo SoCell.
+
+    Args:
+        y_block_1: SoCell instance (YBlock1)
+        x_period_2: now_np của output (MyToItemFinal)
+        x_period_1: XPeriod1
+        value_2: Value2
+        value_1: Value1
+        by_type: ByType
+        by_percent: ByPercent
+        to_alt: ToALT
+
+    Returns:
+        SoCellOverlay
+    """
+    return SoCellOverlay(
+        YBLOCKS_OUTPUT_LAYOUT,
+        y_block_1,
+        (x_period_2, value_2, x_period_1, value_1, by_type, by_percent, to_alt, x_period_1)
+    )
+
 
 def create_socell_from_yblocks(
         y_block_2: SoCell,
@@ -28,100 +164,30 @@ def create_socell_from_yblocks(
     Returns:
         SoCell instance mới
     """
-    return SoCell(
-        now_y_block_fnf_fnf=y_block_2.now_y_block_fnf_fnf,
-        now_y_block_kr_item_code_kr1=y_block_2.now_y_block_kr_item_code_kr1,
-        now_y_block_kr_item_code_kr2=y_block_2.now_y_block_kr_item_code_kr2,
-        now_y_block_kr_item_code_kr3=y_block_2.now_y_block_kr_item_code_kr3,
-        now_y_block_kr_item_code_kr4=y_block_2.now_y_block_kr_item_code_kr4,
-        now_y_block_kr_item_code_kr5=y_block_2.now_y_block_kr_item_code_kr5,
-        now_y_block_kr_item_code_kr6=y_block_2.now_y_block_kr_item_code_kr6,
-        now_y_block_kr_item_code_kr7=y_block_2.now_y_block_kr_item_code_kr7,
-        now_y_block_kr_item_code_kr8=y_block_2.now_y_block_kr_item_code_kr8,
-        now_y_block_cdt_cdt1=y_block_2.now_y_block_cdt_cdt1,
-        now_y_block_cdt_cdt2=y_block_2.now_y_block_cdt_cdt2,
-        now_y_block_cdt_cdt3=y_block_2.now_y_block_cdt_cdt3,
-        now_y_block_cdt_cdt4=y_block_2.now_y_block_cdt_cdt4,
-        now_y_block_ptnow_pt1=y_block_2.now_y_block_ptnow_pt1,
-        now_y_block_ptnow_pt2=y_block_2.now_y_block_ptnow_pt2,
-        now_y_block_ptnow_duration=y_block_2.now_y_block_ptnow_duration,
-        now_y_block_ptprev_pt1=y_block_2.now_y_block_ptprev_pt1,
-        now_y_block_ptprev_pt2=y_block_2.now_y_block_ptprev_pt2,
-        now_y_block_ptprev_duration=y_block_2.now_y_block_ptprev_duration,
-        now_y_block_ptfix_owntype=y_block_2.now_y_block_ptfix_owntype,
-        now_y_block_ptfix_aitype=y_block_2.now_y_block_ptfix_aitype,
-        now_y_block_ptsub_cty1=y_block_2.now_y_block_ptsub_cty1,
-        now_y_block_ptsub_cty2=y_block_2.now_y_block_ptsub_cty2,
-        now_y_block_ptsub_ostype=y_block_2.now_y_block_ptsub_ostype,
-        now_y_block_funnel_fu1=y_block_2.now_y_block_funnel_fu1,
-        now_y_block_funnel_fu2=y_block_2.now_y_block_funnel_fu2,
-        now_y_block_channel_ch=y_block_2.now_y_block_channel_ch,
-        now_y_block_employee_egt1=y_block_2.now_y_block_employee_egt1,
-        now_y_block_employee_egt2=y_block_2.now_y_block_employee_egt2,
-        now_y_block_employee_egt3=y_block_2.now_y_block_employee_egt3,
-        now_y_block_employee_egt4=y_block_2.now_y_block_employee_egt4,
-        now_y_block_hr_hr1=y_block_2.now_y_block_hr_hr1,
-        now_y_block_hr_hr2=y_block_2.now_y_block_hr_hr2,
-        now_y_block_hr_hr3=y_block_2.now_y_block_hr_hr3,
-        now_y_block_sec=y_block_2.now_y_block_sec,
-        now_y_block_period_mx=y_block_2.now_y_block_period_mx,
-        now_y_block_period_dx=y_block_2.now_y_block_period_dx,
-        now_y_block_period_ppc=y_block_2.now_y_block_period_ppc,
-        now_y_block_period_np=y_block_2.now_y_block_period_np,
-        now_y_block_le_le1=y_block_2.now_y_block_le_le1,
-        now_y_block_le_le2=y_block_2.now_y_block_le_le2,
-        now_y_block_unit=y_block_2.now_y_block_unit,
-        now_np=y_block_2.now_np,
-        now_value=value_2,
-        prev_y_block_kr_item_code_kr1=y_block_1.now_y_block_kr_item_code_kr1,
-        prev_y_block_kr_item_code_kr2=y_block_1.now_y_block_kr_item_code_kr2,
-        prev_y_block_kr_item_code_kr3=y_block_1.now_y_block_kr_item_code_kr3,
-        prev_y_block_kr_item_code_kr4=y_block_1.now_y_block_kr_item_code_kr4,
-        prev_y_block_kr_item_code_kr5=y_block_1.now_y_block_kr_item_code_kr5,
-        prev_y_block_kr_item_code_kr6=y_block_1.now_y_block_kr_item_code_kr6,
-        prev_y_block_kr_item_code_kr7=y_block_1.now_y_block_kr_item_code_kr7,
-        prev_y_block_kr_item_code_kr8=y_block_1.now_y_block_kr_item_code_kr8,
-        prev_y_block_cdt_cdt1=y_block_1.now_y_block_cdt_cdt1,
-        prev_y_block_cdt_cdt2=y_block_1.now_y_block_cdt_cdt2,
-        prev_y_block_cdt_cdt3=y_block_1.now_y_block_cdt_cdt3,
-        prev_y_block_cdt_cdt4=y_block_1.now_y_block_cdt_cdt4,
-        prev_y_block_ptnow_pt1=y_block_1.now_y_block_ptnow_pt1,
-        prev_y_block_ptnow_pt2=y_block_1.now_y_block_ptnow_pt2,
-        prev_y_block_ptnow_duration=y_block_1.now_y_block_ptnow_duration,
-        prev_y_block_ptprev_pt1=y_block_1.now_y_block_ptprev_pt1,
-        prev_y_block_ptprev_pt2=y_block_1.now_y_block_ptprev_pt2,
-        prev_y_block_ptprev_duration=y_block_1.now_y_block_ptprev_duration,
-        prev_y_block_ptfix_owntype=y_block_1.now_y_block_ptfix_owntype,
-        prev_y_block_ptfix_aitype=y_block_1.now_y_block_ptfix_aitype,
-        prev_y_block_ptsub_cty1=y_block_1.now_y_block_ptsub_cty1,
-        prev_y_block_ptsub_cty2=y_block_1.now_y_block_ptsub_cty2,
-        prev_y_block_ptsub_ostype=y_block_1.now_y_block_ptsub_ostype,
-        prev_y_block_funnel_fu1=y_block_1.now_y_block_funnel_fu1,
-        prev_y_block_funnel_fu2=y_block_1.now_y_block_funnel_fu2,
-        prev_y_block_channel_ch=y_block_1.now_y_block_channel_ch,
-        prev_y_block_employee_egt1=y_block_1.now_y_block_employee_egt1,
-        prev_y_block_employee_egt2=y_block_1.now_y_block_employee_egt2,
-        prev_y_block_employee_egt3=y_block_1.now_y_block_employee_egt3,
-        prev_y_block_employee_egt4=y_block_1.now_y_block_employee_egt4,
-        prev_y_block_hr_hr1=y_block_1.now_y_block_hr_hr1,
-        prev_y_block_hr_hr2=y_block_1.now_y_block_hr_hr2,
-        prev_y_block_hr_hr3=y_block_1.now_y_block_hr_hr3,
-        prev_y_block_sec=y_block_1.now_y_block_sec,
-        prev_y_block_period_mx=y_block_1.now_y_block_period_mx,
-        prev_y_block_period_dx=y_block_1.now_y_block_period_dx,
-        prev_y_block_le_le1=y_block_1.now_y_block_le_le1,
-        prev_y_block_le_le2=y_block_1.now_y_block_le_le2,
-        prev_y_block_unit=y_block_1.now_y_block_unit,
-        prev_y_block_fnf_fnf=y_block_1.now_y_block_fnf_fnf,
-        prev_y_block_kr_item_name=y_block_1.now_y_block_kr_item_name,
-        prev_y_block_period_np=x_period_1,
-        prev_value=value_1,
-        by_block_bytype=by_type,
-        by_block_bypercent=by_percent,
-        now_zblock2_alt=to_alt,
-        prev_zblock2_alt=y_block_1.now_zblock2_alt,
-        prev_np=x_period_1
-    )
+    values = dict(YBLOCKS_NOW_MAPPING.items_of(y_block_2))
+    values.update(YBLOCKS_PREV_MAPPING.items_of(y_block_1))
+    values.update(zip(
+        YBLOCKS_OUTPUT_LAYOUT.overridden_fields,
+        (y_block_2.now_np, value_2, x_period_1, value_1, by_type, by_percent, to_alt, x_period_1)
+    ))
+    return SoCell(**values)
+
+
+def overlay_socell_for_offset(
+        y_block_1: SoCell,
+        to_alt: str,
+        x_period_2: str,
+        x_period_1: str,
+        value_1: float,
+        by_type: str
+) -> SoCellOverlay:
+    """
+    Overlay tương đương create_socell_for_offset (NowYBlock = PrevYBlock = YBlock1).
+
+    Returns:
+        SoCellOverlay
+    """
+    return SoCellOverlay(OFFSET_OUTPUT_LAYOUT, y_block_1, (to_alt, x_period_2, value_1, x_period_1, value_1, by_type))
 
 
 def create_socell_for_offset(
@@ -148,92 +214,4 @@ def create_socell_for_offset(
     Returns:
         SoCell instance mới
     """
-    return SoCell(
-        now_y_block_kr_item_code_kr1=y_block_1.now_y_block_kr_item_code_kr1,
-        now_y_block_kr_item_code_kr2=y_block_1.now_y_block_kr_item_code_kr2,
-        now_y_block_kr_item_code_kr3=y_block_1.now_y_block_kr_item_code_kr3,
-        now_y_block_kr_item_code_kr4=y_block_1.now_y_block_kr_item_code_kr4,
-        now_y_block_kr_item_code_kr5=y_block_1.now_y_block_kr_item_code_kr5,
-        now_y_block_kr_item_code_kr6=y_block_1.now_y_block_kr_item_code_kr6,
-        now_y_block_kr_item_code_kr7=y_block_1.now_y_block_kr_item_code_kr7,
-        now_y_block_kr_item_code_kr8=y_block_1.now_y_block_kr_item_code_kr8,
-        now_y_block_cdt_cdt1=y_block_1.now_y_block_cdt_cdt1,
-        now_y_block_cdt_cdt2=y_block_1.now_y_block_cdt_cdt2,
-        now_y_block_cdt_cdt3=y_block_1.now_y_block_cdt_cdt3,
-        now_y_block_cdt_cdt4=y_block_1.now_y_block_cdt_cdt4,
-        now_y_block_ptnow_pt1=y_block_1.now_y_block_ptnow_pt1,
-        now_y_block_ptnow_pt2=y_block_1.now_y_block_ptnow_pt2,
-        now_y_block_ptnow_duration=y_block_1.now_y_block_ptnow_duration,
-        now_y_block_ptprev_pt1=y_block_1.now_y_block_ptprev_pt1,
-        now_y_block_ptprev_pt2=y_block_1.now_y_block_ptprev_pt2,
-        now_y_block_ptprev_duration=y_block_1.now_y_block_ptprev_duration,
-        now_y_block_ptfix_owntype=y_block_1.now_y_block_ptfix_owntype,
-        now_y_block_ptfix_aitype=y_block_1.now_y_block_ptfix_aitype,
-        now_y_block_ptsub_cty1=y_block_1.now_y_block_ptsub_cty1,
-        now_y_block_ptsub_cty2=y_block_1.now_y_block_ptsub_cty2,
-        now_y_block_ptsub_ostype=y_block_1.now_y_block_ptsub_ostype,
-        now_y_block_funnel_fu1=y_block_1.now_y_block_funnel_fu1,
-        now_y_block_funnel_fu2=y_block_1.now_y_block_funnel_fu2,
-        now_y_block_channel_ch=y_block_1.now_y_block_channel_ch,
-        now_y_block_employee_egt1=y_block_1.now_y_block_employee_egt1,
-        now_y_block_employee_egt2=y_block_1.now_y_block_employee_egt2,
-        now_y_block_employee_egt3=y_block_1.now_y_block_employee_egt3,
-        now_y_block_employee_egt4=y_block_1.now_y_block_employee_egt4,
-        now_y_block_hr_hr1=y_block_1.now_y_block_hr_hr1,
-        now_y_block_hr_hr2=y_block_1.now_y_block_hr_hr2,
-        now_y_block_hr_hr3=y_block_1.now_y_block_hr_hr3,
-        now_y_block_sec=y_block_1.now_y_block_sec,
-        now_y_block_period_mx=y_block_1.now_y_block_period_mx,
-        now_y_block_period_dx=y_block_1.now_y_block_period_dx,
-        now_y_block_period_ppc=y_block_1.now_y_block_period_ppc,
-        now_y_block_period_np=y_block_1.now_y_block_period_np,
-        now_y_block_le_le1=y_block_1.now_y_block_le_le1,
-        now_y_block_le_le2=y_block_1.now_y_block_le_le2,
-        now_y_block_unit=y_block_1.now_y_block_unit,
-        now_zblock2_alt=to_alt,
-        now_np=x_period_2,
-        now_value=value_1,
-        prev_y_block_kr_item_code_kr1=y_block_1.now_y_block_kr_item_code_kr1,
-        prev_y_block_kr_item_code_kr2=y_block_1.now_y_block_kr_item_code_kr2,
-        prev_y_block_kr_item_code_kr3=y_block_1.now_y_block_kr_item_code_kr3,
-        prev_y_block_kr_item_code_kr4=y_block_1.now_y_block_kr_item_code_kr4,
-        prev_y_block_kr_item_code_kr5=y_block_1.now_y_block_kr_item_code_kr5,
-        prev_y_block_kr_item_code_kr6=y_block_1.now_y_block_kr_item_code_kr6,
-        prev_y_block_kr_item_code_kr7=y_block_1.now_y_block_kr_item_code_kr7,
-        prev_y_block_kr_item_code_kr8=y_block_1.now_y_block_kr_item_code_kr8,
-        prev_y_block_cdt_cdt1=y_block_1.now_y_block_cdt_cdt1,
-        prev_y_block_cdt_cdt2=y_block_1.now_y_block_cdt_cdt2,
-        prev_y_block_cdt_cdt3=y_block_1.now_y_block_cdt_cdt3,
-        prev_y_block_cdt_cdt4=y_block_1.now_y_block_cdt_cdt4,
-        prev_y_block_ptnow_pt1=y_block_1.now_y_block_ptnow_pt1,
-        prev_y_block_ptnow_pt2=y_block_1.now_y_block_ptnow_pt2,
-        prev_y_block_ptnow_duration=y_block_1.now_y_block_ptnow_duration,
-        prev_y_block_ptprev_pt1=y_block_1.now_y_block_ptprev_pt1,
-        prev_y_block_ptprev_pt2=y_block_1.now_y_block_ptprev_pt2,
-        prev_y_block_ptprev_duration=y_block_1.now_y_block_ptprev_duration,
-        prev_y_block_ptfix_owntype=y_block_1.now_y_block_ptfix_owntype,
-        prev_y_block_ptfix_aitype=y_block_1.now_y_block_ptfix_aitype,
-        prev_y_block_ptsub_cty1=y_block_1.now_y_block_ptsub_cty1,
-        prev_y_block_ptsub_cty2=y_block_1.now_y_block_ptsub_cty2,
-        prev_y_block_ptsub_ostype=y_block_1.now_y_block_ptsub_ostype,
-        prev_y_block_funnel_fu1=y_block_1.now_y_block_funnel_fu1,
-        prev_y_block_funnel_fu2=y_block_1.now_y_block_funnel_fu2,
-        prev_y_block_channel_ch=y_block_1.now_y_block_channel_ch,
-        prev_y_block_employee_egt1=y_block_1.now_y_block_employee_egt1,
-        prev_y_block_employee_egt2=y_block_1.now_y_block_employee_egt2,
-        prev_y_block_employee_egt3=y_block_1.now_y_block_employee_egt3,
-        prev_y_block_employee_egt4=y_block_1.now_y_block_employee_egt4,
-        prev_y_block_hr_hr1=y_block_1.now_y_block_hr_hr1,
-        prev_y_block_hr_hr2=y_block_1.now_y_block_hr_hr2,
-        prev_y_block_hr_hr3=y_block_1.now_y_block_hr_hr3,
-        prev_y_block_sec=y_block_1.now_y_block_sec,
-        prev_y_block_period_mx=y_block_1.now_y_block_period_mx,
-        prev_y_block_period_dx=y_block_1.now_y_block_period_dx,
-        prev_y_block_period_np=y_block_1.now_y_block_period_np,
-        prev_y_block_le_le1=y_block_1.now_y_block_le_le1,
-        prev_y_block_le_le2=y_block_1.now_y_block_le_le2,
-        prev_y_block_unit=y_block_1.now_y_block_unit,
-        prev_ppc=x_period_1,
-        prev_value=value_1,
-        by_block_bytype=by_type,
-    )
+    return overlay_socell_for_offset(y_block_1, to_alt, x_period_2, x_period_1, value_1, by_type).to_so_cell()
@@ -0,0 +1,350 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.field_mappings import FieldMapping, YBLOCK_MAPPING, PREV_YBLOCK_MAPPING
+from queries.match_keys import _normalize_value, _normalize_column
+from queries.query_builder import build_so_cell_slice_query, build_so_cell_slice_count_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SO_CELL_CACHE_MB = 1024
+# Ước lượng memory của một giá trị (object column) khi load slice, dùng với COUNT(*) của slice
+ESTIMATED_VALUE_BYTES = 64
+# Page size khi load slice (để dừng sớm khi slice vượt memory budget)
+SLICE_PAGE_SIZE = 50000
+# Capacity của column buffers tăng theo hệ số này khi append rows write-through
+SLICE_GROWTH_FACTOR = 1.25
+
+
+def _non_empty_predicates(item, mapping: FieldMapping) -> Dict:
+    """
+    Dict so_cell column -> value của các fields có giá trị (bỏ None/NaN/''), giống điều kiện
+    WHERE của các hàm build query.
+    """
+    return dict(mapping.non_empty_items(item))
+
+
+def source_conditions(allocation_by_type_items) -> List[Dict]:
+    """Step 70: một điều kiện (AND) cho mỗi allocation_by_type_item, như build_so_cell_batch_query."""
+    conditions = []
+    for item in allocation_by_type_items:
+        if getattr(item, 'by_block_by_type', None) in ['GAgg', 'ByAgg']:
+            continue
+        predicates = _non_empty_predicates(item, YBLOCK_MAPPING)
+        if predicates:
+            conditions.append(predicates)
+    return conditions
+
+
+def prev_conditions(from_so_cell_items) -> List[Dict]:
+    """Step 90: PrevYBlock = NowYBlock của y_block_1 và now_np, như build_so_cell_prev_batch_query."""
+    conditions = []
+    for y_block_1 in from_so_cell_items:
+        predicates = _non_empty_predicates(y_block_1, PREV_YBLOCK_MAPPING)
+        x_period_1 = y_block_1.now_np
+        if x_period_1 is not None and not pd.isna(x_period_1):
+            predicates['now_np'] = x_period_1
+        if predicates:
+            conditions.append(predicates)
+    return conditions
+
+
+def by_kr_predicates(allocation_by_kr_item) -> Dict:
+    """Step 160: các điều kiện của AllocationByKR, như build_so_cell_by_kr_batch_query (không gồm to_items)."""
+    return _non_empty_predicates(allocation_by_kr_item, YBLOCK_MAPPING)
+
+
+def _append_values(buffer: np.ndarray, length: int, values: list) -> np.ndarray:
+    """
+    Ghi values vào buffer[length:] (giữ dtype của cột nếu values chuyển được, ví dụ None -> NaN
+    cho cột float; ngược lại cột chuyển sang object), cấp buffer lớn hơn khi hết capacity.
+
+    Returns:
+        Buffer chứa length + len(values) giá trị đầu tiên (có thể là buffer mới)
+    """
+    try:
+        appended = np.asarray(values, dtype=buffer.dtype) if buffer.dtype != object else None
+    except (TypeError, ValueError):
+        appended = None
+        buffer = buffer.astype(object)
+    if appended is None:
+        appended = np.empty(len(values), dtype=object)
+        appended[:] = values
+
+    needed = length + len(values)
+    if needed > len(buffer):
+        grown = np.empty(max(needed, int(needed * SLICE_GROWTH_FACTOR)), dtype=buffer.dtype)
+        grown[:length] = buffer[:length]
+        buffer = grown
+    buffer[length:needed] = appended
+    return buffer
+
+
+class _SoCellSlice:
+    """
+    Một slice của so_cell_raw_full lưu theo cột (numpy arrays), cùng normalized columns
+    (tính lazy) để filter bằng masks.
+
+    Mỗi cột là view [:length] của một buffer có capacity dư, rows write-through được append
+    vào buffer (giữ dtype của cột) thay vì copy lại cả cột mỗi lần flush.
+    """
+
+    def __init__(self, predicates: Dict, columns: Dict[str, np.ndarray], nbytes: int):
+        self.predicates = predicates
+        self.columns = columns
+        self.nbytes = nbytes
+        self.length = len(next(iter(columns.values()))) if columns else 0
+        self.pending_rows: List[Dict] = []
+        self._buffers: Dict[str, np.ndarray] = dict(columns)
+        self._normalized: Dict[str, np.ndarray] = {}
+
+    def matches_row(self, row: Dict) -> bool:
+        return all(_normalize_value(row.get(column)) == _normalize_value(value)
+                   for column, value in self.predicates.items())
+
+    def flush_pending(self) -> int:
+        """
+        Append các rows đã insert trong run (write-through) vào các cột.
+
+        Returns:
+            Số bytes (ước lượng) slice tăng thêm
+        """
+        if not self.pending_rows:
+            return 0
+        row_bytes = self.nbytes / self.length if self.length else ESTIMATED_VALUE_BYTES * len(self.columns)
+        length = self.length + len(self.pending_rows)
+        for column in self.columns:
+            buffer = _append_values(self._buffers[column], self.length, [row.get(column) for row in self.pending_rows])
+            self._buffers[column] = buffer
+            self.columns[column] = buffer[:length]
+        added_bytes = int(row_bytes * len(self.pending_rows))
+        self.length = length
+        self.nbytes += added_bytes
+        self.pending_rows = []
+        self._normalized = {}
+        return added_bytes
+
+    def normalized(self, column: str) -> np.ndarray:
+        values = self._normalized.get(column)
+        if values is None:
+            values = _normalize_column(pd.Series(self.columns[column]))
+            self._normalized[column] = values
+        return values
+
+    def mask(self, conditions: Optional[List[Dict]], isin: Optional[Dict[str, list]]) -> np.ndarray:
+        if conditions is None:
+            mask = np.ones(self.length, dtype=bool)
+        else:
+            # Gom các điều kiện theo tập columns: mỗi nhóm lọc trước bằng isin từng cột
+            # rồi kiểm tra chính xác tuple key trên các rows còn lại
+            mask = np.zeros(self.length, dtype=bool)
+            groups = {}
+            for condition in conditions:
+                columns = tuple(sorted(condition))
+                groups.setdefault(columns, set()).add(tuple(_normalize_value(condition[c]) for c in columns))
+            for columns, keys in groups.items():
+                group_mask = np.ones(self.length, dtype=bool)
+                for position, column in enumerate(columns):
+                    values = list({key[position] for key in keys})
+                    group_mask &= pd.Series(self.normalized(column)).isin(values).to_numpy()
+                candidates = np.flatnonzero(group_mask)
+                if len(columns) > 1 and len(keys) > 1 and len(candidates):
+                    arrays = [self.normalized(column)[candidates] for column in columns]
+                    exact = np.fromiter((key in keys for key in zip(*arrays)), dtype=bool, count=len(candidates))
+                    candidates = candidates[exact]
+                mask[candidates] = True
+
+        for column, values in (isin or {}).items():
+            normalized_values = [_normalize_value(value) for value in values]
+            mask &= pd.Series(self.normalized(column)).isin(normalized_values).to_numpy()
+        return mask
+
+
+class SoCellStore:
+    """
+    Cache columnar trong memory các slices của so_cell_raw_full, dùng chung cho các ALTs
+    trong một lần run_allocate.
+
+    Mỗi slice được load một lần bằng query với các điều kiện bằng (ví dụ now_np = period,
+    now_zblock2_alt = ALT, các fields của AllocationByKR); Step 70 / 90 / 160 sau đó lọc slice
+    trong memory bằng numpy masks thay vì scan lại table. Tổng size các slices bị giới hạn bởi
+    memory budget (LRU eviction); slice lớn hơn budget không được cache và caller query trực tiếp.
+    Size của slice được ước lượng bằng COUNT(*) trước khi load, nên slice quá lớn không bị
+    tải về rồi bỏ đi.
+
+    SoCellStore cũng là proxy của connector: rows insert vào so_cell table trong run được
+    append vào các slices khớp điều kiện, nên output của ALT trước được thấy bởi ALT sau
+    như khi query BigQuery.
+    """
+
+    def __init__(self, bq, project_id: str, dataset_id: str, table_id: str,
+                 memory_budget_mb: float = DEFAULT_SO_CELL_CACHE_MB):
+        """
+        Args:
+            bq: Connector (BigQueryConnector hoặc MeteredBigQuery)
+            project_id: GCP project ID
+            dataset_id: Dataset của so_cell table
+            table_id: so_cell table
+            memory_budget_mb: Tổng memory tối đa của các slices (MB)
+        """
+        self.bq = bq
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.slices: "OrderedDict[tuple, _SoCellSlice]" = OrderedDict()
+        self.nbytes = 0
+        # Slices vượt memory budget: không load lại trong run
+        self._oversized = set()
+        self.stats = {'hits': 0, 'loads': 0, 'oversized': 0, 'evictions': 0, 'rows_loaded': 0, 'rows_appended': 0}
+
+    def __getattr__(self, name):
+        return getattr(self.bq, name)
+
+    def select(self, predicates: Dict, columns: List[str], conditions: Optional[List[Dict]] = None,
+               isin: Optional[Dict[str, list]] = None) -> Optional[pd.DataFrame]:
+        """
+        Lấy các rows của slice predicates khớp conditions (OR của các dict điều kiện bằng)
+        và isin (column -> list giá trị).
+
+        Args:
+            predicates: Điều kiện bằng xác định slice
+            columns: Các cột cần trả về
+            conditions: List of dicts column -> value (None = không lọc thêm)
+            isin: Dict column -> list values
+
+        Returns:
+            DataFrame (columns theo thứ tự yêu cầu), hoặc None nếu slice vượt memory budget
+            (caller query trực tiếp)
+        """
+        slice_key = tuple(sorted((column, _normalize_value(value)) for column, value in predicates.items()))
+        if slice_key in self._oversized:
+            return None
+
+        needed_columns = list(dict.fromkeys(
+            list(columns)
+            + [column for condition in conditions or [] for column in condition]
+            + list(isin or {})
+        ))
+
+        so_cell_slice = self.slices.get(slice_key)
+        if so_cell_slice is not None and all(column in so_cell_slice.columns for column in needed_columns):
+            self.slices.move_to_end(slice_key)
+            self.stats['hits'] += 1
+        else:
+            if so_cell_slice is not None:
+                # Thiếu cột: load lại slice với các cột cũ + cột mới
+                needed_columns = list(dict.fromkeys(list(so_cell_slice.columns) + needed_columns))
+                self._drop(slice_key)
+            so_cell_slice = self._load(slice_key, predicates, needed_columns)
+            if so_cell_slice is None:
+                return None
+
+        added_bytes = so_cell_slice.flush_pending()
+        if added_bytes:
+            self.nbytes += added_bytes
+            self._evict(keep=slice_key)
+        mask = so_cell_slice.mask(conditions, isin)
+        return pd.DataFrame({column: so_cell_slice.columns[column][mask] for column in columns})
+
+    def _mark_oversized(self, slice_key: tuple, size_mb: float):
+        logger.info("[SoCellStore] Slice %s (%.1f MB) exceeds memory budget (%s MB), querying directly",
+                    dict(slice_key), size_mb, self.memory_budget // (1024 * 1024))
+        self._oversized.add(slice_key)
+        self.stats['oversized'] += 1
+
+    def _load(self, slice_key: tuple, predicates: Dict, columns: List[str]) -> Optional[_SoCellSlice]:
+        count_query = build_so_cell_slice_count_query(predicates, self.project_id, self.dataset_id, self.table_id)
+        row_count = int(self.bq.execute_query(count_query).iloc[0]['row_count'] or 0)
+        estimated_bytes = row_count * len(columns) * ESTIMATED_VALUE_BYTES
+        if estimated_bytes > self.memory_budget:
+            self._mark_oversized(slice_key, estimated_bytes / (1024 * 1024))
+            return None
+
+        query = build_so_cell_slice_query(predicates, self.project_id, self.dataset_id, self.table_id, columns)
+        started = time.perf_counter()
+        pages = []
+        nbytes = 0
+        for page in self.bq.execute_query_iter(query, page_size=SLICE_PAGE_SIZE):
+            pages.append(page)
+            nbytes += int(page.memory_usage(deep=True).sum())
+            if nbytes > self.memory_budget:
+                # Ước lượng thấp hơn thực tế (giá trị dài)
+                self._mark_oversized(slice_key, nbytes / (1024 * 1024))
+                return None
+
+        df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=columns)
+        so_cell_slice = _SoCellSlice(
+            predicates=predicates,
+            columns={column: df[column].to_numpy() if column in df.columns else np.full(len(df), None, dtype=object)
+                     for column in columns},
+            nbytes=nbytes
+        )
+        self.slices[slice_key] = so_cell_slice
+        self.nbytes += nbytes
+        self.stats['loads'] += 1
+        self.stats['rows_loaded'] += len(df)
+        logger.info("[SoCellStore] Loaded slice %s: %s rows, %.1f MB in %.3fs",
+                    dict(slice_key), len(df), nbytes / (1024 * 1024), time.perf_counter() - started)
+        self._evict(keep=slice_key)
+        return so_cell_slice
+
+    def _drop(self, slice_key: tuple):
+        so_cell_slice = self.slices.pop(slice_key)
+        self.nbytes -= so_cell_slice.nbytes
+
+    def _evict(self, keep: tuple):
+        while self.nbytes > self.memory_budget and len(self.slices) > 1:
+            slice_key = next(iter(self.slices))
+            if slice_key == keep:
+                self.slices.move_to_end(slice_key)
+                continue
+            self._drop(slice_key)
+            self.stats['evictions'] += 1
+
+    def _write_through(self, dataset_id, table_id, rows):
+        if dataset_id != self.dataset_id or table_id != self.table_id or not self.slices:
+            return
+        for row in rows:
+            row_dict = asdict(row) if hasattr(row, '__dataclass_fields__') else row
+            for so_cell_slice in self.slices.values():
+                if so_cell_slice.matches_row(row_dict):
+                    so_cell_slice.pending_rows.append(row_dict)
+                    self.stats['rows_appended'] += 1
+
+    def insert_row(self, dataset_id, table_id, row_data):
+        success = self.bq.insert_row(dataset_id, table_id, row_data)
+        if success:
+            self._write_through(dataset_id, table_id, [row_data])
+        return success
+
+    def insert_rows(self, dataset_id, table_id, rows_data):
+        success = self.bq.insert_rows(dataset_id, table_id, rows_data)
+        if success:
+            self._write_through(dataset_id, table_id, rows_data)
+        return success
+
+    def insert_rows_batch(self, dataset_id, table_id, rows_data):
+        success = self.bq.insert_rows_batch(dataset_id, table_id, rows_data)
+        if success:
+            self._write_through(dataset_id, table_id, rows_data)
+        return success
+
+    def load_parquet_file(self, dataset_id, table_id, file_path):
+        import pyarrow.parquet as pq
+
+        success = self.bq.load_parquet_file(dataset_id, table_id, file_path)
+        if success and dataset_id == self.dataset_id and table_id == self.table_id and self.slices:
+            for batch in pq.ParquetFile(file_path).iter_batches():
+                self._write_through(dataset_id, table_id, batch.to_pylist())
+        return success
+
+    def log_summary(self):
+        logger.info("[SoCellStore] %s slices cached (%.1f MB / %s MB budget), stats: %s",
+                    len(self.slices), self.nbytes / (1024 * 1024), self.memory_budget // (1024 * 1024), self.stats)
@@ -0,0 +1,316 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Số giây giữa các lần cập nhật heartbeat của unit đang chạy
+HEARTBEAT_INTERVAL_SEC = 60.0
+
+
+class SqliteWorkQueue:
+    """
+    Work queue dùng chung giữa coordinator và các worker, lưu trong một file SQLite.
+
+    Mỗi work unit là một ALT (z_number), với thứ tự (seq) và các units phải done trước
+    (depends_on, bảng work_unit_deps). Worker claim unit bằng một transaction IMMEDIATE nên nhiều
+    worker processes không claim trùng unit. Queue file phải nằm trên local disk của host chạy
+    các processes: WAL locking của SQLite không hoạt động qua network filesystems (NFS, SMB).
+
+    complete / fail / heartbeat chỉ cập nhật unit còn running và đang được claim bởi chính
+    worker đó: worker bị requeue (stale) không ghi đè trạng thái của lần claim sau.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            timeout: Số giây chờ khi database đang bị lock bởi process khác
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_units (
+                unit_id TEXT PRIMARY KEY,
+                run_key TEXT NOT NULL,
+                z_number INTEGER NOT NULL,
+                my_x_period TEXT NOT NULL,
+                seq INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                claimed_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT
+            )
+        """)
+        # Queue file tạo bởi version trước không có các cột seq / heartbeat_at
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(work_units)")}
+        if 'seq' not in columns:
+            self.conn.execute("ALTER TABLE work_units ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        if 'heartbeat_at' not in columns:
+            self.conn.execute("ALTER TABLE work_units ADD COLUMN heartbeat_at REAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_unit_deps (
+                unit_id TEXT NOT NULL,
+                depends_on TEXT NOT NULL,
+                PRIMARY KEY (unit_id, depends_on)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_work_units_run_status ON work_units (run_key, status)")
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, run_key: str, units: List[Dict]) -> int:
+        """
+        Thêm work units vào queue. Unit đã tồn tại (cùng unit_id) được giữ nguyên trạng thái.
+
+        Args:
+            run_key: Định danh của run
+            units: List of dicts có keys unit_id, z_number, my_x_period, seq và depends_on
+                (list unit_ids phải done trước khi unit được claim)
+
+        Returns:
+            Số units mới được thêm
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                """
+                INSERT OR IGNORE INTO work_units
+                    (unit_id, run_key, z_number, my_x_period, seq, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        unit['unit_id'],
+                        run_key,
+                        int(unit['z_number']),
+                        unit['my_x_period'],
+                        int(unit['seq']),
+                        STATUS_PENDING,
+                        now
+                    )
+                    for unit in units
+                ]
+            )
+            added = self.conn.total_changes - before
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO work_unit_deps (unit_id, depends_on) VALUES (?, ?)",
+                [(unit['unit_id'], depends_on) for unit in units for depends_on in unit.get('depends_on', [])]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, run_key: str, worker_id: str) -> Optional[Dict]:
+        """
+        Claim unit pending đầu tiên (theo seq) có mọi dependencies đã done cho worker.
+
+        Returns:
+            Dict thông tin unit, hoặc None nếu không có unit pending claim được
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                """
+                SELECT * FROM work_units AS unit
+                WHERE unit.run_key = ? AND unit.status = ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM work_unit_deps AS dep
+                    JOIN work_units AS parent ON parent.unit_id = dep.depends_on
+                    WHERE dep.unit_id = unit.unit_id AND parent.status != ?
+                )
+                ORDER BY unit.seq, unit.unit_id
+                LIMIT 1
+                """,
+                (run_key, STATUS_PENDING, STATUS_DONE)
+            ).fetchone()
+
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            self.conn.execute(
+                """
+                UPDATE work_units
+                SET status = ?, worker_id = ?, attempts = attempts + 1, claimed_at = ?, heartbeat_at = NULL
+                WHERE unit_id = ?
+                """,
+                (STATUS_RUNNING, worker_id, time.time(), row['unit_id'])
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return {
+            'unit_id': row['unit_id'],
+            'run_key': row['run_key'],
+            'z_number': row['z_number'],
+            'my_x_period': row['my_x_period'],
+            'attempts': row['attempts'] + 1
+        }
+
+    def complete(self, unit_id: str, worker_id: str, result: Dict) -> bool:
+        """
+        Đánh dấu unit hoàn thành và lưu result/metrics của worker.
+
+        Returns:
+            False nếu unit không còn được claim bởi worker_id (đã bị requeue), result bị bỏ
+        """
+        cursor = self.conn.execute(
+            """
+            UPDATE work_units SET status = ?, finished_at = ?, result = ?, error = NULL
+            WHERE unit_id = ? AND worker_id = ? AND status = ?
+            """,
+            (STATUS_DONE, time.time(), json.dumps(result, default=str), unit_id, worker_id, STATUS_RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id: str, worker_id: str, error: str, result: Optional[Dict] = None) -> bool:
+        """
+        Đánh dấu unit thất bại (có thể requeue lại bằng requeue_failed).
+
+        Returns:
+            False nếu unit không còn được claim bởi worker_id (đã bị requeue)
+        """
+        cursor = self.conn.execute(
+            """
+            UPDATE work_units SET status = ?, finished_at = ?, result = ?, error = ?
+            WHERE unit_id = ? AND worker_id = ? AND status = ?
+            """,
+            (STATUS_FAILED, time.time(), json.dumps(result, default=str) if result else None, error,
+             unit_id, worker_id, STATUS_RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def requeue_failed(self, run_key: str, max_attempts: int = 3) -> int:
+        """
+        Đưa các unit failed (chưa vượt max_attempts) về pending.
+
+        Returns:
+            Số units được requeue
+        """
+        cursor = self.conn.execute(
+            "UPDATE work_units SET status = ?, worker_id = NULL WHERE run_key = ? AND status = ? AND attempts < ?",
+            (STATUS_PENDING, run_key, STATUS_FAILED, max_attempts)
+        )
+        return cursor.rowcount
+
+    def heartbeat(self, unit_id: str, worker_id: str):
+        """
+        Cập nhật heartbeat của unit đang chạy bởi worker_id (xem UnitHeartbeat, requeue_stale).
+        """
+        self.conn.execute(
+            "UPDATE work_units SET heartbeat_at = ? WHERE unit_id = ? AND worker_id = ? AND status = ?",
+            (time.time(), unit_id, worker_id, STATUS_RUNNING)
+        )
+
+    def requeue_stale(self, run_key: str, stale_after_sec: float) -> int:
+        """
+        Đưa các unit running không có heartbeat (hoặc claim, nếu chưa có heartbeat) trong
+        stale_after_sec (worker chết giữa chừng) về pending.
+
+        Returns:
+            Số units được requeue
+        """
+        cursor = self.conn.execute(
+            """
+            UPDATE work_units SET status = ?, worker_id = NULL
+            WHERE run_key = ? AND status = ? AND COALESCE(heartbeat_at, claimed_at) < ?
+            """,
+            (STATUS_PENDING, run_key, STATUS_RUNNING, time.time() - stale_after_sec)
+        )
+        return cursor.rowcount
+
+    def summary(self, run_key: str) -> Dict[str, int]:
+        """
+        Đếm số units theo status của run.
+        """
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) AS cnt FROM work_units WHERE run_key = ? GROUP BY status",
+            (run_key,)
+        ).fetchall()
+        counts = {STATUS_PENDING: 0, STATUS_RUNNING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        counts.update({row['status']: row['cnt'] for row in rows})
+        return counts
+
+    def results(self, run_key: str) -> List[Dict]:
+        """
+        Lấy trạng thái và result/metrics của tất cả units trong run.
+        """
+        rows = self.conn.execute(
+            """
+            SELECT unit_id, z_number, status, worker_id, attempts, claimed_at, finished_at, result, error
+            FROM work_units WHERE run_key = ? ORDER BY seq, unit_id
+            """,
+            (run_key,)
+        ).fetchall()
+        return [
+            {
+                'unit_id': row['unit_id'],
+                'z_number': row['z_number'],
+                'status': row['status'],
+                'worker_id': row['worker_id'],
+                'attempts': row['attempts'],
+                'duration_sec': (row['finished_at'] - row['claimed_at'])
+                if row['finished_at'] and row['claimed_at'] else None,
+                'result': json.loads(row['result']) if row['result'] else None,
+                'error': row['error']
+            }
+            for row in rows
+        ]
+
+
+class UnitHeartbeat:
+    """
+    Context manager: thread cập nhật heartbeat của unit đang chạy mỗi interval_sec
+    (connection SQLite riêng), để requeue_stale phân biệt unit chạy lâu với worker đã chết.
+    """
+
+    def __init__(self, db_path: str, unit_id: str, worker_id: str, interval_sec: float = HEARTBEAT_INTERVAL_SEC):
+        self.db_path = db_path
+        self.unit_id = unit_id
+        self.worker_id = worker_id
+        self.interval_sec = interval_sec
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{unit_id}", daemon=True)
+
+    def _run(self):
+        queue = SqliteWorkQueue(self.db_path)
+        try:
+            queue.heartbeat(self.unit_id, self.worker_id)
+            while not self._stop.wait(self.interval_sec):
+                queue.heartbeat(self.unit_id, self.worker_id)
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
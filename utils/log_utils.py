@@ -0,0 +1,106 @@
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+# Level mặc định đọc từ env FA_LOG_LEVEL (DEBUG/INFO/WARN/ERROR)
+LOG_LEVEL_ENV = "FA_LOG_LEVEL"
+# Trong hot loops chỉ log DEBUG cho N events đầu tiên và sau đó mỗi LOG_SAMPLE_EVERY events của một step
+LOG_SAMPLE_FIRST_N_ENV = "FA_LOG_SAMPLE_FIRST_N"
+LOG_SAMPLE_EVERY_ENV = "FA_LOG_SAMPLE_EVERY"
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_SAMPLE_FIRST_N = 3
+DEFAULT_SAMPLE_EVERY = 1000
+
+_LEVEL_NAMES = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARN': logging.WARNING,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR
+}
+
+
+class StepFormatter(logging.Formatter):
+    """
+    Format log record giống format print cũ: "[INFO][Step 70] message" (WARNING hiển thị là WARN).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        level_name = 'WARN' if record.levelno == logging.WARNING else record.levelname
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        return f"[{level_name}]{message}" if message.startswith('[') else f"[{level_name}] {message}"
+
+
+def configure_logging(level: Optional[str] = None, force: bool = False):
+    """
+    Cấu hình logging cho các run entry points (run_allocate, coordinator/worker, main_*.py).
+    Nếu root logger đã có handler (ví dụ API đã gọi logging.basicConfig) thì giữ nguyên cấu hình đó,
+    chỉ set level khi level được truyền vào, trừ khi force=True.
+
+    Args:
+        level: DEBUG/INFO/WARN/ERROR (default: env FA_LOG_LEVEL hoặc INFO)
+        force: True = thay handler hiện có của root logger
+    """
+    level_name = (level or os.environ.get(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL).upper()
+    if level_name not in _LEVEL_NAMES:
+        raise ValueError(f"Invalid log level: {level_name}. Expected one of: {', '.join(_LEVEL_NAMES)}")
+
+    root = logging.getLogger()
+    if force or not root.handlers:
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StepFormatter())
+        root.addHandler(handler)
+    elif level is None:
+        return
+    root.setLevel(_LEVEL_NAMES[level_name])
+
+
+class StepLogSampler:
+    """
+    Log sampling cho hot loops (mỗi source cell / to_item / output SoCell).
+
+    Mỗi event chỉ tăng counter của step; message được build (lazy %-formatting) và log ở DEBUG
+    cho first_n events đầu tiên và sau đó mỗi every events. Ở level INFO các events không tốn
+    chi phí format/IO; log_summary() ghi một dòng INFO tổng hợp số events theo step.
+    """
+
+    def __init__(self, logger: logging.Logger, first_n: Optional[int] = None, every: Optional[int] = None):
+        """
+        Args:
+            logger: Logger của module gọi
+            first_n: Số events đầu tiên của mỗi step được log (default: env FA_LOG_SAMPLE_FIRST_N hoặc 3)
+            every: Sau first_n, log mỗi every events (default: env FA_LOG_SAMPLE_EVERY hoặc 1000)
+        """
+        self.logger = logger
+        self.first_n = first_n if first_n is not None else int(
+            os.environ.get(LOG_SAMPLE_FIRST_N_ENV, DEFAULT_SAMPLE_FIRST_N))
+        self.every = max(1, every if every is not None else int(
+            os.environ.get(LOG_SAMPLE_EVERY_ENV, DEFAULT_SAMPLE_EVERY)))
+        self.counts: Dict[str, int] = {}
+        self._debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, step: str, msg: str, *args):
+        """
+        Đếm một event của step và log DEBUG nếu event được sample.
+
+        Args:
+            step: Tên step, ví dụ "Step 100"
+            msg: Format string (%-style), args chỉ được format khi event được log
+        """
+        count = self.counts.get(step, 0) + 1
+        self.counts[step] = count
+        if self._debug_enabled and (count <= self.first_n or count % self.every == 0):
+            self.logger.debug("[%s] " + msg + " (event #%s)", step, *args, count)
+
+    def log_summary(self, prefix: str = ""):
+        """
+        Ghi một dòng INFO cho mỗi step với tổng số events.
+        """
+        for step, count in self.counts.items():
+            self.logger.info("[%s] %s%s events", step, prefix, count)
@@ -1,3 +1,128 @@
+import numpy as np
+from functools import lru_cache
+from typing import List
+
+# Period được biểu diễn bằng month index (int): năm * 12 + (tháng - 1), năm đầy đủ (2000 + YY).
+# "M2501" <-> 2025 * 12 + 0. So sánh/cộng trừ tháng làm trực tiếp trên int.
+
+
+@lru_cache(maxsize=None)
+def parse_period(period: str) -> int:
+    """
+    Parse chuỗi period dạng "M2907" thành month index (có cache).
+
+    Args:
+        period: Chuỗi dạng "M2907" (tháng 7 năm 2029)
+
+    Returns:
+        Month index (int)
+
+    Example:
+        >>> parse_period("M2501")
+        24300
+    """
+    if not period or len(period) < 5 or period[0] != 'M':
+        raise ValueError(f"Invalid period format: {period}. Expected format: M2501")
+
+    year = 2000 + int(period[1:3])
+    month = int(period[3:5])
+    return year * 12 + month - 1
+
+
+@lru_cache(maxsize=None)
+def format_period(period_index: int) -> str:
+    """
+    Format month index thành chuỗi period dạng "M2907" (có cache).
+
+    Args:
+        period_index: Month index (từ parse_period)
+
+    Returns:
+        Chuỗi dạng "M2907"
+    """
+    year, month_zero = divmod(int(period_index), 12)
+    return f"M{year % 100:02d}{month_zero + 1:02d}"
+
+
+@lru_cache(maxsize=None)
+def parse_period_offset(offset_period: str) -> int:
+    """
+    Parse chuỗi offset dạng "MP04" thành số tháng (có cache).
+
+    Args:
+        offset_period: Chuỗi dạng "MP04" (plus 4 tháng)
+
+    Returns:
+        Số tháng (int)
+    """
+    if not offset_period or len(offset_period) < 4 or not offset_period.startswith('MP'):
+        raise ValueError(f"Invalid offset_period format: {offset_period}. Expected format: MP04")
+
+    return int(offset_period[2:])
+
+
+def parse_periods(periods: List[str]) -> np.ndarray:
+    """
+    Parse nhiều periods thành numpy array month index, chỉ parse các giá trị unique.
+
+    Args:
+        periods: List các chuỗi dạng "M2501"
+
+    Returns:
+        numpy int64 array cùng thứ tự với periods
+    """
+    if len(periods) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    unique_periods, inverse = np.unique(np.asarray(periods, dtype=object).astype(str), return_inverse=True)
+    unique_indexes = np.array([parse_period(period) for period in unique_periods], dtype=np.int64)
+    return unique_indexes[inverse]
+
+
+def format_periods(period_indexes: np.ndarray) -> List[str]:
+    """
+    Format numpy array month index thành list chuỗi period (vectorized year/month split).
+
+    Args:
+        period_indexes: Array month index
+
+    Returns:
+        List các chuỗi dạng "M2501"
+    """
+    period_indexes = np.asarray(period_indexes, dtype=np.int64)
+    if period_indexes.size == 0:
+        return []
+
+    unique_indexes, inverse = np.unique(period_indexes, return_inverse=True)
+    years, month_zeros = np.divmod(unique_indexes, 12)
+    formatted = np.array(
+        [f"M{year % 100:02d}{month_zero + 1:02d}" for year, month_zero in zip(years.tolist(), month_zeros.tolist())],
+        dtype=object
+    )
+    return formatted[inverse].tolist()
+
+
+def shift_periods(period_indexes: np.ndarray, offset) -> np.ndarray:
+    """
+    Dịch month indexes đi offset tháng (offset có thể là int hoặc array cùng shape).
+    """
+    return np.asarray(period_indexes, dtype=np.int64) + np.asarray(offset, dtype=np.int64)
+
+
+def period_range(end_period: str, count: int) -> np.ndarray:
+    """
+    Tạo dãy month index lùi dần từ end_period: [end, end - 1, ..., end - (count - 1)].
+
+    Args:
+        end_period: Chuỗi dạng "M2504"
+        count: Số periods
+
+    Returns:
+        numpy int64 array, phần tử thứ L = end_period - L tháng
+    """
+    return parse_period(end_period) - np.arange(count, dtype=np.int64)
+
+
 def add_period_strings(base_period: str, offset_period: str) -> str:
     """
     Cộng 2 chuỗi thời gian lại với nhau.
@@ -15,27 +140,7 @@ def add_period_strings(base_period: str, offset_period: str) -> str:
         >>> add_period_strings("M2512", "MP01")
         "M2601"
     """
-    if not base_period or len(base_period) < 5 or base_period[0] != 'M':
-        raise ValueError(f"Invalid base_period format: {base_period}. Expected format: M2907")
-
-    year_str = base_period[1:3]
-    month_str = base_period[3:5]
-    base_year = 2000 + int(year_str)
-    base_month = int(month_str)
-
-    if not offset_period or len(offset_period) < 4 or not offset_period.startswith('MP'):
-        raise ValueError(f"Invalid offset_period format: {offset_period}. Expected format: MP04")
-
-    offset_months = int(offset_period[2:])
-
-    total_months = base_month + offset_months
-    new_year = base_year + (total_months - 1) // 12
-    new_month = ((total_months - 1) % 12) + 1
-
-    year_suffix = str(new_year)[-2:]
-    result = f"M{year_suffix}{new_month:02d}"
-
-    return result
+    return format_period(parse_period(base_period) + parse_period_offset(offset_period))
 
 
 def add_period_with_offset(base_period: str, offset: int) -> str:
@@ -57,19 +162,22 @@ def add_period_with_offset(base_period: str, offset: int) -> str:
         >>> add_period_with_offset("M2512", 1)
         "M2601"
     """
-    if not base_period or len(base_period) < 5 or base_period[0] != 'M':
-        raise ValueError(f"Invalid base_period format: {base_period}. Expected format: M2501")
+    return format_period(parse_period(base_period) + offset)
 
-    year_str = base_period[1:3]
-    month_str = base_period[3:5]
-    base_year = 2000 + int(year_str)
-    base_month = int(month_str)
 
-    total_months = (base_year * 12 + base_month) + offset
-    new_year = (total_months - 1) // 12
-    new_month = ((total_months - 1) % 12) + 1
+def add_periods_with_offset(base_periods: List[str], offset: int) -> List[str]:
+    """
+    Vectorized version của add_period_with_offset cho nhiều base_periods cùng offset.
 
-    year_suffix = str(new_year)[-2:]
-    result = f"M{year_suffix}{new_month:02d}"
+    Args:
+        base_periods: List các chuỗi dạng "M2501"
+        offset: Số tháng cần cộng/trừ (dương = tịnh tiến, âm = lùi)
 
-    return result
+    Returns:
+        List kết quả cùng thứ tự với base_periods
+
+    Example:
+        >>> add_periods_with_offset(["M2501", "M2512", "M2501"], 1)
+        ["M2502", "M2601", "M2502"]
+    """
+    return format_periods(shift_periods(parse_periods(base_periods), offset))